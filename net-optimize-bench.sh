@@ -0,0 +1,527 @@
+#!/usr/bin/env bash
+# ==============================================================================
+# 🧪 Net-Optimize Bench - 单机网络命名空间 A/B 基准
+# 用途：验证 net-optimize-ultimate.sh 的参数（sysctl / 拥塞算法 / 队列）是否真的提升吞吐、降低延迟
+#
+# 拓扑（全部在本机，不碰宿主机网卡）：
+#   nobench-c (客户端) ── veth ── nobench-r (路由器，tc netem 模拟跨境链路) ── veth ── nobench-s (VPS 侧)
+#   netem 在路由器两个出口上：各加一半 RTT + 抖动 + 丢包 + 限速
+#   候选参数同时作用在 c / s 两端（每个命名空间有自己的一套 net.ipv4.* 参数，宿主机不受影响）
+#
+# 负载（数据方向 s -> c，模拟从 VPS 下载）：
+#   TCP 单流 / 多流批量：吞吐 Mbit/s + 发送端重传段数（/proc/net/snmp RetransSegs 差值）
+#   UDP 定速发送：收到的 Mbit/s + 丢包率 + 接收端 Udp RcvbufErrors / InErrors 增量（区分“链路丢”和“本机缓冲满丢”）
+#   请求/响应（RR）：空载 和 批量下载同时进行 两种情况下的 p50 / p99 延迟
+#
+# 用法：
+#   bash net-optimize-bench.sh [--path cn-us] [--path lossy ...]
+#       [--candidate 名字[:sysctl文件[:拥塞算法[:队列]]] ...] [--duration 10] [--runs 1]
+#       [--streams 1] [--rr-count 300] [--no-udp] [--udp-rcvbuf 8388608] [--udp-size 1400] [--json out.jsonl]
+#   不给 --candidate 时比较：
+#     baseline  新命名空间的内核默认值 + cubic + fq_codel
+#     ultimate  net-optimize-ultimate.sh --print-sysctl 渲染的参数 + bbr + fq
+#   sysctl 文件是 sysctl.d 格式；写 "-" 表示不改。非命名空间化的全局参数（如 net.core.rmem_max）默认跳过，
+#   加 --allow-global 才会写到宿主机（结束时恢复原值）。
+#   --udp-rcvbuf：UDP 接收端 SO_RCVBUF 请求值（默认 8MB，和 quic-go 一类 QUIC 实现差不多；0 = 不设，用 rmem_default），
+#   实际值被 net.core.rmem_max 截断，所以 baseline / ultimate 的 rmem_max 差异会直接体现在 RcvbufErrors 上。
+#
+# 链路（--path，可多次；--list-paths 列出）：名字 RTT(ms) 抖动(ms) 丢包(%) 带宽(Mbit, 0=不限)
+#   --path-spec "名字 RTT 抖动 丢包 带宽" 临时加一条（如按实测的本机链路），并选中它
+# 依赖：root、iproute2（ip / tc + sch_netem）、python3
+# ==============================================================================
+
+set -euo pipefail
+
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+
+NS_C="nobench-c"
+NS_R="nobench-r"
+NS_S="nobench-s"
+ADDR_C="10.203.1.2"
+ADDR_S="10.203.2.2"
+PORT_TCP=5301
+PORT_RR=5302
+PORT_UDP=5303
+
+: "${DURATION:=10}"
+: "${RUNS:=1}"
+: "${STREAMS:=1}"
+: "${RR_COUNT:=300}"
+: "${UDP_RATE_MBIT:=0}"   # 0 = 链路带宽的 90%（不限速链路按 500）
+: "${UDP_RCVBUF:=8388608}"
+: "${UDP_SIZE:=1400}"
+
+# 名字 RTT 抖动 丢包 带宽
+PATH_PROFILES=(
+  "lan      1    0   0     0"
+  "cn-hk    35   3   0.1   500"
+  "cn-jp    60   5   0.2   300"
+  "cn-us    180  10  0.5   200"
+  "cn-eu    240  15  0.8   150"
+  "lossy    200  20  2     100"
+)
+
+green(){ printf "\033[32m%s\033[0m\n" "$*"; }
+yellow(){ printf "\033[33m%s\033[0m\n" "$*"; }
+red(){ printf "\033[31m%s\033[0m\n" "$*"; }
+title(){ echo "============================================================"; }
+sep(){ echo "------------------------------------------------------------"; }
+has(){ command -v "$1" >/dev/null 2>&1; }
+
+in_ns(){ local ns="$1"; shift; ip netns exec "$ns" "$@"; }
+
+usage() { sed -n '2,30p' "$0" | sed 's/^# \{0,1\}//'; }
+
+# ========= 参数 =========
+SELECTED_PATHS=()
+CANDIDATES=()
+JSON_OUT=""
+ALLOW_GLOBAL=0
+NO_UDP=0
+
+while [ $# -gt 0 ]; do
+  case "$1" in
+    --path) SELECTED_PATHS+=("$2"); shift 2 ;;
+    --path-spec) PATH_PROFILES+=("$2"); SELECTED_PATHS+=("${2%% *}"); shift 2 ;;
+    --candidate) CANDIDATES+=("$2"); shift 2 ;;
+    --duration) DURATION="$2"; shift 2 ;;
+    --runs) RUNS="$2"; shift 2 ;;
+    --streams) STREAMS="$2"; shift 2 ;;
+    --rr-count) RR_COUNT="$2"; shift 2 ;;
+    --udp-rate) UDP_RATE_MBIT="$2"; shift 2 ;;
+    --udp-rcvbuf) UDP_RCVBUF="$2"; shift 2 ;;
+    --udp-size) UDP_SIZE="$2"; shift 2 ;;
+    --json) JSON_OUT="$2"; shift 2 ;;
+    --allow-global) ALLOW_GLOBAL=1; shift ;;
+    --no-udp) NO_UDP=1; shift ;;
+    --list-paths) printf '%s\n' "${PATH_PROFILES[@]}"; exit 0 ;;
+    -h|--help) usage; exit 0 ;;
+    *) red "❌ 未知参数：$1"; usage; exit 1 ;;
+  esac
+done
+[ "${#SELECTED_PATHS[@]}" -gt 0 ] || SELECTED_PATHS=(cn-us lossy)
+
+path_profile() {
+  local name="$1" line
+  for line in "${PATH_PROFILES[@]}"; do
+    set -- $line
+    [ "$1" = "$name" ] && { echo "$line"; return 0; }
+  done
+  return 1
+}
+
+# ========= 前置检查 =========
+[ "$(id -u)" -eq 0 ] || { red "❌ 需要 root（创建网络命名空间）"; exit 1; }
+for c in ip tc python3; do has "$c" || { red "❌ 缺少 $c"; exit 1; }; done
+for p in "${SELECTED_PATHS[@]}"; do path_profile "$p" >/dev/null || { red "❌ 未知链路：$p（--list-paths 查看）"; exit 1; }; done
+
+WORK="$(mktemp -d /tmp/nobench.XXXXXX)"
+RESULTS="$WORK/results.jsonl"
+: >"$RESULTS"
+GLOBAL_BACKUP="$WORK/global-sysctl.backup"
+: >"$GLOBAL_BACKUP"
+BG_PIDS=()
+
+cleanup() {
+  local pid ns
+  for pid in "${BG_PIDS[@]:-}"; do [ -n "$pid" ] && kill "$pid" 2>/dev/null || true; done
+  for ns in "$NS_C" "$NS_R" "$NS_S"; do
+    for pid in $(ip netns pids "$ns" 2>/dev/null || true); do kill "$pid" 2>/dev/null || true; done
+    ip netns del "$ns" 2>/dev/null || true
+  done
+  # 恢复 --allow-global 改过的宿主机参数
+  if [ -s "$GLOBAL_BACKUP" ]; then
+    while IFS='=' read -r k v; do
+      sysctl -qw "$k=$v" >/dev/null 2>&1 || true
+    done <"$GLOBAL_BACKUP"
+    echo "♻️ 已恢复宿主机全局参数：$(wc -l <"$GLOBAL_BACKUP") 项"
+  fi
+  rm -rf "$WORK"
+}
+trap cleanup EXIT
+trap 'code=$?; red "❌ 出错：第 ${BASH_LINENO[0]} 行 -> ${BASH_COMMAND} (退出码 $code)"; exit $code' ERR
+
+# ========= 负载工具（python3，发送 / 接收两端都用它）=========
+cat >"$WORK/nobench.py" <<'PYEOF'
+import json, socket, struct, sys, threading, time
+
+CHUNK = b"\0" * 65536
+
+def tcp_source(port, duration):
+    """每个连接持续发 duration 秒后关闭。"""
+    srv = socket.socket(); srv.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    srv.bind(("0.0.0.0", port)); srv.listen(64)
+    def serve(c):
+        end = time.monotonic() + duration
+        try:
+            while time.monotonic() < end:
+                c.sendall(CHUNK)
+        except OSError:
+            pass
+        finally:
+            c.close()
+    while True:
+        c, _ = srv.accept()
+        threading.Thread(target=serve, args=(c,), daemon=True).start()
+
+def tcp_sink(host, port, streams):
+    total = [0] * streams
+    def one(i):
+        s = socket.create_connection((host, port))
+        while True:
+            b = s.recv(262144)
+            if not b:
+                break
+            total[i] += len(b)
+        s.close()
+    t0 = time.monotonic()
+    ts = [threading.Thread(target=one, args=(i,)) for i in range(streams)]
+    for t in ts: t.start()
+    for t in ts: t.join()
+    el = time.monotonic() - t0
+    print(json.dumps({"bytes": sum(total), "seconds": round(el, 3), "mbit": round(sum(total) * 8 / el / 1e6, 2)}))
+
+def rr_server(port, resp):
+    srv = socket.socket(); srv.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    srv.bind(("0.0.0.0", port)); srv.listen(64)
+    payload = b"r" * resp
+    def serve(c):
+        c.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        try:
+            while True:
+                b = c.recv(64)
+                if not b:
+                    break
+                c.sendall(payload)
+        except OSError:
+            pass
+        c.close()
+    while True:
+        c, _ = srv.accept()
+        threading.Thread(target=serve, args=(c,), daemon=True).start()
+
+def rr_client(host, port, count, resp, seconds):
+    """最多 count 次请求，最长 seconds 秒（高 RTT 链路上次数会少一些）。"""
+    s = socket.create_connection((host, port))
+    s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    lat = []
+    end = time.monotonic() + seconds
+    while len(lat) < count and time.monotonic() < end:
+        t0 = time.monotonic()
+        s.sendall(b"q" * 64)
+        got = 0
+        while got < resp:
+            b = s.recv(resp - got)
+            if not b:
+                raise SystemExit("rr: connection closed")
+            got += len(b)
+        lat.append((time.monotonic() - t0) * 1000)
+    s.close()
+    lat.sort()
+    pick = lambda q: round(lat[min(len(lat) - 1, int(q * len(lat)))], 2)
+    print(json.dumps({"p50": pick(0.5), "p99": pick(0.99), "count": len(lat)}))
+
+def udp_sink(port, idle, rcvbuf):
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    if rcvbuf:
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf)
+    s.bind(("0.0.0.0", port)); s.settimeout(idle)
+    n = nbytes = 0; first = last = None
+    try:
+        while True:
+            b = s.recv(65535)
+            now = time.monotonic()
+            if first is None: first = now
+            last = now; n += 1; nbytes += len(b)
+    except socket.timeout:
+        pass
+    el = (last - first) if n > 1 else 0
+    print(json.dumps({"packets": n, "bytes": nbytes, "mbit": round(nbytes * 8 / el / 1e6, 2) if el else 0,
+                      "rcvbuf": s.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)}))
+
+def udp_send(host, port, duration, mbit, size):
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    pkt = b"u" * size
+    pps = mbit * 1e6 / 8 / size
+    sent = 0; t0 = time.monotonic(); end = t0 + duration
+    while True:
+        now = time.monotonic()
+        if now >= end: break
+        due = int((now - t0) * pps)
+        while sent < due:
+            try: s.sendto(pkt, (host, port))
+            except OSError: pass
+            sent += 1
+        time.sleep(0.0005)
+    print(json.dumps({"packets": sent}))
+
+cmd = sys.argv[1]; a = sys.argv[2:]
+if cmd == "tcp-source": tcp_source(int(a[0]), float(a[1]))
+elif cmd == "tcp-sink": tcp_sink(a[0], int(a[1]), int(a[2]))
+elif cmd == "rr-server": rr_server(int(a[0]), int(a[1]))
+elif cmd == "rr-client": rr_client(a[0], int(a[1]), int(a[2]), int(a[3]), float(a[4]))
+elif cmd == "udp-sink": udp_sink(int(a[0]), float(a[1]), int(a[2]))
+elif cmd == "udp-send": udp_send(a[0], int(a[1]), float(a[2]), float(a[3]), int(a[4]))
+PYEOF
+NOBENCH="python3 $WORK/nobench.py"
+
+# ========= 拓扑 =========
+setup_topology() {
+  local ns
+  for ns in "$NS_C" "$NS_R" "$NS_S"; do
+    ip netns del "$ns" 2>/dev/null || true
+    ip netns add "$ns"
+    in_ns "$ns" ip link set lo up
+  done
+
+  ip link add c-r netns "$NS_C" type veth peer name r-c netns "$NS_R"
+  ip link add s-r netns "$NS_S" type veth peer name r-s netns "$NS_R"
+
+  in_ns "$NS_C" ip addr add "$ADDR_C/24" dev c-r
+  in_ns "$NS_C" ip link set c-r up
+  in_ns "$NS_C" ip route add default via 10.203.1.1
+
+  in_ns "$NS_S" ip addr add "$ADDR_S/24" dev s-r
+  in_ns "$NS_S" ip link set s-r up
+  in_ns "$NS_S" ip route add default via 10.203.2.1
+
+  in_ns "$NS_R" ip addr add 10.203.1.1/24 dev r-c
+  in_ns "$NS_R" ip addr add 10.203.2.1/24 dev r-s
+  in_ns "$NS_R" ip link set r-c up
+  in_ns "$NS_R" ip link set r-s up
+  in_ns "$NS_R" sysctl -qw net.ipv4.ip_forward=1
+  # veth 默认开 GSO/TSO，超大段绕过 netem 的逐包限速，关掉让链路模拟更接近真实网卡
+  for dev in r-c r-s; do in_ns "$NS_R" ethtool -K "$dev" gso off tso off gro off >/dev/null 2>&1 || true; done
+}
+
+# 路由器两个出口各加一半 RTT；带宽为 0 不限速；RTT / 丢包都为 0 时不挂 netem（纯 veth 参照）
+apply_path() {
+  local name rtt jitter loss rate
+  read -r name rtt jitter loss rate <<<"$(path_profile "$1")"
+  local half=$((rtt / 2)) jhalf=$((jitter / 2)) dev
+  for dev in r-c r-s; do
+    in_ns "$NS_R" tc qdisc del dev "$dev" root 2>/dev/null || true
+    if [ "$rtt" -le 1 ] && [ "$loss" = "0" ] && [ "$rate" = "0" ]; then
+      continue
+    fi
+    local args=(delay "${half}ms")
+    [ "$jhalf" -gt 0 ] && args+=("${jhalf}ms" distribution normal)
+    [ "$loss" != "0" ] && args+=(loss "${loss}%")
+    if [ "$rate" != "0" ]; then
+      # 队列上限按 2×BDP 个 1500 字节包，至少 1000
+      local limit=$((rate * rtt * 1000 / 8 / 1500 * 2))
+      [ "$limit" -lt 1000 ] && limit=1000
+      args+=(rate "${rate}mbit" limit "$limit")
+    fi
+    in_ns "$NS_R" tc qdisc add dev "$dev" root netem "${args[@]}" || {
+      red "❌ netem 不可用（modprobe sch_netem？）"; return 1; }
+  done
+  PATH_RTT="$rtt"; PATH_RATE="$rate"
+}
+
+# ========= 候选参数 =========
+# 返回 0 表示该 key 在命名空间里存在（每个命名空间独立）
+ns_has_key() { in_ns "$NS_S" test -e "/proc/sys/${1//./\/}"; }
+
+apply_sysctl_file() {
+  local file="$1" k v applied=0 skipped=0 global=0
+  [ -n "$file" ] && [ "$file" != "-" ] || return 0
+  while IFS= read -r line; do
+    line="${line%%#*}"
+    [[ "$line" == *=* ]] || continue
+    k="$(echo "${line%%=*}" | tr -d '[:space:]')"
+    v="$(echo "${line#*=}" | sed 's/^[[:space:]]*//; s/[[:space:]]*$//')"
+    [ -n "$k" ] || continue
+    case "$k" in net.core.default_qdisc|net.ipv4.tcp_congestion_control) continue ;; esac  # 由 候选的 队列 / 拥塞算法 字段决定
+    if ns_has_key "$k"; then
+      in_ns "$NS_C" sysctl -qw "$k=$v" >/dev/null 2>&1 || true
+      in_ns "$NS_S" sysctl -qw "$k=$v" >/dev/null 2>&1 && applied=$((applied + 1)) || skipped=$((skipped + 1))
+    elif [ "$ALLOW_GLOBAL" = "1" ] && [ -e "/proc/sys/${k//./\/}" ]; then
+      grep -q "^$k=" "$GLOBAL_BACKUP" || echo "$k=$(sysctl -n "$k" 2>/dev/null | tr '\t' ' ')" >>"$GLOBAL_BACKUP"
+      sysctl -qw "$k=$v" >/dev/null 2>&1 && global=$((global + 1)) || skipped=$((skipped + 1))
+    else
+      skipped=$((skipped + 1))
+    fi
+  done <"$file"
+  echo "    sysctl：命名空间内 $applied 项，宿主机全局 $global 项，跳过 $skipped 项"
+}
+
+apply_candidate() {
+  local sysfile="$1" cc="$2" qdisc="$3" ns
+  if [ -n "$cc" ]; then
+    modprobe "tcp_$cc" 2>/dev/null || true
+    for ns in "$NS_C" "$NS_S"; do
+      in_ns "$ns" sysctl -qw net.ipv4.tcp_congestion_control="$cc" >/dev/null 2>&1 || {
+        yellow "    ⚠️ 拥塞算法 $cc 不可用，保持 $(in_ns "$ns" sysctl -n net.ipv4.tcp_congestion_control)"; break; }
+    done
+  fi
+  if [ -n "$qdisc" ]; then
+    modprobe "sch_$qdisc" 2>/dev/null || true
+    in_ns "$NS_C" tc qdisc replace dev c-r root "$qdisc" 2>/dev/null || true
+    in_ns "$NS_S" tc qdisc replace dev s-r root "$qdisc" 2>/dev/null || yellow "    ⚠️ 队列 $qdisc 不可用"
+  fi
+  apply_sysctl_file "$sysfile"
+}
+
+default_candidates() {
+  CANDIDATES=("baseline:-:cubic:fq_codel")
+  local ult=""
+  for f in "$SCRIPT_DIR/net-optimize-ultimate.sh" /usr/local/sbin/net-optimize-ultimate.sh; do
+    [ -f "$f" ] && { ult="$f"; break; }
+  done
+  if [ -n "$ult" ] && bash "$ult" --print-sysctl >"$WORK/ultimate.conf" 2>/dev/null; then
+    CANDIDATES+=("ultimate:$WORK/ultimate.conf:bbr:fq")
+  else
+    yellow "⚠️ 找不到 net-optimize-ultimate.sh（或不支持 --print-sysctl），只跑 baseline"
+  fi
+}
+
+# ========= 测量 =========
+retrans() { in_ns "$NS_S" awk '/^Tcp:/ {if (!h) {for (i=1;i<=NF;i++) if ($i=="RetransSegs") c=i; h=1} else print $c}' /proc/net/snmp; }
+
+# 客户端命名空间的 "RcvbufErrors InErrors"（snmp 按命名空间独立）
+udp_errors() {
+  in_ns "$NS_C" awk '/^Udp:/ {if (!h) {for (i=1;i<=NF;i++) {if ($i=="RcvbufErrors") b=i; if ($i=="InErrors") e=i}; h=1} else print $b, $e}' /proc/net/snmp
+}
+
+# 后台起服务：直接 ip netns exec（不经函数 / 子 shell），$! 就是服务进程本身
+bg() { local ns="$1"; shift; ip netns exec "$ns" "$@" & BG_PIDS+=($!); }
+
+stop_bg() {
+  local pid
+  for pid in "${BG_PIDS[@]:-}"; do [ -n "$pid" ] && kill "$pid" 2>/dev/null || true; done
+  # 兜底：命名空间里残留的进程
+  for ns in "$NS_C" "$NS_S"; do
+    for pid in $(ip netns pids "$ns" 2>/dev/null || true); do kill "$pid" 2>/dev/null || true; done
+  done
+  wait 2>/dev/null || true
+  BG_PIDS=()
+}
+
+measure() {
+  local path="$1" cand="$2" run="$3"
+  local udp_rate="$UDP_RATE_MBIT"
+  if [ "$udp_rate" = "0" ]; then
+    udp_rate=500
+    [ "$PATH_RATE" != "0" ] && udp_rate=$((PATH_RATE * 9 / 10))
+  fi
+
+  bg "$NS_S" $NOBENCH tcp-source "$PORT_TCP" "$DURATION"
+  bg "$NS_S" $NOBENCH rr-server "$PORT_RR" 1024
+  sleep 0.5
+
+  # RR 空载
+  local rr_idle rr_load tcp udp_recv udp_sent r0 r1 ub0=0 ue0=0 ub1=0 ue1=0
+  rr_idle="$(in_ns "$NS_C" $NOBENCH rr-client "$ADDR_S" "$PORT_RR" "$RR_COUNT" 1024 "$DURATION")"
+
+  # TCP 批量 + 同时 RR（负载下延迟）
+  r0="$(retrans)"
+  in_ns "$NS_C" $NOBENCH tcp-sink "$ADDR_S" "$PORT_TCP" "$STREAMS" >"$WORK/tcp.json" &
+  local sink=$!
+  sleep 1
+  rr_load="$(in_ns "$NS_C" $NOBENCH rr-client "$ADDR_S" "$PORT_RR" "$RR_COUNT" 1024 "$((DURATION > 2 ? DURATION - 2 : 1))")"
+  wait "$sink"
+  tcp="$(cat "$WORK/tcp.json")"
+  r1="$(retrans)"
+
+  # UDP 定速（--no-udp 跳过，结果里 UDP 字段为 null）
+  udp_sent='{"packets": 0}'
+  udp_recv='{"packets": 0, "mbit": null, "rcvbuf": null}'
+  if [ "$NO_UDP" != "1" ]; then
+    read -r ub0 ue0 <<<"$(udp_errors)"
+    in_ns "$NS_C" $NOBENCH udp-sink "$PORT_UDP" 2 "$UDP_RCVBUF" >"$WORK/udp.json" &
+    local usink=$!
+    sleep 0.3
+    udp_sent="$(in_ns "$NS_S" $NOBENCH udp-send "$ADDR_C" "$PORT_UDP" "$DURATION" "$udp_rate" "$UDP_SIZE")"
+    wait "$usink"
+    udp_recv="$(cat "$WORK/udp.json")"
+    read -r ub1 ue1 <<<"$(udp_errors)"
+  fi
+
+  stop_bg
+
+  python3 - "$path" "$cand" "$run" "$tcp" "$((r1 - r0))" "$udp_sent" "$udp_recv" "$rr_idle" "$rr_load" "$udp_rate" \
+    "$((ub1 - ub0))" "$((ue1 - ue0))" >>"$RESULTS" <<'PYEOF'
+import json, sys
+path, cand, run, tcp, retr, usent, urecv, rri, rrl, urate, ubuf, uerr = sys.argv[1:]
+tcp, usent, urecv, rri, rrl = map(json.loads, (tcp, usent, urecv, rri, rrl))
+loss = round(max(0, 1 - urecv["packets"] / usent["packets"]) * 100, 2) if usent["packets"] else None
+print(json.dumps({
+    "path": path, "candidate": cand, "run": int(run),
+    "tcp_mbit": tcp["mbit"], "retrans": int(retr),
+    "udp_rate": float(urate), "udp_mbit": urecv["mbit"], "udp_loss_pct": loss,
+    "udp_rcvbuf": urecv["rcvbuf"], "udp_rcvbuf_err": int(ubuf) if urecv["mbit"] is not None else None,
+    "udp_in_err": int(uerr) if urecv["mbit"] is not None else None,
+    "rr_p50": rri["p50"], "rr_p99": rri["p99"], "load_p50": rrl["p50"], "load_p99": rrl["p99"],
+}))
+PYEOF
+  tail -n1 "$RESULTS" | python3 -c '
+import json, sys
+r = json.load(sys.stdin)
+udp = "UDP %(udp_mbit)s Mbit/s 丢 %(udp_loss_pct)s%%（缓冲满 %(udp_rcvbuf_err)s，rcvbuf %(udp_rcvbuf)s）| " % r if r["udp_mbit"] is not None else ""
+print(("    TCP %(tcp_mbit)s Mbit/s 重传 %(retrans)s | " % r) + udp +
+      "RR p50/p99 %(rr_p50)s/%(rr_p99)sms 负载下 %(load_p50)s/%(load_p99)sms" % r)'
+}
+
+report() {
+  python3 - "$RESULTS" <<'PYEOF'
+import json, statistics, sys
+rows = [json.loads(l) for l in open(sys.argv[1]) if l.strip()]
+keys = ["tcp_mbit", "retrans", "udp_mbit", "udp_loss_pct", "udp_rcvbuf_err", "rr_p50", "rr_p99", "load_p50", "load_p99"]
+higher_better = {"tcp_mbit", "udp_mbit"}
+agg = {}
+for r in rows:
+    agg.setdefault((r["path"], r["candidate"]), []).append(r)
+paths = list(dict.fromkeys(r["path"] for r in rows))
+cands = list(dict.fromkeys(r["candidate"] for r in rows))
+def median(vals):
+    vals = [x for x in vals if x is not None]
+    return statistics.median(vals) if vals else float("nan")
+med = {k: {m: median(x[m] for x in v) for m in keys} for k, v in agg.items()}
+head = f"{'候选':<14}{'TCP Mbit/s':>12}{'重传':>8}{'UDP Mbit/s':>12}{'UDP丢%':>8}{'缓冲满':>9}{'RR p50':>9}{'RR p99':>9}{'负载p50':>9}{'负载p99':>9}"
+for p in paths:
+    print(f"\n📶 链路 {p}（{len(agg[(p, cands[0])])} 轮取中位数）")
+    print(head)
+    base = med.get((p, cands[0]))
+    for c in cands:
+        m = med.get((p, c))
+        if not m:
+            continue
+        print(f"{c:<14}{m['tcp_mbit']:>12.1f}{m['retrans']:>8.0f}{m['udp_mbit']:>12.1f}{m['udp_loss_pct']:>8.2f}{m['udp_rcvbuf_err']:>9.0f}"
+              f"{m['rr_p50']:>9.1f}{m['rr_p99']:>9.1f}{m['load_p50']:>9.1f}{m['load_p99']:>9.1f}")
+        if c != cands[0] and base:
+            diffs = []
+            for k in ("tcp_mbit", "udp_mbit", "load_p99", "retrans"):
+                if base[k] and base[k] == base[k]:
+                    d = (m[k] - base[k]) / base[k] * 100
+                    good = d > 0 if k in higher_better else d < 0
+                    diffs.append(f"{k} {d:+.1f}% {'✅' if good else '⚠️'}")
+            print(f"{'':<14}vs {cands[0]}: " + "，".join(diffs))
+PYEOF
+}
+
+# ========= 主流程 =========
+[ "${#CANDIDATES[@]}" -gt 0 ] || default_candidates
+
+echo "🧪 Net-Optimize Bench：链路 ${SELECTED_PATHS[*]}，候选 ${#CANDIDATES[@]} 个，每项 ${DURATION}s × ${RUNS} 轮"
+title
+
+for path in "${SELECTED_PATHS[@]}"; do
+  for spec in "${CANDIDATES[@]}"; do
+    IFS=':' read -r cname csys ccc cqd <<<"$spec"
+    for run in $(seq 1 "$RUNS"); do
+      echo "▶ 链路 $path | 候选 $cname | 第 $run 轮"
+      # 每轮都重建命名空间：上一轮的 sysctl / 路由缓存 / TCP metrics 不会带进来
+      setup_topology
+      apply_path "$path"
+      apply_candidate "${csys:-}" "${ccc:-}" "${cqd:-}"
+      measure "$path" "$cname" "$run"
+    done
+  done
+done
+
+sep
+echo "📊 结果"
+report
+[ -n "$JSON_OUT" ] && cp "$RESULTS" "$JSON_OUT" && green "✅ 原始结果：$JSON_OUT"
+title
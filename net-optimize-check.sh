@@ -36,6 +36,460 @@ svc_state() {
   fi
 }
 
+# ================== --watch：高频内核计数器采样 + 瓶颈诊断 ==================
+# 静态检查只能看“配了什么”，看不出“哪个参数正在被打满”。--watch 以亚秒间隔读
+# /proc/net/{snmp,netstat,softnet_stat,sockstat} 和 conntrack 统计，增量放进环形缓冲，
+# 算速率 / 窗口峰值，把在涨的丢包计数映射回对应的调优参数。
+# 每轮只用 bash 内建 read 读 /proc、EPOCHREALTIME 取时间，结果用 printf -v 直接写进变量，
+# 不走命令替换，采样循环不 fork（bash < 5 没有 EPOCHREALTIME，退回 date，每轮多两次 fork）。
+#
+#   bash net-optimize-check.sh --watch [--interval 0.5] [--duration 30] [--window 60]
+#        [--prom /var/lib/node_exporter/textfile/net_optimize.prom] [--json /tmp/net-watch.json]
+#   wget -qO- .../net-optimize-check.sh | bash -s -- --watch --duration 60
+#
+# --duration 0 一直跑到 Ctrl-C；--prom 是 node_exporter textfile collector 格式，每秒原子刷新。
+WATCH=0
+WATCH_INTERVAL="${WATCH_INTERVAL:-0.5}"
+WATCH_DURATION="${WATCH_DURATION:-30}"
+WATCH_WINDOW="${WATCH_WINDOW:-60}"
+WATCH_PROM="${WATCH_PROM:-}"
+WATCH_JSON="${WATCH_JSON:-}"
+PROC_ROOT="${PROC_ROOT:-/proc}"
+
+while [[ $# -gt 0 ]]; do
+  case "$1" in
+    --watch) WATCH=1 ;;
+    --interval) WATCH_INTERVAL="$2"; shift ;;
+    --duration) WATCH_DURATION="$2"; shift ;;
+    --window) WATCH_WINDOW="$2"; shift ;;
+    --prom) WATCH_PROM="$2"; shift ;;
+    --json) WATCH_JSON="$2"; shift ;;
+    -h|--help)
+      sed -n '/^# ================== --watch/,/^WATCH=0/p' "$0" | sed '$d'
+      exit 0 ;;
+    *) red "❌ 未知参数：$1"; exit 2 ;;
+  esac
+  shift
+done
+
+# 采样的单调计数器：前缀与 /proc 文件里的行首一致（Softnet / Conntrack 为各 CPU 求和）
+WATCH_COUNTERS=(
+  Softnet:processed Softnet:dropped Softnet:time_squeeze
+  Tcp:OutSegs Tcp:RetransSegs Tcp:InErrs
+  TcpExt:ListenOverflows TcpExt:ListenDrops TcpExt:TCPReqQFullDrop TcpExt:TCPReqQFullDoCookies
+  TcpExt:TCPBacklogDrop TcpExt:RcvPruned TcpExt:TCPRcvQDrop
+  TcpExt:TCPMemoryPressures TcpExt:TCPAbortOnMemory TcpExt:TCPTimeWaitOverflow
+  Udp:InDatagrams Udp:InErrors Udp:RcvbufErrors Udp:SndbufErrors Udp:MemErrors
+  Conntrack:insert_failed Conntrack:drop Conntrack:early_drop
+)
+
+# 计数器 -> 被打满的参数 | 说明（窗口内有增量即判定）
+WATCH_RULES=(
+  "Softnet:time_squeeze|net.core.netdev_budget|软中断单轮预算用完仍有包（squeeze）：加大 netdev_budget / netdev_budget_usecs，或开 RPS 分摊到多核"
+  "Softnet:dropped|net.core.netdev_max_backlog|每 CPU 输入队列满丢包：加大 netdev_max_backlog"
+  "TcpExt:ListenOverflows|net.core.somaxconn|accept 队列溢出：somaxconn / 应用 listen(backlog) 太小，或应用 accept 太慢"
+  "TcpExt:TCPReqQFullDrop|net.ipv4.tcp_max_syn_backlog|半连接队列满丢 SYN：加大 tcp_max_syn_backlog（并确认 tcp_syncookies=1）"
+  "TcpExt:TCPReqQFullDoCookies|net.ipv4.tcp_max_syn_backlog|半连接队列满改发 syncookie：SYN 洪峰或 tcp_max_syn_backlog 偏小"
+  "TcpExt:TCPBacklogDrop|net.ipv4.tcp_rmem|socket backlog 满丢包：接收缓冲偏小或应用读得慢"
+  "TcpExt:RcvPruned|net.ipv4.tcp_rmem|接收队列被裁剪：tcp_rmem 上限偏小"
+  "TcpExt:TCPRcvQDrop|net.ipv4.tcp_rmem|接收队列内存不足丢包：tcp_rmem / tcp_mem 偏小"
+  "TcpExt:TCPMemoryPressures|net.ipv4.tcp_mem|TCP 总内存进入压力区：tcp_mem 偏小"
+  "TcpExt:TCPAbortOnMemory|net.ipv4.tcp_mem|因内存不足 / 孤儿连接过多直接 RST：tcp_mem / tcp_max_orphans 偏小"
+  "TcpExt:TCPTimeWaitOverflow|net.ipv4.tcp_max_tw_buckets|TIME_WAIT 桶溢出：tcp_max_tw_buckets 偏小"
+  "Udp:RcvbufErrors|net.core.rmem_max|UDP 接收缓冲满丢包：加大 rmem_max / rmem_default / udp_rmem_min（或应用 SO_RCVBUF）"
+  "Udp:SndbufErrors|net.core.wmem_max|UDP 发送缓冲满：加大 wmem_max / wmem_default / udp_wmem_min"
+  "Udp:MemErrors|net.ipv4.udp_mem|UDP 总内存超限丢包：udp_mem 偏小"
+  "Conntrack:insert_failed|net.netfilter.nf_conntrack_max|conntrack 插入失败：表满或哈希桶冲突，加大 nf_conntrack_max / buckets"
+  "Conntrack:drop|net.netfilter.nf_conntrack_max|conntrack 表满丢新连接：加大 nf_conntrack_max"
+  "Conntrack:early_drop|net.netfilter.nf_conntrack_max|conntrack 表满提前淘汰连接：加大 nf_conntrack_max"
+)
+
+# 瞬时量（取窗口峰值）-> 上限 / 压力阈值
+WATCH_GAUGES=(ct_count tcp_mem_pages udp_mem_pages tcp_tw tcp_orphan)
+WATCH_GAUGE_RULES=(
+  "ct_count|ct_max|90|net.netfilter.nf_conntrack_max|conntrack 条目接近上限"
+  "tcp_mem_pages|tcp_mem_pressure|100|net.ipv4.tcp_mem|TCP 内存达到 tcp_mem 压力阈值"
+  "udp_mem_pages|udp_mem_pressure|100|net.ipv4.udp_mem|UDP 内存达到 udp_mem 压力阈值"
+  "tcp_tw|tw_max|90|net.ipv4.tcp_max_tw_buckets|TIME_WAIT 数接近 tcp_max_tw_buckets"
+  "tcp_orphan|orphan_max|90|net.ipv4.tcp_max_orphans|孤儿连接接近 tcp_max_orphans"
+)
+
+declare -A W_WANT=() W_CUR=() W_PREV=() W_START=() W_RING=() W_WSUM=() W_WMAX=() W_RATE=()
+declare -A W_GAUGE=() W_GPEAK=() W_LIMIT=()
+W_RING_DT=()
+
+# "0.5" -> 500000（微秒），不依赖 bc/awk
+sec_to_us() {
+  local s="$1" i f
+  i="${s%%.*}"; f=""
+  [[ "$s" == *.* ]] && f="${s#*.}"
+  f="${f}000000"; f="${f:0:6}"
+  echo $(( 10#${i:-0} * 1000000 + 10#$f ))
+}
+
+us_to_s() { printf "%d.%01d" $(( $1 / 1000000 )) $(( $1 % 1000000 / 100000 )); }
+
+# 当前时间（微秒）写进变量 $1
+now_us() {
+  if [[ -n "${EPOCHREALTIME:-}" ]]; then
+    printf -v "$1" '%s' "${EPOCHREALTIME/[^0-9]/}"
+  else
+    printf -v "$1" '%s' "$(date +%s%6N)"
+  fi
+}
+
+# 文件 $2 的第一个字段写进变量 $1（读不到记 0）
+read_one() {
+  local _v=""
+  [[ -r "$2" ]] && read -r _v _ < "$2" 2>/dev/null || true
+  printf -v "$1" '%s' "${_v:-0}"
+}
+
+# /proc/net/snmp、/proc/net/netstat：表头行 + 数值行成对出现
+watch_read_pairs() {
+  local file="$1" hdr val pfx i
+  [[ -r "$file" ]] || return 0
+  while read -r -a hdr && read -r -a val; do
+    [[ "${hdr[0]}" == "${val[0]}" ]] || continue
+    pfx="${hdr[0]%:}"
+    for ((i = 1; i < ${#hdr[@]}; i++)); do
+      [[ -n "${W_WANT[$pfx:${hdr[i]}]:-}" ]] && W_CUR[$pfx:${hdr[i]}]="${val[i]}"
+    done
+  done < "$file"
+}
+
+# softnet_stat：每 CPU 一行十六进制，列 0 processed / 1 dropped / 2 time_squeeze
+watch_read_softnet() {
+  local f p=0 d=0 s=0
+  [[ -r "$PROC_ROOT/net/softnet_stat" ]] || return 0
+  while read -r -a f; do
+    p=$(( p + 16#${f[0]} )); d=$(( d + 16#${f[1]} )); s=$(( s + 16#${f[2]} ))
+  done < "$PROC_ROOT/net/softnet_stat"
+  W_CUR[Softnet:processed]=$p; W_CUR[Softnet:dropped]=$d; W_CUR[Softnet:time_squeeze]=$s
+}
+
+# /proc/net/stat/nf_conntrack：表头给列名（各内核版本列不同），每 CPU 一行十六进制
+watch_read_conntrack() {
+  local file="$PROC_ROOT/net/stat/nf_conntrack" hdr f i name
+  local -A sum=()
+  read_one 'W_GAUGE[ct_count]' "$PROC_ROOT/sys/net/netfilter/nf_conntrack_count"
+  [[ -r "$file" ]] || return 0
+  { read -r -a hdr
+    while read -r -a f; do
+      for ((i = 1; i < ${#hdr[@]} && i < ${#f[@]}; i++)); do
+        name="${hdr[i]}"
+        [[ -n "${W_WANT[Conntrack:$name]:-}" ]] && sum[$name]=$(( ${sum[$name]:-0} + 16#${f[i]} ))
+      done
+    done
+  } < "$file"
+  for name in "${!sum[@]}"; do W_CUR[Conntrack:$name]=${sum[$name]}; done
+}
+
+# /proc/net/sockstat：TCP: inuse N orphan N tw N alloc N mem N / UDP: inuse N mem N
+watch_read_sockstat() {
+  local f i
+  [[ -r "$PROC_ROOT/net/sockstat" ]] || return 0
+  while read -r -a f; do
+    case "${f[0]}" in
+      TCP:) for ((i = 1; i + 1 < ${#f[@]}; i += 2)); do
+              case "${f[i]}" in
+                orphan) W_GAUGE[tcp_orphan]=${f[i+1]} ;;
+                tw) W_GAUGE[tcp_tw]=${f[i+1]} ;;
+                mem) W_GAUGE[tcp_mem_pages]=${f[i+1]} ;;
+              esac
+            done ;;
+      UDP:) for ((i = 1; i + 1 < ${#f[@]}; i += 2)); do
+              [[ "${f[i]}" == mem ]] && W_GAUGE[udp_mem_pages]=${f[i+1]}
+            done ;;
+    esac
+  done < "$PROC_ROOT/net/sockstat"
+}
+
+watch_read_limits() {
+  local v
+  read_one 'W_LIMIT[ct_max]' "$PROC_ROOT/sys/net/netfilter/nf_conntrack_max"
+  read_one 'W_LIMIT[tw_max]' "$PROC_ROOT/sys/net/ipv4/tcp_max_tw_buckets"
+  read_one 'W_LIMIT[orphan_max]' "$PROC_ROOT/sys/net/ipv4/tcp_max_orphans"
+  v=(0 0 0); [[ -r "$PROC_ROOT/sys/net/ipv4/tcp_mem" ]] && read -r -a v < "$PROC_ROOT/sys/net/ipv4/tcp_mem"
+  W_LIMIT[tcp_mem_pressure]="${v[1]:-0}"
+  v=(0 0 0); [[ -r "$PROC_ROOT/sys/net/ipv4/udp_mem" ]] && read -r -a v < "$PROC_ROOT/sys/net/ipv4/udp_mem"
+  W_LIMIT[udp_mem_pressure]="${v[1]:-0}"
+}
+
+watch_sample() {
+  watch_read_pairs "$PROC_ROOT/net/snmp"
+  watch_read_pairs "$PROC_ROOT/net/netstat"
+  watch_read_softnet
+  watch_read_conntrack
+  watch_read_sockstat
+}
+
+# 把本轮增量写进环形缓冲槽位，窗口和做增量维护（减去被覆盖的旧槽）
+watch_push() {
+  local dt="$1" slot k d old
+  slot=$(( W_N % W_SLOTS ))
+  if (( W_N >= W_SLOTS )); then
+    W_WDT=$(( W_WDT - W_RING_DT[slot] ))
+  fi
+  W_RING_DT[slot]=$dt
+  W_WDT=$(( W_WDT + dt ))
+  for k in "${WATCH_COUNTERS[@]}"; do
+    d=$(( ${W_CUR[$k]:-0} - ${W_PREV[$k]:-0} ))
+    (( d < 0 )) && d=0   # 32 位计数器回绕 / 模块重载
+    old=0
+    (( W_N >= W_SLOTS )) && old=${W_RING[$k|$slot]:-0}
+    W_RING[$k|$slot]=$d
+    W_WSUM[$k]=$(( ${W_WSUM[$k]:-0} - old + d ))
+    W_RATE[$k]=$(( d * 1000000 / dt ))
+  done
+  for k in "${WATCH_GAUGES[@]}"; do
+    (( ${W_GAUGE[$k]:-0} > ${W_GPEAK[$k]:-0} )) && W_GPEAK[$k]=${W_GAUGE[$k]}
+  done
+  W_N=$(( W_N + 1 ))
+}
+
+# 窗口内单个采样间隔的最大速率（只在出报告时算）
+watch_window_max() {
+  local n s k r
+  n=$(( W_N < W_SLOTS ? W_N : W_SLOTS ))
+  for k in "${WATCH_COUNTERS[@]}"; do W_WMAX[$k]=0; done
+  for ((s = 0; s < n; s++)); do
+    for k in "${WATCH_COUNTERS[@]}"; do
+      r=${W_RING[$k|$s]}
+      (( r == 0 )) && continue
+      r=$(( r * 1000000 / W_RING_DT[s] ))
+      (( r > W_WMAX[$k] )) && W_WMAX[$k]=$r
+    done
+  done
+}
+
+# 重传率（万分比）：窗口内 RetransSegs / OutSegs
+watch_retrans_bp() {
+  local out=${W_WSUM[Tcp:OutSegs]:-0}
+  (( out > 0 )) && echo $(( ${W_WSUM[Tcp:RetransSegs]:-0} * 10000 / out )) || echo 0
+}
+
+# 诊断结果：W_SAT 每项 "param|counter|delta|hint"
+watch_diagnose() {
+  local rule k param hint g lim pct v cap
+  W_SAT=()
+  for rule in "${WATCH_RULES[@]}"; do
+    IFS='|' read -r k param hint <<<"$rule"
+    (( ${W_WSUM[$k]:-0} > 0 )) && W_SAT+=("$param|$k|${W_WSUM[$k]}|$hint")
+  done
+  for rule in "${WATCH_GAUGE_RULES[@]}"; do
+    IFS='|' read -r g lim pct param hint <<<"$rule"
+    v=${W_GPEAK[$g]:-0}; cap=${W_LIMIT[$lim]:-0}
+    (( cap > 0 && v * 100 >= cap * pct )) && W_SAT+=("$param|$g|$v|$hint（峰值 $v / $cap）")
+  done
+  return 0
+}
+
+watch_is_sat() {
+  local s
+  for s in "${W_SAT[@]}"; do
+    [[ "$s" == "$1|$2|"* ]] && return 0
+  done
+  return 1
+}
+
+watch_write_prom() {
+  local file="$1" tmp="$1.tmp" k rule param hint sat
+  {
+    echo "# HELP net_optimize_counter_total Kernel network counter (monotonic, summed over CPUs)."
+    echo "# TYPE net_optimize_counter_total counter"
+    for k in "${WATCH_COUNTERS[@]}"; do
+      printf 'net_optimize_counter_total{group="%s",counter="%s"} %s\n' "${k%%:*}" "${k#*:}" "${W_CUR[$k]:-0}"
+    done
+    echo "# HELP net_optimize_counter_rate Per-second rate over the last sample interval."
+    echo "# TYPE net_optimize_counter_rate gauge"
+    for k in "${WATCH_COUNTERS[@]}"; do
+      printf 'net_optimize_counter_rate{group="%s",counter="%s"} %s\n' "${k%%:*}" "${k#*:}" "${W_RATE[$k]:-0}"
+    done
+    echo "# HELP net_optimize_counter_rate_max Highest per-interval rate inside the sampling window."
+    echo "# TYPE net_optimize_counter_rate_max gauge"
+    for k in "${WATCH_COUNTERS[@]}"; do
+      printf 'net_optimize_counter_rate_max{group="%s",counter="%s"} %s\n' "${k%%:*}" "${k#*:}" "${W_WMAX[$k]:-0}"
+    done
+    echo "# HELP net_optimize_gauge Instantaneous kernel network gauge."
+    echo "# TYPE net_optimize_gauge gauge"
+    for k in "${WATCH_GAUGES[@]}"; do
+      printf 'net_optimize_gauge{name="%s"} %s\n' "$k" "${W_GAUGE[$k]:-0}"
+    done
+    echo "# HELP net_optimize_limit Configured limit the gauges are compared against."
+    echo "# TYPE net_optimize_limit gauge"
+    for k in "${!W_LIMIT[@]}"; do
+      printf 'net_optimize_limit{name="%s"} %s\n' "$k" "${W_LIMIT[$k]}"
+    done
+    echo "# HELP net_optimize_retrans_ratio TCP RetransSegs / OutSegs inside the sampling window."
+    echo "# TYPE net_optimize_retrans_ratio gauge"
+    printf 'net_optimize_retrans_ratio %s\n' "$(printf '0.%04d' "$(watch_retrans_bp)")"
+    echo "# HELP net_optimize_saturated 1 if the counter/gauge mapped to this sysctl moved inside the window."
+    echo "# TYPE net_optimize_saturated gauge"
+    for rule in "${WATCH_RULES[@]}"; do
+      IFS='|' read -r k param hint <<<"$rule"
+      sat=0; watch_is_sat "$param" "$k" && sat=1
+      printf 'net_optimize_saturated{param="%s",source="%s"} %s\n' "$param" "$k" "$sat"
+    done
+    for rule in "${WATCH_GAUGE_RULES[@]}"; do
+      IFS='|' read -r k _ _ param hint <<<"$rule"
+      sat=0; watch_is_sat "$param" "$k" && sat=1
+      printf 'net_optimize_saturated{param="%s",source="%s"} %s\n' "$param" "$k" "$sat"
+    done
+    echo "# HELP net_optimize_sampler_samples Samples taken since start."
+    echo "# TYPE net_optimize_sampler_samples counter"
+    echo "net_optimize_sampler_samples $W_N"
+  } > "$tmp" && mv -f "$tmp" "$file"
+}
+
+json_str() {
+  local s="${1//\\/\\\\}"
+  printf '"%s"' "${s//\"/\\\"}"
+}
+
+watch_write_json() {
+  local file="$1" tmp="$1.tmp" k s first param src delta hint
+  {
+    printf '{"interval_s":%s,"window_s":%s,"samples":%s,"elapsed_s":%s,' \
+      "$(us_to_s "$W_INTERVAL_US")" "$(us_to_s "$W_WDT")" "$W_N" "$(us_to_s "$W_ELAPSED")"
+    printf '"retrans_ratio":0.%04d,"counters":{' "$(watch_retrans_bp)"
+    first=1
+    for k in "${WATCH_COUNTERS[@]}"; do
+      (( first )) || printf ','; first=0
+      printf '%s:{"value":%s,"total":%s,"window":%s,"rate":%s,"rate_avg":%s,"rate_max":%s}' \
+        "$(json_str "$k")" "${W_CUR[$k]:-0}" $(( ${W_CUR[$k]:-0} - ${W_START[$k]:-0} )) "${W_WSUM[$k]:-0}" \
+        "${W_RATE[$k]:-0}" $(( W_WDT > 0 ? ${W_WSUM[$k]:-0} * 1000000 / W_WDT : 0 )) "${W_WMAX[$k]:-0}"
+    done
+    printf '},"gauges":{'
+    first=1
+    for k in "${WATCH_GAUGES[@]}"; do
+      (( first )) || printf ','; first=0
+      printf '%s:{"value":%s,"peak":%s}' "$(json_str "$k")" "${W_GAUGE[$k]:-0}" "${W_GPEAK[$k]:-0}"
+    done
+    printf '},"limits":{'
+    first=1
+    for k in "${!W_LIMIT[@]}"; do
+      (( first )) || printf ','; first=0
+      printf '%s:%s' "$(json_str "$k")" "${W_LIMIT[$k]}"
+    done
+    printf '},"saturated":['
+    first=1
+    for s in "${W_SAT[@]}"; do
+      IFS='|' read -r param src delta hint <<<"$s"
+      (( first )) || printf ','; first=0
+      printf '{"param":%s,"source":%s,"value":%s,"hint":%s}' \
+        "$(json_str "$param")" "$(json_str "$src")" "$delta" "$(json_str "$hint")"
+    done
+    printf ']}\n'
+  } > "$tmp" && mv -f "$tmp" "$file"
+}
+
+watch_emit() {
+  watch_window_max
+  watch_diagnose
+  [[ -n "$WATCH_PROM" ]] && watch_write_prom "$WATCH_PROM"
+  [[ -n "$WATCH_JSON" ]] && watch_write_json "$WATCH_JSON"
+  return 0
+}
+
+watch_line() {
+  local bp ct
+  bp="$(watch_retrans_bp)"
+  ct="${W_GAUGE[ct_count]:-0}/${W_LIMIT[ct_max]:-0}"
+  printf "⏱ %6ss  squeeze/s=%-5s backlog_drop/s=%-5s listen_ovf/s=%-5s tcp_rcvq_drop/s=%-5s udp_rcvbuf/s=%-5s ct=%s retrans=%d.%02d%%%s\n" \
+    "$(us_to_s "$W_ELAPSED")" "${W_RATE[Softnet:time_squeeze]:-0}" "${W_RATE[Softnet:dropped]:-0}" \
+    "${W_RATE[TcpExt:ListenOverflows]:-0}" "${W_RATE[TcpExt:TCPBacklogDrop]:-0}" "${W_RATE[Udp:RcvbufErrors]:-0}" \
+    "$ct" $(( bp / 100 )) $(( bp % 100 )) "$( (( ${#W_SAT[@]} )) && echo "  ⚠️ ${#W_SAT[@]} 项饱和" )"
+}
+
+watch_summary() {
+  local k s param src val hint bp
+  title
+  echo "📈 采样汇总：$W_N 次，间隔 $(us_to_s "$W_INTERVAL_US")s，窗口 $(us_to_s "$W_WDT")s"
+  sep
+  printf "%-30s %12s %12s %12s\n" "计数器" "窗口增量" "平均/s" "峰值/s"
+  for k in "${WATCH_COUNTERS[@]}"; do
+    (( ${W_WSUM[$k]:-0} > 0 )) || continue
+    printf "%-27s %12s %12s %12s\n" "$k" "${W_WSUM[$k]}" \
+      $(( W_WDT > 0 ? W_WSUM[$k] * 1000000 / W_WDT : 0 )) "${W_WMAX[$k]:-0}"
+  done
+  for k in "${WATCH_GAUGES[@]}"; do
+    echo "  🔹 $k 峰值 = ${W_GPEAK[$k]:-0}"
+  done
+  bp="$(watch_retrans_bp)"
+  printf "  🔹 TCP 重传率 = %d.%02d%%\n" $(( bp / 100 )) $(( bp % 100 ))
+  sep
+  if (( ${#W_SAT[@]} == 0 )); then
+    green "✅ 窗口内没有调优参数被打满"
+  else
+    red "❌ 以下参数在窗口内出现饱和："
+    for s in "${W_SAT[@]}"; do
+      IFS='|' read -r param src val hint <<<"$s"
+      yellow "  ⚠️ $param  ← $src ($val)"
+      echo "     $hint"
+    done
+  fi
+  (( bp >= 200 )) && yellow "  ℹ️ 重传率 ≥ 2%：多为路径丢包 / 拥塞，本机参数改不了，可对比拥塞算法与队列（net-optimize-bench.sh）"
+  return 0
+}
+
+watch_main() {
+  local k t0 t_prev t dt next sleep_us sleep_s report_us=1000000 last_report=0 fd
+  W_INTERVAL_US="$(sec_to_us "$WATCH_INTERVAL")"
+  (( W_INTERVAL_US >= 10000 )) || { red "❌ --interval 至少 0.01 秒"; exit 2; }
+  W_SLOTS=$(( $(sec_to_us "$WATCH_WINDOW") / W_INTERVAL_US ))
+  (( W_SLOTS >= 1 )) || W_SLOTS=1
+  W_N=0; W_WDT=0; W_ELAPSED=0; W_SAT=()
+  for k in "${WATCH_COUNTERS[@]}"; do W_WANT[$k]=1; done
+
+  watch_read_limits
+  watch_sample
+  for k in "${WATCH_COUNTERS[@]}"; do W_START[$k]=${W_CUR[$k]:-0}; W_PREV[$k]=${W_CUR[$k]:-0}; done
+
+  echo "📡 内核网络计数器采样：间隔 ${WATCH_INTERVAL}s，窗口 ${WATCH_WINDOW}s（$W_SLOTS 槽），时长 $( (( WATCH_DURATION > 0 )) && echo "${WATCH_DURATION}s" || echo "直到 Ctrl-C" )"
+  [[ -n "$WATCH_PROM" ]] && echo "  🔸 Prometheus textfile：$WATCH_PROM"
+  [[ -n "$WATCH_JSON" ]] && echo "  🔸 JSON：$WATCH_JSON"
+  sep
+
+  # 亚秒睡眠：read -t 读一个永远没数据的管道，省掉每轮 fork sleep
+  exec {fd}<> <(:)
+  W_STOP=0
+  trap 'W_STOP=1' INT TERM
+  now_us t0; t_prev=$t0; next=$t0
+  while (( ! W_STOP )); do
+    next=$(( next + W_INTERVAL_US ))
+    now_us t
+    sleep_us=$(( next - t ))
+    if (( sleep_us > 0 )); then
+      printf -v sleep_s '%d.%06d' $(( sleep_us / 1000000 )) $(( sleep_us % 1000000 ))
+      read -r -t "$sleep_s" -u "$fd" _ || true
+    fi
+    (( W_STOP )) && break
+    watch_sample
+    now_us t
+    dt=$(( t - t_prev )); (( dt > 0 )) || dt=1
+    watch_push "$dt"
+    for k in "${WATCH_COUNTERS[@]}"; do W_PREV[$k]=${W_CUR[$k]:-0}; done
+    t_prev=$t
+    W_ELAPSED=$(( t - t0 ))
+    if (( W_ELAPSED - last_report >= report_us )); then
+      last_report=$W_ELAPSED
+      watch_emit
+      watch_line
+    fi
+    (( WATCH_DURATION > 0 && W_ELAPSED >= WATCH_DURATION * 1000000 )) && break
+  done
+  trap - INT TERM
+  exec {fd}<&-
+  watch_emit
+  watch_summary
+  (( ${#W_SAT[@]} == 0 ))
+}
+
+if (( WATCH )); then
+  watch_main && exit 0 || exit 1
+fi
+
 echo "🔍 开 始 系 统 状 态 检 测 （网 络 优 化 + Nginx）..."
 title
 
@@ -102,6 +556,47 @@ if has lsmod; then
   fi
 fi
 
+# conntrack 旁路（NOTRACK）：命中计数 + 与启用前基线对比 conntrack 条数和内核态 CPU
+nt_conf="/etc/net-optimize/notrack.conf"
+if [[ -f "$nt_conf" ]]; then
+  nt_backend="$(. "$nt_conf"; echo "${NOTRACK_BACKEND:-}")"
+  nt_rules="$(. "$nt_conf"; echo "${NOTRACK_RULES:-}")"
+  nt_base_count="$(. "$nt_conf"; echo "${NOTRACK_BASE_COUNT:-}")"
+  nt_base_cpu="$(. "$nt_conf"; echo "${NOTRACK_BASE_CPU:-}")"
+  nt_base_time="$(. "$nt_conf"; echo "${NOTRACK_BASE_TIME:-}")"
+  echo ""
+  echo "  🚀 conntrack 旁路（NOTRACK，$nt_backend）：$nt_rules"
+  if [[ "$nt_backend" == "nft" ]]; then
+    if has nft && nft list table inet netopt_notrack >/dev/null 2>&1; then
+      green "  ✅ nft 表 inet netopt_notrack 存在"
+      nft list table inet netopt_notrack 2>/dev/null | grep -E 'counter' | sed 's/^[[:space:]]*/     /'
+    else
+      yellow "  ⚠️ nft 表 inet netopt_notrack 不存在（未生效或被清空）"
+    fi
+  else
+    for c in iptables ip6tables; do
+      has "$c" || continue
+      if "$c" -t raw -S PREROUTING 2>/dev/null | grep -q 'NETOPT_NT_PRE'; then
+        green "  ✅ [$c] raw 表 NETOPT_NT_PRE / NETOPT_NT_OUT 已挂载"
+        "$c" -t raw -L NETOPT_NT_PRE -n -v -x 2>/dev/null | awk 'NR > 2 {print "     " $0}'
+      else
+        yellow "  ⚠️ [$c] raw 表未挂载 NETOPT_NT_PRE"
+      fi
+    done
+  fi
+
+  nt_count="$(cat /proc/sys/net/netfilter/nf_conntrack_count 2>/dev/null || echo '?')"
+  nt_f='/^cpu / {print $4 + $7 + $8, $2 + $3 + $4 + $5 + $6 + $7 + $8 + $9; exit}'
+  read -r k1 t1 < <(awk "$nt_f" "$PROC_ROOT/stat")
+  sleep 2
+  read -r k2 t2 < <(awk "$nt_f" "$PROC_ROOT/stat")
+  nt_cpu="$(awk -v k=$((k2 - k1)) -v t=$((t2 - t1)) 'BEGIN { printf "%.1f", (t > 0 ? k * 100 / t : 0) }')"
+  printf '  %-22s %14s %14s\n' "" "启用前" "当前"
+  printf '  %-22s %14s %14s\n' "nf_conntrack_count" "${nt_base_count:-?}" "$nt_count"
+  printf '  %-22s %13s%% %13s%%\n' "内核态 CPU（sy+irq+si）" "${nt_base_cpu:-?}" "$nt_cpu"
+  echo "  ℹ️ 基线采于 ${nt_base_time:-?}；旧连接按超时慢慢退出，条数要过一段时间才降下来，CPU 对比需在相近负载下看"
+fi
+
 sep
 echo "📂 [3] ulimit / fd"
 sep
@@ -118,7 +613,9 @@ echo "📡 [4] MSS Clamping 规则（iptables/nft 双栈）"
 sep
 echo "✅ iptables mangle/POSTROUTING (含计数)："
 if has iptables; then
-  iptables -t mangle -L POSTROUTING -n -v 2>/dev/null | grep -E 'TCPMSS|Chain|pkts|bytes' || echo "  (none)"
+  iptables -t mangle -L POSTROUTING -n -v 2>/dev/null | grep -E 'TCPMSS|NETOPT_MSS|Chain|pkts|bytes' || echo "  (none)"
+  # 按目的地分组钳制时，规则在 NETOPT_MSS 链里
+  iptables -t mangle -L NETOPT_MSS -n -v 2>/dev/null || true
 else
   echo "  (iptables not installed)"
 fi
@@ -131,7 +628,7 @@ else
 fi
 
 if has iptables; then
-  dup="$(iptables -t mangle -S POSTROUTING 2>/dev/null | grep -c 'TCPMSS' || true)"
+  dup="$(iptables -t mangle -S POSTROUTING 2>/dev/null | grep -cE 'TCPMSS|NETOPT_MSS' || true)"
   dup="${dup%%$'\n'*}"; dup="${dup:-0}"
   if [[ "$dup" -gt 1 ]]; then
     yellow "⚠️ 发现多条 TCPMSS 规则：$dup 条（可能重复叠加）"
@@ -150,6 +647,62 @@ else
   echo "  (ss not installed)"
 fi
 
+# UDP 丢包归因：Udp 计数器（累计 + 2 秒增量）→ 按端口的 socket 丢包 → 缓冲区建议
+echo ""
+echo "✅ UDP 丢包与缓冲建议："
+udp_snmp() {
+  awk '/^Udp:/ { if (!h) { for (i = 2; i <= NF; i++) n[i] = $i; h = 1 } else for (i = 2; i <= NF; i++) print n[i], $i }' "$PROC_ROOT/net/snmp"
+}
+declare -A U0=() U1=()
+while read -r k v; do U0[$k]=$v; done < <(udp_snmp)
+sleep 2
+while read -r k v; do U1[$k]=$v; done < <(udp_snmp)
+for k in InDatagrams InErrors RcvbufErrors SndbufErrors MemErrors InCsumErrors; do
+  [[ -n "${U1[$k]:-}" ]] || continue
+  printf '  🔸 %-14s 累计 %-12s 2 秒内 +%s\n' "$k" "${U1[$k]}" "$(( ${U1[$k]} - ${U0[$k]:-0} ))"
+done
+
+rmem_max="$(cat "$PROC_ROOT/sys/net/core/rmem_max" 2>/dev/null || echo 0)"
+rmem_def="$(cat "$PROC_ROOT/sys/net/core/rmem_default" 2>/dev/null || echo 0)"
+# 端口 rb 丢包：有 ss 时取 skmem（rb 是内核实际的接收缓冲，SO_RCVBUF 会被翻倍），否则只从 /proc/net/udp 取丢包
+if has ss; then
+  udp_socks="$(ss -uanm 2>/dev/null | awk '
+    /^[A-Z]/ { n = split($4, a, ":"); port = a[n]; next }
+    /skmem:/ { rb = d = 0
+               if (match($0, /rb[0-9]+/)) rb = substr($0, RSTART + 2, RLENGTH - 2)
+               if (match($0, /,d[0-9]+/)) d = substr($0, RSTART + 2, RLENGTH - 2)
+               print port, rb, d }' || true)"
+else
+  udp_socks="$(cat "$PROC_ROOT/net/udp" "$PROC_ROOT/net/udp6" 2>/dev/null | awk '
+    $1 ~ /^[0-9]+:$/ { split($2, a, ":"); print a[2], $NF }' | while read -r hex d; do echo "$((16#$hex)) ? $d"; done || true)"
+fi
+udp_drop_socks="$(awk '$3 > 0' <<<"$udp_socks" | sort -k3,3nr | head -n 10)"
+if [[ -z "$udp_drop_socks" ]]; then
+  green "  ✅ 没有 UDP socket 丢包（rmem_max=$rmem_max rmem_default=$rmem_def）"
+else
+  printf '  %-8s %12s %10s  %s\n' 端口 接收缓冲 丢包 建议
+  while read -r port rb d; do
+    if [[ "$rb" == "?" ]]; then
+      advice="安装 iproute2（ss）可看到实际缓冲；先把 net.core.rmem_max 调到 $(( rmem_max * 2 ))"
+    elif (( rb >= 2 * rmem_max )); then
+      advice="被 rmem_max 截断：net.core.rmem_max → $(( rmem_max * 2 > 8388608 ? rmem_max * 2 : 8388608 ))"
+    elif (( rb == rmem_def )); then
+      advice="程序没设 SO_RCVBUF（用 rmem_default）：程序里设置接收缓冲，或 net.core.rmem_default → $(( rmem_def * 4 ))"
+    else
+      advice="程序自设 SO_RCVBUF=$(( rb / 2 ))，未到上限：在程序配置里调大（上限 rmem_max=$rmem_max）"
+    fi
+    printf '  %-8s %12s %10s  %s\n' "$port" "$rb" "$d" "$advice"
+  done <<<"$udp_drop_socks"
+fi
+
+udp_pages="$(awk '/^UDP:/ { for (i = 2; i < NF; i++) if ($i == "mem") print $(i + 1) }' "$PROC_ROOT/net/sockstat" 2>/dev/null || true)"
+read -r _ udp_press udp_max < "$PROC_ROOT/sys/net/ipv4/udp_mem" 2>/dev/null || true
+if (( ${U1[MemErrors]:-0} > ${U0[MemErrors]:-0} )) || { [[ -n "$udp_pages" && -n "${udp_press:-}" ]] && (( udp_pages >= udp_press )); }; then
+  yellow "  ⚠️ UDP 总内存 ${udp_pages:-?} 页已到 udp_mem 压力线 ${udp_press:-?}：net.ipv4.udp_mem 调大一倍（$(( ${udp_press:-0} * 2 )) / $(( ${udp_max:-0} * 2 ))）"
+else
+  echo "  🔸 UDP 总内存 ${udp_pages:-?} 页 / 压力线 ${udp_press:-?} 页"
+fi
+
 if has conntrack; then
   udp_lines="$(conntrack -L -p udp 2>/dev/null | sed '/^$/d' | wc -l | tr -d ' ')"
   tcp_lines="$(conntrack -L -p tcp 2>/dev/null | sed '/^$/d' | wc -l | tr -d ' ')"
@@ -272,5 +825,66 @@ else
   echo "  👉 Ubuntu/Debian 可用：apt-get install -y cron && systemctl enable --now cron"
 fi
 
+sep
+echo "🧵 [10] 软中断 / CPU 分流（RPS / RFS / XPS / IRQ）"
+sep
+# softnet_stat 每 CPU 一行十六进制：列 0 processed / 1 dropped / 2 time_squeeze / 9 received_rps / 12 cpu（新内核才有）
+if [[ -r "$PROC_ROOT/net/softnet_stat" ]]; then
+  sn_total=0; sn_rows=()
+  i=0
+  while read -r -a f; do
+    cpu="$i"; [[ -n "${f[12]:-}" ]] && cpu=$(( 16#${f[12]} ))
+    p=$(( 16#${f[0]} ))
+    sn_rows+=("$cpu $p $(( 16#${f[1]} )) $(( 16#${f[2]} )) $(( 16#${f[9]:-0} ))")
+    sn_total=$(( sn_total + p ))
+    i=$(( i + 1 ))
+  done < "$PROC_ROOT/net/softnet_stat"
+
+  printf '  %-5s %14s %7s %10s %9s %12s\n' CPU processed 占比 dropped squeeze rps_recv
+  sn_max=0
+  for r in "${sn_rows[@]}"; do
+    read -r cpu p d s rps <<<"$r"
+    pct=0; (( sn_total > 0 )) && pct=$(( p * 100 / sn_total ))
+    (( pct > sn_max )) && sn_max=$pct
+    printf '  %-5s %14s %6s%% %10s %9s %12s\n' "$cpu" "$p" "$pct" "$d" "$s" "$rps"
+  done
+  if (( ${#sn_rows[@]} > 1 && sn_max >= 80 )); then
+    yellow "  ⚠️ 软中断集中在单个 CPU（${sn_max}%），建议启用 RPS / XPS（ENABLE_STEERING=auto）"
+  fi
+else
+  echo "ℹ️ 无法读取 softnet_stat"
+fi
+
+echo ""
+echo "  rps_sock_flow_entries = $(cat "$PROC_ROOT/sys/net/core/rps_sock_flow_entries" 2>/dev/null || echo '?')"
+steer_ifaces=""
+[[ -f /etc/net-optimize/steering.conf ]] && steer_ifaces="$(awk '$1 == "sysfs" {split($2, a, "/"); print a[3]}' /etc/net-optimize/steering.conf | sort -u)"
+[[ -n "$steer_ifaces" ]] || steer_ifaces="$(ip -o route show default 2>/dev/null | awk '{for (i=1;i<NF;i++) if ($i=="dev") {print $(i+1); exit}}' || true)"
+for ifc in $steer_ifaces; do
+  q="/sys/class/net/$ifc/queues"
+  [[ -d "$q" ]] || continue
+  echo "  $ifc："
+  for d in "$q"/rx-*; do
+    echo "    ${d##*/}: rps_cpus=$(cat "$d/rps_cpus" 2>/dev/null || echo '?') rps_flow_cnt=$(cat "$d/rps_flow_cnt" 2>/dev/null || echo '?')"
+  done
+  for d in "$q"/tx-*; do
+    [[ -r "$d/xps_cpus" ]] && echo "    ${d##*/}: xps_cpus=$(cat "$d/xps_cpus" 2>/dev/null)"
+  done
+done
+if [[ -f /etc/net-optimize/steering.conf ]]; then
+  grep '^irq ' /etc/net-optimize/steering.conf | while read -r _ name want; do
+    irq="$(awk -v n="$name" '$NF == n {sub(":", "", $1); print $1; exit}' "$PROC_ROOT/interrupts" 2>/dev/null || true)"
+    [[ -n "$irq" ]] || continue
+    cur="$(cat "$PROC_ROOT/irq/$irq/smp_affinity_list" 2>/dev/null || echo '?')"
+    if [[ "$cur" == "$want" ]]; then
+      green "  ✅ IRQ $irq ($name) → CPU $cur"
+    else
+      yellow "  ⚠️ IRQ $irq ($name) → CPU $cur（计划 $want，可能被 irqbalance 接管）"
+    fi
+  done
+else
+  echo "  ℹ️ 未生成分流计划（单核或 ENABLE_STEERING=0）"
+fi
+
 title
 green "🎉 检 测 完 成"
\ No newline at end of file
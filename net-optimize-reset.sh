@@ -30,12 +30,49 @@ if command -v nft >/dev/null 2>&1; then
 fi
 
 if command -v iptables >/dev/null 2>&1; then
-  iptables -t mangle -S 2>/dev/null | grep TCPMSS | sed 's/^-A/iptables -t mangle -D/' | bash 2>/dev/null || true
+  iptables -t mangle -S 2>/dev/null | grep -E 'TCPMSS|-j NETOPT_MSS' | sed 's/^-A/iptables -t mangle -D/' | bash 2>/dev/null || true
+  iptables -t mangle -F NETOPT_MSS 2>/dev/null || true
+  iptables -t mangle -X NETOPT_MSS 2>/dev/null || true
 fi
 
 # 4. 清除 conntrack 配置
 rm -f /etc/modules-load.d/nf_conntrack.conf 2>/dev/null || true
 sed -i "/nf_conntrack/d" /etc/sysctl.d/99-net-optimize.conf 2>/dev/null || true
+rm -f /etc/modprobe.d/net-optimize-conntrack.conf 2>/dev/null || true
+systemctl disable --now net-optimize-conntrack.timer >/dev/null 2>&1 || true
+rm -f /etc/systemd/system/net-optimize-conntrack.timer /etc/systemd/system/net-optimize-conntrack.service 2>/dev/null || true
+
+# 4.4 删除 conntrack 旁路（NOTRACK）规则，还原启用前的 ip_local_reserved_ports
+if [ -f /etc/net-optimize/notrack.conf ]; then
+  sysctl -w net.ipv4.ip_local_reserved_ports="$(. /etc/net-optimize/notrack.conf; echo "${NOTRACK_PREV_RESERVED:-}")" >/dev/null 2>&1 || true
+fi
+nft delete table inet netopt_notrack 2>/dev/null || true
+for c in iptables ip6tables iptables-nft ip6tables-nft iptables-legacy ip6tables-legacy; do
+  command -v "$c" >/dev/null 2>&1 || continue
+  "$c" -t raw -D PREROUTING -j NETOPT_NT_PRE 2>/dev/null || true
+  "$c" -t raw -D OUTPUT -j NETOPT_NT_OUT 2>/dev/null || true
+  "$c" -t raw -F NETOPT_NT_PRE 2>/dev/null || true
+  "$c" -t raw -X NETOPT_NT_PRE 2>/dev/null || true
+  "$c" -t raw -F NETOPT_NT_OUT 2>/dev/null || true
+  "$c" -t raw -X NETOPT_NT_OUT 2>/dev/null || true
+done
+
+# 4.45 关回本脚本打开的网卡卸载特性（UDP GRO 转发 / GSO）
+if [ -f /etc/net-optimize/offload.conf ] && command -v ethtool >/dev/null 2>&1; then
+  grep -v '^#' /etc/net-optimize/offload.conf | while read -r iface feat; do
+    [ -n "$feat" ] && ethtool -K "$iface" "$feat" off >/dev/null 2>&1 || true
+  done
+  echo "🗑 已关闭 UDP GRO / GSO 卸载特性"
+fi
+
+# 4.5 关闭 CPU 分流（RPS / RFS / XPS 恢复内核默认 0；IRQ 亲和重启后由内核 / irqbalance 重新分配）
+if [ -f /etc/net-optimize/steering.conf ]; then
+  sysctl -w net.core.rps_sock_flow_entries=0 >/dev/null 2>&1 || true
+  grep -E '^sysfs ' /etc/net-optimize/steering.conf | while read -r _ path _; do
+    echo 0 >"/sys/$path" 2>/dev/null || true
+  done
+  echo "🗑 已关闭 RPS / RFS / XPS"
+fi
 
 # 5. 删除启动恢复服务
 systemctl disable net-optimize-apply.service >/dev/null 2>&1 || true
@@ -12,9 +12,23 @@
 
 set -euo pipefail
 
+# 库模式：NET_OPTIMIZE_SOURCE_ONLY=1 时 source 本脚本只加载函数（测试 / 其他脚本复用）；
+# --print-sysctl 只按当前硬件（或 PROC_ROOT / SYS_ROOT 指向的 fixture 树）渲染 sysctl 配置到 stdout；
+# --print-conntrack 同理只打印 conntrack 容量计算结果；--probe-mss 只探测 PMTU、打印将写入的 MSS 规则
+# （可在 netns 里对不同 MTU 的 veth 验证）；--print-steering 只打印 CPU 分流计划。这些都不自动更新、不安装、不需要 root。
+# --conntrack-monitor 由 net-optimize-conntrack.timer 周期调用（不自动更新、不跑主流程）。
+NET_OPTIMIZE_LIB_MODE=0
+case "${1:-}" in
+  --print-sysctl|--print-conntrack|--conntrack-monitor|--probe-mss|--print-steering) NET_OPTIMIZE_LIB_MODE=1 ;;
+esac
+if [ "${NET_OPTIMIZE_SOURCE_ONLY:-0}" = "1" ]; then
+  NET_OPTIMIZE_LIB_MODE=1
+fi
+
 # === 1. 自动更新机制 ===
 SCRIPT_PATH="/usr/local/sbin/net-optimize-ultimate.sh"
 REMOTE_URL="https://raw.githubusercontent.com/SHICHUNHUI88/vps-net-optimize/main/net-optimize-ultimate.sh"
+BENCH_URL="https://raw.githubusercontent.com/SHICHUNHUI88/vps-net-optimize/main/net-optimize-bench.sh"
 
 # conntrack 模块开机加载（systemd）
 CONNTRACK_MODULES_CONF="/etc/modules-load.d/conntrack.conf"
@@ -39,6 +53,7 @@ sha256_of() {
   fi
 }
 
+if [ "$NET_OPTIMIZE_LIB_MODE" != "1" ]; then
 remote_buf="$(fetch_raw "$REMOTE_URL" || true)"
 if [ -n "${remote_buf:-}" ]; then
   remote_hash="$(printf "%s" "$remote_buf" | sha256_of)"
@@ -59,24 +74,72 @@ trap 'code=$?; echo "❌ 出错：第 ${BASH_LINENO[0]} 行 -> ${BASH_COMMAND} (
 
 echo "🚀 Net-Optimize-Ultimate v3.2.2 开始执行..."
 echo "========================================================"
+fi
 
 # === 2. 全局配置开关 ===
 : "${ENABLE_FQ_PIE:=1}"
+# 拥塞算法 / 队列：prefer = 固定偏好顺序；measure = 命名空间里实测各组合后选最优（需 root + iproute2 + python3）
+: "${CC_SELECT:=prefer}"
+: "${CC_SELECT_CCS:=bbrplus bbr bbr2 cubic htcp westwood}"
+: "${CC_SELECT_QDISCS:=fq fq_codel fq_pie cake}"
+: "${CC_SELECT_PATH:=auto}"     # auto = ping CC_SELECT_TARGETS 实测；或 bench 预设名（cn-hk / cn-us / lossy ...）
+: "${CC_SELECT_TARGETS:=223.5.5.5 119.29.29.29}"
+: "${CC_SELECT_RATE:=300}"      # 模拟链路带宽（Mbit），TARGET_BW_MBIT 优先
+: "${CC_SELECT_DURATION:=5}"
+: "${CC_SELECT_WEIGHT:=60}"     # 得分里吞吐占的百分比，其余给负载下延迟
+: "${CC_SELECT_REPORT:=/etc/net-optimize/cc-select.json}"
 : "${ENABLE_MTU_PROBE:=1}"
 : "${ENABLE_MSS_CLAMP:=1}"
+# 只给了 MSS_VALUE 的老用法保持固定值
+[ -n "${MSS_VALUE:-}" ] && : "${MSS_MODE:=fixed}"
 : "${MSS_VALUE:=1452}"
+: "${MSS_MODE:=probe}"     # probe = 实测 PMTU 推 MSS；pmtu = --clamp-mss-to-pmtu；fixed = MSS_VALUE
+: "${MSS_PROBE_TARGETS:=1.1.1.1 8.8.8.8}"
+: "${MSS_DEST_SETS:=}"     # 按目的地分组钳制："探测IP,网段,... 探测IP,网段,..."，每组单独探测
+: "${MSS_PROBE_MIN:=1280}"
+: "${MSS_PROBE_TIMEOUT:=1}"
 : "${ENABLE_CONNTRACK_TUNE:=1}"
-: "${NFCT_MAX:=262144}"
+: "${NFCT_MAX:=auto}"        # auto = 按内存 + 观测峰值计算；填数字则固定（不装扩容 timer）
+: "${NFCT_MEM_PCT:=2}"        # 基础上限：满表占内存的百分比
+: "${NFCT_MEM_PCT_MAX:=10}"   # 硬上限：扩容最多让满表占到内存的百分比
+: "${NFCT_ENTRY_BYTES:=320}"  # 单条连接跟踪条目（nf_conn + slab 开销）的估算字节数
+: "${NFCT_HEADROOM:=2}"       # 上限至少是观测峰值的倍数
+: "${NFCT_BUCKET_DIV:=4}"     # 满表时平均哈希链长：hashsize = max / div（向上取 2 的幂）
+: "${NFCT_FLOOR:=16384}"
+: "${NFCT_CEIL:=4194304}"
+: "${NFCT_GROW_PCT:=80}"      # monitor：count 达到 max 的百分比就扩容（翻倍，不超过硬上限）
+: "${NFCT_MONITOR_SEC:=30}"
+: "${NFCT_STATE:=/etc/net-optimize/conntrack.state}"
+: "${ENABLE_UDP_OFFLOAD:=1}"        # UDP GRO 转发 / GSO 网卡卸载（需 ethtool）
+: "${UDP_OFFLOAD_FEATURES:=rx-udp-gro-forwarding tx-udp-segmentation generic-receive-offload generic-segmentation-offload}"
+: "${NOTRACK_PORTS:=}"             # conntrack 旁路端口："443 tcp:8443 udp:20000-30000"；空 = 关闭
+: "${NOTRACK_BACKEND:=auto}"        # auto / nft / iptables
+: "${NOTRACK_SAMPLE_SEC:=3}"        # 启用前采样内核态 CPU 的秒数（基线）
+: "${ENABLE_STEERING:=auto}"       # RPS / RFS / XPS / IRQ 亲和：auto = 多核时启用；0 = 关闭
+: "${STEER_IFACES:=}"              # 空 = 默认路由网卡
+: "${STEER_FLOW_ENTRIES:=32768}"   # RFS 全局 flow 表（rps_sock_flow_entries）
 : "${ENABLE_NGINX_REPO:=1}"
 : "${SKIP_APT:=0}"
 : "${APPLY_AT_BOOT:=1}"
+# sysctl profile：auto / throughput / latency / balanced / small-memory
+: "${NET_PROFILE:=auto}"
+: "${TARGET_BW_MBIT:=0}"   # 目标带宽（Mbit/s），0 = 按网卡速率，拿不到按 1000
+: "${TARGET_RTT_MS:=0}"    # 目标 RTT（ms），0 = 按 profile 默认
+: "${PROC_ROOT:=/proc}"    # 硬件探测读取的 /proc、/sys 根（测试时指向 fixture 树）
+: "${SYS_ROOT:=/sys}"
 
 # 路径定义
 CONFIG_DIR="/etc/net-optimize"
 CONFIG_FILE="$CONFIG_DIR/config"
 MODULES_FILE="$CONFIG_DIR/modules.list"
+STEERING_FILE="$CONFIG_DIR/steering.conf"
+NOTRACK_FILE="$CONFIG_DIR/notrack.conf"
+UDP_OFFLOAD_FILE="$CONFIG_DIR/offload.conf"
+NOTRACK_NFT="$CONFIG_DIR/notrack.nft"
 APPLY_SCRIPT="/usr/local/sbin/net-optimize-apply"
 CONNTRACK_MODULES_CONF="/etc/modules-load.d/conntrack.conf"
+NFCT_MODPROBE_CONF="/etc/modprobe.d/net-optimize-conntrack.conf"
+NFCT_MONITOR_UNIT="net-optimize-conntrack"
 
 # === 3. 核心工具函数 ===
 require_root() {
@@ -154,6 +217,7 @@ SYSCTL_KEYS=(
   net.ipv4.udp_rmem_min
   net.ipv4.udp_wmem_min
   net.ipv4.udp_mem
+  net.ipv4.tcp_mem
   net.netfilter.nf_conntrack_max
   net.netfilter.nf_conntrack_udp_timeout
   net.netfilter.nf_conntrack_udp_timeout_stream
@@ -267,7 +331,7 @@ clean_old_config() {
 
   # 2) 旧 iptables TCPMSS 规则（加 timeout + -w，避免等锁卡死）
   if have_cmd iptables; then
-    if timeout 2s iptables -w 2 -t mangle -S POSTROUTING 2>/dev/null | grep -q TCPMSS; then
+    if timeout 2s iptables -w 2 -t mangle -S POSTROUTING 2>/dev/null | grep -qE 'TCPMSS|NETOPT_MSS'; then
       need_clean=1
     fi
   fi
@@ -289,11 +353,13 @@ clean_old_config() {
   # 清理旧规则（同样加 timeout + -w）
   if have_cmd iptables; then
     timeout 3s iptables -w 2 -t mangle -S POSTROUTING 2>/dev/null \
-      | grep -E '(^-A POSTROUTING .*TCPMSS| TCPMSS )' \
+      | grep -E '(^-A POSTROUTING .*TCPMSS| TCPMSS |NETOPT_MSS)' \
       | while read -r rule; do
           del_rule="${rule/-A POSTROUTING/-D POSTROUTING}"
           iptables -w 2 -t mangle $del_rule 2>/dev/null || true
         done || true
+    iptables -w 2 -t mangle -F NETOPT_MSS 2>/dev/null || true
+    iptables -w 2 -t mangle -X NETOPT_MSS 2>/dev/null || true
   fi
 
   # 清理旧配置文件（保留目录）
@@ -406,6 +472,32 @@ EOF
 setup_tcp_congestion() {
   echo "📶 设置TCP拥塞算法和队列..."
 
+  local target_cc="cubic"
+  CC_SELECT_NOTE=""
+  if [ "$CC_SELECT" = "measure" ] && cc_select_measure && try_set_qdisc "$SEL_QDISC"; then
+    FINAL_QDISC="$SEL_QDISC"
+    target_cc="$SEL_CC"
+  else
+    [ -n "$CC_SELECT_NOTE" ] && echo "⚠️ 实测胜出的队列 $SEL_QDISC 无法设为默认，改用默认偏好顺序" && CC_SELECT_NOTE=""
+    setup_qdisc_by_preference
+    target_cc="$(cc_by_preference)"
+  fi
+
+  if has_sysctl_key net.ipv4.tcp_congestion_control; then
+    sysctl -w net.ipv4.tcp_congestion_control="$target_cc" >/dev/null 2>&1 || true
+  fi
+
+  FINAL_CC="$(sysctl -n net.ipv4.tcp_congestion_control 2>/dev/null || echo unknown)"
+
+  echo "✅ 最终生效拥塞算法: $FINAL_CC"
+  echo "✅ 最终生效队列算法: $FINAL_QDISC"
+
+  if [[ "$target_cc" != cubic ]] && [[ "$FINAL_CC" != "$target_cc" ]]; then
+    echo "⚠️ 提示: 尝试启用 $target_cc 失败，系统自动回退到了 $FINAL_CC"
+  fi
+}
+
+setup_qdisc_by_preference() {
   # qdisc：真实尝试写入
   if [ "$ENABLE_FQ_PIE" = "1" ] && try_set_qdisc fq_pie; then
     FINAL_QDISC="fq_pie"
@@ -416,48 +508,540 @@ setup_tcp_congestion() {
   else
     FINAL_QDISC="$(sysctl -n net.core.default_qdisc 2>/dev/null || echo unknown)"
   fi
+}
 
-  # 拥塞算法：BBRplus > BBR > Cubic
-  local target_cc="cubic"
+# 拥塞算法：BBRplus > BBR > Cubic
+cc_by_preference() {
   local available_cc
   available_cc="$(sysctl -n net.ipv4.tcp_available_congestion_control 2>/dev/null || echo cubic)"
 
   if echo "$available_cc" | grep -qw bbrplus; then
-    target_cc="bbrplus"
+    echo "bbrplus"
   elif echo "$available_cc" | grep -qw bbr; then
-    target_cc="bbr"
+    echo "bbr"
+  else
+    echo "cubic"
   fi
+}
 
-  if has_sysctl_key net.ipv4.tcp_congestion_control; then
-    sysctl -w net.ipv4.tcp_congestion_control="$target_cc" >/dev/null 2>&1 || true
+# === 7.1 拥塞算法 / 队列实测选择（CC_SELECT=measure）===
+# 固定偏好顺序（bbr > cubic、fq_pie > fq）不一定适合本机链路：按实测 RTT / 抖动 / 丢包在网络命名空间里
+# 模拟链路（net-optimize-bench.sh），每个可用的 拥塞算法 × 队列 组合跑一小段批量传输 + 请求/响应，
+# 得分 = 权重 × 吞吐/最高吞吐 + (1 - 权重) × 最低负载p99/负载p99，最高者写入 FINAL_CC / FINAL_QDISC，
+# 测量数据存 $CC_SELECT_REPORT，sysctl 文件头注明依据。
+find_bench_script() {
+  local f d
+  d="$(cd "$(dirname "${BASH_SOURCE[0]}")" 2>/dev/null && pwd || true)"
+  for f in "$d/net-optimize-bench.sh" /usr/local/sbin/net-optimize-bench.sh; do
+    [ -f "$f" ] && { echo "$f"; return 0; }
+  done
+  f="$(mktemp /tmp/net-optimize-bench.XXXXXX)"
+  if fetch_raw "$BENCH_URL" >"$f" 2>/dev/null && [ -s "$f" ]; then
+    echo "$f"
+    return 0
   fi
+  rm -f "$f"
+  return 1
+}
 
-  FINAL_CC="$(sysctl -n net.ipv4.tcp_congestion_control 2>/dev/null || echo unknown)"
+# 输出 bench 的链路参数：CC_SELECT_PATH 是预设名时原样；auto 时 ping CC_SELECT_TARGETS 取 RTT 最大的一条
+cc_select_path_spec() {
+  local t out rtt mdev loss best_rtt=-1 spec="" rate
+  if [ "$CC_SELECT_PATH" != "auto" ]; then
+    echo "--path $CC_SELECT_PATH"
+    return 0
+  fi
+  rate="$TARGET_BW_MBIT"
+  [ "$rate" -gt 0 ] 2>/dev/null || rate="$CC_SELECT_RATE"
+  if have_cmd ping; then
+    for t in $CC_SELECT_TARGETS; do
+      out="$(ping -n -q -c 20 -i 0.2 -W 1 "$t" 2>/dev/null || true)"
+      loss="$(echo "$out" | sed -n 's/.* \([0-9.]*\)% packet loss.*/\1/p')"
+      # rtt min/avg/max/mdev = 1.0/2.0/3.0/0.5 ms
+      read -r rtt mdev <<<"$(echo "$out" | awk -F'[/ =]+' '/^rtt/ {printf "%.0f %.0f", $7, $9}')"
+      [ -n "${rtt:-}" ] || continue
+      if [ "$rtt" -gt "$best_rtt" ]; then
+        best_rtt="$rtt"
+        spec="measured $rtt $((mdev * 2)) ${loss:-0} $rate"
+      fi
+    done
+  fi
+  if [ -n "$spec" ]; then
+    echo "--path-spec|$spec"
+  else
+    echo "--path cn-us"
+  fi
+}
 
-  echo "✅ 最终生效拥塞算法: $FINAL_CC"
-  echo "✅ 最终生效队列算法: $FINAL_QDISC"
+# 成功时设置 SEL_CC / SEL_QDISC / CC_SELECT_NOTE
+cc_select_measure() {
+  local bench cc q ccs=() qdiscs=() cands=() avail spec conf work winner
+
+  [ "$(id -u)" -eq 0 ] && have_cmd ip && have_cmd tc && have_cmd python3 || {
+    echo "⚠️ CC_SELECT=measure 需要 root + iproute2 + python3，改用默认偏好顺序"; return 1; }
+  bench="$(find_bench_script)" || { echo "⚠️ 找不到 net-optimize-bench.sh，改用默认偏好顺序"; return 1; }
+
+  for cc in $CC_SELECT_CCS; do modprobe "tcp_$cc" 2>/dev/null || true; done
+  avail=" $(sysctl -n net.ipv4.tcp_available_congestion_control 2>/dev/null || echo cubic) "
+  for cc in $CC_SELECT_CCS; do [[ "$avail" == *" $cc "* ]] && ccs+=("$cc"); done
+  # 队列能否用：在临时命名空间的 veth 上试挂（不动宿主机 default_qdisc，bench 本身也要 netns + veth）
+  ip netns add nobench-qd 2>/dev/null || true
+  ip -n nobench-qd link add q0 type veth peer name q1 2>/dev/null || true
+  for q in $CC_SELECT_QDISCS; do
+    modprobe "sch_$q" 2>/dev/null || true
+    tc -n nobench-qd qdisc replace dev q0 root "$q" >/dev/null 2>&1 && qdiscs+=("$q")
+  done
+  ip netns del nobench-qd 2>/dev/null || true
+  [ "${#ccs[@]}" -gt 0 ] && [ "${#qdiscs[@]}" -gt 0 ] || {
+    echo "⚠️ 没有可测的拥塞算法 / 队列组合，改用默认偏好顺序"; return 1; }
+
+  work="$(mktemp -d /tmp/cc-select.XXXXXX)"
+  conf="$work/sysctl.conf"
+  render_sysctl_conf >"$conf" 2>/dev/null || conf="-"
+  for cc in "${ccs[@]}"; do
+    for q in "${qdiscs[@]}"; do cands+=(--candidate "$cc+$q:$conf:$cc:$q"); done
+  done
 
-  if [[ "$target_cc" == bbr* ]] && [[ "$FINAL_CC" != "$target_cc" ]]; then
-    echo "⚠️ 提示: 尝试启用 $target_cc 失败，系统自动回退到了 $FINAL_CC"
+  spec="$(cc_select_path_spec)"
+  local path_args=()
+  if [[ "$spec" == --path-spec\|* ]]; then path_args=(--path-spec "${spec#*|}"); else read -r -a path_args <<<"$spec"; fi
+  echo "⏳ 实测 ${#ccs[@]} 个拥塞算法 × ${#qdiscs[@]} 个队列（${path_args[*]}，每组约 $((CC_SELECT_DURATION * 2 + 3))s）..."
+
+  if ! bash "$bench" "${path_args[@]}" "${cands[@]}" --duration "$CC_SELECT_DURATION" --no-udp \
+      --json "$work/results.jsonl" >"$work/bench.log" 2>&1; then
+    [[ "$bench" == /tmp/net-optimize-bench.* ]] && rm -f "$bench"
+    echo "⚠️ 实测失败（日志 $work/bench.log 末尾）："
+    tail -n 5 "$work/bench.log" | sed 's/^/    /'
+    return 1
   fi
+
+  install -d "$(dirname "$CC_SELECT_REPORT")"
+  winner="$(python3 - "$work/results.jsonl" "$CC_SELECT_WEIGHT" "${path_args[*]}" "$CC_SELECT_REPORT" <<'PYEOF'
+import json, statistics, sys, time
+src, weight, path, out = sys.argv[1], int(sys.argv[2]) / 100, sys.argv[3], sys.argv[4]
+rows = [json.loads(l) for l in open(src) if l.strip()]
+by = {}
+for r in rows:
+    by.setdefault(r["candidate"], []).append(r)
+cands = []
+for name, rs in by.items():
+    med = lambda k: statistics.median(x[k] for x in rs)
+    cc, q = name.split("+", 1)
+    cands.append({
+        "cc": cc, "qdisc": q, "tcp_mbit": med("tcp_mbit"), "retrans": med("retrans"),
+        "rr_p50": med("rr_p50"), "load_p50": med("load_p50"), "load_p99": med("load_p99"),
+        "queue_delay_ms": round(max(0.0, med("load_p50") - med("rr_p50")), 2),
+    })
+best_tput = max(c["tcp_mbit"] for c in cands) or 1
+best_p99 = min(c["load_p99"] for c in cands) or 1
+for c in cands:
+    c["score"] = round(weight * c["tcp_mbit"] / best_tput + (1 - weight) * best_p99 / max(c["load_p99"], 1e-3), 4)
+cands.sort(key=lambda c: -c["score"])
+w = cands[0]
+report = {"time": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()), "path": path,
+          "throughput_weight": weight, "winner": {"cc": w["cc"], "qdisc": w["qdisc"]}, "candidates": cands}
+with open(out + ".tmp", "w") as f:
+    json.dump(report, f, ensure_ascii=False, indent=2)
+import os
+os.replace(out + ".tmp", out)
+for c in cands:
+    print(f"  {c['cc']:>8} + {c['qdisc']:<9} 吞吐 {c['tcp_mbit']:>8.1f} Mbit/s  排队 {c['queue_delay_ms']:>7.1f}ms  "
+          f"负载p99 {c['load_p99']:>7.1f}ms  重传 {c['retrans']:>6.0f}  得分 {c['score']:.3f}", file=sys.stderr)
+print(w["cc"], w["qdisc"], w["tcp_mbit"], w["load_p99"], w["score"])
+PYEOF
+)" || { echo "⚠️ 实测结果解析失败"; return 1; }
+  rm -rf "$work"
+  [[ "$bench" == /tmp/net-optimize-bench.* ]] && rm -f "$bench"
+
+  local tput p99 score
+  read -r SEL_CC SEL_QDISC tput p99 score <<<"$winner"
+  CC_SELECT_NOTE="实测选择 $SEL_CC + $SEL_QDISC（${path_args[*]}：吞吐 ${tput}Mbit/s，负载 p99 ${p99}ms，得分 $score；明细 $CC_SELECT_REPORT）"
+  echo "🏁 $CC_SELECT_NOTE"
+  return 0
 }
 
-# === 8. Sysctl 深度整合（写入文件，自适应内核能力）===
-write_sysctl_conf() {
-  echo "📊 写入内核参数配置文件..."
+# === 7.5 硬件感知 profile（缓冲区 / backlog / 收包预算按内存、CPU、网卡速率和目标 BDP 计算）===
+# 只读 $PROC_ROOT / $SYS_ROOT，不调用 sysctl / ip，可以对 fixture 树测试
+read_proc_sys() {
+  local key="$1" def="${2:-}" v=""
+  v="$(cat "$PROC_ROOT/sys/${key//.//}" 2>/dev/null || true)"
+  echo "${v:-$def}"
+}
 
-  local sysctl_file="$SYSCTL_AUTH_FILE"
-  install -d /etc/sysctl.d
+hw_mem_kb() {
+  local v
+  v="$(awk '/^MemTotal:/ {print $2; exit}' "$PROC_ROOT/meminfo" 2>/dev/null || true)"
+  echo "${v:-0}"
+}
+
+hw_cpu_count() {
+  local v
+  v="$(awk '/^processor[[:space:]]*:/ {n++} END {print n+0}' "$PROC_ROOT/cpuinfo" 2>/dev/null || true)"
+  [ "${v:-0}" -gt 0 ] 2>/dev/null || v=1
+  echo "$v"
+}
+
+# 默认路由所在网卡：/proc/net/route 里 Destination 为 00000000 的那行；没有就取第一块非 lo 网卡
+hw_default_iface() {
+  local iface=""
+  iface="$(awk 'NR > 1 && $2 == "00000000" {print $1; exit}' "$PROC_ROOT/net/route" 2>/dev/null || true)"
+  if [ -z "$iface" ] && [ -d "$SYS_ROOT/class/net" ]; then
+    iface="$(ls "$SYS_ROOT/class/net" 2>/dev/null | grep -v '^lo$' | head -n1 || true)"
+  fi
+  echo "$iface"
+}
+
+# 网卡协商速率（Mbit/s）；virtio 等拿不到（-1 / 读失败）时输出 0
+hw_nic_speed_mbit() {
+  local iface="$1" v=""
+  [ -n "$iface" ] && v="$(cat "$SYS_ROOT/class/net/$iface/speed" 2>/dev/null || true)"
+  if [[ "$v" =~ ^[0-9]+$ ]] && [ "$v" -gt 0 ]; then echo "$v"; else echo 0; fi
+}
+
+clamp() { local v="$1" lo="$2" hi="$3"; [ "$v" -lt "$lo" ] && v="$lo"; [ "$v" -gt "$hi" ] && v="$hi"; echo "$v"; }
+
+# 计算 profile，结果放在 PROF_* 全局变量里
+profile_resolve() {
+  local mem_kb cpus iface nic bw rtt page
+  mem_kb="$(hw_mem_kb)"
+  cpus="$(hw_cpu_count)"
+  iface="$(hw_default_iface)"
+  nic="$(hw_nic_speed_mbit "$iface")"
+  page="${PAGE_SIZE:-$(getconf PAGESIZE 2>/dev/null || echo 4096)}"
+
+  local mem_mb=$((mem_kb / 1024))
+  [ "$mem_mb" -gt 0 ] || mem_mb=1024   # meminfo 读不到时按 1G 算，不至于给出离谱的值
+
+  bw="$TARGET_BW_MBIT"
+  [ "$bw" -gt 0 ] 2>/dev/null || bw="$nic"
+  [ "$bw" -gt 0 ] 2>/dev/null || bw=1000
+
+  local name="$NET_PROFILE" how="指定"
+  if [ "$name" = "auto" ]; then
+    how="auto"
+    if [ "$mem_mb" -lt 1024 ]; then
+      name="small-memory"
+    elif [ "$cpus" -ge 4 ] && { [ "$bw" -ge 10000 ] || [ "$mem_mb" -ge 8192 ]; }; then
+      name="throughput"
+    else
+      name="balanced"
+    fi
+  fi
+
+  # 各 profile 的系数：
+  #   rtt 默认目标 RTT；div 缓冲区上限不超过 内存/div；mem_a..c tcp_mem/udp_mem 三档（内存页数的 /64 份数）
+  #   dflt 默认 socket 缓冲；rinit/winit tcp_rmem/tcp_wmem 初始值；lowat tcp_notsent_lowat
+  #   blf netdev_max_backlog = 带宽(Mbit) × blf；bud 收包预算倍数；usecs 预算时长；somax 每 MB 内存的 accept 队列
+  #   udp_a..c udp_mem 三档（同样是内存页数的 /64 份数；内核默认约 6 / 8 / 16，QUIC 大流量时容易先撞上）
+  #   udpbuf rmem_max / wmem_max 下限（MB）：QUIC 实现（quic-go / quinn）自己 SO_RCVBUF 要 7MB 左右，被 rmem_max 截断就丢包
+  local rtt_def div mem_a mem_b mem_c dflt rinit winit lowat blf bud usecs somax somax_cap optmem udpmin
+  local udp_a udp_b udp_c udpbuf
+  case "$name" in
+    throughput)
+      rtt_def=250; div=8;  mem_a=6; mem_b=8; mem_c=12; dflt=1048576; rinit=262144; winit=65536; lowat=131072
+      blf=8; bud=2; usecs=8000; somax=64; somax_cap=131072; optmem=131072; udpmin=16384
+      udp_a=8; udp_b=12; udp_c=24; udpbuf=16 ;;
+    latency)
+      rtt_def=50;  div=16; mem_a=4; mem_b=6; mem_c=8;  dflt=212992;  rinit=87380;  winit=16384; lowat=16384
+      blf=2; bud=1; usecs=2000; somax=32; somax_cap=65535;  optmem=65536;  udpmin=16384
+      udp_a=6; udp_b=8; udp_c=16; udpbuf=8 ;;
+    small-memory)
+      rtt_def=150; div=64; mem_a=2; mem_b=3; mem_c=4;  dflt=212992;  rinit=87380;  winit=16384; lowat=16384
+      blf=1; bud=1; usecs=2000; somax=8;  somax_cap=16384;  optmem=20480;  udpmin=8192
+      udp_a=3; udp_b=4; udp_c=8; udpbuf=4 ;;
+    balanced)
+      rtt_def=150; div=16; mem_a=4; mem_b=6; mem_c=8;  dflt=262144;  rinit=131072; winit=16384; lowat=16384
+      blf=4; bud=1; usecs=4000; somax=32; somax_cap=65535;  optmem=65536;  udpmin=16384
+      udp_a=6; udp_b=8; udp_c=16; udpbuf=8 ;;
+    *)
+      echo "❌ 未知 NET_PROFILE: $name（可选 auto / throughput / latency / balanced / small-memory）" >&2
+      return 1 ;;
+  esac
+
+  rtt="$TARGET_RTT_MS"
+  [ "$rtt" -gt 0 ] 2>/dev/null || rtt="$rtt_def"
+
+  # BDP（字节）= 带宽(Mbit/s) × 125000 × RTT(s) = bw × 125 × rtt(ms)
+  # 缓冲区上限取 2×BDP（tcp_adv_win_scale 让约一半缓冲用于数据），再受内存约束，按 MB 取整
+  local mb=1048576 bdp buf
+  bdp=$((bw * 125 * rtt))
+  buf=$((bdp * 2))
+  buf="$(clamp "$buf" $((4 * mb)) $((512 * mb)))"
+  [ "$buf" -lt $((udpbuf * mb)) ] && buf=$((udpbuf * mb))
+  [ "$buf" -gt $((mem_mb * mb / div)) ] && buf=$((mem_mb * mb / div))
+  [ "$buf" -lt "$mb" ] && buf="$mb"
+  buf=$(((buf + mb - 1) / mb * mb))
+
+  local pages=$((mem_kb * 1024 / page))
+  [ "$pages" -gt 0 ] || pages=$((mem_mb * mb / page))
+
+  PROF_NAME="$name"
+  PROF_HOW="$how"
+  PROF_MEM_MB="$mem_mb"
+  PROF_CPUS="$cpus"
+  PROF_IFACE="${iface:-unknown}"
+  PROF_NIC_MBIT="$nic"
+  PROF_BW_MBIT="$bw"
+  PROF_RTT_MS="$rtt"
+  PROF_BDP="$bdp"
+
+  PROF_RMEM_MAX="$buf"
+  PROF_WMEM_MAX="$buf"
+  PROF_RMEM_DEFAULT=$((dflt < buf ? dflt : buf))
+  PROF_WMEM_DEFAULT="$PROF_RMEM_DEFAULT"
+  PROF_TCP_RMEM="4096 $rinit $buf"
+  PROF_TCP_WMEM="4096 $winit $buf"
+  PROF_TCP_MEM="$((pages * mem_a / 64)) $((pages * mem_b / 64)) $((pages * mem_c / 64))"
+  PROF_UDP_MEM="$((pages * udp_a / 64)) $((pages * udp_b / 64)) $((pages * udp_c / 64))"
+  PROF_OPTMEM="$optmem"
+  PROF_UDP_MIN="$udpmin"
+  PROF_NOTSENT_LOWAT="$lowat"
+
+  PROF_SOMAXCONN="$(clamp $((mem_mb * somax)) 1024 "$somax_cap")"
+  PROF_SYN_BACKLOG=$((PROF_SOMAXCONN * 2))
+  PROF_NETDEV_BACKLOG="$(clamp $((bw * blf)) 1000 262144)"
+  [ "$name" = "small-memory" ] && PROF_NETDEV_BACKLOG="$(clamp "$PROF_NETDEV_BACKLOG" 1000 4096)"
+  PROF_BUDGET="$(clamp $((300 * bud * ((bw + 2499) / 2500))) 300 2400)"
+  PROF_BUDGET_USECS="$usecs"
+}
+
+profile_summary() {
+  local nic="未知"
+  [ "$PROF_NIC_MBIT" -gt 0 ] && nic="${PROF_NIC_MBIT}Mbit"
+  echo "$PROF_NAME（$PROF_HOW）| 内存 ${PROF_MEM_MB}MB | CPU $PROF_CPUS | 网卡 $PROF_IFACE $nic | 目标 ${PROF_BW_MBIT}Mbit × ${PROF_RTT_MS}ms，BDP $((PROF_BDP / 1024))KB，缓冲上限 $((PROF_RMEM_MAX / 1048576))MB"
+}
+
+# === 7.6 conntrack 表容量（nf_conntrack_max + hashsize，按内存和观测到的峰值连接数）===
+# 条目按需从 slab 分配，nf_conntrack_max 只是上限；真正预分配的是哈希桶（每桶 8 字节）。
+# 上限 = max(内存 × NFCT_MEM_PCT% / 单条目, 峰值 × NFCT_HEADROOM)，封顶 内存 × NFCT_MEM_PCT_MAX%；
+# 峰值记在 $NFCT_STATE（--conntrack-monitor 持续更新），重装时沿用。
+next_pow2() { local v="$1" p=1; while [ "$p" -lt "$v" ]; do p=$((p * 2)); done; echo "$p"; }
+
+ct_state_get() {
+  local v=""
+  [ -r "$NFCT_STATE" ] && v="$(awk -F= -v k="$1" '$1 == k {v = $2} END {print v}' "$NFCT_STATE" 2>/dev/null || true)"
+  [[ "$v" =~ ^[0-9]+$ ]] || v="$2"
+  echo "$v"
+}
+
+ct_state_write() {
+  install -d "$(dirname "$NFCT_STATE")"
+  {
+    echo "# Net-Optimize: conntrack 容量（--conntrack-monitor 维护，开机由 net-optimize-apply 读取）"
+    echo "CT_PEAK=$1"
+    echo "CT_MAX=$2"
+    echo "CT_BUCKETS=$3"
+    echo "CT_UPDATED=$(date -u '+%FT%TZ')"
+  } >"$NFCT_STATE.tmp" && mv -f "$NFCT_STATE.tmp" "$NFCT_STATE"
+}
+
+# 纯计算：conntrack_size 内存KB 峰值 -> CT_MAX / CT_BUCKETS / CT_CAP / CT_NOTE
+conntrack_size() {
+  local mem_kb="$1" peak="$2" mem_bytes base want
+  mem_bytes=$((mem_kb * 1024))
+  [ "$mem_bytes" -gt 0 ] || mem_bytes=$((1024 * 1048576))
+
+  base=$((mem_bytes / 100 * NFCT_MEM_PCT / NFCT_ENTRY_BYTES))
+  CT_CAP="$(clamp $((mem_bytes / 100 * NFCT_MEM_PCT_MAX / NFCT_ENTRY_BYTES)) "$NFCT_FLOOR" "$NFCT_CEIL")"
+
+  want=$((peak * NFCT_HEADROOM))
+  [ "$want" -lt "$base" ] && want="$base"
+  CT_NOTE=""
+  [ "$want" -gt "$CT_CAP" ] && CT_NOTE="峰值 × $NFCT_HEADROOM 超过内存上限 $CT_CAP，已封顶"
+  want="$(clamp "$want" "$NFCT_FLOOR" "$CT_CAP")"
+
+  CT_MAX=$(((want + 1023) / 1024 * 1024))
+  [ "$CT_MAX" -gt "$CT_CAP" ] && CT_MAX="$CT_CAP"
+  CT_BUCKETS="$(next_pow2 $(((CT_MAX + NFCT_BUCKET_DIV - 1) / NFCT_BUCKET_DIV)))"
+}
+
+# 读内存 / 峰值 / 当前计数算容量；NFCT_MAX 是数字时按指定值，只算 hashsize
+conntrack_resolve() {
+  local peak cur
+  peak="$(ct_state_get CT_PEAK 0)"
+  cur="$(read_proc_sys net.netfilter.nf_conntrack_count 0)"
+  [[ "$cur" =~ ^[0-9]+$ ]] && [ "$cur" -gt "$peak" ] && peak="$cur"
+  CT_PEAK="$peak"
+
+  conntrack_size "$(hw_mem_kb)" "$peak"
+  CT_HOW="auto"
+  if [[ "$NFCT_MAX" =~ ^[0-9]+$ ]]; then
+    CT_HOW="指定"
+    CT_MAX="$NFCT_MAX"
+    CT_BUCKETS="$(next_pow2 $(((CT_MAX + NFCT_BUCKET_DIV - 1) / NFCT_BUCKET_DIV)))"
+    CT_NOTE=""
+  fi
+  return 0
+}
+
+conntrack_summary() {
+  echo "nf_conntrack_max $CT_MAX（$CT_HOW）| hashsize $CT_BUCKETS | 观测峰值 $CT_PEAK | 上限封顶 $CT_CAP | 哈希表 $((CT_BUCKETS * 8 / 1024))KB，满表约 $((CT_MAX * NFCT_ENTRY_BYTES / 1048576))MB${CT_NOTE:+ | ⚠️ $CT_NOTE}"
+}
+
+# 运行时生效 + 持久化（sysctl.d / modprobe.d / 状态文件）
+conntrack_apply() {
+  local max="$1" buckets="$2" hs="$SYS_ROOT/module/nf_conntrack/parameters/hashsize"
+
+  # hashsize 只能在初始 netns 里改；改的时候内核会整表 rehash，只在变化时写
+  if [ -w "$hs" ] && [ "$(cat "$hs" 2>/dev/null || echo 0)" != "$buckets" ]; then
+    echo "$buckets" >"$hs" 2>/dev/null || echo "  ⚠️ hashsize 运行时调整失败（容器 / 非初始 netns？），重启后按 modprobe.d 生效"
+  fi
+  sysctl -w net.netfilter.nf_conntrack_max="$max" >/dev/null 2>&1 || echo "  ⚠️ nf_conntrack_max 运行时写入失败"
+
+  install -d "$(dirname "$NFCT_MODPROBE_CONF")"
+  {
+    echo "# Net-Optimize: conntrack 哈希桶数（模块加载时生效；内建时由 net-optimize-apply 写 /sys）"
+    echo "options nf_conntrack hashsize=$buckets"
+  } >"$NFCT_MODPROBE_CONF"
+  if [ -f "$SYSCTL_AUTH_FILE" ]; then
+    sed -i "s/^net\.netfilter\.nf_conntrack_max = .*/net.netfilter.nf_conntrack_max = $max/" "$SYSCTL_AUTH_FILE"
+  fi
+  ct_state_write "$CT_PEAK" "$max" "$buckets"
+}
+
+# 周期检查（timer 调用）：记录峰值；count 到 max 的 NFCT_GROW_PCT% 就在表满之前翻倍扩容
+conntrack_monitor() {
+  local count max buckets old_peak new nb
+  count="$(read_proc_sys net.netfilter.nf_conntrack_count "")"
+  max="$(read_proc_sys net.netfilter.nf_conntrack_max 0)"
+  if ! [[ "$count" =~ ^[0-9]+$ ]] || ! [ "$max" -gt 0 ] 2>/dev/null; then
+    echo "ℹ️ conntrack 未加载，跳过"
+    return 0
+  fi
+
+  old_peak="$(ct_state_get CT_PEAK 0)"
+  CT_PEAK="$old_peak"
+  [ "$count" -gt "$CT_PEAK" ] && CT_PEAK="$count"
+  buckets="$(read_proc_sys net.netfilter.nf_conntrack_buckets "$(ct_state_get CT_BUCKETS 0)")"
+  conntrack_size "$(hw_mem_kb)" "$CT_PEAK"
+
+  if [ $((count * 100)) -ge $((max * NFCT_GROW_PCT)) ]; then
+    new=$((max * 2))
+    [ "$new" -gt "$CT_CAP" ] && new="$CT_CAP"
+    if [ "$new" -gt "$max" ]; then
+      nb="$(next_pow2 $(((new + NFCT_BUCKET_DIV - 1) / NFCT_BUCKET_DIV)))"
+      [ "$nb" -lt "$buckets" ] && nb="$buckets"
+      conntrack_apply "$new" "$nb"
+      echo "📈 conntrack $count/$max ≥ ${NFCT_GROW_PCT}%：nf_conntrack_max $max -> $new，hashsize $buckets -> $nb"
+    else
+      echo "⚠️ conntrack $count/$max ≥ ${NFCT_GROW_PCT}%，已到内存上限 $CT_CAP（NFCT_MEM_PCT_MAX=$NFCT_MEM_PCT_MAX%），不再扩容"
+    fi
+    return 0
+  fi
+
+  [ "$CT_PEAK" -gt "$old_peak" ] && ct_state_write "$CT_PEAK" "$max" "$buckets"
+  return 0
+}
+
+conntrack_install_monitor() {
+  local timer="/etc/systemd/system/$NFCT_MONITOR_UNIT.timer"
+  if [[ "$NFCT_MAX" =~ ^[0-9]+$ ]] || [ ! -x "$SCRIPT_PATH" ] || ! have_cmd systemctl; then
+    # 固定上限（或脚本没装到 $SCRIPT_PATH）时不自动扩容；清掉之前装过的 timer
+    if [ -f "$timer" ]; then
+      systemctl disable --now "$NFCT_MONITOR_UNIT.timer" >/dev/null 2>&1 || true
+      rm -f "$timer" "/etc/systemd/system/$NFCT_MONITOR_UNIT.service"
+      systemctl daemon-reload 2>/dev/null || true
+    fi
+    return 0
+  fi
+
+  cat >"/etc/systemd/system/$NFCT_MONITOR_UNIT.service" <<EOF
+[Unit]
+Description=Net-Optimize conntrack table auto-grow
+
+[Service]
+Type=oneshot
+ExecStart=$SCRIPT_PATH --conntrack-monitor
+EOF
+
+  cat >"$timer" <<EOF
+[Unit]
+Description=Net-Optimize conntrack table auto-grow (every ${NFCT_MONITOR_SEC}s)
+
+[Timer]
+OnBootSec=60
+OnUnitActiveSec=$NFCT_MONITOR_SEC
+AccuracySec=5
+
+[Install]
+WantedBy=timers.target
+EOF
+
+  systemctl daemon-reload 2>/dev/null || true
+  systemctl enable --now "$NFCT_MONITOR_UNIT.timer" >/dev/null 2>&1 || true
+  echo "  ✅ 已启用 $NFCT_MONITOR_UNIT.timer（每 ${NFCT_MONITOR_SEC}s，达到 ${NFCT_GROW_PCT}% 自动扩容）"
+}
+
+# === 7.8 UDP 快速路径：GRO 转发 / GSO 网卡卸载 ===
+# rx-udp-gro-forwarding：转发的 UDP（本机 ip_forward=1 做中转时）也走 GRO 聚合，按包处理变成按批处理；
+# tx-udp-segmentation：QUIC 实现（quic-go / quinn）用 UDP GSO 一次 sendmsg 发一串包，网卡支持时交给硬件切分。
+# 只打开 ethtool -k 里存在、不是 [fixed]、当前为 off 的特性，记到 $UDP_OFFLOAD_FILE（“网卡 特性”每行一项），
+# 开机由 net-optimize-apply 重放，还原脚本按同一份清单关回去。
+udp_offload_plan() {
+  local iface feat state features
+  for iface in ${STEER_IFACES:-$(hw_default_iface)}; do
+    features="$(ethtool -k "$iface" 2>/dev/null || true)"
+    [ -n "$features" ] || continue
+    for feat in $UDP_OFFLOAD_FEATURES; do
+      state="$(awk -v f="$feat:" '$1 == f {print $2 ($3 == "[fixed]" ? "-fixed" : ""); exit}' <<<"$features")"
+      if [ "$state" = "off" ]; then echo "$iface $feat"; fi
+    done
+  done
+}
+
+setup_udp_offload() {
+  if [ "$ENABLE_UDP_OFFLOAD" != "1" ]; then
+    echo "⏭️ 跳过 UDP GRO / GSO 卸载"
+    return 0
+  fi
+  if ! have_cmd ethtool; then
+    echo "ℹ️ 未安装 ethtool，跳过 UDP GRO / GSO 卸载"
+    return 0
+  fi
+
+  echo "📦 UDP 快速路径（GRO 转发 / GSO）..."
+  local plan iface feat ok=0 fail=0
+  plan="$(udp_offload_plan)"
+  # 已有清单时合并：上一次打开的特性现在显示 on，不会再出现在 plan 里，但还原时要关回去
+  [ -f "$UDP_OFFLOAD_FILE" ] && plan="$(printf '%s\n%s\n' "$(grep -v '^#' "$UDP_OFFLOAD_FILE")" "$plan")"
+  plan="$(sed '/^$/d' <<<"$plan" | sort -u)"
+  if [ -z "$plan" ]; then
+    echo "  ✅ 网卡不支持可调的 UDP 卸载特性，或已全部打开"
+    return 0
+  fi
+
+  while read -r iface feat; do
+    if ethtool -K "$iface" "$feat" on >/dev/null 2>&1; then
+      ok=$((ok + 1))
+      echo "  ✅ $iface $feat on"
+    else
+      fail=$((fail + 1))
+      echo "  ⚠️ $iface $feat 打开失败"
+    fi
+  done <<<"$plan"
+
+  install -d "$(dirname "$UDP_OFFLOAD_FILE")"
+  { echo "# Net-Optimize: 由本脚本打开的网卡卸载特性（网卡 特性）"; echo "$plan"; } >"$UDP_OFFLOAD_FILE.tmp"
+  mv -f "$UDP_OFFLOAD_FILE.tmp" "$UDP_OFFLOAD_FILE"
+  echo "  📦 卸载特性：成功 $ok 项，失败 $fail 项"
+}
+
+# === 8. Sysctl 深度整合（写入文件，自适应内核能力）===
+# 渲染 sysctl.d 文件内容到 stdout（纯函数：不写文件、不需要 root）
+render_sysctl_conf() {
+  profile_resolve || return 1
 
   # 如果 FINAL_CC / FINAL_QDISC 为空，兜底读取当前 runtime
   local cc qdisc
-  cc="${FINAL_CC:-$(sysctl -n net.ipv4.tcp_congestion_control 2>/dev/null || echo cubic)}"
-  qdisc="${FINAL_QDISC:-$(sysctl -n net.core.default_qdisc 2>/dev/null || echo fq)}"
+  cc="${FINAL_CC:-$(read_proc_sys net.ipv4.tcp_congestion_control cubic)}"
+  qdisc="${FINAL_QDISC:-$(read_proc_sys net.core.default_qdisc fq)}"
 
   {
     echo "# ========================================================="
     echo "# 🚀 Net-Optimize Ultimate - Kernel Parameters"
     echo "# Generated: $(date -u '+%F %T UTC')"
+    echo "# Profile: $(profile_summary)"
+    [ -n "${CC_SELECT_NOTE:-}" ] && echo "# CC/qdisc: $CC_SELECT_NOTE"
     echo "# ========================================================="
     echo
 
@@ -466,16 +1050,16 @@ write_sysctl_conf() {
     echo "net.ipv4.tcp_congestion_control = $cc"
     echo
 
-    echo "# === 基础网络设置 ==="
-    echo "net.core.netdev_max_backlog = 250000"
-    echo "net.core.somaxconn = 1000000"
-    echo "net.ipv4.tcp_max_syn_backlog = 819200"
+    echo "# === 基础网络设置（backlog 按内存 / 带宽）==="
+    echo "net.core.netdev_max_backlog = $PROF_NETDEV_BACKLOG"
+    echo "net.core.somaxconn = $PROF_SOMAXCONN"
+    echo "net.ipv4.tcp_max_syn_backlog = $PROF_SYN_BACKLOG"
     echo "net.ipv4.tcp_syncookies = 1"
     echo
 
-    echo "# === 网卡收包预算（你参考那套里有，建议保留）==="
-    echo "net.core.netdev_budget = 50000"
-    echo "net.core.netdev_budget_usecs = 5000"
+    echo "# === 网卡收包预算（按带宽 / profile）==="
+    echo "net.core.netdev_budget = $PROF_BUDGET"
+    echo "net.core.netdev_budget_usecs = $PROF_BUDGET_USECS"
     echo
 
     echo "# === 连接生命周期 ==="
@@ -493,7 +1077,7 @@ write_sysctl_conf() {
     echo "net.ipv4.tcp_no_metrics_save = 0"
     echo "net.ipv4.tcp_ecn = 1"
     echo "net.ipv4.tcp_ecn_fallback = 1"
-    echo "net.ipv4.tcp_notsent_lowat = 16384"
+    echo "net.ipv4.tcp_notsent_lowat = $PROF_NOTSENT_LOWAT"
     echo "net.ipv4.tcp_fastopen = 3"
     echo "net.ipv4.tcp_timestamps = 1"
     echo "net.ipv4.tcp_autocorking = 0"
@@ -507,17 +1091,18 @@ write_sysctl_conf() {
     echo "net.ipv4.tcp_frto = 0"
     echo
 
-    echo "# === 内存缓冲区优化（64MB方案）==="
-    echo "net.core.rmem_max = 67108864"
-    echo "net.core.wmem_max = 67108864"
-    echo "net.core.rmem_default = 67108864"
-    echo "net.core.wmem_default = 67108864"
-    echo "net.core.optmem_max = 65536"
-    echo "net.ipv4.tcp_rmem = 4096 87380 67108864"
-    echo "net.ipv4.tcp_wmem = 4096 65536 67108864"
-    echo "net.ipv4.udp_rmem_min = 16384"
-    echo "net.ipv4.udp_wmem_min = 16384"
-    echo "net.ipv4.udp_mem = 65536 131072 262144"
+    echo "# === 内存缓冲区（上限 = 2×BDP，受内存约束；tcp_mem / udp_mem 按内存页数）==="
+    echo "net.core.rmem_max = $PROF_RMEM_MAX"
+    echo "net.core.wmem_max = $PROF_WMEM_MAX"
+    echo "net.core.rmem_default = $PROF_RMEM_DEFAULT"
+    echo "net.core.wmem_default = $PROF_WMEM_DEFAULT"
+    echo "net.core.optmem_max = $PROF_OPTMEM"
+    echo "net.ipv4.tcp_rmem = $PROF_TCP_RMEM"
+    echo "net.ipv4.tcp_wmem = $PROF_TCP_WMEM"
+    echo "net.ipv4.tcp_mem = $PROF_TCP_MEM"
+    echo "net.ipv4.udp_rmem_min = $PROF_UDP_MIN"
+    echo "net.ipv4.udp_wmem_min = $PROF_UDP_MIN"
+    echo "net.ipv4.udp_mem = $PROF_UDP_MEM"
     echo
 
     echo "# === 路由/转发（按你的需求保留）==="
@@ -581,8 +1166,9 @@ write_sysctl_conf() {
     echo
 
     if [ "$ENABLE_CONNTRACK_TUNE" = "1" ]; then
-      echo "# === 连接跟踪优化 ==="
-      echo "net.netfilter.nf_conntrack_max = $NFCT_MAX"
+      conntrack_resolve
+      echo "# === 连接跟踪优化（$(conntrack_summary)）==="
+      echo "net.netfilter.nf_conntrack_max = $CT_MAX"
       echo "net.netfilter.nf_conntrack_udp_timeout = 30"
       echo "net.netfilter.nf_conntrack_udp_timeout_stream = 180"
       echo "net.netfilter.nf_conntrack_tcp_timeout_established = 432000"
@@ -591,7 +1177,19 @@ write_sysctl_conf() {
       echo "net.netfilter.nf_conntrack_tcp_timeout_fin_wait = 120"
       echo
     fi
-  } >"$sysctl_file"
+  }
+}
+
+write_sysctl_conf() {
+  echo "📊 写入内核参数配置文件..."
+
+  local sysctl_file="$SYSCTL_AUTH_FILE"
+  install -d /etc/sysctl.d
+
+  # 先算好 profile（PROF_* 留在当前 shell，状态报告里也要用），失败就不动旧文件
+  profile_resolve || { echo "❌ sysctl profile 计算失败"; return 1; }
+  render_sysctl_conf >"$sysctl_file"
+  echo "✅ profile: $(profile_summary)"
 
   sysctl -e --system >/dev/null 2>&1 || echo "⚠️ 部分参数不支持，但不影响其他项"
   echo "✅ sysctl 参数已写入并应用：$sysctl_file"
@@ -640,7 +1238,17 @@ setup_conntrack() {
   # 4) 不靠重启，立刻让 systemd-modules-load 吃进去
   systemctl restart systemd-modules-load 2>/dev/null || true
 
-  # 5) ✅ 关键：写入“触发 conntrack”的安全规则（INVALID 丢弃）
+  # 5) 容量：模块加载后才有 nf_conntrack_count，这里再按内存 + 峰值算一次，运行时生效并持久化
+  conntrack_resolve
+  if [ -r /proc/sys/net/netfilter/nf_conntrack_max ]; then
+    conntrack_apply "$CT_MAX" "$CT_BUCKETS"
+    echo "  ✅ $(conntrack_summary)"
+    conntrack_install_monitor
+  else
+    echo "  ℹ️ nf_conntrack 未加载，容量将在开机时按 sysctl.d / modprobe.d 生效"
+  fi
+
+  # 6) ✅ 关键：写入“触发 conntrack”的安全规则（INVALID 丢弃）
   #    没有这步，你就会重启后又变 0（因为没规则触发跟踪）
   if command -v iptables >/dev/null 2>&1; then
     iptables -t filter -C INPUT  -m conntrack --ctstate INVALID -j DROP 2>/dev/null \
@@ -652,7 +1260,7 @@ setup_conntrack() {
     echo "  ✅ 已写入 conntrack 触发规则（INVALID -> DROP）：INPUT/OUTPUT"
   fi
 
-  # 6) 打印最可信计数器（不保证立刻>0，得有流量才会涨）
+  # 7) 打印最可信计数器（不保证立刻>0，得有流量才会涨）
   if [ -r /proc/sys/net/netfilter/nf_conntrack_count ]; then
     echo "  🔎 nf_conntrack_count=$(cat /proc/sys/net/netfilter/nf_conntrack_count 2>/dev/null)"
   fi
@@ -660,6 +1268,237 @@ setup_conntrack() {
   echo "✅ 连接跟踪配置完成"
 }
 
+# === 9.1 conntrack 旁路（NOTRACK）：代理监听端口不进连接跟踪（默认关闭，NOTRACK_PORTS 非空才启用）===
+# setup_conntrack 故意让所有流量走 conntrack（INVALID 丢弃），但代理入站每条连接都要插表 / 查表，
+# 连接洪水还能把表打满。raw 表里对这些端口 notrack：入站按目的端口（PREROUTING），回包按源端口（OUTPUT）；
+# 其他流量（包括代理发出的上游连接）照常跟踪。OUTPUT 只按源端口匹配，出站连接的临时端口落进这些端口就会
+# 被误旁路，所以同时把它们加进 ip_local_reserved_ports（内核不再拿来当临时端口，监听不受影响）。
+# 被 notrack 的包状态是 UNTRACKED，不会命中 INVALID DROP，
+# 但也不会经过 NAT——做了端口跳跃（REDIRECT / DNAT）的端口不要放进来。
+# 格式：NOTRACK_PORTS="443 8443 tcp:80 udp:20000-30000"，不带协议 = tcp + udp
+notrack_entries() {
+  local e protos p lo hi x
+  for e in $NOTRACK_PORTS; do
+    protos="tcp udp"; p="$e"
+    case "$e" in
+      tcp:* | udp:*) protos="${e%%:*}"; p="${e#*:}" ;;
+    esac
+    if ! [[ "$p" =~ ^[0-9]+(-[0-9]+)?$ ]]; then
+      echo "  ⚠️ NOTRACK_PORTS 忽略无法识别的条目：$e" >&2
+      continue
+    fi
+    lo="${p%-*}"; hi="${p#*-}"
+    if [ "$lo" -lt 1 ] || [ "$hi" -gt 65535 ] || [ "$lo" -gt "$hi" ]; then
+      echo "  ⚠️ NOTRACK_PORTS 端口范围无效：$e" >&2
+      continue
+    fi
+    for x in $protos; do echo "$x:$lo-$hi"; done
+  done | sort -u | tr '\n' ' ' | sed 's/ $//'
+}
+
+notrack_backend() {
+  case "$NOTRACK_BACKEND" in
+    nft | iptables) echo "$NOTRACK_BACKEND"; return 0 ;;
+  esac
+  # auto：iptables 本身就是 nf_tables 前端或者没有 iptables 时用原生 nft，否则用 iptables（legacy）
+  if have_cmd nft && { ! have_cmd iptables || iptables -V 2>/dev/null | grep -q nf_tables; }; then
+    echo nft
+  elif have_cmd iptables; then
+    echo iptables
+  else
+    echo none
+  fi
+}
+
+# 原生 nft：独立的 inet 表，先建再删再建，整份脚本一次性原子替换
+notrack_nft_script() {
+  local rules="$1" hook dir proto r ports
+  echo "table inet netopt_notrack"
+  echo "delete table inet netopt_notrack"
+  echo "table inet netopt_notrack {"
+  for hook in prerouting:dport output:sport; do
+    dir="${hook#*:}"; hook="${hook%:*}"
+    echo "  chain $hook {"
+    echo "    type filter hook $hook priority -300; policy accept;"
+    for proto in tcp udp; do
+      ports=""
+      for r in $rules; do
+        [ "${r%%:*}" = "$proto" ] || continue
+        r="${r#*:}"
+        [ "${r%-*}" = "${r#*-}" ] && r="${r%-*}"
+        ports+="${ports:+, }$r"
+      done
+      [ -n "$ports" ] && echo "    $proto $dir { $ports } counter notrack"
+    done
+    echo "  }"
+  done
+  echo "}"
+}
+
+notrack_clear() {
+  local c
+  have_cmd nft && nft delete table inet netopt_notrack 2>/dev/null || true
+  for c in iptables ip6tables iptables-nft ip6tables-nft iptables-legacy ip6tables-legacy; do
+    have_cmd "$c" || continue
+    "$c" -t raw -D PREROUTING -j NETOPT_NT_PRE 2>/dev/null || true
+    "$c" -t raw -D OUTPUT -j NETOPT_NT_OUT 2>/dev/null || true
+    "$c" -t raw -F NETOPT_NT_PRE 2>/dev/null || true
+    "$c" -t raw -X NETOPT_NT_PRE 2>/dev/null || true
+    "$c" -t raw -F NETOPT_NT_OUT 2>/dev/null || true
+    "$c" -t raw -X NETOPT_NT_OUT 2>/dev/null || true
+  done
+}
+
+# iptables / ip6tables：raw 表两条自定义链，PREROUTING / OUTPUT 各 1 条跳转；xt_CT 不可用时退回老的 NOTRACK 目标
+notrack_apply_iptables() {
+  local rules="$1" c r proto ports target=(-j CT --notrack) n=0
+  for c in iptables ip6tables; do
+    have_cmd "$c" || continue
+    "$c" -t raw -N NETOPT_NT_PRE 2>/dev/null || "$c" -t raw -F NETOPT_NT_PRE
+    "$c" -t raw -N NETOPT_NT_OUT 2>/dev/null || "$c" -t raw -F NETOPT_NT_OUT
+    for r in $rules; do
+      proto="${r%%:*}"; ports="${r#*:}"; ports="${ports/-/:}"
+      "$c" -t raw -A NETOPT_NT_PRE -p "$proto" --dport "$ports" "${target[@]}" 2>/dev/null \
+        || { target=(-j NOTRACK); "$c" -t raw -A NETOPT_NT_PRE -p "$proto" --dport "$ports" "${target[@]}"; } || return 1
+      "$c" -t raw -A NETOPT_NT_OUT -p "$proto" --sport "$ports" "${target[@]}" || return 1
+    done
+    "$c" -t raw -I PREROUTING 1 -j NETOPT_NT_PRE || return 1
+    "$c" -t raw -I OUTPUT 1 -j NETOPT_NT_OUT || return 1
+    n=$((n + 1))
+  done
+  [ "$n" -gt 0 ]
+}
+
+# NOTRACK 端口 -> ip_local_reserved_ports 写法（逗号分隔，tcp / udp 共用一张表）
+notrack_reserved_list() {
+  local r
+  for r in $1; do
+    r="${r#*:}"
+    [ "${r%-*}" = "${r#*-}" ] && r="${r%-*}"
+    echo "$r"
+  done | sort -u | tr '\n' ',' | sed 's/,$//'
+}
+
+# 保留端口 $1 占掉临时端口范围里的多少个：输出 "占用 总数"
+reserved_in_local_range() {
+  local lo hi
+  read -r lo hi < <(read_proc_sys net/ipv4/ip_local_port_range "32768 60999")
+  echo "$1" | tr ',' '\n' | awk -v L="$lo" -v H="$hi" -F- '
+    NF { a = $1; b = (NF > 1 ? $2 : $1); if (a < L) a = L; if (b > H) b = H; if (b >= a) n += b - a + 1 }
+    END { print n + 0, H - L + 1 }'
+}
+
+# 把 NOTRACK 端口并入 ip_local_reserved_ports（$2 = 启用前原有的值）；临时端口几乎被占光时不保留、只告警
+notrack_reserve_ports() {
+  local rules="$1" prev="$2" want used total
+  want="$(notrack_reserved_list "$rules")"
+  read -r used total < <(reserved_in_local_range "${prev:+$prev,}$want")
+  if [ $((total - used)) -lt 1024 ]; then
+    echo "  ⚠️ NOTRACK 端口覆盖了几乎整个临时端口范围（$used/$total），不写 ip_local_reserved_ports；" >&2
+    echo "     出站连接的源端口落进这些端口会被一起旁路，建议缩小 NOTRACK_PORTS 或调整 ip_local_port_range" >&2
+    echo "$prev"
+    return 0
+  fi
+  if ! sysctl -w net.ipv4.ip_local_reserved_ports="${prev:+$prev,}$want" >/dev/null 2>&1; then
+    echo "  ⚠️ ip_local_reserved_ports 写入失败，出站临时端口可能落进 NOTRACK 端口" >&2
+    echo "$prev"
+    return 0
+  fi
+  [ "$used" -gt $((total / 2)) ] && echo "  ⚠️ 保留端口占去临时端口范围 $used/$total，出站并发连接多时可能不够用" >&2
+  read_proc_sys net/ipv4/ip_local_reserved_ports "$want"
+}
+
+# softirq + system 占总 CPU 时间的百分比（采样 $1 秒）：notrack 省下的正是这部分开销
+cpu_kernel_pct() {
+  local k1 t1 k2 t2 f='/^cpu / {print $4 + $7 + $8, $2 + $3 + $4 + $5 + $6 + $7 + $8 + $9; exit}'
+  read -r k1 t1 < <(awk "$f" "$PROC_ROOT/stat")
+  sleep "${1:-3}"
+  read -r k2 t2 < <(awk "$f" "$PROC_ROOT/stat")
+  awk -v k=$((k2 - k1)) -v t=$((t2 - t1)) 'BEGIN { printf "%.1f\n", (t > 0 ? k * 100 / t : 0) }'
+}
+
+notrack_nat_warn() {
+  local nat=""
+  have_cmd iptables && nat="$(iptables -t nat -S PREROUTING 2>/dev/null | grep -E 'REDIRECT|DNAT' || true)"
+  have_cmd nft && nat+="$(nft list ruleset 2>/dev/null | grep -E '\b(redirect|dnat)\b' || true)"
+  [ -n "$nat" ] || return 0
+  echo "  ⚠️ 检测到 NAT 转发规则；被 notrack 的端口不会做 REDIRECT / DNAT（端口跳跃会失效），请确认下列规则的端口不在 NOTRACK_PORTS 中："
+  echo "$nat" | sed 's/^/     /'
+}
+
+setup_notrack() {
+  local rules backend base_count="" base_cpu="" base_time="" prev_reserved reserved
+  if [ -z "$NOTRACK_PORTS" ]; then
+    if [ -f "$NOTRACK_FILE" ]; then
+      notrack_clear
+      prev_reserved="$(. "$NOTRACK_FILE"; echo "${NOTRACK_PREV_RESERVED:-}")"
+      sysctl -w net.ipv4.ip_local_reserved_ports="$prev_reserved" >/dev/null 2>&1 || true
+      rm -f "$NOTRACK_FILE" "$NOTRACK_NFT"
+      echo "🗑 已移除 conntrack 旁路（NOTRACK）规则"
+    fi
+    return 0
+  fi
+
+  echo "🚀 配置 conntrack 旁路（NOTRACK）..."
+  rules="$(notrack_entries)"
+  [ -n "$rules" ] || { echo "  ⚠️ NOTRACK_PORTS 没有有效端口，跳过"; return 0; }
+  backend="$(notrack_backend)"
+  [ "$backend" != "none" ] || { echo "  ⚠️ nft / iptables 都不可用，跳过"; return 0; }
+
+  # 基线：第一次启用前的 conntrack 条数和内核态 CPU；已有基线时沿用（否则量到的是旁路后的值）
+  # 原有的 ip_local_reserved_ports 同理只在第一次记录，关闭时还原
+  prev_reserved="$(read_proc_sys net/ipv4/ip_local_reserved_ports)"
+  if [ -f "$NOTRACK_FILE" ]; then
+    base_count="$(. "$NOTRACK_FILE"; echo "${NOTRACK_BASE_COUNT:-}")"
+    base_cpu="$(. "$NOTRACK_FILE"; echo "${NOTRACK_BASE_CPU:-}")"
+    base_time="$(. "$NOTRACK_FILE"; echo "${NOTRACK_BASE_TIME:-}")"
+    prev_reserved="$(. "$NOTRACK_FILE"; echo "${NOTRACK_PREV_RESERVED-$prev_reserved}")"
+  fi
+  if [ -z "$base_time" ]; then
+    base_count="$(read_proc_sys net/netfilter/nf_conntrack_count 0)"
+    base_cpu="$(cpu_kernel_pct "$NOTRACK_SAMPLE_SEC")"
+    base_time="$(date '+%F %T')"
+  fi
+
+  notrack_clear
+  if [ "$backend" = "nft" ]; then
+    notrack_nft_script "$rules" >"$NOTRACK_NFT.tmp" && mv -f "$NOTRACK_NFT.tmp" "$NOTRACK_NFT"
+    if ! nft -f "$NOTRACK_NFT"; then
+      echo "  ❌ nft 写入失败"
+      rm -f "$NOTRACK_NFT"
+      return 1
+    fi
+  else
+    rm -f "$NOTRACK_NFT"
+    if ! notrack_apply_iptables "$rules"; then
+      echo "  ❌ iptables raw 表写入失败（内核缺少 xt_CT / xt_NOTRACK？）"
+      notrack_clear
+      return 1
+    fi
+  fi
+  reserved="$(notrack_reserve_ports "$rules" "$prev_reserved")"
+
+  cat >"$NOTRACK_FILE.tmp" <<EOF
+# Net-Optimize: conntrack 旁路（NOTRACK），开机由 net-optimize-apply 重放
+NOTRACK_BACKEND=$backend
+NOTRACK_RULES="$rules"
+NOTRACK_BASE_COUNT=$base_count
+NOTRACK_BASE_CPU=$base_cpu
+NOTRACK_BASE_TIME="$base_time"
+NOTRACK_PREV_RESERVED="$prev_reserved"
+NOTRACK_RESERVED="$reserved"
+EOF
+  mv -f "$NOTRACK_FILE.tmp" "$NOTRACK_FILE"
+
+  echo "  ✅ [$backend] 不跟踪：$rules"
+  echo "  🔒 ip_local_reserved_ports：${reserved:-（未设置）}"
+  echo "  📏 基线（$base_time）：nf_conntrack_count=$base_count，内核态 CPU ${base_cpu}%（check 脚本对比当前值）"
+  notrack_nat_warn
+  if have_cmd iptables && iptables -S INPUT 2>/dev/null | grep -q '^-P INPUT DROP'; then
+    echo "  ⚠️ INPUT 默认 DROP：只放行 ESTABLISHED 的防火墙会丢掉 UNTRACKED 包，需要按端口放行或加 --ctstate UNTRACKED -j ACCEPT"
+  fi
+}
+
 # === 10. MSS Clamping 依赖：出口接口探测 ===
 detect_outbound_iface() {
   local iface=""
@@ -673,14 +1512,273 @@ detect_outbound_iface() {
   echo "$iface"
 }
 
-# === 10.1 MSS Clamping（强制收敛为1条，避免重复叠加）===
+# === 9.5 多队列 / CPU 分流（RPS / RFS / XPS / IRQ 亲和）===
+# 多核 VPS 配单队列 virtio 网卡时，收包软中断全压在一个核上，其他核闲着。
+# 按网卡队列数和在线 CPU 生成一份“分流计划”（每行：sysctl 键 值 / sysfs 路径 值 / irq 名字 CPU），
+# 写到 $STEERING_FILE，运行时执行，开机由 net-optimize-apply 重放（IRQ 按名字查号，不依赖编号不变）。
+#   rx 队列 < CPU 数：RPS 把每个 rx 队列分到所有 CPU，RFS 按 rps_sock_flow_entries / 队列数 分配 flow 表
+#   rx 队列 ≥ CPU 数：网卡硬件 RSS 已经分散，关闭 RPS
+#   tx 队列 > 1：XPS 把 CPU 轮流绑到各 tx 队列；队列中断按队列号绑到 CPU（irqbalance 在跑时不动 IRQ）
+expand_cpu_list() {
+  local part a b out=()
+  for part in ${1//,/ }; do
+    if [[ "$part" == *-* ]]; then
+      a="${part%-*}"; b="${part#*-}"
+      for ((; a <= b; a++)); do out+=("$a"); done
+    else
+      out+=("$part")
+    fi
+  done
+  echo "${out[*]}"
+}
+
+online_cpus() {
+  local v
+  v="$(cat "$SYS_ROOT/devices/system/cpu/online" 2>/dev/null || true)"
+  if [ -n "$v" ]; then
+    expand_cpu_list "$v"
+  else
+    seq -s ' ' 0 $(($(hw_cpu_count) - 1))
+  fi
+}
+
+# CPU 列表 -> sysfs 位图（每 32 位一段，高位段在前，逗号分隔）
+cpu_mask() {
+  local c hi=0 i out=""
+  local -a words=()
+  for c in "$@"; do
+    words[c / 32]=$(( ${words[c / 32]:-0} | (1 << (c % 32)) ))
+    [ $((c / 32)) -gt "$hi" ] && hi=$((c / 32))
+  done
+  for ((i = hi; i >= 0; i--)); do
+    out+="$(printf '%08x' "${words[i]:-0}")"
+    [ "$i" -gt 0 ] && out+=","
+  done
+  echo "$out"
+}
+
+# 网卡的队列中断："IRQ号 名字"；名字是 eth0-TxRx-0 这类，或 virtio 的 virtioN-input.Q / virtioN-output.Q
+iface_irqs() {
+  local iface="$1" dev=""
+  dev="$(readlink -f "$SYS_ROOT/class/net/$iface/device" 2>/dev/null || true)"
+  dev="${dev##*/}"
+  awk -v a="$iface" -v b="$dev" '
+    $1 ~ /^[0-9]+:$/ {
+      name = $NF; irq = substr($1, 1, length($1) - 1)
+      if (index(name, a "-") == 1 || name == a) print irq, name
+      else if (b ~ /^virtio/ && (index(name, b "-input") == 1 || index(name, b "-output") == 1)) print irq, name
+    }' "$PROC_ROOT/interrupts" 2>/dev/null || true
+}
+
+queue_count() { ls -d "$SYS_ROOT/class/net/$1/queues/$2"-* 2>/dev/null | wc -l | tr -d ' '; }
+
+steering_plan() {
+  local -a cpus
+  read -r -a cpus <<<"$(online_cpus)"
+  local n=${#cpus[@]} flow iface nrx ntx i c q mask all irq name
+  if [ "$n" -le 1 ]; then
+    echo "# 单核，不需要分流"
+    return 0
+  fi
+
+  flow="$(next_pow2 "$STEER_FLOW_ENTRIES")"
+  all="$(cpu_mask "${cpus[@]}")"
+  echo "# Net-Optimize: CPU 分流计划（CPU ${cpus[*]}）"
+  echo "sysctl net.core.rps_sock_flow_entries $flow"
+
+  for iface in ${STEER_IFACES:-$(hw_default_iface)}; do
+    [ -d "$SYS_ROOT/class/net/$iface/queues" ] || { echo "# $iface：没有 queues 目录，跳过"; continue; }
+    nrx="$(queue_count "$iface" rx)"
+    ntx="$(queue_count "$iface" tx)"
+    echo "# $iface：rx 队列 $nrx，tx 队列 $ntx"
+
+    for ((i = 0; i < nrx; i++)); do
+      if [ "$nrx" -lt "$n" ]; then
+        echo "sysfs class/net/$iface/queues/rx-$i/rps_cpus $all"
+        echo "sysfs class/net/$iface/queues/rx-$i/rps_flow_cnt $((flow / nrx))"
+      else
+        echo "sysfs class/net/$iface/queues/rx-$i/rps_cpus 0"
+        echo "sysfs class/net/$iface/queues/rx-$i/rps_flow_cnt 0"
+      fi
+    done
+
+    if [ "$ntx" -gt 1 ]; then
+      for ((i = 0; i < ntx; i++)); do
+        local sel=()
+        for ((c = 0; c < n; c++)); do [ $((c % ntx)) -eq "$i" ] && sel+=("${cpus[c]}"); done
+        [ "${#sel[@]}" -gt 0 ] || sel=("${cpus[i % n]}")
+        echo "sysfs class/net/$iface/queues/tx-$i/xps_cpus $(cpu_mask "${sel[@]}")"
+      done
+    fi
+
+    # 同一队列号的收 / 发中断绑同一个核；名字里没有队列号的按出现顺序轮流
+    i=0
+    while read -r irq name; do
+      [ -n "$irq" ] || continue
+      q="${name##*[.-]}"
+      [[ "$q" =~ ^[0-9]+$ ]] || q="$i"
+      echo "irq $name ${cpus[q % n]}"
+      i=$((i + 1))
+    done <<<"$(iface_irqs "$iface")"
+  done
+}
+
+steering_apply() {
+  local file="$1" kind a b irq ok=0 fail=0 irqbal=0
+  systemctl is-active --quiet irqbalance 2>/dev/null && irqbal=1
+  [ "$irqbal" = "1" ] && echo "  ℹ️ irqbalance 运行中，IRQ 亲和交给它，只设 RPS / RFS / XPS"
+  while read -r kind a b; do
+    case "$kind" in
+      sysctl)
+        sysctl -w "$a=$b" >/dev/null 2>&1 && ok=$((ok + 1)) || fail=$((fail + 1)) ;;
+      sysfs)
+        echo "$b" >"$SYS_ROOT/$a" 2>/dev/null && ok=$((ok + 1)) || fail=$((fail + 1)) ;;
+      irq)
+        [ "$irqbal" = "1" ] && continue
+        irq="$(awk -v n="$a" '$NF == n {sub(":", "", $1); print $1; exit}' "$PROC_ROOT/interrupts" 2>/dev/null || true)"
+        [ -n "$irq" ] && echo "$b" >"$PROC_ROOT/irq/$irq/smp_affinity_list" 2>/dev/null \
+          && ok=$((ok + 1)) || fail=$((fail + 1)) ;;
+    esac
+  done < <(grep -v '^#' "$file")
+  echo "  ✅ 分流设置：成功 $ok 项，失败 $fail 项"
+}
+
+setup_steering() {
+  if [ "$ENABLE_STEERING" = "0" ]; then
+    echo "⏭️ 跳过 CPU 分流（RPS / XPS / IRQ）"
+    rm -f "$STEERING_FILE"
+    return 0
+  fi
+
+  echo "🧵 配置多队列 / CPU 分流（RPS / RFS / XPS / IRQ 亲和）..."
+  install -d "$(dirname "$STEERING_FILE")"
+  steering_plan >"$STEERING_FILE.tmp" && mv -f "$STEERING_FILE.tmp" "$STEERING_FILE"
+  grep '^#' "$STEERING_FILE" | sed 's/^# /  /'
+  if ! grep -q '^sysctl ' "$STEERING_FILE"; then
+    rm -f "$STEERING_FILE"
+    return 0
+  fi
+  steering_apply "$STEERING_FILE"
+}
+
+# === 10.0 PMTU 探测：按目标实测路径 MTU 推出 MSS（IPv4：MSS = PMTU - 40）===
+# 固定 1452 对干净的 1500 路径偏小（浪费吞吐），对隧道路径偏大（PMTU 黑洞）。
+# 以 DF 位 ping 二分出能通过的最大包长；ICMP frag-needed 被过滤的黑洞同样表现为“大包不通”。
+ping_df_supported() {
+  # ping -h 本身退出码非 0（pipefail 下会把整条管道判失败），只看输出
+  have_cmd ping && { ping -h 2>&1 || true; } | grep -q -- '-M'
+}
+
+# ping_df 目标 IP包长：DF 置位发一个包，丢包重试一次
+ping_df() {
+  local target="$1" mtu="$2" i
+  for i in 1 2; do
+    ping -n -q -M do -c 1 -W "$MSS_PROBE_TIMEOUT" -s $((mtu - 28)) "$target" >/dev/null 2>&1 && return 0
+  done
+  return 1
+}
+
+route_iface() {
+  ip -4 route get "$1" 2>/dev/null | awk '{for(i=1;i<=NF;i++) if($i=="dev") {print $(i+1); exit}}' | head -n1 || true
+}
+
+iface_mtu() {
+  local v=""
+  [ -n "${1:-}" ] && v="$(cat "/sys/class/net/$1/mtu" 2>/dev/null || true)"
+  [[ "$v" =~ ^[0-9]+$ ]] && echo "$v" || echo 1500
+}
+
+# 到 target 的有效 PMTU；连 MSS_PROBE_MIN 都不通（不回 ping / 不可达）时输出空
+pmtu_probe() {
+  local target="$1" lo="$MSS_PROBE_MIN" hi mid
+  hi="$(iface_mtu "$(route_iface "$target")")"
+  if [ "$hi" -le "$lo" ]; then
+    ping_df "$target" "$hi" && echo "$hi"
+    return 0
+  fi
+  ping_df "$target" "$lo" || return 0
+  ping_df "$target" "$hi" && { echo "$hi"; return 0; }
+  while [ $((hi - lo)) -gt 1 ]; do
+    mid=$(((lo + hi) / 2))
+    if ping_df "$target" "$mid"; then lo="$mid"; else hi="$mid"; fi
+  done
+  echo "$lo"
+}
+
+# 按 MSS_MODE 算默认钳制值 MSS_DEFAULT（数字或 pmtu）和分组规则 MSS_SET_RULES（"网段,网段=MSS ..."）
+mss_resolve() {
+  local t p min="" entry probe cidrs
+  MSS_DEFAULT="$MSS_VALUE"
+  MSS_SET_RULES=""
+
+  case "$MSS_MODE" in
+    fixed) ;;
+    pmtu) MSS_DEFAULT="pmtu" ;;
+    probe)
+      if ! ping_df_supported; then
+        echo "⚠️ ping 不支持 -M do（busybox？），改用 --clamp-mss-to-pmtu"
+        MSS_DEFAULT="pmtu"
+        return 0
+      fi
+      for t in $MSS_PROBE_TARGETS; do
+        p="$(pmtu_probe "$t")"
+        if [ -z "$p" ]; then
+          echo "  ⚠️ PMTU 探测 $t：不可达，忽略"
+          continue
+        fi
+        echo "  🔎 PMTU 探测 $t：$p（MSS $((p - 40))）"
+        [ -z "$min" ] || [ "$p" -lt "$min" ] && min="$p"
+      done
+      if [ -n "$min" ]; then
+        MSS_DEFAULT=$((min - 40))
+      else
+        echo "  ⚠️ 所有探测目标都不可达，改用 --clamp-mss-to-pmtu"
+        MSS_DEFAULT="pmtu"
+      fi
+      ;;
+    *)
+      echo "❌ 未知 MSS_MODE: $MSS_MODE（可选 probe / pmtu / fixed）" >&2
+      return 1 ;;
+  esac
+
+  # 分组：每组第一个元素是探测 IP，整组（含探测 IP）作为 -d 匹配；探测失败的组走默认规则
+  [ -n "$MSS_DEST_SETS" ] || return 0
+  ping_df_supported || { echo "  ⚠️ ping 不支持 -M do，跳过 MSS_DEST_SETS"; return 0; }
+  for entry in $MSS_DEST_SETS; do
+    probe="${entry%%,*}"
+    probe="${probe%/*}"
+    cidrs="$entry"
+    p="$(pmtu_probe "$probe")"
+    if [ -z "$p" ]; then
+      echo "  ⚠️ 分组 $cidrs：探测 $probe 不可达，走默认规则"
+      continue
+    fi
+    echo "  🔎 分组 $cidrs：PMTU $p（MSS $((p - 40))）"
+    MSS_SET_RULES="${MSS_SET_RULES:+$MSS_SET_RULES }$cidrs=$((p - 40))"
+  done
+  return 0
+}
+
+mss_target_args() {
+  if [ "$1" = "pmtu" ]; then echo "--clamp-mss-to-pmtu"; else echo "--set-mss $1"; fi
+}
+
+mss_summary() {
+  local d="$MSS_DEFAULT"
+  [ "$d" = "pmtu" ] && d="clamp-to-pmtu"
+  echo "模式 $MSS_MODE，默认 $d${MSS_SET_RULES:+，分组 $MSS_SET_RULES}"
+}
+
+# === 10.1 MSS Clamping（强制收敛为1条，避免重复叠加；有分组时 POSTROUTING 只有 1 条跳转到 NETOPT_MSS 链）===
 setup_mss_clamping() {
     if [ "${ENABLE_MSS_CLAMP:-0}" != "1" ]; then
         echo "⏭️ 跳过MSS Clamping"
         return 0
     fi
 
-    echo "📡 设置MSS Clamping (MSS=$MSS_VALUE)..."
+    echo "📡 设置MSS Clamping（MSS_MODE=$MSS_MODE）..."
+    mss_resolve || return 1
+    echo "✅ MSS: $(mss_summary)"
 
     local iface
     iface="$(detect_outbound_iface 2>/dev/null || true)"
@@ -697,6 +1795,9 @@ setup_mss_clamping() {
 ENABLE_MSS_CLAMP=1
 CLAMP_IFACE=$iface
 MSS_VALUE=$MSS_VALUE
+MSS_MODE=$MSS_MODE
+MSS_DEFAULT=$MSS_DEFAULT
+MSS_SET_RULES="$MSS_SET_RULES"
 EOF
 
     # 收集可用 iptables 后端（至少保证 iptables 本体）
@@ -713,7 +1814,7 @@ EOF
 
         echo "🧹 [$cmd] 强制清理所有 TCPMSS 规则..."
         while :; do
-            rules="$("$cmd" -t mangle -S POSTROUTING 2>/dev/null | grep -E 'TCPMSS' || true)"
+            rules="$("$cmd" -t mangle -S POSTROUTING 2>/dev/null | grep -E 'TCPMSS|NETOPT_MSS' || true)"
             [ -z "$rules" ] && break
 
             round=$((round + 1))
@@ -727,6 +1828,8 @@ EOF
                 "$cmd" -t mangle "${parts[@]}" 2>/dev/null || true
             done <<<"$rules"
         done
+        "$cmd" -t mangle -F NETOPT_MSS 2>/dev/null || true
+        "$cmd" -t mangle -X NETOPT_MSS 2>/dev/null || true
     }
 
     # 统一添加：只添加 1 条
@@ -734,14 +1837,23 @@ EOF
         local cmd="$1"
         echo "➕ [$cmd] 写入 1 条 TCPMSS 规则..."
 
-        if [ -n "$iface" ] && [ "$iface" != "unknown" ]; then
-            "$cmd" -t mangle -A POSTROUTING -o "$iface" -p tcp --tcp-flags SYN,RST SYN \
-                -j TCPMSS --set-mss "$MSS_VALUE" 2>/dev/null && return 0
-        else
-            "$cmd" -t mangle -A POSTROUTING -p tcp --tcp-flags SYN,RST SYN \
-                -j TCPMSS --set-mss "$MSS_VALUE" 2>/dev/null && return 0
+        local syn=(-p tcp --tcp-flags SYN,RST SYN) out=() r
+        [ -n "$iface" ] && [ "$iface" != "unknown" ] && out=(-o "$iface")
+
+        if [ -z "$MSS_SET_RULES" ]; then
+            "$cmd" -t mangle -A POSTROUTING "${out[@]}" "${syn[@]}" \
+                -j TCPMSS $(mss_target_args "$MSS_DEFAULT") 2>/dev/null && return 0
+            return 1
         fi
 
+        # 分组：TCPMSS 只会调小不会调大，所以命中分组后 RETURN，不再吃默认规则
+        "$cmd" -t mangle -N NETOPT_MSS 2>/dev/null || "$cmd" -t mangle -F NETOPT_MSS 2>/dev/null || return 1
+        for r in $MSS_SET_RULES; do
+            "$cmd" -t mangle -A NETOPT_MSS -d "${r%=*}" "${syn[@]}" -j TCPMSS --set-mss "${r##*=}" 2>/dev/null || return 1
+            "$cmd" -t mangle -A NETOPT_MSS -d "${r%=*}" -j RETURN 2>/dev/null || return 1
+        done
+        "$cmd" -t mangle -A NETOPT_MSS "${syn[@]}" -j TCPMSS $(mss_target_args "$MSS_DEFAULT") 2>/dev/null || return 1
+        "$cmd" -t mangle -A POSTROUTING "${out[@]}" "${syn[@]}" -j NETOPT_MSS 2>/dev/null && return 0
         return 1
     }
 
@@ -766,7 +1878,7 @@ EOF
 
     # 3) 验证：只允许 1 条
     local cnt
-    cnt="$(iptables -t mangle -S POSTROUTING 2>/dev/null | grep -c 'TCPMSS' || true)"
+    cnt="$(iptables -t mangle -S POSTROUTING 2>/dev/null | grep -cE 'TCPMSS|NETOPT_MSS' || true)"
     cnt="${cnt%%$'\n'*}"; cnt="${cnt:-0}"
     if [ "$cnt" -gt 1 ]; then
         echo "⚠️ 仍检测到重复 TCPMSS：$cnt 条（可能有其他脚本/服务在加）"
@@ -946,6 +2058,16 @@ fi
 
 sysctl -e --system >/dev/null 2>&1 || true
 
+# conntrack 容量：内建模块时 modprobe.d 的 hashsize 不生效，按状态文件补写（monitor 扩容后的值也在这里）
+CT_STATE="/etc/net-optimize/conntrack.state"
+if [ -f "$CT_STATE" ]; then
+  . "$CT_STATE"
+  if [ -n "${CT_BUCKETS:-}" ] && [ -w /sys/module/nf_conntrack/parameters/hashsize ]; then
+    echo "$CT_BUCKETS" >/sys/module/nf_conntrack/parameters/hashsize 2>/dev/null || true
+  fi
+  [ -n "${CT_MAX:-}" ] && sysctl -w net.netfilter.nf_conntrack_max="$CT_MAX" >/dev/null 2>&1 || true
+fi
+
 if command -v iptables >/dev/null 2>&1; then
   iptables -t filter -C OUTPUT -m conntrack --ctstate NEW -j ACCEPT 2>/dev/null \
     || iptables -t filter -I OUTPUT 1 -m conntrack --ctstate NEW -j ACCEPT 2>/dev/null || true
@@ -961,8 +2083,13 @@ if [ -f "$CONFIG_FILE" ]; then
   . "$CONFIG_FILE"
 
   if [ "${ENABLE_MSS_CLAMP:-0}" = "1" ]; then
-    MSS="${MSS_VALUE:-1452}"
+    # MSS_DEFAULT：数字或 pmtu（--clamp-mss-to-pmtu）；MSS_SET_RULES："网段,网段=MSS ..."（安装时探测好的，开机不再探测）
+    MSS="${MSS_DEFAULT:-${MSS_VALUE:-1452}}"
     IFACE="${CLAMP_IFACE:-}"
+    if [ "$MSS" = "pmtu" ]; then target=(--clamp-mss-to-pmtu); else target=(--set-mss "$MSS"); fi
+    syn=(-p tcp --tcp-flags SYN,RST SYN)
+    out=()
+    [ -n "$IFACE" ] && [ "$IFACE" != "unknown" ] && out=(-o "$IFACE")
 
     # 三后端一致：iptables / iptables-nft / iptables-legacy
     ipt_cmds=()
@@ -976,7 +2103,7 @@ if [ -f "$CONFIG_FILE" ]; then
 
       for cmd in "${ipt_cmds[@]}"; do
         # 清理旧 TCPMSS
-        rules="$("$cmd" -t mangle -S POSTROUTING 2>/dev/null | grep -E '(^-A POSTROUTING .*TCPMSS| TCPMSS )' || true)"
+        rules="$("$cmd" -t mangle -S POSTROUTING 2>/dev/null | grep -E '(^-A POSTROUTING .*TCPMSS| TCPMSS |NETOPT_MSS)' || true)"
         if [ -n "$rules" ]; then
           while IFS= read -r rule; do
             [ -z "$rule" ] && continue
@@ -986,19 +2113,78 @@ if [ -f "$CONFIG_FILE" ]; then
           done <<<"$rules"
         fi
 
+        "$cmd" -t mangle -F NETOPT_MSS 2>/dev/null || true
+        "$cmd" -t mangle -X NETOPT_MSS 2>/dev/null || true
+
         # 写入新规则（避免重复）
-        if [ -n "$IFACE" ] && [ "$IFACE" != "unknown" ]; then
-          "$cmd" -t mangle -C POSTROUTING -o "$IFACE" -p tcp --tcp-flags SYN,RST SYN -j TCPMSS --set-mss "$MSS" 2>/dev/null \
-            || "$cmd" -t mangle -A POSTROUTING -o "$IFACE" -p tcp --tcp-flags SYN,RST SYN -j TCPMSS --set-mss "$MSS" 2>/dev/null || true
+        if [ -z "${MSS_SET_RULES:-}" ]; then
+          "$cmd" -t mangle -C POSTROUTING "${out[@]}" "${syn[@]}" -j TCPMSS "${target[@]}" 2>/dev/null \
+            || "$cmd" -t mangle -A POSTROUTING "${out[@]}" "${syn[@]}" -j TCPMSS "${target[@]}" 2>/dev/null || true
         else
-          "$cmd" -t mangle -C POSTROUTING -p tcp --tcp-flags SYN,RST SYN -j TCPMSS --set-mss "$MSS" 2>/dev/null \
-            || "$cmd" -t mangle -A POSTROUTING -p tcp --tcp-flags SYN,RST SYN -j TCPMSS --set-mss "$MSS" 2>/dev/null || true
+          "$cmd" -t mangle -N NETOPT_MSS 2>/dev/null || true
+          for r in $MSS_SET_RULES; do
+            "$cmd" -t mangle -A NETOPT_MSS -d "${r%=*}" "${syn[@]}" -j TCPMSS --set-mss "${r##*=}" 2>/dev/null || true
+            "$cmd" -t mangle -A NETOPT_MSS -d "${r%=*}" -j RETURN 2>/dev/null || true
+          done
+          "$cmd" -t mangle -A NETOPT_MSS "${syn[@]}" -j TCPMSS "${target[@]}" 2>/dev/null || true
+          "$cmd" -t mangle -A POSTROUTING "${out[@]}" "${syn[@]}" -j NETOPT_MSS 2>/dev/null || true
         fi
       done
     fi
   fi
 fi
 
+# conntrack 旁路（NOTRACK）：nft 直接载入保存的脚本；iptables 按端口表重建 raw 表两条链
+NOTRACK_FILE="/etc/net-optimize/notrack.conf"
+if [ -f "$NOTRACK_FILE" ]; then
+  . "$NOTRACK_FILE"
+  # 出站临时端口避开 NOTRACK 端口（否则 OUTPUT 按源端口会把出站连接一起旁路）
+  [ -n "${NOTRACK_RESERVED:-}" ] && sysctl -w net.ipv4.ip_local_reserved_ports="$NOTRACK_RESERVED" >/dev/null 2>&1 || true
+  if [ "${NOTRACK_BACKEND:-}" = "nft" ]; then
+    nft -f /etc/net-optimize/notrack.nft 2>/dev/null || true
+  else
+    for c in iptables ip6tables; do
+      command -v "$c" >/dev/null 2>&1 || continue
+      "$c" -t raw -N NETOPT_NT_PRE 2>/dev/null || "$c" -t raw -F NETOPT_NT_PRE 2>/dev/null || true
+      "$c" -t raw -N NETOPT_NT_OUT 2>/dev/null || "$c" -t raw -F NETOPT_NT_OUT 2>/dev/null || true
+      target=(-j CT --notrack)
+      for r in ${NOTRACK_RULES:-}; do
+        proto="${r%%:*}"; ports="${r#*:}"; ports="${ports/-/:}"
+        "$c" -t raw -A NETOPT_NT_PRE -p "$proto" --dport "$ports" "${target[@]}" 2>/dev/null \
+          || { target=(-j NOTRACK); "$c" -t raw -A NETOPT_NT_PRE -p "$proto" --dport "$ports" "${target[@]}" 2>/dev/null; } || true
+        "$c" -t raw -A NETOPT_NT_OUT -p "$proto" --sport "$ports" "${target[@]}" 2>/dev/null || true
+      done
+      "$c" -t raw -C PREROUTING -j NETOPT_NT_PRE 2>/dev/null || "$c" -t raw -I PREROUTING 1 -j NETOPT_NT_PRE 2>/dev/null || true
+      "$c" -t raw -C OUTPUT -j NETOPT_NT_OUT 2>/dev/null || "$c" -t raw -I OUTPUT 1 -j NETOPT_NT_OUT 2>/dev/null || true
+    done
+  fi
+fi
+
+# UDP GRO 转发 / GSO：ethtool 设置不持久，开机重放
+UDP_OFFLOAD_FILE="/etc/net-optimize/offload.conf"
+if [ -f "$UDP_OFFLOAD_FILE" ] && command -v ethtool >/dev/null 2>&1; then
+  grep -v '^#' "$UDP_OFFLOAD_FILE" | while read -r iface feat; do
+    [ -n "$feat" ] && ethtool -K "$iface" "$feat" on >/dev/null 2>&1 || true
+  done
+fi
+
+# CPU 分流（RPS / RFS / XPS / IRQ 亲和）：重放安装时生成的计划，IRQ 按名字重新查号
+STEERING_FILE="/etc/net-optimize/steering.conf"
+if [ -f "$STEERING_FILE" ]; then
+  irqbal=0
+  systemctl is-active --quiet irqbalance 2>/dev/null && irqbal=1
+  while read -r kind a b; do
+    case "$kind" in
+      sysctl) sysctl -w "$a=$b" >/dev/null 2>&1 || true ;;
+      sysfs) echo "$b" >"/sys/$a" 2>/dev/null || true ;;
+      irq)
+        [ "$irqbal" = "1" ] && continue
+        irq="$(awk -v n="$a" '$NF == n {sub(":", "", $1); print $1; exit}' /proc/interrupts 2>/dev/null || true)"
+        [ -n "$irq" ] && echo "$b" >"/proc/irq/$irq/smp_affinity_list" 2>/dev/null || true ;;
+    esac
+  done < <(grep -v '^#' "$STEERING_FILE")
+fi
+
 echo "[$(date)] Net-Optimize 开机优化完成"
 EOF
 
@@ -1035,7 +2221,9 @@ print_status() {
   echo "📊 基 础 状 态 :"
   echo "  TCP 拥 塞 算 法 : $(get_sysctl net.ipv4.tcp_congestion_control)"
   echo "  默 认 队 列     : $(get_sysctl net.core.default_qdisc)"
+  [ -n "${CC_SELECT_NOTE:-}" ] && echo "  选 择 依 据     : $CC_SELECT_NOTE"
   echo "  文 件 句 柄 限 制 : $(ulimit -n)"
+  echo "  sysctl profile  : ${PROF_NAME:-unknown}"
   echo "  rmem_default    : $(get_sysctl net.core.rmem_default) bytes"
   echo ""
 
@@ -1051,6 +2239,8 @@ print_status() {
   if conntrack_available; then
     echo "  ✅ conntrack 可 用（模块或内建）"
     echo "  nf_conntrack_max          : $(get_sysctl net.netfilter.nf_conntrack_max)"
+    echo "  hashsize（桶数）           : $(cat /sys/module/nf_conntrack/parameters/hashsize 2>/dev/null || echo N/A)"
+    echo "  观测峰值                  : $(ct_state_get CT_PEAK 0)（$NFCT_STATE）"
     echo "  udp_timeout               : $(get_sysctl net.netfilter.nf_conntrack_udp_timeout)"
     echo "  udp_timeout_stream        : $(get_sysctl net.netfilter.nf_conntrack_udp_timeout_stream)"
     echo "  tcp_timeout_established   : $(get_sysctl net.netfilter.nf_conntrack_tcp_timeout_established)"
@@ -1098,13 +2288,43 @@ print_status() {
   echo ""
 
   echo "📡 MSS Clamping 规 则（默认后端 iptables）:"
-  if have_cmd iptables && iptables -t mangle -L POSTROUTING -n 2>/dev/null | grep -q TCPMSS; then
-    iptables -t mangle -L POSTROUTING -n -v 2>/dev/null | grep -E 'Chain|pkts|bytes|TCPMSS' || true
+  [ -n "${MSS_DEFAULT:-}" ] && echo "  $(mss_summary)"
+  if have_cmd iptables && iptables -t mangle -L POSTROUTING -n 2>/dev/null | grep -qE 'TCPMSS|NETOPT_MSS'; then
+    iptables -t mangle -L POSTROUTING -n -v 2>/dev/null | grep -E 'Chain|pkts|bytes|TCPMSS|NETOPT_MSS' || true
+    iptables -t mangle -L NETOPT_MSS -n -v 2>/dev/null || true
   else
     echo "  ⚠️ 未 找 到 MSS 规 则（可 用 iptables-nft/iptables-legacy 再 看）"
   fi
   echo ""
 
+  echo "🚀 conntrack 旁 路 :"
+  if [ -f "$NOTRACK_FILE" ]; then
+    (. "$NOTRACK_FILE"; echo "  [$NOTRACK_BACKEND] $NOTRACK_RULES"; [ -z "${NOTRACK_RESERVED:-}" ] || echo "  ip_local_reserved_ports=$NOTRACK_RESERVED")
+  else
+    echo "  未 启 用（NOTRACK_PORTS 为空）"
+  fi
+  echo ""
+
+  echo "📦 UDP 卸 载 :"
+  if [ -f "$UDP_OFFLOAD_FILE" ] && have_cmd ethtool; then
+    local iface feat
+    while read -r iface feat; do
+      echo "  $iface $feat : $(ethtool -k "$iface" 2>/dev/null | awk -v f="$feat:" '$1 == f {print $2; exit}')"
+    done < <(grep -v '^#' "$UDP_OFFLOAD_FILE")
+  else
+    echo "  未 调 整（无 ethtool 或网卡不支持）"
+  fi
+  echo ""
+
+  echo "🧵 CPU 分 流 :"
+  if [ -f "$STEERING_FILE" ]; then
+    grep '^#' "$STEERING_FILE" | sed 's/^# /  /'
+    echo "  rps_sock_flow_entries : $(get_sysctl net.core.rps_sock_flow_entries)"
+  else
+    echo "  未 启 用（单核或 ENABLE_STEERING=0）"
+  fi
+  echo ""
+
   echo "💻 系 统 信 息 :"
   echo "  内 核 版 本 : $(uname -r)"
   echo "  发 行 版     : $(detect_distro)"
@@ -1130,6 +2350,9 @@ main() {
   converge_sysctl_authority
   force_apply_sysctl_runtime
   setup_conntrack
+  setup_notrack
+  setup_steering
+  setup_udp_offload
   setup_mss_clamping
   fix_nginx_repo
   install_boot_service
@@ -1139,7 +2362,7 @@ main() {
   echo "✅ 所有优化配置完成！"
   echo ""
   echo "📌 重要提示："
-  echo "  1. 64MB缓冲区需要重启后完全生效"
+  echo "  1. 缓冲区 / backlog 按 profile（${PROF_NAME:-auto}）计算，需要重启后完全生效；NET_PROFILE=... 可指定"
   echo "  2. 检查状态: systemctl status net-optimize"
   echo "  3. 查看连接: cat /proc/net/nf_conntrack | head -20"
   echo "  4. 验证MSS: iptables -t mangle -L -n -v / iptables-nft ... / iptables-legacy ..."
@@ -1160,4 +2383,32 @@ main() {
 }
 
 # === 15. 执行 ===
+if [ "${NET_OPTIMIZE_SOURCE_ONLY:-0}" = "1" ]; then
+  return 0 2>/dev/null || exit 0
+fi
+case "${1:-}" in
+  --print-sysctl)
+    render_sysctl_conf
+    exit $? ;;
+  --print-conntrack)
+    conntrack_resolve
+    echo "CT_MAX=$CT_MAX"
+    echo "CT_BUCKETS=$CT_BUCKETS"
+    echo "CT_PEAK=$CT_PEAK"
+    echo "CT_CAP=$CT_CAP"
+    echo "# $(conntrack_summary)"
+    exit 0 ;;
+  --conntrack-monitor)
+    conntrack_monitor
+    exit $? ;;
+  --print-steering)
+    steering_plan
+    exit 0 ;;
+  --probe-mss)
+    mss_resolve || exit 1
+    echo "MSS_DEFAULT=$MSS_DEFAULT"
+    echo "MSS_SET_RULES=\"$MSS_SET_RULES\""
+    echo "# $(mss_summary)"
+    exit 0 ;;
+esac
 main
\ No newline at end of file
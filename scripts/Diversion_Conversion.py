@@ -1,13 +1,25 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import argparse
+import asyncio
 import json
+import multiprocessing
 import os
 import sys
-import subprocess
-import ipaddress
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
-from urllib.request import Request, urlopen
+
+from artifact_index import count_rule_types, describe, write_index
+from build_journal import BuildJournal, entry_hash, sha256_bytes
+from cidr_store import CidrStore, is_cidr, sort_cidrs
+from http_pool import HttpPool
+from job_runner import REPORT, run_job
+from mirror_fetch import HedgedFetcher, MirrorStats, candidate_urls
+from refresh_scheduler import RefreshScheduler, format_duration
+from regex_optimizer import REGEX_OPTIMIZE, optimize_domain_regex
+import rule_delta
 
 try:
     import yaml
@@ -22,12 +34,36 @@ REMOTE_TMP = ROOT / "remote-tmp"
 REMOTE_SRS = ROOT / "remote-srs"
 REMOTE_MRS = ROOT / "remote-mrs"
 
+# 规则级增量：remote-delta/<产物名>/（快照 + 最近 DELTA_KEEP 代增量，见 rule_delta）
+REMOTE_DELTA = ROOT / "remote-delta"
+
+# 本轮构建的产物元数据 {产物路径: {"counts": ..., "source": ...}}，结束时写进各目录 index.json
+INDEX_META = {}
+
+# 构建状态（journal 等），不属于产物
+REMOTE_STATE = ROOT / "remote-state"
+JOURNAL_PATH = Path(os.getenv("BUILD_JOURNAL", str(REMOTE_STATE / "journal.jsonl")))
+SCHEDULE_PATH = Path(os.getenv("SCHEDULE_STATE", str(REMOTE_STATE / "schedule.json")))
+MIRROR_STATS_PATH = Path(os.getenv("MIRROR_STATS", str(REMOTE_STATE / "mirrors.json")))
+
+# 按条目刷新调度（--schedule 时只处理到期条目）；全量构建也会更新它的状态
+SCHEDULER = RefreshScheduler(SCHEDULE_PATH)
+# manifest 条目 {name: item}，调度要读 refresh / priority
+MANIFEST_ITEMS = {}
+
 SINGBOX_BIN = os.getenv("SINGBOX_BIN", "./sing-box")
 MIHOMO_BIN = os.getenv("MIHOMO_BIN", "./mihomo")
 
 # 严格模式：只要本次构建失败/无规则，就删除旧产物，避免“假更新”
 STRICT_MODE = True
 
+# 流水线模式：serial（默认，逐条处理）/ async（拉取、解析、编译三段重叠）
+PIPELINE_MODE = os.getenv("PIPELINE_MODE", "serial").strip().lower()
+FETCH_CONCURRENCY = int(os.getenv("FETCH_CONCURRENCY", "8"))
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", str(os.cpu_count() or 2)))
+COMPILE_CONCURRENCY = int(os.getenv("COMPILE_CONCURRENCY", str(os.cpu_count() or 2)))
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "4"))
+
 
 def log(msg: str) -> None:
     print(msg, flush=True)
@@ -42,26 +78,35 @@ def safe_unlink(path: Path) -> None:
         log(f"    ⚠️ 删除失败: {path} -> {e}")
 
 
-def http_get(url: str) -> str:
-    req = Request(url, headers={"User-Agent": "Mozilla/5.0"})
-    with urlopen(req, timeout=60) as r:
-        return r.read().decode("utf-8", errors="ignore")
+# 全局连接池：manifest 基本都指向 cdn.jsdelivr.net，连接 keep-alive 复用
+HTTP = HttpPool(timeout=60)
+
+# 多镜像 + 对冲请求：一个 CDN 节点慢 / 挂了不至于让 STRICT 删产物；各镜像延迟统计跨构建保留
+MIRROR_STATS = MirrorStats(MIRROR_STATS_PATH)
+FETCHER = HedgedFetcher(HTTP, MIRROR_STATS)
+
 
+def http_get(url: str, name: str = "") -> str:
+    """拉取 manifest 源：url + 条目 mirrors（缺省自动推导）里先返回有效内容的那个。"""
+    item = MANIFEST_ITEMS.get(name) or {}
+    data, _ = FETCHER.fetch(candidate_urls(url, item.get("mirrors")), label=name or url)
+    return data.decode("utf-8", errors="ignore")
 
-def run(cmd, timeout: int = 180) -> str:
+
+def run(cmd, timeout: float = None, entries: int = 0, label: str = "") -> str:
+    """
+    所有子进程都走 job_runner：超时按条目数自适应（也可显式指定），
+    带内存/CPU 上限，超时整组 kill，并记入耗时/峰值 RSS 报表。
+    """
     log(f"    ▶ Run: {' '.join(cmd)}")
-    p = subprocess.run(
-        cmd,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT,
-        text=True,
-        timeout=timeout,
-    )
-    out = (p.stdout or "").rstrip()
+    r = run_job(cmd, entries=entries, timeout=timeout, label=label)
+    out = (r.stdout + r.stderr).rstrip()
     if out:
         log(out)
-    if p.returncode != 0:
-        raise RuntimeError(f"Command failed ({p.returncode}): {' '.join(cmd)}\n{out}")
+    if r.timed_out:
+        raise RuntimeError(f"Command timeout ({r.timeout:.0f}s): {' '.join(cmd)}\n{out}")
+    if r.returncode != 0:
+        raise RuntimeError(f"Command failed ({r.returncode}): {' '.join(cmd)}\n{out}")
     return out
 
 
@@ -69,6 +114,7 @@ def ensure_dirs() -> None:
     REMOTE_TMP.mkdir(parents=True, exist_ok=True)
     REMOTE_SRS.mkdir(parents=True, exist_ok=True)
     REMOTE_MRS.mkdir(parents=True, exist_ok=True)
+    REMOTE_DELTA.mkdir(parents=True, exist_ok=True)
 
 
 def safe_load_struct(text: str):
@@ -130,6 +176,9 @@ def detect_format(fmt: str, raw_text: str) -> str:
       - domain-text   : 纯域名 txt（一行一个）
       - ip-text       : 纯 CIDR txt（一行一个）
       - singbox-json  : sing-box 规则源 JSON
+      - hosts         : hosts 文件（0.0.0.0 domain）
+      - adguard       : AdGuard / Adblock DNS 语法（||domain^）
+      - dnsmasq       : dnsmasq（address=/domain/ 、server=/domain/）
       - auto          : 自动判断
     """
     fmt = (fmt or "auto").strip().lower()
@@ -142,6 +191,10 @@ def detect_format(fmt: str, raw_text: str) -> str:
         "singbox-json",
         "singbox_json",
         "source",
+        "hosts",
+        "adguard",
+        "adblock",
+        "dnsmasq",
         "auto",
     ):
         pass
@@ -158,9 +211,15 @@ def detect_format(fmt: str, raw_text: str) -> str:
             return "singbox-json"
         if fmt == "source":
             return "singbox-json"
+        if fmt == "adblock":
+            return "adguard"
+        return fmt
+
+    # 自动检测：拦截列表先按行嗅探（百万行的 hosts 交给 YAML 解析会非常慢，"[Adblock" 头也会被当成 JSON 数组）
+    fmt = sniff_blocklist_format(raw_text)
+    if fmt:
         return fmt
 
-    # 自动检测
     t = (raw_text or "").strip()
     obj = safe_load_struct(t)
     if is_singbox_ruleset_json(obj):
@@ -187,13 +246,9 @@ def detect_format(fmt: str, raw_text: str) -> str:
         if not s:
             continue
         total += 1
-        if "/" in s:
-            try:
-                ipaddress.ip_network(s, strict=False)
-                cidr_hits += 1
-                continue
-            except Exception:
-                pass
+        if "/" in s and is_cidr(s):
+            cidr_hits += 1
+            continue
         if "." in s and " " not in s and "," not in s and "/" not in s:
             domain_hits += 1
         if total >= 50:
@@ -267,6 +322,8 @@ def extract_supported_from_clash_lines(rule_lines: list) -> dict:
     """
     从 Clash 规则里提取：
       DOMAIN / DOMAIN-SUFFIX / DOMAIN-KEYWORD / DOMAIN-REGEX / IP-CIDR / IP-CIDR6 / PROCESS-NAME
+    IP-CIDR / IP-CIDR6 先攒起来，最后批量校验并转成规范写法（见 cidr_store）。
+    DOMAIN-REGEX 能等价改写的转成 domain / suffix / keyword，剩下的合并（见 regex_optimizer）。
     """
     b = {
         "domain": set(),
@@ -277,6 +334,8 @@ def extract_supported_from_clash_lines(rule_lines: list) -> dict:
         "ip_cidr6": set(),
         "process_name": set(),
     }
+    cidr4_raw = []
+    cidr6_raw = []
 
     for line in rule_lines:
         base = strip_action(line)
@@ -298,20 +357,26 @@ def extract_supported_from_clash_lines(rule_lines: list) -> dict:
         elif t == "DOMAIN-REGEX":
             b["domain_regex"].add(v)
         elif t == "IP-CIDR":
-            try:
-                ipaddress.ip_network(v, strict=False)
-                b["ip_cidr"].add(v)
-            except ValueError:
-                pass
+            cidr4_raw.append(v)
         elif t == "IP-CIDR6":
-            try:
-                ipaddress.ip_network(v, strict=False)
-                b["ip_cidr6"].add(v)
-            except ValueError:
-                pass
+            cidr6_raw.append(v)
         elif t == "PROCESS-NAME":
             b["process_name"].add(v)
 
+    b["ip_cidr"].update(CidrStore(cidr4_raw))
+    b["ip_cidr6"].update(CidrStore(cidr6_raw))
+
+    if b["domain_regex"] and REGEX_OPTIMIZE:
+        plan = optimize_domain_regex(b["domain_regex"])
+        b["domain"] |= plan.domain
+        # regex 改写出的 suffix 按 sing-box 语义：带点 = 仅子域，不带点 = 自身 + 子域，原样保留
+        # 单独记一份给 MRS 用（Clash DOMAIN-SUFFIX 的 ".x" 是自身 + 子域，同名时以它为准）
+        b["regex_suffix"] = plan.suffix - b["domain_suffix"]
+        b["domain_suffix"] |= plan.suffix
+        b["domain_keyword"] |= plan.keyword
+        b["domain_regex"] = set(plan.regex)
+        log(f"    🧮 {plan.summary()}")
+
     return b
 
 
@@ -358,9 +423,9 @@ def parse_domain_list(raw_text: str) -> list:
 def parse_cidr_list(raw_text: str):
     """
     解析纯 CIDR 列表，也兼容 "IP-CIDR,xxx" / "IP-CIDR6,xxx"
+    返回 (v4, v6)：规范写法、去重、按数值排序
     """
-    v4 = set()
-    v6 = set()
+    candidates = []
     for line in (raw_text or "").splitlines():
         s = line.strip()
         if not s or s.startswith("#"):
@@ -376,16 +441,238 @@ def parse_cidr_list(raw_text: str):
             else:
                 continue
 
+        candidates.append(s)
+
+    return CidrStore(candidates).sorted_unique().split_versions()
+
+
+# ========= 拦截列表解析（hosts / AdGuard / dnsmasq）=========
+#
+# 百万行级别的广告 / 追踪拦截列表：逐行流式读（不 splitlines 出整张列表，不走 YAML），
+# 规范化（小写、去尾点、IDNA）后分成两类：
+#   exact  : 只拦自身（hosts）
+#   suffix : 自身 + 全部子域（AdGuard ||x^、dnsmasq address=/x/）
+# 再做后缀最小化：父域已在 suffix 里的子域（不管 exact 还是 suffix）都是多余的，直接去掉。
+
+BLOCK_SINKHOLES = {"0.0.0.0", "127.0.0.1", "::", "::1", "0:0:0:0:0:0:0:0", "0:0:0:0:0:0:0:1"}
+BLOCK_IGNORED_HOSTS = {
+    "localhost",
+    "localhost.localdomain",
+    "local",
+    "broadcasthost",
+    "ip6-localhost",
+    "ip6-loopback",
+    "ip6-localnet",
+    "ip6-mcastprefix",
+    "ip6-allnodes",
+    "ip6-allrouters",
+    "ip6-allhosts",
+    "0.0.0.0",
+}
+# AdGuard DNS 规则里不改变“拦截这个域名”语义的修饰符；其它（$client / $dnstype / $denyallow ...）跳过
+ADGUARD_SAFE_MODIFIERS = {"important", "all", "document", "doc", "third-party", "3p"}
+_DOMAIN_CHARS = frozenset("abcdefghijklmnopqrstuvwxyz0123456789-_.")
+
+
+def iter_lines(raw_text: str):
+    """逐行迭代大文本，不生成整张行列表。"""
+    text = raw_text or ""
+    start = 0
+    n = len(text)
+    while start < n:
+        end = text.find("\n", start)
+        if end < 0:
+            end = n
+        yield text[start:end]
+        start = end + 1
+
+
+def normalize_domain(s: str) -> str:
+    """小写、去首尾点、非 ASCII 转 punycode；不像域名（无点 / 非法字符 / IP / 过长）返回空串。"""
+    s = s.strip().strip(".").lower()
+    if not s or "." not in s or len(s) > 253:
+        return ""
+    if not s.isascii():
         try:
-            net = ipaddress.ip_network(s, strict=False)
-            if net.version == 4:
-                v4.add(s)
+            s = s.encode("idna").decode("ascii")
+        except UnicodeError:
+            return ""
+    if not _DOMAIN_CHARS.issuperset(s) or ".." in s:
+        return ""
+    if s.replace(".", "").isdigit():
+        return ""
+    return s
+
+
+def _parent_suffixes(d: str):
+    """a.b.example.com -> b.example.com, example.com, com"""
+    i = d.find(".")
+    while i >= 0:
+        yield d[i + 1:]
+        i = d.find(".", i + 1)
+
+
+def minimize_suffixes(exact: set, suffix: set):
+    """去掉被更短 suffix 覆盖的条目；返回 (exact, suffix, 去掉的条数)。"""
+    before = len(exact) + len(suffix)
+    suffix = {d for d in suffix if not any(p in suffix for p in _parent_suffixes(d))}
+    exact = {d for d in exact if d not in suffix and not any(p in suffix for p in _parent_suffixes(d))}
+    return exact, suffix, before - len(exact) - len(suffix)
+
+
+def parse_hosts_list(raw_text: str):
+    """
+    hosts 文件："0.0.0.0 a.com b.com  # 注释"。只收指向黑洞地址（0.0.0.0 / 127.0.0.1 / :: / ::1）的行，
+    其它映射是改解析不是拦截，跳过。返回 (exact, suffix, 跳过行数)。
+    """
+    exact = set()
+    skipped = 0
+    for line in iter_lines(raw_text):
+        i = line.find("#")
+        if i >= 0:
+            line = line[:i]
+        parts = line.split()
+        if len(parts) < 2:
+            continue
+        if parts[0] not in BLOCK_SINKHOLES:
+            skipped += 1
+            continue
+        for h in parts[1:]:
+            if h.lower() in BLOCK_IGNORED_HOSTS:
+                continue
+            d = normalize_domain(h)
+            if d:
+                exact.add(d)
             else:
-                v6.add(s)
-        except Exception:
-            pass
+                skipped += 1
+    return exact, set(), skipped
+
+
+def parse_adguard_list(raw_text: str):
+    """
+    AdGuard / Adblock DNS 语法："||example.com^"（自身 + 子域）、"@@||example.com^"（放行）。
+    "!" / "#" 注释、[Adblock ...] 头、元素隐藏、URL 路径规则、通配符规则、带其它修饰符的规则跳过。
+    放行只能精确抵消同名拦截（规则集没有例外语义），父域被拦时放行子域做不到，计入跳过。
+    返回 (exact, suffix, 跳过行数)。
+    """
+    block = set()
+    allow = set()
+    skipped = 0
+    for line in iter_lines(raw_text):
+        s = line.strip()
+        if not s or s[0] in "!#[":
+            continue
+        target = block
+        if s.startswith("@@"):
+            target = allow
+            s = s[2:]
+        if not s.startswith("||"):
+            skipped += 1
+            continue
+        s = s[2:]
+        i = s.find("$")
+        if i >= 0:
+            mods = {m.strip().lower() for m in s[i + 1:].split(",") if m.strip()}
+            s = s[:i]
+            if not mods <= ADGUARD_SAFE_MODIFIERS:
+                skipped += 1
+                continue
+        if s.endswith("|"):
+            s = s[:-1]
+        if s.endswith("^"):
+            s = s[:-1]
+        d = normalize_domain(s)
+        if not d:
+            skipped += 1
+            continue
+        target.add(d)
+
+    if allow:
+        covered = sum(1 for d in allow if d not in block and any(p in block for p in _parent_suffixes(d)))
+        block -= allow
+        skipped += covered
+    return set(), block, skipped
 
-    return sorted(v4), sorted(v6)
+
+def dnsmasq_is_block(key: str, target: str) -> bool:
+    """
+    只有“不解析 / 解析到黑洞”才算拦截：
+      server= / local=：目标为空（只查本地，等于 NXDOMAIN）
+      address=        ：目标为空、"#" 或黑洞地址
+    "server=/qq.com/114.114.114.114" 这类是转发（dnsmasq-china-list），"address=/x/1.2.3.4" 是改解析，都不是拦截。
+    """
+    target = target.strip()
+    if key in ("server", "local"):
+        return not target
+    return not target or target == "#" or target in BLOCK_SINKHOLES
+
+
+def parse_dnsmasq_list(raw_text: str):
+    """
+    dnsmasq 拦截行："address=/a.com/b.com/0.0.0.0"、"address=/a.com/"、"server=/a.com/"、"local=/a.com/"，
+    每个域名都是自身 + 子域；转发 / 改解析的行计入跳过。返回 (exact, suffix, 跳过行数)。
+    """
+    suffix = set()
+    skipped = 0
+    for line in iter_lines(raw_text):
+        s = line.strip()
+        if not s or s.startswith("#"):
+            continue
+        key, sep, rest = s.partition("=")
+        key = key.strip()
+        if not sep or key not in ("address", "server", "local") or not rest.startswith("/"):
+            skipped += 1
+            continue
+        fields = rest.split("/")
+        if len(fields) < 3 or not dnsmasq_is_block(key, fields[-1]):
+            skipped += 1
+            continue
+        # "/a.com/b.com/target" -> ["", "a.com", "b.com", "target"]，最后一段是目标地址
+        for h in fields[1:-1]:
+            d = normalize_domain(h)
+            if d:
+                suffix.add(d)
+            elif h:
+                skipped += 1
+    return set(), suffix, skipped
+
+
+BLOCKLIST_PARSERS = {
+    "hosts": parse_hosts_list,
+    "adguard": parse_adguard_list,
+    "dnsmasq": parse_dnsmasq_list,
+}
+
+
+def sniff_blocklist_format(raw_text: str, sample: int = 200) -> str:
+    """看前 sample 条有效行：hosts / AdGuard / dnsmasq 之一占六成以上就返回它，否则空串。"""
+    hits = {"hosts": 0, "adguard": 0, "dnsmasq": 0}
+    total = 0
+    for line in iter_lines(raw_text):
+        s = line.strip()
+        if not s or s[0] == "#":
+            continue
+        if s[0] == "!" or s.startswith("[Adblock"):
+            hits["adguard"] += 1
+            continue
+        total += 1
+        if s.startswith("||") or s.startswith("@@||"):
+            hits["adguard"] += 1
+        elif s.startswith(("address=/", "server=/", "local=/")):
+            # 转发行（server=/x/上游）不算拦截列表的证据
+            key, _, rest = s.partition("=")
+            if dnsmasq_is_block(key, rest.rsplit("/", 1)[-1]):
+                hits["dnsmasq"] += 1
+        else:
+            parts = s.split(None, 1)
+            if len(parts) == 2 and parts[0] in BLOCK_SINKHOLES:
+                hits["hosts"] += 1
+        if total >= sample:
+            break
+    if total == 0:
+        return ""
+    fmt, n = max(hits.items(), key=lambda kv: kv[1])
+    return fmt if n >= max(3, int(total * 0.6)) else ""
 
 
 # ========= sing-box & mihomo 输出 =========
@@ -407,10 +694,10 @@ def build_singbox_source_json(b: dict) -> dict:
     if b.get("domain_regex"):
         rule["domain_regex"] = sorted(b["domain_regex"])
 
-    ip_cidr_merged = set(b.get("ip_cidr") or [])
-    ip_cidr_merged.update(b.get("ip_cidr6") or [])
+    ip_cidr_merged = list(b.get("ip_cidr") or [])
+    ip_cidr_merged.extend(b.get("ip_cidr6") or [])
     if ip_cidr_merged:
-        rule["ip_cidr"] = sorted(ip_cidr_merged)
+        rule["ip_cidr"] = sort_cidrs(ip_cidr_merged)
 
     if b.get("process_name"):
         rule["process_name"] = sorted(b["process_name"])
@@ -442,11 +729,10 @@ def output_paths_for_name(name: str):
 
 
 def cleanup_outputs_for_name(name: str) -> None:
-    """严格增删同步：删除一个 name 对应的所有产物。"""
-    srs_path, domain_mrs, ip_mrs = output_paths_for_name(name)
-    safe_unlink(srs_path)
-    safe_unlink(domain_mrs)
-    safe_unlink(ip_mrs)
+    """严格增删同步：删除一个 name 对应的所有产物（连同增量快照 / 增量链）。"""
+    for path in output_paths_for_name(name):
+        safe_unlink(path)
+        rule_delta.remove(REMOTE_DELTA, path.name)
 
 
 def cleanup_orphan_outputs(valid_names) -> None:
@@ -476,21 +762,81 @@ def cleanup_orphan_outputs(valid_names) -> None:
                 log(f"🧹 STRICT: 删除孤儿 MRS: {p}")
                 safe_unlink(p)
 
+    # remote-delta/<产物名>/
+    if REMOTE_DELTA.exists():
+        for d in REMOTE_DELTA.iterdir():
+            if not d.is_dir():
+                continue
+            base = None
+            for suffix in (".srs", "_domain.mrs", "_ipcidr.mrs"):
+                if d.name.endswith(suffix):
+                    base = d.name[: -len(suffix)]
+                    break
+            if base not in valid_names:
+                log(f"🧹 STRICT: 删除孤儿增量: {d}")
+                rule_delta.remove(REMOTE_DELTA, d.name)
+
+
+# ========= 严格模式：产物落地（SRS / MRS 共用） =========
+
+def discard_strict_output(tmp_path: Path, dst_path: Path, label: str) -> None:
+    """构建失败：删 tmp，STRICT_MODE 下连旧产物一起删掉。"""
+    safe_unlink(tmp_path)
+    if STRICT_MODE:
+        log(f"    🧹 STRICT: 删除旧 {label} 以避免用到脏产物")
+        safe_unlink(dst_path)
+
+
+def commit_strict_output(tmp_path: Path, dst_path: Path, label: str) -> bool:
+    """
+    编译命令成功后调用：
+    - tmp 不存在 / 大小为 0：视为失败
+    - 否则 os.replace 原子替换正式产物
+    """
+    if not tmp_path.exists():
+        log(f"    ❌ 临时 {label} 文件未生成")
+        discard_strict_output(tmp_path, dst_path, label)
+        return False
+
+    size = tmp_path.stat().st_size
+    log(f"    ✅ 临时 {label} 生成成功: {tmp_path} ({size} bytes)")
+
+    if size == 0:
+        log(f"    ⚠️ 临时 {label} 大小为 0，视为失败")
+        discard_strict_output(tmp_path, dst_path, label)
+        return False
+
+    try:
+        os.replace(tmp_path, dst_path)
+    except Exception as e:
+        log(f"    ❌ 替换正式 {label} 失败: {e}")
+        discard_strict_output(tmp_path, dst_path, label)
+        return False
+
+    final_size = dst_path.stat().st_size
+    log(f"    ✅ {label} 更新成功: {dst_path} ({final_size} bytes)")
+    return True
+
 
 # ========= 严格模式：sing-box SRS 编译 =========
 
-def compile_singbox_srs_strict(src_json: dict, name: str) -> bool:
+def count_source_entries(src_json: dict) -> int:
+    """sing-box 源 JSON 里的规则条目数（用于估算编译超时）。"""
+    n = 0
+    for r in (src_json or {}).get("rules") or []:
+        if isinstance(r, dict):
+            n += sum(len(v) for v in r.values() if isinstance(v, list))
+    return n
+
+
+def prepare_singbox_srs(src_json: dict, name: str):
     """
-    严格模式编译 SRS：
-    - 源 JSON 写到 remote-tmp/{name}.json
-    - 编译输出到 remote-srs/{name}.srs.tmp
-    - 成功且非空：替换 remote-srs/{name}.srs
-    - 失败/空：删除 tmp，并在 STRICT_MODE 下删除旧 srs
+    - 源 JSON 写到 remote-tmp/{name}.json（保留，便于调试）
+    - 返回 (cmd, tmp_srs, srs_path)，编译输出到 remote-srs/{name}.srs.tmp
     """
     srs_path, _, _ = output_paths_for_name(name)
     tmp_srs = srs_path.with_suffix(".srs.tmp")
 
-    # 写源 JSON
     sbox_json_path = REMOTE_TMP / f"{name}.json"
     sbox_json_path.write_text(
         json.dumps(src_json, ensure_ascii=False, indent=2),
@@ -501,62 +847,42 @@ def compile_singbox_srs_strict(src_json: dict, name: str) -> bool:
     safe_unlink(tmp_srs)
 
     cmd = [SINGBOX_BIN, "rule-set", "compile", str(sbox_json_path), "-o", str(tmp_srs)]
+    return cmd, tmp_srs, srs_path
 
-    try:
-        run(cmd, timeout=240)
-    except Exception as e:
-        log(f"    ❌ 编译 SRS 出错: {e}")
-        safe_unlink(tmp_srs)
-        if STRICT_MODE:
-            log("    🧹 STRICT: 删除旧 SRS 以避免用到脏产物")
-            safe_unlink(srs_path)
-        # 源 JSON 只作为中间产物，可以保留或删除，这里保留，便于调试
-        return False
 
-    if not tmp_srs.exists():
-        log("    ❌ 临时 SRS 文件未生成")
-        if STRICT_MODE:
-            log("    🧹 STRICT: 删除旧 SRS 以避免用到脏产物")
-            safe_unlink(srs_path)
-        return False
-
-    size = tmp_srs.stat().st_size
-    log(f"    ✅ 临时 SRS 生成成功: {tmp_srs} ({size} bytes)")
-
-    if size == 0:
-        log("    ⚠️ 临时 SRS 大小为 0，视为失败")
-        safe_unlink(tmp_srs)
-        if STRICT_MODE:
-            log("    🧹 STRICT: 删除旧 SRS 以避免用到脏产物")
-            safe_unlink(srs_path)
-        return False
+def compile_singbox_srs_strict(src_json: dict, name: str) -> bool:
+    """
+    严格模式编译 SRS：
+    - 成功且非空：替换 remote-srs/{name}.srs
+    - 失败/空：删除 tmp，并在 STRICT_MODE 下删除旧 srs
+    """
+    cmd, tmp_srs, srs_path = prepare_singbox_srs(src_json, name)
 
-    # 原子替换
     try:
-        os.replace(tmp_srs, srs_path)
+        run(cmd, entries=count_source_entries(src_json), label=f"{name}.srs")
     except Exception as e:
-        log(f"    ❌ 替换正式 SRS 失败: {e}")
-        safe_unlink(tmp_srs)
-        if STRICT_MODE:
-            log("    🧹 STRICT: 删除旧 SRS 以避免用到脏产物")
-            safe_unlink(srs_path)
+        log(f"    ❌ 编译 SRS 出错: {e}")
+        discard_strict_output(tmp_srs, srs_path, "SRS")
         return False
 
-    final_size = srs_path.stat().st_size
-    log(f"    ✅ SRS 更新成功: {srs_path} ({final_size} bytes)")
-    return True
+    return commit_strict_output(tmp_srs, srs_path, "SRS")
 
 
 # ========= 严格模式：MRS 编译 =========
 
-def convert_with_mihomo_strict(behavior: str, src_yaml: Path, dst_mrs: Path) -> bool:
+def prepare_mihomo_mrs(behavior: str, items: list, name: str):
     """
-    严格模式编译 MRS：
-    - 输出先写到 dst_mrs.tmp
-    - 成功且非空再替换 dst_mrs
-    - 失败/空时删除 tmp，并在 STRICT_MODE 下删除旧 mrs
+    behavior: domain / ipcidr
+    - 写 mihomo 源 YAML 到 remote-tmp/{name}_{behavior}.yaml
+    - 返回 (cmd, src_yaml, tmp_mrs, dst_mrs)
     """
+    dst_mrs = REMOTE_MRS / f"{name}_{behavior}.mrs"
     tmp_mrs = dst_mrs.with_suffix(dst_mrs.suffix + ".tmp")
+
+    src_yaml = REMOTE_TMP / f"{name}_{behavior}.yaml"
+    write_mihomo_payload_yaml(items, src_yaml)
+    log(f"    ✅ write mihomo {behavior} source: {src_yaml}")
+
     safe_unlink(tmp_mrs)
 
     cmd = [
@@ -567,120 +893,439 @@ def convert_with_mihomo_strict(behavior: str, src_yaml: Path, dst_mrs: Path) ->
         str(src_yaml),
         str(tmp_mrs),
     ]
+    return cmd, src_yaml, tmp_mrs, dst_mrs
+
+
+def build_mrs_from_list(behavior: str, items: list, name: str) -> bool:
+    """
+    严格模式：
+    - 有条目：编译到 name_{behavior}.mrs（严格模式 + 原子写）
+    - 无条目：删除 name_{behavior}.mrs（增删同步）
+    """
+    dst_mrs = REMOTE_MRS / f"{name}_{behavior}.mrs"
+    if not items:
+        log(f"    ℹ️ no {behavior} entries, delete {behavior}.mrs if exists (sync)")
+        safe_unlink(dst_mrs)
+        return False
 
+    cmd, src_yaml, tmp_mrs, dst_mrs = prepare_mihomo_mrs(behavior, items, name)
     try:
-        run(cmd, timeout=180)
+        run(cmd, entries=len(items), label=f"{name}_{behavior}.mrs")
+        ok = commit_strict_output(tmp_mrs, dst_mrs, "MRS")
     except Exception as e:
         log(f"    ❌ mihomo 转换出错: {e}")
-        safe_unlink(tmp_mrs)
-        if STRICT_MODE:
-            log("    🧹 STRICT: 删除旧 MRS 以避免用到脏产物")
-            safe_unlink(dst_mrs)
-        return False
+        discard_strict_output(tmp_mrs, dst_mrs, "MRS")
+        ok = False
+    finally:
+        safe_unlink(src_yaml)
+    return ok
 
-    if not tmp_mrs.exists():
-        log("    ❌ 临时 MRS 文件未生成")
-        if STRICT_MODE:
-            log("    🧹 STRICT: 删除旧 MRS 以避免用到脏产物")
-            safe_unlink(dst_mrs)
-        return False
 
-    size = tmp_mrs.stat().st_size
-    log(f"    ✅ 临时 MRS 生成成功: {tmp_mrs} ({size} bytes)")
+def build_mrs_domain_from_list(domains: list, name: str) -> bool:
+    return build_mrs_from_list("domain", domains, name)
 
-    if size == 0:
-        log("    ⚠️ 临时 MRS 大小为 0，视为失败")
-        safe_unlink(tmp_mrs)
-        if STRICT_MODE:
-            log("    🧹 STRICT: 删除旧 MRS 以避免用到脏产物")
-            safe_unlink(dst_mrs)
-        return False
 
-    try:
-        os.replace(tmp_mrs, dst_mrs)
-    except Exception as e:
-        log(f"    ❌ 替换正式 MRS 失败: {e}")
-        safe_unlink(tmp_mrs)
-        if STRICT_MODE:
-            log("    🧹 STRICT: 删除旧 MRS 以避免用到脏产物")
-            safe_unlink(dst_mrs)
-        return False
+def build_mrs_ip_from_list(cidrs: list, name: str) -> bool:
+    return build_mrs_from_list("ipcidr", cidrs, name)
 
-    final_size = dst_mrs.stat().st_size
-    log(f"    ✅ MRS 更新成功: {dst_mrs} ({final_size} bytes)")
-    return True
 
+# ========= 单个条目：解析 -> 构建计划 =========
 
-def build_mrs_domain_from_list(domains: list, name: str) -> bool:
+def parse_item(name: str, raw: str, fmt_in: str):
     """
-    严格模式：
-    - 有域名：编译到 name_domain.mrs（严格模式 + 原子写）
-    - 无域名：删除 name_domain.mrs（增删同步）
+    纯 CPU 计算（不碰产物），可以丢到进程池里跑。
+    返回构建计划 dict：
+      {"srs": sing-box 源 JSON, "domains": [...] 或 None, "cidrs": [...] 或 None}
+    其中 None 表示这一类产物本轮不处理（沿用原串行逻辑）。
+    解析结果为空时返回 None：调用方按增删同步删除该 name 的所有产物。
     """
-    _, domain_mrs, _ = output_paths_for_name(name)
+    fmt = detect_format(fmt_in, raw)
+    log(f"    🔍 [{name}] detected format: {fmt_in} -> {fmt}")
+
+    # 只有 singbox-json 需要整体解析；纯文本 / 拦截列表不必先过一遍 JSON / YAML
+    obj = safe_load_struct(raw) if fmt == "singbox-json" else None
+
+    # ---- 1) singbox-json 源（有就原样编译）----
+    if fmt == "singbox-json" and is_singbox_ruleset_json(obj):
+        src_json = obj or {}
+        rules = src_json.get("rules") or []
+        if not rules:
+            log(f"    ⚠️ [{name}] singbox-json 中 rules 为空 -> 删除该 name 的所有产物（增删同步）")
+            return None
+
+        # 顺手从 sing-box JSON 抽 domain/ip 生成 mrs
+        domains = []
+        cidrs = []
+        for r in rules:
+            if not isinstance(r, dict):
+                continue
+            for d in r.get("domain") or []:
+                if isinstance(d, str) and d.strip():
+                    domains.append(d.strip().lstrip("."))
+            for ds in r.get("domain_suffix") or []:
+                if isinstance(ds, str) and ds.strip():
+                    domains.append(ds.strip().lstrip("."))
+            for c in r.get("ip_cidr") or []:
+                if isinstance(c, str) and c.strip():
+                    cidrs.append(c.strip())
+
+        return {
+            "srs": src_json,
+            "domains": sorted(set(domains)),
+            "cidrs": sort_cidrs(cidrs),
+        }
+
+    # ---- 2) 纯域名 txt ----
+    if fmt == "domain-text":
+        domains = parse_domain_list(raw)
+        log(f"    ✅ [{name}] parsed domain lines: {len(domains)}")
+        if not domains:
+            log(f"    ⚠️ [{name}] domain-text parsed 0 -> 删除该 name 的所有产物（增删同步）")
+            return None
+
+        # srs：把这些全当 domain_suffix 来用（带前导点）
+        b = {
+            "domain": set(),
+            "domain_suffix": {("." + d) for d in domains},
+            "domain_keyword": set(),
+            "domain_regex": set(),
+            "ip_cidr": set(),
+            "ip_cidr6": set(),
+            "process_name": set(),
+        }
+        return {"srs": build_singbox_source_json(b), "domains": domains, "cidrs": None}
+
+    # ---- 3) 纯 CIDR txt ----
+    if fmt == "ip-text":
+        v4, v6 = parse_cidr_list(raw)
+        log(f"    ✅ [{name}] parsed cidr lines: v4={len(v4)} v6={len(v6)}")
+        if not v4 and not v6:
+            log(f"    ⚠️ [{name}] ip-text parsed 0 -> 删除该 name 的所有产物（增删同步）")
+            return None
+
+        # parse_cidr_list 已经规范化 + 去重 + 数值排序，v4 在前 v6 在后
+        all_cidrs = v4 + v6
+
+        # srs：v4+v6 全塞 ip_cidr；mrs(ipcidr)：v4+v6 一起
+        b = {
+            "domain": set(),
+            "domain_suffix": set(),
+            "domain_keyword": set(),
+            "domain_regex": set(),
+            "ip_cidr": set(all_cidrs),
+            "ip_cidr6": set(),
+            "process_name": set(),
+        }
+        return {"srs": build_singbox_source_json(b), "domains": None, "cidrs": all_cidrs}
+
+    # ---- 4) 拦截列表：hosts / AdGuard / dnsmasq ----
+    if fmt in BLOCKLIST_PARSERS:
+        exact, suffix, skipped = BLOCKLIST_PARSERS[fmt](raw)
+        exact, suffix, folded = minimize_suffixes(exact, suffix)
+        log(
+            f"    ✅ [{name}] parsed {fmt}: domain={len(exact)} suffix={len(suffix)} "
+            f"(suffix 覆盖去重 {folded}，跳过 {skipped})"
+        )
+        if not exact and not suffix:
+            log(f"    ⚠️ [{name}] {fmt} parsed 0 -> 删除该 name 的所有产物（增删同步）")
+            return None
+
+        # srs：suffix 不带前导点（sing-box：自身 + 子域）；mrs：mihomo domain 行为里 +. 表示自身 + 子域
+        b = {
+            "domain": exact,
+            "domain_suffix": suffix,
+            "domain_keyword": set(),
+            "domain_regex": set(),
+            "ip_cidr": set(),
+            "ip_cidr6": set(),
+            "process_name": set(),
+        }
+        domains = sorted(exact) + sorted("+." + d for d in suffix)
+        return {"srs": build_singbox_source_json(b), "domains": domains, "cidrs": None}
+
+    # ---- 5) Clash 类规则（默认）----
+    rule_lines = parse_rule_lines_from_clash_like(raw)
+    b = extract_supported_from_clash_lines(rule_lines)
+
+    cnt = (
+        len(b["domain"])
+        + len(b["domain_suffix"])
+        + len(b["domain_keyword"])
+        + len(b["domain_regex"])
+        + len(b["ip_cidr"])
+        + len(b["ip_cidr6"])
+        + len(b["process_name"])
+    )
+    log(
+        f"    ✅ [{name}] extracted items: {cnt} "
+        f"(domain={len(b['domain'])}, suffix={len(b['domain_suffix'])}, "
+        f"keyword={len(b['domain_keyword'])}, regex={len(b['domain_regex'])}, "
+        f"cidr={len(b['ip_cidr'])}, cidr6={len(b['ip_cidr6'])}, process={len(b['process_name'])})"
+    )
 
-    if not domains:
-        log("    ℹ️ no domain entries, delete domain.mrs if exists (sync)")
-        safe_unlink(domain_mrs)
-        return False
+    if cnt == 0:
+        log(f"    ⚠️ [{name}] extracted 0 supported rules -> 删除该 name 的所有产物（增删同步）")
+        return None
 
-    tmp_domain_yaml = REMOTE_TMP / f"{name}_domain.yaml"
-    write_mihomo_payload_yaml(domains, tmp_domain_yaml)
-    log(f"    ✅ write mihomo domain source: {tmp_domain_yaml}")
+    # mihomo MRS（domain / ipcidr）：+.x = 自身 + 子域，.x = 仅子域，裸 x 只匹配自身
+    domains_for_mrs = []
+    for d in b["domain"]:
+        domains_for_mrs.append(d.lstrip("."))
+    regex_suffix = b.get("regex_suffix") or set()
+    for ds in b["domain_suffix"]:
+        if ds in regex_suffix and ds.startswith("."):
+            domains_for_mrs.append(ds)
+        else:
+            domains_for_mrs.append("+." + ds.lstrip("."))
+    mrs_unsupported = len(b["domain_keyword"]) + len(b["domain_regex"])
+    if mrs_unsupported:
+        log(
+            f"    ℹ️ [{name}] MRS 不支持 keyword / regex：{mrs_unsupported} 条只进 SRS "
+            f"(keyword={len(b['domain_keyword'])}, regex={len(b['domain_regex'])})"
+        )
 
-    ok = convert_with_mihomo_strict("domain", tmp_domain_yaml, domain_mrs)
-    safe_unlink(tmp_domain_yaml)
-    if ok:
-        log(f"    ✅ MRS(domain): {domain_mrs} ({domain_mrs.stat().st_size} bytes)")
-    return ok
+    return {
+        "srs": build_singbox_source_json(b),
+        "domains": sorted(set(domains_for_mrs)),
+        "cidrs": sort_cidrs(list(b["ip_cidr"]) + list(b["ip_cidr6"])),
+    }
 
 
-def build_mrs_ip_from_list(cidrs: list, name: str) -> bool:
+def build_outputs(name: str, plan) -> bool:
     """
-    严格模式：
-    - 有 CIDR：编译到 name_ipcidr.mrs
-    - 无 CIDR：删除 name_ipcidr.mrs
+    按构建计划串行编译；plan 为 None 时做增删同步清理。
+    返回本单元是否完整成功（空列表删产物也算成功）。
     """
-    _, _, ip_mrs = output_paths_for_name(name)
+    if plan is None:
+        cleanup_outputs_for_name(name)
+        return True
+
+    # 先给 sing-box 出 SRS，再给 mihomo 出 MRS（domain / ipcidr）
+    ok = compile_singbox_srs_strict(plan["srs"], name)
+    if plan["domains"] is not None:
+        ok = (build_mrs_domain_from_list(plan["domains"], name) or not plan["domains"]) and ok
+    if plan["cidrs"] is not None:
+        ok = (build_mrs_ip_from_list(plan["cidrs"], name) or not plan["cidrs"]) and ok
+    return ok
+
+
+# ========= 异步流水线：fetch / parse / compile 三段重叠 =========
 
-    if not cidrs:
-        log("    ℹ️ no ipcidr entries, delete ipcidr.mrs if exists (sync)")
-        safe_unlink(ip_mrs)
+async def run_async(cmd, entries: int = 0, label: str = "") -> str:
+    """run() 的 asyncio 版本：job_runner 是阻塞等待，放到线程里跑。"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, lambda: run(cmd, entries=entries, label=label))
+
+
+async def compile_singbox_srs_strict_async(src_json: dict, name: str, sem) -> bool:
+    cmd, tmp_srs, srs_path = prepare_singbox_srs(src_json, name)
+    try:
+        async with sem:
+            await run_async(cmd, entries=count_source_entries(src_json), label=f"{name}.srs")
+    except Exception as e:
+        log(f"    ❌ [{name}] 编译 SRS 出错: {e}")
+        discard_strict_output(tmp_srs, srs_path, "SRS")
         return False
+    return commit_strict_output(tmp_srs, srs_path, "SRS")
 
-    tmp_ip_yaml = REMOTE_TMP / f"{name}_ipcidr.yaml"
-    write_mihomo_payload_yaml(cidrs, tmp_ip_yaml)
-    log(f"    ✅ write mihomo ipcidr source: {tmp_ip_yaml}")
 
-    ok = convert_with_mihomo_strict("ipcidr", tmp_ip_yaml, ip_mrs)
-    safe_unlink(tmp_ip_yaml)
-    if ok:
-        log(f"    ✅ MRS(ipcidr): {ip_mrs} ({ip_mrs.stat().st_size} bytes)")
+async def build_mrs_from_list_async(behavior: str, items: list, name: str, sem) -> bool:
+    dst_mrs = REMOTE_MRS / f"{name}_{behavior}.mrs"
+    if not items:
+        log(f"    ℹ️ [{name}] no {behavior} entries, delete {behavior}.mrs if exists (sync)")
+        safe_unlink(dst_mrs)
+        return False
+
+    cmd, src_yaml, tmp_mrs, dst_mrs = prepare_mihomo_mrs(behavior, items, name)
+    try:
+        async with sem:
+            await run_async(cmd, entries=len(items), label=f"{name}_{behavior}.mrs")
+        ok = commit_strict_output(tmp_mrs, dst_mrs, "MRS")
+    except Exception as e:
+        log(f"    ❌ [{name}] mihomo 转换出错: {e}")
+        discard_strict_output(tmp_mrs, dst_mrs, "MRS")
+        ok = False
+    finally:
+        safe_unlink(src_yaml)
     return ok
 
 
-# ========= main =========
+async def build_outputs_async(name: str, plan, sem) -> bool:
+    """build_outputs() 的异步版本：SRS 与两个 MRS 并发编译，子进程数受 sem 限制。"""
+    if plan is None:
+        cleanup_outputs_for_name(name)
+        return True
 
-def main() -> None:
-    if not MANIFEST.exists():
-        log(f"❌ Missing manifest: {MANIFEST}")
-        sys.exit(1)
+    jobs = [compile_singbox_srs_strict_async(plan["srs"], name, sem)]
+    lists = [None]
+    if plan["domains"] is not None:
+        jobs.append(build_mrs_from_list_async("domain", plan["domains"], name, sem))
+        lists.append(plan["domains"])
+    if plan["cidrs"] is not None:
+        jobs.append(build_mrs_from_list_async("ipcidr", plan["cidrs"], name, sem))
+        lists.append(plan["cidrs"])
+    results = await asyncio.gather(*jobs)
+    return all(r or (items is not None and not items) for r, items in zip(results, lists))
 
-    ensure_dirs()
 
-    items = json.loads(MANIFEST.read_text(encoding="utf-8"))
-    if not isinstance(items, list) or not items:
-        log("❌ remote-rules.json is empty or invalid.")
-        sys.exit(1)
+def finish_unit(journal: BuildJournal, unit, ok: bool, source_sha256: str = "", plan=None) -> None:
+    """
+    单元结束：把结果和当前产物哈希写进 journal（失败也记，续跑时会重跑），
+    并记下各产物的条目数 / 源地址，最后写进 index.json。
+    """
+    name, url, fmt_in = unit
+    journal.record(name, entry_hash(name, url, fmt_in), ok, source_sha256, output_paths_for_name(name))
+    if ok:
+        publish_deltas(name, plan)
+        note = SCHEDULER.record(name, entry_hash(name, url, fmt_in), MANIFEST_ITEMS.get(name) or {}, source_sha256)
+        if note:
+            log(f"    🕒 [{name}] {note}")
 
-    # 先检查二进制
-    run([SINGBOX_BIN, "version"], timeout=60)
-    run([MIHOMO_BIN, "-v"], timeout=60)
+    if plan is None:
+        return
+    srs_path, domain_mrs, ip_mrs = output_paths_for_name(name)
+    INDEX_META[srs_path] = {"counts": count_rule_types(plan["srs"]), "source": url}
+    if plan["domains"] is not None:
+        INDEX_META[domain_mrs] = {"counts": {"domain": len(plan["domains"])}, "source": url}
+    if plan["cidrs"] is not None:
+        INDEX_META[ip_mrs] = {"counts": {"ipcidr": len(plan["cidrs"])}, "source": url}
 
-    # 先清理已不存在于 manifest 中的孤儿产物
-    valid_names = [ (it.get("name") or "").strip() for it in items if (it.get("name") or "").strip() ]
-    cleanup_orphan_outputs(valid_names)
 
+def publish_deltas(name: str, plan) -> None:
+    """
+    成功的单元才更新增量（失败时保留上一代快照，客户端继续用旧规则）；
+    源里规则被清空 / 某类产物不再生成时，对应的增量目录一起删掉。
+    """
+    srs_path, domain_mrs, ip_mrs = output_paths_for_name(name)
+    snaps = {srs_path.name: None, domain_mrs.name: None, ip_mrs.name: None}
+    if plan is not None:
+        snaps[srs_path.name] = rule_delta.srs_snapshot(plan["srs"])
+        if plan["domains"]:
+            snaps[domain_mrs.name] = rule_delta.mrs_snapshot("domain", plan["domains"])
+        if plan["cidrs"]:
+            snaps[ip_mrs.name] = rule_delta.mrs_snapshot("ipcidr", plan["cidrs"])
+
+    for artifact, snap in snaps.items():
+        if snap is None:
+            rule_delta.remove(REMOTE_DELTA, artifact)
+            continue
+        try:
+            note = rule_delta.publish(REMOTE_DELTA, artifact, snap)
+        except Exception as e:
+            # 增量只是省流量的附加产物，出错不影响本单元结果；删掉让客户端回退全量
+            log(f"    ⚠️ [{name}] 增量生成失败: {artifact} -> {e}")
+            rule_delta.remove(REMOTE_DELTA, artifact)
+            continue
+        if note:
+            log(f"    {note}")
+
+
+def write_output_indexes() -> None:
+    """remote-srs / remote-mrs 各写一个 index.json（见 artifact_index）。"""
+    for d in (REMOTE_SRS, REMOTE_MRS):
+        meta = {p.name: m for p, m in INDEX_META.items() if p.parent == d}
+        log(describe(d, write_index(d, meta)))
+
+
+async def run_pipeline_async(units: list, journal: BuildJournal) -> None:
+    """
+    三段流水线，段与段之间是有界队列（背压）：
+      fetch   : FETCH_CONCURRENCY 个 worker，线程里走 HttpPool（keep-alive 复用 CDN 连接）
+      parse   : 进程池（CPU 密集，绕开 GIL）
+      compile : 经 job_runner 调 sing-box / mihomo（线程里等待），信号量限制并发
+
+    所有产物的增删（含 STRICT 清理）都只在 compile 段发生，同名条目用锁串行化。
+    """
+    loop = asyncio.get_running_loop()
+    fetch_q = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    parse_q = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    compile_q = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+
+    sem = asyncio.Semaphore(COMPILE_CONCURRENCY)
+    name_locks = {}
+
+    fetch_executor = ThreadPoolExecutor(max_workers=FETCH_CONCURRENCY)
+    # 解析进程不能 fork：worker 是首次 submit 时才起的，那时拉取 / 编译线程已经在跑，
+    # fork 出来的子进程可能继承被别的线程持有的锁（logging / stdout / HttpPool）而死锁
+    parse_executor = ProcessPoolExecutor(
+        max_workers=PARSE_WORKERS, mp_context=multiprocessing.get_context("forkserver")
+    )
+
+    async def feeder():
+        for unit in units:
+            await fetch_q.put(unit)
+        for _ in range(FETCH_CONCURRENCY):
+            await fetch_q.put(None)
+
+    async def fetcher():
+        while True:
+            unit = await fetch_q.get()
+            if unit is None:
+                await parse_q.put(None)
+                return
+            name, url, fmt_in = unit
+            log(f"\n==> {name}\n    url: {url}\n    format: {fmt_in}")
+            try:
+                raw = await loop.run_in_executor(fetch_executor, http_get, url, name)
+                err = None
+            except Exception as e:
+                raw, err = None, e
+            await parse_q.put((unit, raw, err))
+
+    async def parser():
+        while True:
+            job = await parse_q.get()
+            if job is None:
+                await compile_q.put(None)
+                return
+            unit, raw, err = job
+            name, _, fmt_in = unit
+            plan = None
+            src_hash = ""
+            if err is None:
+                src_hash = sha256_bytes(raw.encode("utf-8"))
+                try:
+                    plan = await loop.run_in_executor(parse_executor, parse_item, name, raw, fmt_in)
+                except Exception as e:
+                    err = e
+            await compile_q.put((unit, plan, err, src_hash))
+
+    async def compiler():
+        while True:
+            job = await compile_q.get()
+            if job is None:
+                return
+            unit, plan, err, src_hash = job
+            name = unit[0]
+            lock = name_locks.setdefault(name, asyncio.Lock())
+            async with lock:
+                if err is not None:
+                    log(f"    ❌ [{name}] 拉取/解析失败: {err}")
+                    if STRICT_MODE:
+                        log(f"    🧹 [{name}] STRICT: 失败 -> 删除该 name 的所有产物")
+                        cleanup_outputs_for_name(name)
+                    finish_unit(journal, unit, False)
+                    continue
+                ok = await build_outputs_async(name, plan, sem)
+                finish_unit(journal, unit, ok, src_hash, plan)
+
+    # fetcher -> parser -> compiler 的哨兵一一传递，数量保持一致
+    workers = [feeder()]
+    workers += [fetcher() for _ in range(FETCH_CONCURRENCY)]
+    workers += [parser() for _ in range(FETCH_CONCURRENCY)]
+    workers += [compiler() for _ in range(FETCH_CONCURRENCY)]
+    try:
+        await asyncio.gather(*workers)
+    finally:
+        fetch_executor.shutdown(wait=True)
+        parse_executor.shutdown(wait=True)
+
+
+# ========= main =========
+
+def load_units(items: list) -> list:
+    """manifest -> [(name, url, format)]，跳过无效条目。"""
+    units = []
     for it in items:
         name = (it.get("name") or "").strip()
         url = (it.get("url") or "").strip()
@@ -689,154 +1334,130 @@ def main() -> None:
         if not name or not url:
             log(f"⚠️ Skip invalid item: {it}")
             continue
+        units.append((name, url, fmt_in))
+    return units
+
 
+def run_serial(units: list, journal: BuildJournal) -> None:
+    for unit in units:
+        name, url, fmt_in = unit
         log(f"\n==> {name}\n    url: {url}\n    format: {fmt_in}")
 
-        # 默认认为失败时要清理对应 name 的所有产物
         try:
             # 拉取远程内容
-            raw = http_get(url)
+            raw = http_get(url, name)
         except Exception as e:
             log(f"    ❌ HTTP 拉取失败: {e}")
             if STRICT_MODE:
                 log("    🧹 STRICT: HTTP 失败 -> 删除该 name 的所有产物")
                 cleanup_outputs_for_name(name)
+            finish_unit(journal, unit, False)
             continue
 
-        fmt = detect_format(fmt_in, raw)
-        log(f"    🔍 detected format: {fmt_in} -> {fmt}")
-
-        obj = safe_load_struct(raw)
-
-        # ---- 1) singbox-json 源（有就原样编译）----
-        if fmt == "singbox-json" and is_singbox_ruleset_json(obj):
-            src_json = obj or {}
-            rules = src_json.get("rules") or []
-            if not rules:
-                log("    ⚠️ singbox-json 中 rules 为空 -> 删除该 name 的所有产物（增删同步）")
-                cleanup_outputs_for_name(name)
-                continue
+        plan = parse_item(name, raw, fmt_in)
+        ok = build_outputs(name, plan)
+        finish_unit(journal, unit, ok, sha256_bytes(raw.encode("utf-8")), plan)
+
+
+def select_resume_units(units: list, journal: BuildJournal) -> list:
+    """续跑：跳过 journal 里已完成且产物哈希仍一致的单元。"""
+    pending = []
+    for unit in units:
+        name, url, fmt_in = unit
+        if journal.is_done(name, entry_hash(name, url, fmt_in)):
+            log(f"⏭️ resume: {name} 已完成，跳过")
+        else:
+            pending.append(unit)
+    return pending
+
+
+def select_due_units(units: list) -> list:
+    """--schedule：只留到期的单元，最紧急的在前。"""
+    entries = {name: entry_hash(name, url, fmt_in) for name, url, fmt_in in units}
+    due, waiting = SCHEDULER.select(units, MANIFEST_ITEMS, entries)
+    for name, left in waiting:
+        log(f"⏭️ schedule: {name} 未到期（{format_duration(max(0, left))} 后）")
+    log(f"🕒 schedule: 到期 {len(due)} / {len(units)}：{', '.join(u[0] for u in due) or '-'}")
+    return due
+
+
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(description="remote-rules.json -> remote-srs / remote-mrs")
+    ap.add_argument(
+        "--mode",
+        choices=("serial", "async"),
+        default=PIPELINE_MODE,
+        help="serial: 逐条拉取/解析/编译；async: 三段重叠的 asyncio 流水线（默认取 PIPELINE_MODE）",
+    )
+    ap.add_argument(
+        "--resume",
+        action="store_true",
+        help="续跑上次被中断的构建：journal 里已完成的单元直接跳过，只跑未完成/失败的",
+    )
+    ap.add_argument(
+        "--schedule",
+        action="store_true",
+        help="按条目 refresh / priority 调度：只拉取到期的条目（见 refresh_scheduler），其余产物保持不动",
+    )
+    return ap.parse_args(argv)
 
-            # 编译 SRS
-            compile_singbox_srs_strict(src_json, name)
 
-            # 顺手从 sing-box JSON 抽 domain/ip 生成 mrs
-            domains = []
-            cidrs = []
-            for r in rules:
-                if not isinstance(r, dict):
-                    continue
-                for d in r.get("domain") or []:
-                    if isinstance(d, str) and d.strip():
-                        domains.append(d.strip().lstrip("."))
-                for ds in r.get("domain_suffix") or []:
-                    if isinstance(ds, str) and ds.strip():
-                        domains.append(ds.strip().lstrip("."))
-                for c in r.get("ip_cidr") or []:
-                    if isinstance(c, str) and c.strip():
-                        cidrs.append(c.strip())
-
-            domains = sorted(set(domains))
-            cidrs = sorted(set(cidrs))
-            build_mrs_domain_from_list(domains, name)
-            build_mrs_ip_from_list(cidrs, name)
-            continue
+def main() -> None:
+    args = parse_args()
 
-        # ---- 2) 纯域名 txt ----
-        if fmt == "domain-text":
-            domains = parse_domain_list(raw)
-            log(f"    ✅ parsed domain lines: {len(domains)}")
-            if not domains:
-                log("    ⚠️ domain-text parsed 0 -> 删除该 name 的所有产物（增删同步）")
-                cleanup_outputs_for_name(name)
-                continue
+    if not MANIFEST.exists():
+        log(f"❌ Missing manifest: {MANIFEST}")
+        sys.exit(1)
 
-            # mrs(domain)
-            build_mrs_domain_from_list(domains, name)
-
-            # srs：把这些全当 domain_suffix 来用（带前导点）
-            b = {
-                "domain": set(),
-                "domain_suffix": {("." + d) for d in domains},
-                "domain_keyword": set(),
-                "domain_regex": set(),
-                "ip_cidr": set(),
-                "ip_cidr6": set(),
-                "process_name": set(),
-            }
-            compile_singbox_srs_strict(build_singbox_source_json(b), name)
-            continue
+    ensure_dirs()
 
-        # ---- 3) 纯 CIDR txt ----
-        if fmt == "ip-text":
-            v4, v6 = parse_cidr_list(raw)
-            log(f"    ✅ parsed cidr lines: v4={len(v4)} v6={len(v6)}")
-            if not v4 and not v6:
-                log("    ⚠️ ip-text parsed 0 -> 删除该 name 的所有产物（增删同步）")
-                cleanup_outputs_for_name(name)
-                continue
+    items = json.loads(MANIFEST.read_text(encoding="utf-8"))
+    if not isinstance(items, list) or not items:
+        log("❌ remote-rules.json is empty or invalid.")
+        sys.exit(1)
 
-            all_cidrs = sorted(set(v4 + v6))
-
-            # mrs(ipcidr)：v4+v6 一起
-            build_mrs_ip_from_list(all_cidrs, name)
-
-            # srs：v4+v6 全塞 ip_cidr
-            b = {
-                "domain": set(),
-                "domain_suffix": set(),
-                "domain_keyword": set(),
-                "domain_regex": set(),
-                "ip_cidr": set(all_cidrs),
-                "ip_cidr6": set(),
-                "process_name": set(),
-            }
-            compile_singbox_srs_strict(build_singbox_source_json(b), name)
-            continue
+    # 先检查二进制
+    run([SINGBOX_BIN, "version"], timeout=60)
+    run([MIHOMO_BIN, "-v"], timeout=60)
 
-        # ---- 4) Clash 类规则（默认）----
-        rule_lines = parse_rule_lines_from_clash_like(raw)
-        b = extract_supported_from_clash_lines(rule_lines)
-
-        cnt = (
-            len(b["domain"])
-            + len(b["domain_suffix"])
-            + len(b["domain_keyword"])
-            + len(b["domain_regex"])
-            + len(b["ip_cidr"])
-            + len(b["ip_cidr6"])
-            + len(b["process_name"])
-        )
-        log(
-            f"    ✅ extracted items: {cnt} "
-            f"(domain={len(b['domain'])}, suffix={len(b['domain_suffix'])}, "
-            f"keyword={len(b['domain_keyword'])}, regex={len(b['domain_regex'])}, "
-            f"cidr={len(b['ip_cidr'])}, cidr6={len(b['ip_cidr6'])}, process={len(b['process_name'])})"
-        )
+    # 先清理已不存在于 manifest 中的孤儿产物
+    valid_names = [ (it.get("name") or "").strip() for it in items if (it.get("name") or "").strip() ]
+    cleanup_orphan_outputs(valid_names)
 
-        if cnt == 0:
-            log("    ⚠️ extracted 0 supported rules -> 删除该 name 的所有产物（增删同步）")
-            cleanup_outputs_for_name(name)
-            continue
+    units = load_units(items)
+    MANIFEST_ITEMS.update({(it.get("name") or "").strip(): it for it in items if isinstance(it, dict)})
 
-        # 先给 sing-box 出 SRS
-        compile_singbox_srs_strict(build_singbox_source_json(b), name)
+    SCHEDULER.load()
+    MIRROR_STATS.load()
+    if args.schedule:
+        units = select_due_units(units)
 
-        # 再给 mihomo 出 MRS（domain / ipcidr）
-        domains_for_mrs = []
-        for d in b["domain"]:
-            domains_for_mrs.append(d.lstrip("."))
-        for ds in b["domain_suffix"]:
-            domains_for_mrs.append(ds.lstrip("."))
+    journal = BuildJournal(JOURNAL_PATH, ROOT)
+    if args.resume and journal.load():
+        units = select_resume_units(units, journal)
+    else:
+        if args.resume:
+            log(f"ℹ️ resume: 没有可用的 journal（{JOURNAL_PATH}），从头构建")
+        journal.start(sha256_bytes(MANIFEST.read_bytes()))
 
-        domains_for_mrs = sorted(set(domains_for_mrs))
-        ip_for_mrs = sorted(set(list(b["ip_cidr"]) + list(b["ip_cidr6"])))
+    log(f"🔧 mode = {args.mode}, units = {len(units)}")
 
-        build_mrs_domain_from_list(domains_for_mrs, name)
-        build_mrs_ip_from_list(ip_for_mrs, name)
+    t0 = time.monotonic()
+    if args.mode == "async":
+        asyncio.run(run_pipeline_async(units, journal))
+    else:
+        run_serial(units, journal)
+    FETCHER.close()
+    HTTP.close()
 
-    log("\n✅ Done.")
+    SCHEDULER.save(valid_names)
+    MIRROR_STATS.save()
+    write_output_indexes()
+    REPORT.log_summary(log)
+    log(f"\n🔌 HTTP: {HTTP.stats()}")
+    log(f"🪞 mirrors: {FETCHER.summary()}")
+    log(f"✅ Done. ({time.monotonic() - t0:.1f}s)")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
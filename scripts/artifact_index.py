@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+产物目录索引：每个输出目录写一个 index.json，客户端拉一次索引就知道哪些文件变了。
+
+index.json 格式：
+  {
+    "version": 1,
+    "generated": "2024-06-01T03:00:00Z",
+    "files": {
+      "cn.srs": {
+        "sha256": "...", "size": 1234,
+        "counts": {"domain_suffix": 100, "ip_cidr": 20},   # 按规则类型的条目数（拿不到就省略）
+        "source": "https://...",                            # 源地址（拿不到就省略）
+        "built": "2024-06-01T03:00:00Z"                     # 该文件内容最后一次变化的时间
+      }
+    }
+  }
+
+sha256 没变的文件沿用旧的 built / counts / source，所以没变化的重建不会改动 index.json。
+
+命令行（给 shell 脚本用）：
+  python3 scripts/artifact_index.py DIR [--suffix .mrs] [--source URL] [--meta meta.tsv]
+meta.tsv 每行：<文件名>\t<字段>\t<值>；字段为 source 时是源地址，否则是该规则类型的条目数。
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+INDEX_NAME = "index.json"
+INDEX_VERSION = 1
+DEFAULT_SUFFIXES = (".srs", ".mrs")
+
+# rule-set 源 JSON 里按条目计数的字段
+RULE_COUNT_KEYS = (
+    "domain",
+    "domain_suffix",
+    "domain_keyword",
+    "domain_regex",
+    "ip_cidr",
+    "process_name",
+)
+
+
+def utc_now() -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+
+
+def sha256_file(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def count_rule_types(ruleset: dict) -> dict:
+    """sing-box rule-set 源对象 -> {规则类型: 条目数}。"""
+    counts = {}
+    for r in (ruleset or {}).get("rules") or []:
+        if not isinstance(r, dict):
+            continue
+        for k in RULE_COUNT_KEYS:
+            v = r.get(k)
+            if isinstance(v, list) and v:
+                counts[k] = counts.get(k, 0) + len(v)
+            elif isinstance(v, str) and v:
+                counts[k] = counts.get(k, 0) + 1
+    return counts
+
+
+def load_index(directory: Path) -> dict:
+    p = Path(directory) / INDEX_NAME
+    try:
+        data = json.loads(p.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def write_index(directory, meta: dict = None, suffixes=DEFAULT_SUFFIXES, default_source: str = ""):
+    """
+    扫描 directory 下的产物，重写 index.json（原子替换）。
+    meta: {文件名: {"counts": {...}, "source": "..."}}，本轮构建提供的元数据；
+    default_source: meta 里没给 source 的文件统一用这个。
+    返回 (新增, 变化, 删除) 的文件名列表。
+    """
+    directory = Path(directory)
+    meta = meta or {}
+    old = load_index(directory)
+    old_files = old.get("files") if isinstance(old.get("files"), dict) else {}
+    now = utc_now()
+
+    files = {}
+    added, changed = [], []
+    for p in sorted(directory.iterdir()) if directory.is_dir() else []:
+        if not p.is_file() or not p.name.endswith(tuple(suffixes)):
+            continue
+        digest = sha256_file(p)
+        prev = old_files.get(p.name) or {}
+        same = prev.get("sha256") == digest
+
+        entry = {"sha256": digest, "size": p.stat().st_size}
+        m = meta.get(p.name) or {}
+        counts = m.get("counts") or (prev.get("counts") if same else None)
+        source = m.get("source") or default_source or prev.get("source")
+        if counts:
+            entry["counts"] = dict(sorted(counts.items()))
+        if source:
+            entry["source"] = source
+        entry["built"] = prev.get("built", now) if same else now
+        files[p.name] = entry
+
+        if not prev:
+            added.append(p.name)
+        elif not same:
+            changed.append(p.name)
+
+    removed = sorted(set(old_files) - set(files))
+
+    # 内容没任何变化就不动 index.json（避免每次构建都多一个提交）
+    if files == old_files and old.get("version") == INDEX_VERSION:
+        return added, changed, removed
+
+    if not files and not old_files:
+        return added, changed, removed
+
+    data = {"version": INDEX_VERSION, "generated": now, "files": files}
+    directory.mkdir(parents=True, exist_ok=True)
+    tmp = directory / (INDEX_NAME + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+    os.replace(tmp, directory / INDEX_NAME)
+    return added, changed, removed
+
+
+def describe(directory, result) -> str:
+    added, changed, removed = result
+    return (
+        f"🗂️ {Path(directory) / INDEX_NAME}: 新增 {len(added)}，变化 {len(changed)}，删除 {len(removed)}"
+    )
+
+
+# ========= 命令行 =========
+
+def load_meta_tsv(path: str) -> dict:
+    meta = {}
+    if path and os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                parts = line.rstrip("\n").split("\t")
+                if len(parts) != 3 or not parts[0]:
+                    continue
+                name, field, value = parts
+                m = meta.setdefault(name, {})
+                if field == "source":
+                    m["source"] = value
+                else:
+                    try:
+                        m.setdefault("counts", {})[field] = int(value)
+                    except ValueError:
+                        continue
+    return meta
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="write index.json for an artifact directory")
+    ap.add_argument("directory")
+    ap.add_argument("--suffix", action="append", help="产物后缀（可多次），默认 .srs/.mrs")
+    ap.add_argument("--source", default="", help="所有文件的默认源地址")
+    ap.add_argument("--meta", default="", help="TSV：<文件名>\\t<字段>\\t<值>")
+    args = ap.parse_args(argv)
+
+    meta = load_meta_tsv(args.meta)
+    result = write_index(args.directory, meta, tuple(args.suffix or DEFAULT_SUFFIXES), args.source)
+    print(describe(args.directory, result), flush=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+构建日志（journal）：记录每个已完成单元，让中断的构建可以续跑。
+
+文件格式：JSON Lines，每完成一个单元追加一行并 fsync：
+  {"run": "...", "manifest_sha256": "..."}                          # 每次全新构建的第一行
+  {"name": "...", "entry": "...", "status": "done" | "failed",
+   "source_sha256": "...", "artifacts": {"remote-srs/x.srs": "<sha256>", ...}, "ts": ...}
+
+续跑（resume）时：某个 name 最后一条记录是 done、manifest 条目没变、
+且记录里的每个产物仍在磁盘上且 sha256 一致，才算完成；否则重跑。
+最后一行写了一半（进程被杀）会被忽略。
+"""
+
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+
+
+def sha256_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def sha256_file(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def entry_hash(*fields) -> str:
+    """manifest 条目指纹（name/url/format 等），条目改了就不再算“已完成”。"""
+    return sha256_bytes(json.dumps(fields, ensure_ascii=False).encode("utf-8"))
+
+
+class BuildJournal:
+    def __init__(self, path: Path, root: Path):
+        self.path = Path(path)
+        self.root = Path(root)
+        self._records = {}
+
+    # ---------- 读 ----------
+
+    def load(self) -> int:
+        """读取已有 journal，返回有效记录数。"""
+        self._records = {}
+        if not self.path.exists():
+            return 0
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(rec, dict) and rec.get("name"):
+                    self._records[rec["name"]] = rec
+        return len(self._records)
+
+    def is_done(self, name: str, entry: str) -> bool:
+        rec = self._records.get(name)
+        if not rec or rec.get("status") != "done" or rec.get("entry") != entry:
+            return False
+        for rel, digest in (rec.get("artifacts") or {}).items():
+            p = self.root / rel
+            if not p.exists() or sha256_file(p) != digest:
+                return False
+        return True
+
+    # ---------- 写 ----------
+
+    def start(self, manifest_sha256: str) -> None:
+        """全新构建：清空旧 journal。"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._records = {}
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"run": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                                "manifest_sha256": manifest_sha256}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def record(self, name: str, entry: str, ok: bool, source_sha256: str = "", artifacts=()) -> None:
+        """追加一条单元记录；artifacts 是该单元当前存在的产物路径。"""
+        arts = {}
+        for p in artifacts:
+            p = Path(p)
+            if p.exists():
+                arts[str(p.relative_to(self.root))] = sha256_file(p)
+
+        rec = {
+            "name": name,
+            "entry": entry,
+            "status": "done" if ok else "failed",
+            "source_sha256": source_sha256,
+            "artifacts": arts,
+            "ts": int(time.time()),
+        }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self._records[name] = rec
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+紧凑 CIDR 存储：校验 / 规范化 / 数值排序 / 去重。
+
+- 语义与 ipaddress.ip_network(s, strict=False) 一致：主机位清零，"1.1.1.1" == "1.1.1.1/32"
+- 存储为 array 列（不保留原字符串）：
+    IPv4: v4(Q)，每条打包成一个整数 (网络地址 << 8) | 前缀，直接就是排序键
+    IPv6: hi(Q) + lo(Q) + plen(B)
+- 输出规范写法（inet_ntop），按 (版本, 网络地址, 前缀) 数值排序
+
+快路径：按块批量处理，地址用 socket.inet_pton 解析（C 实现，拒绝前导零等非法写法），
+循环全部交给 map / operator 在 C 里跑，不为每条创建 ipaddress 对象。
+块里有任何一条走不了快路径（非法条目、"/255.255.255.0" 掩码写法等），
+这一块退回逐条解析，逐条解析失败再交给 ipaddress 兜底。
+"""
+
+import ipaddress
+import socket
+import sys
+from array import array
+from functools import partial
+from itertools import chain, repeat
+from operator import and_, lshift, or_, rshift
+
+_BLOCK = 4096
+
+_PTON4 = partial(socket.inet_pton, socket.AF_INET)
+_PTON6 = partial(socket.inet_pton, socket.AF_INET6)
+_NTOP4 = partial(socket.inet_ntop, socket.AF_INET)
+_NTOP6 = partial(socket.inet_ntop, socket.AF_INET6)
+
+_MASK64 = (1 << 64) - 1
+# _NETMASK[v][p]：前缀长度 p 对应的网络掩码
+_NETMASK = {
+    4: [((1 << 32) - 1) ^ ((1 << (32 - p)) - 1) for p in range(33)],
+    6: [((1 << 128) - 1) ^ ((1 << (128 - p)) - 1) for p in range(129)],
+}
+_BIG_ENDIAN = sys.byteorder == "big"
+# IPv4 格式化查表：(记录内字节偏移, 该字节 -> 字符串)
+_V4_COLUMNS = (
+    (3, [f"{i}." for i in range(256)]),
+    (4, [f"{i}." for i in range(256)]),
+    (5, [f"{i}." for i in range(256)]),
+    (6, [f"{i}/" for i in range(256)]),
+    (7, [f"{i}\n" for i in range(256)]),
+)
+
+
+def parse_cidr(text: str):
+    """
+    解析一个 CIDR / 单个 IP，返回 (version, network_int, prefix)，非法返回 None。
+    """
+    s = text.strip()
+    addr, sep, plen = s.partition("/")
+    version = 6 if ":" in addr else 4
+    bits = 128 if version == 6 else 32
+
+    try:
+        value = int.from_bytes((_PTON6 if version == 6 else _PTON4)(addr), "big")
+        if not sep:
+            prefix = bits
+        elif plen.isdigit() and plen.isascii():
+            prefix = int(plen)
+            if prefix > bits:
+                return None
+        else:
+            raise ValueError(plen)
+    except (OSError, ValueError):
+        # 少见写法（掩码前缀 / 带 scope 等）交给 ipaddress 兜底
+        try:
+            net = ipaddress.ip_network(s, strict=False)
+        except ValueError:
+            return None
+        return net.version, int(net.network_address), net.prefixlen
+
+    return version, value & _NETMASK[version][prefix], prefix
+
+
+def format_cidr(version: int, value: int, prefix: int) -> str:
+    if version == 6:
+        return f"{_NTOP6(value.to_bytes(16, 'big'))}/{prefix}"
+    return f"{_NTOP4(value.to_bytes(4, 'big'))}/{prefix}"
+
+
+def canonical_cidr(text: str):
+    """规范写法（"1.1.1.1" -> "1.1.1.1/32"，主机位清零）；非法返回 None。"""
+    t = parse_cidr(text)
+    return format_cidr(*t) if t else None
+
+
+def is_cidr(text: str) -> bool:
+    return parse_cidr(text) is not None
+
+
+def _split_prefixes(chunk, bits: int):
+    """批量拆 "addr/plen"，返回 (addrs, prefixes)；有任何不规范的前缀返回 None。"""
+    if all(map(str.__contains__, chunk, repeat("/"))):
+        # 常见情况：每条恰好一个 "/"。拼起来一次 split，地址和前缀交替出现
+        parts = "/".join(chunk).split("/")
+        if len(parts) != 2 * len(chunk):
+            return None
+        addrs, plens = parts[0::2], parts[1::2]
+    else:
+        addrs, seps, plens = zip(*map(str.partition, chunk, repeat("/")))
+        # 没有 "/" 才补默认前缀；"1.2.3.4/" 这种空前缀和逐条解析一样算非法
+        default = str(bits)
+        plens = [p if sep else default for sep, p in zip(seps, plens)]
+
+    if "" in plens:
+        return None
+    joined = "".join(plens)
+    if not (joined.isascii() and joined.isdigit()):
+        return None
+    prefixes = list(map(int, plens))
+    if max(prefixes) > bits:
+        return None
+    return addrs, prefixes
+
+
+def _packed_to_ints(packed: bytes, typecode: str) -> array:
+    """把网络字节序的定长整数串批量转成本机 array。"""
+    a = array(typecode, packed)
+    if not _BIG_ENDIAN:
+        a.byteswap()
+    return a
+
+
+class CidrStore:
+    """按列存储的 CIDR 集合。add()/add_many() 只追加，sorted_unique() 排序去重。"""
+
+    __slots__ = ("v4", "v6_hi", "v6_lo", "v6_plen", "invalid")
+
+    def __init__(self, items=None):
+        self.v4 = array("Q")
+        self.v6_hi = array("Q")
+        self.v6_lo = array("Q")
+        self.v6_plen = array("B")
+        self.invalid = 0
+        if items is not None:
+            self.add_many(items)
+
+    def __len__(self) -> int:
+        return len(self.v4) + len(self.v6_plen)
+
+    # ---------- 写入 ----------
+
+    def _append(self, version: int, value: int, prefix: int) -> None:
+        if version == 4:
+            self.v4.append((value << 8) | prefix)
+        else:
+            self.v6_hi.append(value >> 64)
+            self.v6_lo.append(value & _MASK64)
+            self.v6_plen.append(prefix)
+
+    def add(self, text: str) -> bool:
+        t = parse_cidr(text)
+        if t is None:
+            self.invalid += 1
+            return False
+        self._append(*t)
+        return True
+
+    def _add_v4_block(self, chunk) -> bool:
+        split = _split_prefixes(chunk, 32)
+        if split is None:
+            return False
+        addrs, prefixes = split
+        try:
+            nets = _packed_to_ints(b"".join(map(_PTON4, addrs)), "I")
+        except OSError:
+            return False
+        nets = map(and_, nets, map(_NETMASK[4].__getitem__, prefixes))
+        self.v4.extend(map(or_, map(lshift, nets, repeat(8)), prefixes))
+        return True
+
+    def _add_v6_block(self, chunk) -> bool:
+        split = _split_prefixes(chunk, 128)
+        if split is None:
+            return False
+        addrs, prefixes = split
+        try:
+            words = _packed_to_ints(b"".join(map(_PTON6, addrs)), "Q")
+        except OSError:
+            return False
+        values = map(or_, map(lshift, words[0::2], repeat(64)), words[1::2])
+        nets = list(map(and_, values, map(_NETMASK[6].__getitem__, prefixes)))
+        self.v6_hi.extend(map(rshift, nets, repeat(64)))
+        self.v6_lo.extend(map(and_, nets, repeat(_MASK64)))
+        self.v6_plen.extend(prefixes)
+        return True
+
+    def _add_block(self, chunk) -> None:
+        if ":" in "".join(chunk):
+            v4 = [s for s in chunk if ":" not in s]
+            v6 = [s for s in chunk if ":" in s]
+        else:
+            v4, v6 = chunk, ()
+        for part, add_block in ((v4, self._add_v4_block), (v6, self._add_v6_block)):
+            if part and not add_block(part):
+                for s in part:
+                    self.add(s)
+
+    def add_many(self, items) -> int:
+        """批量追加，返回成功条数（非法条目计入 self.invalid）。"""
+        items = list(filter(None, map(str.strip, items)))
+        before = len(self)
+        for i in range(0, len(items), _BLOCK):
+            self._add_block(items[i:i + _BLOCK])
+        return len(self) - before
+
+    # ---------- 排序 / 去重 ----------
+
+    def sorted_unique(self) -> "CidrStore":
+        """数值排序 + 去重，返回新的 CidrStore。"""
+        out = CidrStore()
+
+        out.v4.extend(sorted(dict.fromkeys(self.v4)))
+
+        # IPv6 临时打包成一个 int 作为排序键：(网络地址 << 8) | 前缀
+        values6 = map(or_, map(lshift, self.v6_hi, repeat(64)), self.v6_lo)
+        keys6 = sorted(dict.fromkeys(map(or_, map(lshift, values6, repeat(8)), self.v6_plen)))
+        out.v6_hi.extend(map(rshift, keys6, repeat(72)))
+        out.v6_lo.extend(map(and_, map(rshift, keys6, repeat(8)), repeat(_MASK64)))
+        out.v6_plen.extend(map(and_, keys6, repeat(0xFF)))
+        return out
+
+    # ---------- 输出 ----------
+
+    def split_versions(self):
+        """返回 (v4 列表, v6 列表)，规范写法，保持当前顺序。"""
+        # IPv4：转成大端 8 字节记录 [3 字节 0 | a | b | c | d | 前缀]，按列查表拼成
+        # "a.b.c.d/p\n" 一整串再 split，避免每条一次格式化调用
+        records = array("Q", self.v4)
+        if not _BIG_ENDIAN:
+            records.byteswap()
+        raw = records.tobytes()
+        cols = [map(table.__getitem__, raw[i::8]) for i, table in _V4_COLUMNS]
+        v4 = "".join(chain.from_iterable(zip(*cols))).split("\n")
+        v4.pop()
+
+        values6 = map(or_, map(lshift, self.v6_hi, repeat(64)), self.v6_lo)
+        v6 = list(map(
+            "{}/{}".format,
+            map(_NTOP6, map(int.to_bytes, values6, repeat(16), repeat("big"))),
+            self.v6_plen,
+        ))
+        return v4, v6
+
+    def to_list(self) -> list:
+        v4, v6 = self.split_versions()
+        return v4 + v6
+
+    def __iter__(self):
+        return iter(self.to_list())
+
+
+def sort_cidrs(items) -> list:
+    """规范化 + 去重 + 数值排序；非法条目丢弃。"""
+    return CidrStore(items).sorted_unique().to_list()
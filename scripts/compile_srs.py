@@ -4,9 +4,12 @@
 import os
 import sys
 import json
-import subprocess
 from typing import Any, Dict, List, Optional, Set
 
+from artifact_index import INDEX_NAME, count_rule_types, describe, write_index
+from job_runner import REPORT, run_job
+from regex_optimizer import REGEX_OPTIMIZE, optimize_domain_regex
+
 # 源目录 & sing-box 可执行文件，可用环境变量覆盖
 SBOX_DIR = os.getenv("SBOX_DIR", "singbox")
 SINGBOX_BIN = os.getenv("SINGBOX_BIN", "./sing-box")
@@ -231,6 +234,15 @@ def build_ruleset_from_payload(data: Any) -> Dict[str, Any]:
             process_name.add(v)
         # 其它类型暂时忽略
 
+    # DOMAIN-REGEX 能改写成 domain / suffix / keyword 的就改写，剩下的合并
+    if domain_regex and REGEX_OPTIMIZE:
+        plan = optimize_domain_regex(domain_regex)
+        domains |= plan.domain
+        domain_suffix |= plan.suffix
+        domain_keyword |= plan.keyword
+        domain_regex = set(plan.regex)
+        log(f"  🧮 {plan.summary()}")
+
     rule: Dict[str, Any] = {"type": "default"}
 
     if domains:
@@ -264,12 +276,22 @@ def write_temp_ruleset_json(base_name: str, ruleset_obj: Dict[str, Any]) -> str:
 
 # ================== 调用 sing-box 编译 SRS（严格模式 + 原子写入） ==================
 
-def compile_to_srs_strict(json_path: str, base_name: str, has_rules: bool) -> bool:
+def count_ruleset_entries(ruleset_obj: Dict[str, Any]) -> int:
+    """rule-set 源对象里的条目数（用于估算编译超时）。"""
+    n = 0
+    for r in ruleset_obj.get("rules", []):
+        if isinstance(r, dict):
+            n += sum(len(v) for v in r.values() if isinstance(v, list))
+    return n
+
+
+def compile_to_srs_strict(json_path: str, base_name: str, has_rules: bool, entries: int = 0) -> bool:
     """
     严格模式编译：
     - 输出写到 *.srs.tmp
     - 成功且非空时，用 os.replace 原子替换 *.srs
     - 失败/超时/空文件时，删除 tmp，并在 STRICT_MODE 下删除旧 *.srs
+    - 经 job_runner 执行：超时按 entries 自适应，带内存/CPU 上限
     """
     output_srs = os.path.join(SBOX_DIR, f"{base_name}.srs")
     tmp_srs = output_srs + ".tmp"
@@ -280,14 +302,7 @@ def compile_to_srs_strict(json_path: str, base_name: str, has_rules: bool) -> bo
     log(f"    ▶ Run: {' '.join(cmd)}")
 
     try:
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
-    except subprocess.TimeoutExpired:
-        log("    ❌ 命令超时")
-        safe_unlink(tmp_srs)
-        if STRICT_MODE:
-            log("    🧹 STRICT: 删除旧 SRS 以避免用到脏产物")
-            safe_unlink(output_srs)
-        return False
+        result = run_job(cmd, entries=entries, label=f"{base_name}.srs")
     except Exception as e:
         log(f"    ❌ 调用 sing-box 出错: {e}")
         safe_unlink(tmp_srs)
@@ -301,6 +316,14 @@ def compile_to_srs_strict(json_path: str, base_name: str, has_rules: bool) -> bo
     if result.stderr.strip():
         log(f"    stderr: {result.stderr.strip()}")
 
+    if result.timed_out:
+        log(f"    ❌ 命令超时（{result.timeout:.0f}s）")
+        safe_unlink(tmp_srs)
+        if STRICT_MODE:
+            log("    🧹 STRICT: 删除旧 SRS 以避免用到脏产物")
+            safe_unlink(output_srs)
+        return False
+
     if result.returncode != 0:
         log(f"    ❌ sing-box 退出码: {result.returncode}")
         safe_unlink(tmp_srs)
@@ -358,7 +381,11 @@ def main() -> None:
         log(f"❌ sing-box 二进制未找到: {SINGBOX_BIN}")
         sys.exit(1)
 
-    json_files = [f for f in os.listdir(SBOX_DIR) if f.endswith(".json")]
+    # 产物索引（index.json）和上次中断残留的临时源不是 rule-set 源，不能拿来编译 / 增删同步
+    json_files = [
+        f for f in os.listdir(SBOX_DIR)
+        if f.endswith(".json") and f != INDEX_NAME and not f.startswith("temp_ruleset_")
+    ]
     if not json_files:
         log(f"⚠️ {SBOX_DIR} 中没有 .json 文件")
         return
@@ -369,6 +396,7 @@ def main() -> None:
     log(f"🔧 发现 {len(json_files)} 个 JSON 文件")
 
     success, fail = 0, 0
+    index_meta: Dict[str, Dict[str, Any]] = {}
 
     for json_file in sorted(json_files):
         full_path = os.path.join(SBOX_DIR, json_file)
@@ -419,17 +447,25 @@ def main() -> None:
         temp_json = write_temp_ruleset_json(base_name, rs_obj)
 
         try:
-            ok = compile_to_srs_strict(temp_json, base_name, has_rules=True)
+            ok = compile_to_srs_strict(
+                temp_json, base_name, has_rules=True, entries=count_ruleset_entries(rs_obj)
+            )
         finally:
             if temp_json and os.path.exists(temp_json):
                 safe_unlink(temp_json)
 
         if ok:
             success += 1
+            index_meta[f"{base_name}.srs"] = {
+                "counts": count_rule_types(rs_obj),
+                "source": f"{SBOX_DIR}/{json_file}",
+            }
         else:
             fail += 1
 
     log(f"\n📊 统计: 成功 {success} 个, 失败 {fail} 个")
+    log(describe(SBOX_DIR, write_index(SBOX_DIR, index_meta, (".srs",))))
+    REPORT.log_summary(log)
 
 
 if __name__ == "__main__":
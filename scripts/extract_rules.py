@@ -2,8 +2,10 @@
 import os
 import sys
 import yaml
-import ipaddress
-import subprocess
+
+from artifact_index import describe, write_index
+from cidr_store import sort_cidrs
+from job_runner import REPORT, run_job
 
 # 从环境变量读取，默认 clash
 SRC_DIR = os.getenv("SRC_DIR", "clash")
@@ -30,10 +32,10 @@ def extract_rules_from_payload(payload):
     """
     从 payload 列表里提取：
     - 纯域名列表 domains
-    - 纯 CIDR 列表 cidrs
+    - 纯 CIDR 列表 cidrs（规范写法、去重、按数值排序）
     """
     domains = set()
-    cidrs = set()
+    cidrs = []
 
     if not isinstance(payload, list):
         return [], []
@@ -62,15 +64,10 @@ def extract_rules_from_payload(payload):
         if stripped.startswith("IP-CIDR"):
             parts = [p.strip() for p in line.split(",") if p.strip()]
             if len(parts) >= 2:
-                cidr = parts[1]
-                try:
-                    ipaddress.ip_network(cidr, strict=False)
-                    cidrs.add(cidr)
-                except ValueError:
-                    pass
+                cidrs.append(parts[1])
             continue
 
-    return sorted(domains), sorted(cidrs)
+    return sorted(domains), sort_cidrs(cidrs)
 
 
 def write_temp_payload_yaml(temp_path: str, items) -> None:
@@ -81,28 +78,32 @@ def write_temp_payload_yaml(temp_path: str, items) -> None:
             f.write(f"  - {it}\n")
 
 
-def convert_with_mihomo_atomic_strict(behavior: str, src_yaml: str, dst_mrs: str) -> bool:
+def convert_with_mihomo_atomic_strict(behavior: str, src_yaml: str, dst_mrs: str, entries: int = 0) -> bool:
     """
     原子写入 + 严格模式：
     - 输出到 dst_mrs.tmp
     - 成功且非空：os.replace 覆盖 dst_mrs
-    - 失败/空：删除 tmp；严格模式下删除 dst_mrs（防止继续用旧文件）
+    - 失败/超时/空：删除 tmp；严格模式下删除 dst_mrs（防止继续用旧文件）
+    - 经 job_runner 执行：超时按 entries 自适应，带内存/CPU 上限
     """
     tmp_out = dst_mrs + ".tmp"
     safe_unlink(tmp_out)
 
     cmd = [MIHOMO_BIN, "convert-ruleset", behavior, "yaml", src_yaml, tmp_out]
     log(f"    ▶ Run: {' '.join(cmd)}")
-    result = subprocess.run(cmd, capture_output=True, text=True)
+    result = run_job(cmd, entries=entries, label=os.path.basename(dst_mrs))
 
     if result.stdout.strip():
         log(f"    stdout: {result.stdout.strip()}")
     if result.stderr.strip():
         log(f"    stderr: {result.stderr.strip()}")
 
-    # 失败：删 tmp，严格模式删旧产物
-    if result.returncode != 0:
-        log(f"    ❌ mihomo exit code: {result.returncode}")
+    # 失败/超时：删 tmp，严格模式删旧产物
+    if result.returncode != 0 or result.timed_out:
+        if result.timed_out:
+            log(f"    ❌ mihomo timeout ({result.timeout:.0f}s)")
+        else:
+            log(f"    ❌ mihomo exit code: {result.returncode}")
         safe_unlink(tmp_out)
         if STRICT_MODE:
             log("    🧹 STRICT: delete old output to avoid stale mrs")
@@ -144,7 +145,8 @@ def convert_with_mihomo_atomic_strict(behavior: str, src_yaml: str, dst_mrs: str
     return True
 
 
-def process_yaml_file(yaml_path: str, base_name: str) -> None:
+def process_yaml_file(yaml_path: str, base_name: str, index_meta: dict) -> None:
+    """index_meta: 成功产出的 mrs 记下条目数 / 源文件，最后写进 index.json。"""
     log(f"\n🔍 Processing {yaml_path} ...")
 
     try:
@@ -185,8 +187,13 @@ def process_yaml_file(yaml_path: str, base_name: str) -> None:
         try:
             write_temp_payload_yaml(temp_domain, domains)
             log(f"  🚀 Converting domain rules ({len(domains)}) ...")
-            ok = convert_with_mihomo_atomic_strict("domain", temp_domain, out_domain)
-            if not ok:
+            ok = convert_with_mihomo_atomic_strict("domain", temp_domain, out_domain, len(domains))
+            if ok:
+                index_meta[os.path.basename(out_domain)] = {
+                    "counts": {"domain": len(domains)},
+                    "source": yaml_path,
+                }
+            else:
                 log("  ❌ Domain conversion failed")
         finally:
             safe_unlink(temp_domain)
@@ -202,8 +209,13 @@ def process_yaml_file(yaml_path: str, base_name: str) -> None:
         try:
             write_temp_payload_yaml(temp_ip, cidrs)
             log(f"  🚀 Converting IP rules ({len(cidrs)}) ...")
-            ok = convert_with_mihomo_atomic_strict("ipcidr", temp_ip, out_ip)
-            if not ok:
+            ok = convert_with_mihomo_atomic_strict("ipcidr", temp_ip, out_ip, len(cidrs))
+            if ok:
+                index_meta[os.path.basename(out_ip)] = {
+                    "counts": {"ipcidr": len(cidrs)},
+                    "source": yaml_path,
+                }
+            else:
                 log("  ❌ IP conversion failed")
         finally:
             safe_unlink(temp_ip)
@@ -233,10 +245,14 @@ def main():
     log(f"🔧 STRICT_MODE = {STRICT_MODE}")
     log(f"🔧 Found {len(yaml_files)} yaml files")
 
+    index_meta = {}
     for yaml_file in sorted(yaml_files):
         full_path = os.path.join(SRC_DIR, yaml_file)
         base_name = os.path.splitext(yaml_file)[0]
-        process_yaml_file(full_path, base_name)
+        process_yaml_file(full_path, base_name, index_meta)
+
+    log(describe(SRC_DIR, write_index(SRC_DIR, index_meta, (".mrs",))))
+    REPORT.log_summary(log)
 
 
 if __name__ == "__main__":
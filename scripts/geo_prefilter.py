@@ -0,0 +1,420 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+geosite 分类预过滤索引：问“host 在 ~1400 个 geo/geosite 分类里的哪些”，不必逐个分类精确匹配。
+
+每个分类一个 Bloom 过滤器，键是该分类每条规则的裸域名（"+." / "." / "*." 前缀去掉；
+full 也一样），查询时把 host 自身和每一级父域都当候选键。过滤器只会多报不会漏报，
+命中的分类（候选）再拿源文本做精确校验；绝大多数分类在过滤这一步就被排除。
+
+布局（位切片）：按键数量级把分类分组，同组的分类共用 m（组内最大键数 × 每键位数）和 k，
+第 p 行是一串位，第 j 位 = 组内第 j 个分类的过滤器第 p 位。查询一个键 = 每组取 k 行按位与，
+剩下的 1 就是候选分类，一次把整组分类都探测完。每个分类的误判率 <= fpr；
+fpr 默认按分类数自动定（分类越多、每个分类要越准，否则候选会被误报淹没）。
+
+文件格式（确定性：源不变则字节不变）：
+  b"GPF1" + u32(LE) 头长度 + 头 JSON + 各组行数据
+  头：{"version", "fpr", "categories": [名], "keys": [键数], "always": [分类下标],
+       "groups": [{"m", "k", "width", "offset", "columns": [分类下标]}]}
+"always" 是含无法取键规则（中间带 "*"）的分类，总是作为候选。
+
+  python3 scripts/geo_prefilter.py build SRC_DIR -o geo/geosite-prefilter.bin [--fpr auto|0.001] [--require-dir DIR]
+  python3 scripts/geo_prefilter.py check INDEX SRC_DIR [--samples 2000]    # 无漏报 + 实测误判率
+  python3 scripts/geo_prefilter.py query INDEX [host ...] [--verify SRC_DIR]  # 不给 host 时读 stdin
+  python3 scripts/geo_prefilter.py overlap INDEX SRC_DIR [--top 30]        # 分类两两重叠的规则条数
+SRC_DIR 里是 <分类>.txt（sync_loy_geo_mrs.sh 喂给 mihomo 的 domain 文本）。
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import random
+import struct
+import sys
+import time
+from collections import Counter
+from functools import lru_cache
+from pathlib import Path
+
+from rule_matcher import RuleIndex, mihomo_domain_rules
+
+MAGIC = b"GPF1"
+FORMAT_VERSION = 1
+MAX_K = 16
+# 每个分类的目标误判率；auto = PREFILTER_FALSE_CANDIDATES / 分类数，
+# 即每个查询键平均多报的候选分类数控制在 PREFILTER_FALSE_CANDIDATES 左右
+PREFILTER_FPR = os.getenv("PREFILTER_FPR", "auto")
+PREFILTER_FALSE_CANDIDATES = float(os.getenv("PREFILTER_FALSE_CANDIDATES", "0.25"))
+VERIFY_CACHE = int(os.getenv("PREFILTER_VERIFY_CACHE", "256"))  # 精确校验时常驻的分类数
+
+
+def log(msg: str) -> None:
+    print(msg, flush=True)
+
+
+# ========= 键 / 哈希 =========
+
+def rule_key(line: str):
+    """一条 mihomo domain 规则 -> 过滤器键（裸域名）；空行 / 注释返回 ""；无法取键返回 None。"""
+    s = line.split("#", 1)[0].strip().lower().rstrip(".")
+    if not s:
+        return ""
+    for prefix in ("+.", "*.", "."):
+        if s.startswith(prefix):
+            s = s[len(prefix):]
+            break
+    if not s or "*" in s:
+        return None
+    return s
+
+
+def host_keys(host: str) -> list:
+    """host 自身和每一级父域（a.b.c -> a.b.c, b.c, c）。"""
+    host = (host or "").strip().rstrip(".").lower()
+    if not host:
+        return []
+    out = [host]
+    i = host.find(".")
+    while i != -1:
+        out.append(host[i + 1:])
+        i = host.find(".", i + 1)
+    return out
+
+
+def _probes(key: str) -> tuple:
+    """一次 blake2b-512 切成 16 个独立的 32 位哈希；过滤器取前 k 个对 m 取模。
+    （不用 h1 + i*h2 双重哈希：m 小的时候各键的探测位置成等差数列，误判率明显偏高）"""
+    return struct.unpack("<16I", hashlib.blake2b(key.encode("utf-8"), digest_size=64).digest())
+
+
+def _params(n: int, fpr: float):
+    """n 个键、目标误判率 -> (m 位数, k 个哈希)；k 最多 MAX_K。"""
+    bits_per_key = -math.log(fpr) / (math.log(2) ** 2)
+    m = max(64, math.ceil(n * bits_per_key))
+    k = min(MAX_K, max(1, round(bits_per_key * math.log(2))))
+    return m, k
+
+
+# ========= 构建 =========
+
+def read_sources(src_dir, require_dir=None) -> dict:
+    """SRC_DIR/<分类>.txt -> {分类: [行]}；空文件跳过；给了 require_dir 时只要那里有同名产物的分类。"""
+    src_dir = Path(src_dir)
+    required = None
+    if require_dir:
+        required = {p.stem for p in Path(require_dir).iterdir() if p.is_file()}
+    out = {}
+    for p in sorted(src_dir.glob("*.txt")):
+        if required is not None and p.stem not in required:
+            continue
+        lines = p.read_text(encoding="utf-8", errors="ignore").splitlines()
+        if any(x.strip() for x in lines):
+            out[p.stem] = lines
+    return out
+
+
+def resolve_fpr(fpr, categories: int) -> float:
+    if fpr in (None, "", "auto"):
+        return min(0.01, PREFILTER_FALSE_CANDIDATES / max(1, categories))
+    return float(fpr)
+
+
+def build(sources: dict, fpr=PREFILTER_FPR) -> bytes:
+    names = sorted(sources)
+    fpr = resolve_fpr(fpr, len(names))
+    keys = []
+    always = []
+    for j, name in enumerate(names):
+        ks = set()
+        wild = False
+        for line in sources[name]:
+            k = rule_key(line)
+            if k is None:
+                wild = True
+            elif k:
+                ks.add(k)
+        keys.append(ks)
+        if wild:
+            always.append(j)
+
+    # 按键数量级分组：组内 m 取最大键数，空间浪费不超过 2 倍
+    groups = {}
+    for j, ks in enumerate(keys):
+        if ks:
+            groups.setdefault(len(ks).bit_length(), []).append(j)
+
+    header_groups = []
+    blobs = []
+    offset = 0
+    for _, cols in sorted(groups.items()):
+        m, k = _params(max(len(keys[j]) for j in cols), fpr)
+        width = (len(cols) + 7) // 8
+        rows = bytearray(m * width)
+        for bit, j in enumerate(cols):
+            byte, mask = bit >> 3, 1 << (bit & 7)
+            for key in keys[j]:
+                for h in _probes(key)[:k]:
+                    rows[h % m * width + byte] |= mask
+        header_groups.append({"m": m, "k": k, "width": width, "offset": offset, "columns": cols})
+        blobs.append(bytes(rows))
+        offset += len(rows)
+
+    header = {
+        "version": FORMAT_VERSION,
+        "fpr": fpr,
+        "categories": names,
+        "keys": [len(ks) for ks in keys],
+        "always": always,
+        "groups": header_groups,
+    }
+    head = json.dumps(header, ensure_ascii=False, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    return MAGIC + struct.pack("<I", len(head)) + head + b"".join(blobs)
+
+
+def write_atomic(path, data: bytes) -> None:
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+# ========= 查询 =========
+
+class GeoPrefilter:
+    def __init__(self, data: bytes):
+        if data[:4] != MAGIC:
+            raise ValueError("not a geosite prefilter index")
+        (hlen,) = struct.unpack_from("<I", data, 4)
+        self.header = json.loads(data[8:8 + hlen])
+        if self.header.get("version") != FORMAT_VERSION:
+            raise ValueError(f"unsupported prefilter version: {self.header.get('version')}")
+        self.categories = self.header["categories"]
+        self.always = frozenset(self.header["always"])
+        self._data = memoryview(data)[8 + hlen:]
+        self._groups = [
+            (g["m"], g["k"], g["width"], g["offset"], g["columns"], (1 << len(g["columns"])) - 1)
+            for g in self.header["groups"]
+        ]
+
+    @classmethod
+    def load(cls, path) -> "GeoPrefilter":
+        return cls(Path(path).read_bytes())
+
+    @property
+    def size(self) -> int:
+        return len(self._data)
+
+    def key_candidates(self, key: str, out: set) -> None:
+        probes = _probes(key)
+        data = self._data
+        for m, k, width, offset, cols, full in self._groups:
+            acc = full
+            for h in probes[:k]:
+                p = offset + h % m * width
+                acc &= int.from_bytes(data[p:p + width], "little")
+                if not acc:
+                    break
+            while acc:
+                low = acc & -acc
+                out.add(cols[low.bit_length() - 1])
+                acc ^= low
+
+    def candidate_ids(self, host: str) -> set:
+        out = set(self.always)
+        for key in host_keys(host):
+            self.key_candidates(key, out)
+        return out
+
+    def candidates(self, host: str) -> list:
+        return [self.categories[j] for j in sorted(self.candidate_ids(host))]
+
+
+class Verifier:
+    """候选分类的精确校验：按需载入 SRC_DIR/<分类>.txt，最近用过的 VERIFY_CACHE 个分类常驻。"""
+
+    def __init__(self, src_dir, cache=VERIFY_CACHE):
+        self.src_dir = Path(src_dir)
+        self.loads = 0
+        self._index = lru_cache(maxsize=cache)(self._load)
+
+    def _load(self, name: str) -> RuleIndex:
+        self.loads += 1
+        idx = RuleIndex(cache_size=0)
+        p = self.src_dir / f"{name}.txt"
+        lines = p.read_text(encoding="utf-8", errors="ignore").splitlines() if p.exists() else []
+        idx.add(name, mihomo_domain_rules(lines))
+        return idx
+
+    def contains(self, name: str, host: str) -> bool:
+        return bool(self._index(name).match(host))
+
+
+def classify(pf: GeoPrefilter, host: str, verifier: Verifier = None) -> tuple:
+    """-> (确认命中的分类, 候选数)；没有 verifier 时候选即结果。"""
+    cands = pf.candidates(host)
+    if verifier is None:
+        return cands, len(cands)
+    return [c for c in cands if verifier.contains(c, host)], len(cands)
+
+
+# ========= 命令 =========
+
+def cmd_build(args) -> int:
+    t0 = time.perf_counter()
+    sources = read_sources(args.src, args.require_dir)
+    if not sources:
+        log(f"❌ {args.src} 里没有非空的 <分类>.txt")
+        return 1
+    data = build(sources, args.fpr)
+    write_atomic(args.output, data)
+    pf = GeoPrefilter(data)
+    fpr = pf.header["fpr"]
+    log(
+        f"🧮 预过滤索引：{len(pf.categories)} 个分类 / {sum(pf.header['keys'])} 个键 / "
+        f"{len(pf.header['groups'])} 组，{pf.size / 1024:.1f} KB，目标误判率 {fpr:.2g}，"
+        f"总是候选 {len(pf.always)} 个，{time.perf_counter() - t0:.1f}s -> {args.output}"
+    )
+    return 0
+
+
+def _random_host(rnd) -> str:
+    label = lambda: "".join(rnd.choice("abcdefghijklmnopqrstuvwxyz0123456789") for _ in range(rnd.randint(4, 10)))  # noqa: E731
+    return ".".join([label() for _ in range(rnd.randint(1, 3))] + [rnd.choice(("com", "net", "org", "cn", "io"))])
+
+
+def cmd_check(args) -> int:
+    pf = GeoPrefilter.load(args.index)
+    sources = read_sources(args.src)
+    pos = {n: j for j, n in enumerate(pf.categories)}
+    exact = [set() for _ in pf.categories]
+
+    # 1) 无漏报：索引里每个分类的每个键都必须把该分类报为候选
+    missing = Counter()
+    for name, lines in sources.items():
+        j = pos.get(name)
+        if j is None:
+            continue  # 构建时被 --require-dir 排除的分类
+        for line in lines:
+            k = rule_key(line)
+            if k:
+                exact[j].add(k)
+                got = set()
+                pf.key_candidates(k, got)
+                if j not in got and j not in pf.always:
+                    missing[name] += 1
+
+    # 2) 实测误判率（按键）：随机域名 + 各级父域逐个问过滤器，对照精确键集合
+    rnd = random.Random(args.seed)
+    probes = fp = keys = 0
+    width = len(pf.categories) - len(pf.always)
+    t0 = time.perf_counter()
+    for _ in range(args.samples):
+        for k in host_keys(_random_host(rnd)):
+            got = set()
+            pf.key_candidates(k, got)
+            fp += sum(1 for j in got if k not in exact[j])
+            probes += width
+            keys += 1
+    elapsed = time.perf_counter() - t0
+
+    rate = fp / probes if probes else 0.0
+    log(
+        f"🔎 漏报分类 {len(missing)}，实测误判率 {rate:.5f}（目标 {pf.header['fpr']:.2g}，每键平均候选 "
+        f"{fp / keys if keys else 0:.2f} 个），{keys / elapsed:.0f} 键/s，未收录分类 {len(set(sources) - set(pos))}"
+    )
+    for name, n in missing.most_common(10):
+        log(f"  ❌ {name}: {n}")
+    return 1 if missing or rate > pf.header["fpr"] * 2 else 0
+
+
+def cmd_query(args) -> int:
+    pf = GeoPrefilter.load(args.index)
+    verifier = Verifier(args.verify) if args.verify else None
+    hosts = args.hosts or (line.strip() for line in sys.stdin)
+    n = cands = hits = 0
+    t0 = time.perf_counter()
+    for h in hosts:
+        if not h:
+            continue
+        found, c = classify(pf, h, verifier)
+        n += 1
+        cands += c
+        hits += len(found)
+        print(f"{h}\t{','.join(found)}")
+    if n:
+        elapsed = time.perf_counter() - t0
+        print(
+            f"📊 {n} 个 host，平均候选 {cands / n:.2f} / {len(pf.categories)} 个分类，"
+            f"确认 {hits / n:.2f}，{n / elapsed:.0f} 个/s",
+            file=sys.stderr,
+        )
+    return 0
+
+
+def cmd_overlap(args) -> int:
+    """每个分类的每条规则（取其裸域名）去问过滤器，候选再精确校验，统计分类两两共享的条数。"""
+    pf = GeoPrefilter.load(args.index)
+    sources = read_sources(args.src)
+    verifier = Verifier(args.src, cache=None)  # 离线分析，全部分类常驻
+    pos = {n: j for j, n in enumerate(pf.categories)}
+    pairs = Counter()
+    checked = 0
+    for name, lines in sources.items():
+        me = pos.get(name)
+        for line in lines:
+            k = rule_key(line)
+            if not k:
+                continue
+            got = set(pf.always)
+            pf.key_candidates(k, got)
+            got.discard(me)
+            for j in got:
+                checked += 1
+                other = pf.categories[j]
+                if verifier.contains(other, k):
+                    pairs[tuple(sorted((name, other)))] += 1
+    log(f"🔗 精确校验 {checked} 次，重叠分类对 {len(pairs)}")
+    for (a, b), n in pairs.most_common(args.top):
+        log(f"  {n:>8}  {a} <-> {b}")
+    return 0
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="bit-sliced Bloom prefilter over geosite categories")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("build", help="从 <分类>.txt 目录生成索引")
+    p.add_argument("src")
+    p.add_argument("-o", "--output", required=True)
+    p.add_argument("--fpr", default=PREFILTER_FPR, help="每个分类的目标误判率（auto 按分类数定）")
+    p.add_argument("--require-dir", default="", help="只收录这个目录里有同名产物（如 <分类>.mrs）的分类")
+    p.set_defaults(func=cmd_build)
+
+    p = sub.add_parser("check", help="校验无漏报并实测误判率")
+    p.add_argument("index")
+    p.add_argument("src")
+    p.add_argument("--samples", type=int, default=2000)
+    p.add_argument("--seed", type=int, default=20240601)
+    p.set_defaults(func=cmd_check)
+
+    p = sub.add_parser("query", help="批量分类（host 参数或 stdin 一行一个）")
+    p.add_argument("index")
+    p.add_argument("--verify", default="", help="<分类>.txt 目录；给了才做精确校验")
+    p.add_argument("hosts", nargs="*")
+    p.set_defaults(func=cmd_query)
+
+    p = sub.add_parser("overlap", help="分类两两重叠分析")
+    p.add_argument("index")
+    p.add_argument("src")
+    p.add_argument("--top", type=int, default=30)
+    p.set_defaults(func=cmd_overlap)
+
+    args = ap.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+极简 HTTP/1.1 连接池（只用标准库）：
+  - 按 (scheme, host, port) 复用 keep-alive 连接，避免每个条目都重新 TCP + TLS 握手
+  - 线程安全：多个线程可共用一个 HttpPool，各自借出/归还连接
+  - 跟随 3xx 重定向
+  - Accept-Encoding: gzip / deflate（装了 brotli 再加 br），透明解压
+  - 5xx / 429 / 超时 / 连接错误：指数退避 + 抖动重试
+
+不绑定任何域名，本地起个 http.server 就能当替身服务器测试。
+"""
+
+import http.client
+import random
+import socket
+import threading
+import time
+import zlib
+from urllib.parse import urljoin, urlsplit
+
+# br 是可选依赖：装了 brotli / brotlicffi 才声明支持
+try:
+    import brotli
+except Exception:
+    try:
+        import brotlicffi as brotli
+    except Exception:
+        brotli = None
+
+ACCEPT_ENCODING = "gzip, deflate, br" if brotli else "gzip, deflate"
+
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0",
+    "Connection": "keep-alive",
+    "Accept-Encoding": ACCEPT_ENCODING,
+}
+
+MAX_REDIRECTS = 5
+
+# 重试：第 n 次重试等待 uniform(0.5, 1.0) * min(BACKOFF_MAX, BACKOFF_BASE * 2**n)
+RETRIES = 3
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 8.0
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class HttpError(Exception):
+    """非 2xx 响应。"""
+
+    def __init__(self, url: str, status: int, reason: str = ""):
+        super().__init__(f"HTTP {status} {reason}: {url}".strip())
+        self.url = url
+        self.status = status
+
+
+def decode_body(body: bytes, encoding: str) -> bytes:
+    """按 Content-Encoding 解压；未知编码原样返回。"""
+    encoding = (encoding or "").strip().lower()
+    if not encoding or encoding == "identity":
+        return body
+    if encoding in ("gzip", "x-gzip"):
+        return zlib.decompress(body, 16 + zlib.MAX_WBITS)
+    if encoding == "deflate":
+        try:
+            return zlib.decompress(body)
+        except zlib.error:
+            # 有些服务端发的是裸 deflate（无 zlib 头）
+            return zlib.decompress(body, -zlib.MAX_WBITS)
+    if encoding == "br" and brotli is not None:
+        return brotli.decompress(body)
+    return body
+
+
+def backoff_delay(attempt: int, base: float = BACKOFF_BASE, cap: float = BACKOFF_MAX) -> float:
+    """指数退避 + 抖动（equal jitter）：避免一批请求同时失败后又同时重试。"""
+    d = min(cap, base * (2 ** attempt))
+    return d / 2 + random.uniform(0, d / 2)
+
+
+class HttpPool:
+    def __init__(
+        self,
+        timeout: float = 60,
+        max_idle_per_host: int = 8,
+        retries: int = RETRIES,
+        backoff_base: float = BACKOFF_BASE,
+        backoff_max: float = BACKOFF_MAX,
+    ):
+        self.timeout = timeout
+        self.max_idle_per_host = max_idle_per_host
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._idle = {}
+        self._lock = threading.Lock()
+        # 统计（给日志用）：新建连接 / 复用次数 / 重试次数 / 线上字节 / 解压后字节
+        self.created = 0
+        self.reused = 0
+        self.retried = 0
+        self.wire_bytes = 0
+        self.body_bytes = 0
+
+    # ---------- 连接借还 ----------
+
+    def _acquire(self, key, fresh: bool = False):
+        with self._lock:
+            conns = self._idle.get(key)
+            if conns and not fresh:
+                self.reused += 1
+                return conns.pop(), True
+            self.created += 1
+
+        scheme, host, port = key
+        if scheme == "https":
+            return http.client.HTTPSConnection(host, port, timeout=self.timeout), False
+        return http.client.HTTPConnection(host, port, timeout=self.timeout), False
+
+    def _release(self, key, conn) -> None:
+        with self._lock:
+            conns = self._idle.setdefault(key, [])
+            if len(conns) < self.max_idle_per_host:
+                conns.append(conn)
+                return
+        conn.close()
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for conns in idle.values():
+            for c in conns:
+                c.close()
+
+    # ---------- 请求 ----------
+
+    def _request_once(self, url: str, headers: dict):
+        """发一次请求，返回 (status, reason, headers, body)。复用的连接出错时换新连接重试一次。"""
+        parts = urlsplit(url)
+        scheme = (parts.scheme or "http").lower()
+        port = parts.port or (443 if scheme == "https" else 80)
+        key = (scheme, parts.hostname, port)
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+
+        hdrs = dict(DEFAULT_HEADERS)
+        hdrs.update(headers or {})
+
+        for attempt in (0, 1):
+            conn, reused = self._acquire(key, fresh=attempt > 0)
+            try:
+                conn.request("GET", path, headers=hdrs)
+                resp = conn.getresponse()
+                body = resp.read()
+            except (http.client.HTTPException, ConnectionError, OSError):
+                conn.close()
+                # 复用的空闲连接可能已被服务端关掉：第一次失败直接换新连接再来
+                if reused:
+                    continue
+                raise
+
+            if resp.will_close:
+                conn.close()
+            else:
+                self._release(key, conn)
+            return resp.status, resp.reason, resp.headers, body
+
+    def _get_no_retry(self, url: str, headers: dict = None) -> bytes:
+        for _ in range(MAX_REDIRECTS + 1):
+            status, reason, resp_headers, body = self._request_once(url, headers)
+            if status in (301, 302, 303, 307, 308) and resp_headers.get("Location"):
+                url = urljoin(url, resp_headers["Location"])
+                continue
+            if not 200 <= status < 300:
+                err = HttpError(url, status, reason)
+                err.retry_after = resp_headers.get("Retry-After")
+                raise err
+
+            data = decode_body(body, resp_headers.get("Content-Encoding"))
+            with self._lock:
+                self.wire_bytes += len(body)
+                self.body_bytes += len(data)
+            return data
+        raise HttpError(url, 310, "too many redirects")
+
+    def get(self, url: str, headers: dict = None, retries: int = None) -> bytes:
+        """
+        GET 并返回解压后的 body；5xx/429/超时/连接错误按退避策略重试。
+        retries 为 None 时用池的默认次数；调用方自己做冗余（如镜像对冲）时传 0。
+        """
+        max_retries = self.retries if retries is None else max(0, retries)
+        attempt = 0
+        while True:
+            try:
+                return self._get_no_retry(url, headers)
+            except HttpError as e:
+                if e.status not in RETRY_STATUS or attempt >= max_retries:
+                    raise
+                delay = backoff_delay(attempt, self.backoff_base, self.backoff_max)
+                # 服务端给了 Retry-After（秒）就听它的，但不超过上限
+                ra = getattr(e, "retry_after", None)
+                if ra and str(ra).strip().isdigit():
+                    delay = min(self.backoff_max, float(ra))
+            except (socket.timeout, TimeoutError, ConnectionError, http.client.HTTPException, OSError):
+                if attempt >= max_retries:
+                    raise
+                delay = backoff_delay(attempt, self.backoff_base, self.backoff_max)
+
+            attempt += 1
+            with self._lock:
+                self.retried += 1
+            time.sleep(delay)
+
+    def stats(self) -> str:
+        return (
+            f"新建 {self.created}，复用 {self.reused}，重试 {self.retried}，"
+            f"传输 {self.wire_bytes} bytes（解压后 {self.body_bytes} bytes）"
+        )
+
+    def get_text(self, url: str, headers: dict = None) -> str:
+        return self.get(url, headers).decode("utf-8", errors="ignore")
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+编译子进程统一入口（sing-box / mihomo）：
+  - 超时按条目数自适应：base + entries/1000 * per_1k，封顶 max
+  - 每个子进程单独设 RLIMIT_AS / RLIMIT_CPU（启动后用 prlimit 设置），防止一个病态输入拖垮整个构建
+  - 子进程放进独立进程组，超时先 SIGTERM 整组，宽限后 SIGKILL
+  - 记录每个 job 的耗时与峰值 RSS（wait4 的 ru_maxrss），构建结束打印汇总
+
+注意：Go 程序启动时会预留较多虚拟地址空间，RLIMIT_AS 不要设得太小；
+JOB_MEM_LIMIT_MB=0 表示不限制。
+"""
+
+import json
+import os
+import resource
+import signal
+import subprocess
+import threading
+import time
+
+JOB_TIMEOUT_BASE = float(os.getenv("JOB_TIMEOUT_BASE", "60"))
+JOB_TIMEOUT_PER_1K = float(os.getenv("JOB_TIMEOUT_PER_1K", "2"))
+JOB_TIMEOUT_MAX = float(os.getenv("JOB_TIMEOUT_MAX", "1800"))
+JOB_MEM_LIMIT_MB = int(os.getenv("JOB_MEM_LIMIT_MB", "4096"))
+JOB_KILL_GRACE = float(os.getenv("JOB_KILL_GRACE", "5"))
+JOB_REPORT = os.getenv("JOB_REPORT", "")
+
+
+def adaptive_timeout(entries: int = 0) -> float:
+    """按条目数估算超时（秒）。"""
+    t = JOB_TIMEOUT_BASE + max(0, entries) / 1000.0 * JOB_TIMEOUT_PER_1K
+    return min(JOB_TIMEOUT_MAX, t)
+
+
+class JobResult:
+    def __init__(self, cmd, label: str):
+        self.cmd = list(cmd)
+        self.label = label
+        self.entries = 0
+        self.timeout = 0.0
+        self.returncode = None
+        self.stdout = ""
+        self.stderr = ""
+        self.duration = 0.0
+        self.peak_rss_kb = 0
+        self.timed_out = False
+
+    @property
+    def ok(self) -> bool:
+        return self.returncode == 0 and not self.timed_out
+
+    def as_dict(self) -> dict:
+        return {
+            "label": self.label,
+            "cmd": self.cmd,
+            "entries": self.entries,
+            "timeout": round(self.timeout, 1),
+            "returncode": self.returncode,
+            "timed_out": self.timed_out,
+            "duration": round(self.duration, 3),
+            "peak_rss_kb": self.peak_rss_kb,
+        }
+
+
+class JobReport:
+    """收集所有 job 结果（线程安全），构建结束时汇总。"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.results = []
+
+    def add(self, r: JobResult) -> None:
+        with self._lock:
+            self.results.append(r)
+
+    def log_summary(self, log, top: int = 10) -> None:
+        with self._lock:
+            results = list(self.results)
+        if not results:
+            return
+
+        total = sum(r.duration for r in results)
+        failed = sum(1 for r in results if not r.ok)
+        timed_out = sum(1 for r in results if r.timed_out)
+        peak = max(r.peak_rss_kb for r in results)
+        log(
+            f"\n⏱️ jobs: {len(results)}，失败 {failed}（超时 {timed_out}），"
+            f"累计耗时 {total:.1f}s，最大峰值 RSS {peak / 1024:.1f} MB"
+        )
+        for r in sorted(results, key=lambda x: x.duration, reverse=True)[:top]:
+            state = "TIMEOUT" if r.timed_out else r.returncode
+            log(
+                f"    {r.duration:7.2f}s  {r.peak_rss_kb / 1024:7.1f} MB  "
+                f"entries={r.entries:<7} rc={state}  {r.label}"
+            )
+
+        if JOB_REPORT:
+            with open(JOB_REPORT, "w", encoding="utf-8") as f:
+                json.dump([r.as_dict() for r in results], f, ensure_ascii=False, indent=2)
+            log(f"    📝 job report: {JOB_REPORT}")
+
+
+REPORT = JobReport()
+
+
+def _limit_child(pid: int, mem_limit_mb: int, cpu_seconds: int) -> None:
+    """
+    子进程启动后用 prlimit 设置资源上限。
+    不用 preexec_fn：流水线在线程池里调 run_job，有线程时 fork 后跑 Python 代码可能死锁。
+    """
+    try:
+        if mem_limit_mb > 0:
+            lim = mem_limit_mb * 1024 * 1024
+            resource.prlimit(pid, resource.RLIMIT_AS, (lim, lim))
+        if cpu_seconds > 0:
+            # 软限到了发 SIGXCPU，硬限多给几秒再 SIGKILL
+            resource.prlimit(pid, resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds + 5))
+    except (ProcessLookupError, PermissionError, OSError, ValueError):
+        pass
+
+
+def _drain(stream, sink: list) -> None:
+    for chunk in iter(lambda: stream.read(65536), b""):
+        sink.append(chunk)
+    stream.close()
+
+
+def _kill_group(pid: int, sig) -> None:
+    try:
+        os.killpg(pid, sig)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def run_job(
+    cmd,
+    entries: int = 0,
+    timeout: float = None,
+    label: str = "",
+    mem_limit_mb: int = None,
+    report: JobReport = REPORT,
+) -> JobResult:
+    """
+    运行一个编译子进程并等待结束（不抛异常，结果看 JobResult；程序不存在 / 无法执行时 returncode=127）。
+    timeout 为 None 时按 entries 自适应；CPU 上限跟随超时。
+    """
+    r = JobResult(cmd, label or os.path.basename(str(cmd[0])))
+    r.entries = entries
+    r.timeout = timeout if timeout is not None else adaptive_timeout(entries)
+    mem = JOB_MEM_LIMIT_MB if mem_limit_mb is None else mem_limit_mb
+
+    t0 = time.monotonic()
+    try:
+        p = subprocess.Popen(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            start_new_session=True,
+        )
+    except OSError as e:
+        r.returncode = 127
+        r.stderr = f"{type(e).__name__}: {e}"
+        r.duration = time.monotonic() - t0
+        if report is not None:
+            report.add(r)
+        return r
+    _limit_child(p.pid, mem, int(r.timeout) + 1)
+    out, err = [], []
+    readers = [
+        threading.Thread(target=_drain, args=(p.stdout, out), daemon=True),
+        threading.Thread(target=_drain, args=(p.stderr, err), daemon=True),
+    ]
+    for t in readers:
+        t.start()
+
+    # 用 waitid(WNOWAIT) 观察退出但先不回收：子进程还是僵尸时进程组号不会被复用，
+    # 可以安全地 killpg 清理残留孙进程；最后再 wait4 回收并拿 rusage（峰值 RSS）
+    deadline = t0 + r.timeout
+    kill_at = None
+    delay = 0.005
+    while os.waitid(os.P_PID, p.pid, os.WEXITED | os.WNOHANG | os.WNOWAIT) is None:
+        now = time.monotonic()
+        if kill_at is None and now >= deadline:
+            r.timed_out = True
+            _kill_group(p.pid, signal.SIGTERM)
+            kill_at = now + JOB_KILL_GRACE
+        elif kill_at is not None and now >= kill_at:
+            _kill_group(p.pid, signal.SIGKILL)
+        time.sleep(delay)
+        delay = min(0.1, delay * 2)
+
+    _kill_group(p.pid, signal.SIGKILL)
+    _, status, ru = os.wait4(p.pid, 0)
+    p.returncode = os.waitstatus_to_exitcode(status)
+    for t in readers:
+        t.join(timeout=JOB_KILL_GRACE)
+
+    r.returncode = p.returncode
+    r.duration = time.monotonic() - t0
+    r.peak_rss_kb = ru.ru_maxrss
+    r.stdout = b"".join(out).decode("utf-8", errors="ignore")
+    r.stderr = b"".join(err).decode("utf-8", errors="ignore")
+
+    if report is not None:
+        report.add(r)
+    return r
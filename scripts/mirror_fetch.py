@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多镜像 + 对冲请求（hedged request）拉取 manifest 源：
+一个 jsDelivr 边缘节点慢 / 挂了，不应该让 STRICT 模式把这个 name 的产物删掉。
+
+remote-rules.json 每个条目可选：
+  "mirrors": ["https://...", ...]   备用地址（和 url 内容相同）
+  "mirrors": "auto"                 按 url 自动推导 jsDelivr / GitHub 镜像（见 auto_mirrors）
+  "mirrors": []                     不用镜像
+  不写时按 MIRROR_AUTO（默认 1）等同 "auto"。
+
+拉取流程：
+  1) 候选地址按历史表现排序（EWMA 延迟 × 失败惩罚，越小越靠前；没数据的保持 manifest 顺序）
+  2) 先请求第一个；超过对冲延迟还没返回，就并发请求下一个，依此类推
+     （对冲延迟：HEDGE_DELAY 秒；"auto" 时取该地址 EWMA 延迟的 2 倍，夹在 [HEDGE_MIN, HEDGE_MAX]）
+  3) 某个地址直接失败，立刻换下一个，不等延迟
+  4) 先返回非空内容的那个胜出；全都失败才抛错
+慢的请求不会被打断，结束后照样计入统计。统计存 remote-state/mirrors.json，下次构建沿用。
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+from urllib.parse import urlsplit
+
+MIRROR_AUTO = os.getenv("MIRROR_AUTO", "1").strip() not in ("0", "false", "no", "off")
+HEDGE_DELAY = os.getenv("HEDGE_DELAY", "auto").strip().lower()
+HEDGE_MIN = float(os.getenv("HEDGE_MIN", "1.5"))
+HEDGE_MAX = float(os.getenv("HEDGE_MAX", "10"))
+HEDGE_WORKERS = int(os.getenv("HEDGE_WORKERS", "16"))
+
+EWMA_ALPHA = 0.3
+# 失败一次相当于慢这么多倍（按失败率折算）
+FAIL_PENALTY = 4.0
+
+_JSDELIVR_GH = re.compile(r"^https?://(?:cdn|fastly|testingcf|gcore)\.jsdelivr\.net/gh/([^/]+)/([^/@]+)(?:@([^/]+))?/(.+)$")
+_RAW_GH = re.compile(r"^https?://raw\.githubusercontent\.com/([^/]+)/([^/]+)/([^/]+)/(.+)$")
+
+
+def log(msg: str) -> None:
+    print(msg, flush=True)
+
+
+def host_of(url: str) -> str:
+    return (urlsplit(url).hostname or "").lower()
+
+
+def auto_mirrors(url: str) -> list:
+    """
+    jsDelivr（gh）/ raw.githubusercontent.com 的地址互相推导：
+      cdn / fastly / testingcf.jsdelivr.net 三个 CDN + GitHub raw。
+    其它地址没有可推导的镜像，返回 []。
+    """
+    m = _JSDELIVR_GH.match(url)
+    if m:
+        user, repo, ref, path = m.groups()
+    else:
+        m = _RAW_GH.match(url)
+        if not m:
+            return []
+        user, repo, ref, path = m.groups()
+
+    at = f"@{ref}" if ref else ""
+    candidates = [
+        f"https://cdn.jsdelivr.net/gh/{user}/{repo}{at}/{path}",
+        f"https://fastly.jsdelivr.net/gh/{user}/{repo}{at}/{path}",
+        f"https://testingcf.jsdelivr.net/gh/{user}/{repo}{at}/{path}",
+        f"https://raw.githubusercontent.com/{user}/{repo}/{ref or 'HEAD'}/{path}",
+    ]
+    return [u for u in candidates if u != url]
+
+
+def candidate_urls(url: str, mirrors=None) -> list:
+    """manifest 条目 -> 去重后的候选地址（url 在最前）。"""
+    if mirrors is None:
+        mirrors = "auto" if MIRROR_AUTO else []
+    if mirrors == "auto":
+        extra = auto_mirrors(url)
+    elif isinstance(mirrors, str):
+        extra = [mirrors]
+    elif isinstance(mirrors, list):
+        extra = [m for m in mirrors if isinstance(m, str)]
+    else:
+        extra = []
+    out = []
+    for u in [url] + extra:
+        u = u.strip()
+        if u and u not in out:
+            out.append(u)
+    return out
+
+
+class MirrorStats:
+    """按 host 记录 EWMA 延迟 / 成功 / 失败，按 URL 记录 EWMA 延迟（算对冲延迟用）。"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.hosts = {}
+        self.urls = {}
+        self._lock = threading.Lock()
+
+    def load(self) -> None:
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            data = {}
+        if isinstance(data, dict):
+            self.hosts = data.get("hosts") if isinstance(data.get("hosts"), dict) else {}
+            self.urls = data.get("urls") if isinstance(data.get("urls"), dict) else {}
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        with self._lock:
+            data = {"hosts": dict(sorted(self.hosts.items())), "urls": dict(sorted(self.urls.items()))}
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        os.replace(tmp, self.path)
+
+    @staticmethod
+    def _ewma(old, value: float) -> float:
+        return value if not isinstance(old, (int, float)) else old + EWMA_ALPHA * (value - old)
+
+    def observe(self, url: str, ok: bool, latency: float) -> None:
+        with self._lock:
+            h = self.hosts.setdefault(host_of(url), {"ok": 0, "fail": 0})
+            if ok:
+                h["ok"] = h.get("ok", 0) + 1
+                h["ewma"] = round(self._ewma(h.get("ewma"), latency), 3)
+                self.urls[url] = round(self._ewma(self.urls.get(url), latency), 3)
+            else:
+                h["fail"] = h.get("fail", 0) + 1
+
+    def score(self, url: str):
+        """越小越好；没有成功记录的 host 返回 None（排序时保持原顺序）。"""
+        h = self.hosts.get(host_of(url)) or {}
+        ewma = h.get("ewma")
+        if not isinstance(ewma, (int, float)):
+            return None
+        total = h.get("ok", 0) + h.get("fail", 0)
+        fail_rate = h.get("fail", 0) / total if total else 0.0
+        return ewma * (1 + FAIL_PENALTY * fail_rate)
+
+    def order(self, urls: list) -> list:
+        """有数据的按分数排在前面，没数据的按原顺序垫后（但 manifest 主地址没数据时仍排第一）。"""
+        scored = [(self.score(u), i, u) for i, u in enumerate(urls)]
+        if scored and scored[0][0] is None:
+            return list(urls)
+        known = sorted((s, i, u) for s, i, u in scored if s is not None)
+        unknown = [u for s, i, u in scored if s is None]
+        return [u for _, _, u in known] + unknown
+
+    def hedge_delay(self, url: str) -> float:
+        if HEDGE_DELAY != "auto":
+            try:
+                return max(0.0, float(HEDGE_DELAY))
+            except ValueError:
+                pass
+        ewma = self.urls.get(url)
+        if not isinstance(ewma, (int, float)):
+            return HEDGE_MAX
+        return min(HEDGE_MAX, max(HEDGE_MIN, 2 * ewma))
+
+
+class HedgedFetcher:
+    def __init__(self, pool, stats: MirrorStats, max_workers: int = HEDGE_WORKERS):
+        self.pool = pool
+        self.stats = stats
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers))
+        self._lock = threading.Lock()
+        self.hedged = 0
+        self.failover = 0
+        self.won_by_mirror = 0
+
+    def _timed_get(self, url: str, remaining: int):
+        t0 = time.monotonic()
+        try:
+            # 后面还有候选时不在这个镜像上重试退避，慢 / 失败交给对冲和故障转移；
+            # 最后一个（或唯一的）候选没有退路，按连接池默认次数重试
+            data = self.pool.get(url, retries=0) if remaining > 0 else self.pool.get(url)
+        except Exception as e:
+            self.stats.observe(url, False, time.monotonic() - t0)
+            return url, None, e
+        self.stats.observe(url, True, time.monotonic() - t0)
+        return url, data, None
+
+    def fetch(self, urls: list, label: str = ""):
+        """按对冲策略拉取，返回 (body bytes, 实际使用的 url)。"""
+        urls = self.stats.order(urls)
+        pending = set()
+        launched = 0
+        errors = []
+        empty = None
+
+        def launch():
+            nonlocal launched
+            pending.add(self._executor.submit(self._timed_get, urls[launched], len(urls) - launched - 1))
+            launched += 1
+
+        launch()
+        while pending:
+            timeout = self.stats.hedge_delay(urls[launched - 1]) if launched < len(urls) else None
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                log(f"    🏁 [{label}] {host_of(urls[launched - 1])} {timeout:.1f}s 未返回，对冲请求 {host_of(urls[launched])}")
+                with self._lock:
+                    self.hedged += 1
+                launch()
+                continue
+            failed_now = False
+            for f in done:
+                pending.discard(f)
+                url, data, err = f.result()
+                if err is not None:
+                    errors.append(f"{host_of(url)}: {err}")
+                    failed_now = True
+                    continue
+                if data.strip():
+                    if url != urls[0]:
+                        with self._lock:
+                            self.won_by_mirror += 1
+                        log(f"    🪞 [{label}] 使用镜像 {url}")
+                    return data, url
+                # 空内容：先记下，看别的镜像有没有内容；都没有再当作真的为空
+                empty = empty if empty is not None else (data, url)
+            if launched < len(urls) and (failed_now or not pending):
+                log(f"    ↪️ [{label}] {errors[-1] if errors else '内容为空'}，切换 {host_of(urls[launched])}")
+                with self._lock:
+                    self.failover += 1
+                launch()
+
+        if empty is not None:
+            return empty
+        raise RuntimeError("所有镜像都失败: " + "; ".join(errors))
+
+    def close(self) -> None:
+        """等还在跑的慢请求结束（它们的延迟也要进统计）。"""
+        self._executor.shutdown(wait=True)
+
+    def summary(self) -> str:
+        return f"对冲 {self.hedged}，失败切换 {self.failover}，镜像胜出 {self.won_by_mirror}"
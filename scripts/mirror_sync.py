@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+目录增量同步：把上游目录（clone 下来的 rule-set 分支 / 本轮编译出的产物）同步到仓库目录，
+代替 “rm -rf + cp”：
+
+  - 大小不同直接算变化；大小相同再并行比 sha256
+  - 只重写变化 / 新增的文件（先写 .tmp 再 os.replace），没变的文件连 mtime 都不动
+  - 只删除上游已经没有的文件；--keep 的文件（如 index.json）永远不动
+  - 最后打印变化摘要（--summary 另存 JSON）
+
+用法：
+  python3 scripts/mirror_sync.py SRC DST [--include '*.srs' ...] [--keep index.json ...]
+                                 [--jobs N] [--dry-run] [--summary out.json] [--allow-empty]
+
+SRC 里没有任何匹配文件时默认拒绝同步（多半是上游 clone / 编译失败），避免把 DST 清空。
+"""
+
+import argparse
+import fnmatch
+import hashlib
+import json
+import os
+import shutil
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+SKIP_DIRS = {".git"}
+SHOW_NAMES = 20
+
+
+def log(msg: str) -> None:
+    print(msg, flush=True)
+
+
+def sha256_file(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def list_files(root: Path, include, keep) -> dict:
+    """root 下匹配 include 的文件 -> {相对路径: 大小}；跳过 .git 和 keep。"""
+    out = {}
+    if not root.is_dir():
+        return out
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if d not in SKIP_DIRS]
+        for fn in filenames:
+            if fn in keep or fn.endswith(".tmp"):
+                continue
+            if include and not any(fnmatch.fnmatch(fn, p) for p in include):
+                continue
+            p = Path(dirpath) / fn
+            out[p.relative_to(root).as_posix()] = p.stat().st_size
+    return out
+
+
+def copy_atomic(src: Path, dst: Path) -> None:
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dst.with_name(dst.name + ".tmp")
+    shutil.copyfile(src, tmp)
+    os.replace(tmp, dst)
+
+
+def prune_empty_dirs(root: Path) -> None:
+    for dirpath, dirnames, filenames in os.walk(root, topdown=False):
+        p = Path(dirpath)
+        if p != root and not any(p.iterdir()):
+            p.rmdir()
+
+
+def sync(src, dst, include=(), keep=("index.json",), jobs: int = 0, dry_run: bool = False) -> dict:
+    """
+    同步 src -> dst，返回摘要：
+      {"added": [...], "changed": [...], "removed": [...], "unchanged": n, "bytes_written": n}
+    """
+    src, dst = Path(src), Path(dst)
+    keep = set(keep or ())
+    src_files = list_files(src, include, keep)
+    dst_files = list_files(dst, include, keep)
+
+    added = sorted(set(src_files) - set(dst_files))
+    removed = sorted(set(dst_files) - set(src_files))
+    common = sorted(set(src_files) & set(dst_files))
+
+    changed = [r for r in common if src_files[r] != dst_files[r]]
+    same_size = [r for r in common if src_files[r] == dst_files[r]]
+
+    # 大小相同的才需要比哈希；读文件 + sha256 都会释放 GIL，线程池就够了
+    def differs(rel: str) -> bool:
+        return sha256_file(src / rel) != sha256_file(dst / rel)
+
+    workers = jobs or min(32, (os.cpu_count() or 2) * 4)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as ex:
+        changed += [r for r, d in zip(same_size, ex.map(differs, same_size)) if d]
+    changed.sort()
+
+    written = 0
+    if not dry_run:
+        for rel in added + changed:
+            copy_atomic(src / rel, dst / rel)
+            written += src_files[rel]
+        for rel in removed:
+            (dst / rel).unlink()
+        if removed and dst.is_dir():
+            prune_empty_dirs(dst)
+
+    return {
+        "added": added,
+        "changed": changed,
+        "removed": removed,
+        "unchanged": len(common) - len(changed),
+        "bytes_written": written,
+        "dry_run": dry_run,
+    }
+
+
+def describe(dst, summary: dict) -> str:
+    lines = [
+        f"🔁 {dst}: 新增 {len(summary['added'])}，变化 {len(summary['changed'])}，"
+        f"删除 {len(summary['removed'])}，未变 {summary['unchanged']}，"
+        f"写入 {summary['bytes_written']} bytes" + ("（dry-run）" if summary["dry_run"] else "")
+    ]
+    for key, mark in (("added", "+"), ("changed", "~"), ("removed", "-")):
+        names = summary[key]
+        for n in names[:SHOW_NAMES]:
+            lines.append(f"    {mark} {n}")
+        if len(names) > SHOW_NAMES:
+            lines.append(f"    {mark} ... 另有 {len(names) - SHOW_NAMES} 个")
+    return "\n".join(lines)
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="incrementally mirror SRC into DST by size + sha256")
+    ap.add_argument("src")
+    ap.add_argument("dst")
+    ap.add_argument("--include", action="append", help="只同步匹配的文件名（glob，可多次），默认全部")
+    ap.add_argument("--keep", action="append", help="DST 里永远不动的文件名（可多次），默认 index.json")
+    ap.add_argument("--jobs", type=int, default=0, help="比对哈希的并发数")
+    ap.add_argument("--dry-run", action="store_true", help="只打印变化，不写盘")
+    ap.add_argument("--summary", default="", help="把摘要另存为 JSON")
+    ap.add_argument("--allow-empty", action="store_true", help="SRC 为空时也同步（会清空 DST）")
+    args = ap.parse_args(argv)
+
+    include = tuple(args.include or ())
+    keep = tuple(args.keep or ("index.json",))
+    if not args.allow_empty and not list_files(Path(args.src), include, set(keep)):
+        log(f"❌ {args.src} 里没有匹配的文件，拒绝同步（避免清空 {args.dst}；确需如此加 --allow-empty）")
+        return 1
+
+    summary = sync(args.src, args.dst, include, keep, args.jobs, args.dry_run)
+    log(describe(args.dst, summary))
+    if args.summary:
+        with open(args.summary, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
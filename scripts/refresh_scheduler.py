@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+按条目调度刷新：广告列表一天变好几次，Loy-private / Loy-icloud 一个月才变一次，
+没必要每次 cron 都全部重拉重编。
+
+remote-rules.json 每个条目可选：
+  "refresh":  "6h" / "1d" / "30d" / 秒数（基准刷新间隔，缺省 SCHEDULE_DEFAULT_REFRESH）
+  "priority": 整数，越大越先处理（缺省 50）
+
+状态文件 remote-state/schedule.json：
+  {"<name>": {"entry": "...", "interval": 秒, "last_fetch": ts, "last_change": ts,
+              "source_sha256": "...", "fetches": n, "changes": n}}
+
+自适应间隔：每次拉取后，内容变了就把间隔减半，没变就乘 1.5，
+限制在 [基准/4, 基准*4] 且不低于 SCHEDULE_MIN_INTERVAL。
+拉取失败不更新状态，下一轮还会被选中。
+"""
+
+import json
+import os
+import re
+import time
+from pathlib import Path
+
+SCHEDULE_DEFAULT_REFRESH = os.getenv("SCHEDULE_DEFAULT_REFRESH", "1d")
+SCHEDULE_MIN_INTERVAL = os.getenv("SCHEDULE_MIN_INTERVAL", "1h")
+# cron 本身有抖动：差这么一点就到期的也算到期，免得被推迟一整轮
+SCHEDULE_SLACK = os.getenv("SCHEDULE_SLACK", "15m")
+DEFAULT_PRIORITY = 50
+
+ADAPT_SHRINK = 0.5
+ADAPT_GROW = 1.5
+ADAPT_RANGE = 4
+
+_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+_DURATION = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([smhdw]?)\s*$", re.IGNORECASE)
+
+
+def parse_duration(value, default: float = 0) -> float:
+    """"6h" / "1d" / 3600 -> 秒；解析不了返回 default。"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value) if value > 0 else default
+    m = _DURATION.match(str(value or ""))
+    if not m:
+        return default
+    seconds = float(m.group(1)) * _UNITS[(m.group(2) or "s").lower()]
+    return seconds if seconds > 0 else default
+
+
+def format_duration(seconds: float) -> str:
+    for unit, size in (("d", 86400), ("h", 3600), ("m", 60)):
+        if seconds >= size:
+            return f"{seconds / size:.1f}{unit}".replace(".0" + unit, unit)
+    return f"{int(seconds)}s"
+
+
+class RefreshScheduler:
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.state = {}
+        self.min_interval = parse_duration(SCHEDULE_MIN_INTERVAL, 3600)
+        self.slack = parse_duration(SCHEDULE_SLACK, 0)
+        self.default_refresh = parse_duration(SCHEDULE_DEFAULT_REFRESH, 86400)
+
+    # ---------- 读 / 写 ----------
+
+    def load(self) -> int:
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            data = {}
+        self.state = {k: v for k, v in data.items() if isinstance(v, dict)} if isinstance(data, dict) else {}
+        return len(self.state)
+
+    def save(self, valid_names=None) -> None:
+        """原子写回；valid_names 给了就顺手清掉 manifest 里已删除的条目。"""
+        if valid_names is not None:
+            valid = set(valid_names)
+            self.state = {k: v for k, v in self.state.items() if k in valid}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(dict(sorted(self.state.items())), f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        os.replace(tmp, self.path)
+
+    # ---------- 调度 ----------
+
+    def base_interval(self, item: dict) -> float:
+        return max(self.min_interval, parse_duration(item.get("refresh"), self.default_refresh))
+
+    @staticmethod
+    def priority(item: dict) -> int:
+        try:
+            return int(item.get("priority", DEFAULT_PRIORITY))
+        except (TypeError, ValueError):
+            return DEFAULT_PRIORITY
+
+    def interval(self, name: str, item: dict) -> float:
+        base = self.base_interval(item)
+        cur = (self.state.get(name) or {}).get("interval")
+        if not isinstance(cur, (int, float)) or cur <= 0:
+            return base
+        return min(max(cur, base / ADAPT_RANGE, self.min_interval), base * ADAPT_RANGE)
+
+    def overdue(self, name: str, entry: str, item: dict, now: float) -> float:
+        """
+        到期程度：(距上次拉取的时间 + slack) / 间隔，>= 1 即到期。
+        没有记录、或 manifest 条目改过（url / format 变了）视为无限到期。
+        """
+        st = self.state.get(name) or {}
+        if st.get("entry") != entry or not st.get("last_fetch"):
+            return float("inf")
+        return (now - st["last_fetch"] + self.slack) / self.interval(name, item)
+
+    def select(self, units: list, items: dict, entries: dict, now: float = None):
+        """
+        units: [(name, url, format)]；items: {name: manifest 条目}；entries: {name: 条目指纹}
+        返回 (到期单元（最紧急的在前）, 未到期 [(name, 下次到期的剩余秒数)])。
+        排序：priority 大的在前，同优先级按到期程度。
+        """
+        now = time.time() if now is None else now
+        due, waiting = [], []
+        for unit in units:
+            name = unit[0]
+            item = items.get(name) or {}
+            score = self.overdue(name, entries[name], item, now)
+            if score >= 1:
+                due.append((-self.priority(item), -score, name, unit))
+            else:
+                st = self.state[name]
+                left = st["last_fetch"] + self.interval(name, item) - self.slack - now
+                waiting.append((name, left))
+        due.sort(key=lambda x: x[:3])
+        return [d[3] for d in due], sorted(waiting, key=lambda x: x[1])
+
+    def record(self, name: str, entry: str, item: dict, source_sha256: str, now: float = None) -> str:
+        """
+        一次成功拉取后更新状态并调整间隔，返回一行说明。
+        source_sha256 为空（拉取失败）时不记录，下一轮重试。
+        """
+        if not source_sha256:
+            return ""
+        now = time.time() if now is None else now
+        st = self.state.get(name) or {}
+        same_entry = st.get("entry") == entry
+        base = self.base_interval(item)
+        cur = self.interval(name, item) if same_entry else base
+
+        if not same_entry or not st.get("source_sha256"):
+            changed = True
+            new_interval = base
+        else:
+            changed = st["source_sha256"] != source_sha256
+            new_interval = cur * (ADAPT_SHRINK if changed else ADAPT_GROW)
+        new_interval = min(max(new_interval, base / ADAPT_RANGE, self.min_interval), base * ADAPT_RANGE)
+
+        self.state[name] = {
+            "entry": entry,
+            "interval": int(new_interval),
+            "last_fetch": int(now),
+            "last_change": int(now) if changed else st.get("last_change", int(now)),
+            "source_sha256": source_sha256,
+            "fetches": (st.get("fetches", 0) if same_entry else 0) + 1,
+            "changes": (st.get("changes", 0) if same_entry else 0) + (1 if changed else 0),
+        }
+        return f"{'有变化' if changed else '无变化'}，下次间隔 {format_duration(new_interval)}"
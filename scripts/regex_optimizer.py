@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+DOMAIN-REGEX 优化：客户端上 regex 是最慢的匹配器，而且每个连接都要跑一遍。
+能等价改写的就改写成更便宜的匹配器（按 sing-box 的语义）：
+
+  ^(.+\\.)?example\\.com$  /  (^|\\.)example\\.com$   -> domain_suffix "example.com"（自身 + 子域）
+  ^.+\\.example\\.com$     /  \\.example\\.com$       -> domain_suffix ".example.com"（仅子域）
+  ^example\\.com$                                  -> domain "example.com"
+  example  /  .*example.*                          -> domain_keyword "example"
+
+剩下的 regex 在安全时合并成一条 (?:a)|(?:b)|...（分批，每批最多 REGEX_MERGE_MAX 条）。
+
+每一处改写 / 合并都会在生成的测试域名上和原 regex 逐条比对，
+结果不一致就放弃这一处改写，保留原 regex。
+校验用的是 Python re，客户端跑的是 Go RE2：两边语义不同的写法（环视、反向引用、\\A \\Z \\z）
+校验结果不可信，直接原样保留，既不改写也不合并。
+"""
+
+import os
+import random
+import re
+
+REGEX_OPTIMIZE = os.getenv("REGEX_OPTIMIZE", "1").strip() not in ("0", "false", "no", "off")
+REGEX_MERGE_MAX = int(os.getenv("REGEX_MERGE_MAX", "32"))
+
+# 自身 + 子域；前面不带 ^ 的两种写法自己就带了“开头”
+_SELF_OR_SUB_ANCHORED = ("(.+\\.)?", "(.*\\.)?", "(?:.+\\.)?", "(?:.*\\.)?")
+_SELF_OR_SUB_FREE = ("(^|\\.)", "(?:^|\\.)")
+# 仅子域
+_SUB_ANCHORED = (".+\\.", ".*\\.")
+
+_LITERAL_CHARS = set("abcdefghijklmnopqrstuvwxyz0123456789-_")
+_LITERAL_ESCAPES = {"\\.": ".", "\\-": "-", "\\_": "_"}
+
+# Python re 与 Go RE2 语义不同：反向引用、环视、\A \Z \z（RE2 不支持前两者，留给 sing-box 报错）
+_RE2_DIVERGENT = re.compile(r"\\[1-9]|\(\?[=!<]|\(\?P=|\\[AZz]")
+# 合并前另外排除：命名组、内联 flag（合并后作用域会变）
+_UNSAFE_TO_MERGE = re.compile(r"\(\?P|\(\?[a-zA-Z]+\)")
+
+_RANDOM_HOSTS_N = 64
+
+
+def _literal(body: str):
+    """把只含转义点和普通域名字符的 regex 片段还原成字面量；否则返回 None。"""
+    out = []
+    i = 0
+    while i < len(body):
+        c = body[i]
+        if c == "\\":
+            lit = _LITERAL_ESCAPES.get(body[i:i + 2])
+            if lit is None:
+                return None
+            out.append(lit)
+            i += 2
+            continue
+        if c not in _LITERAL_CHARS:
+            return None
+        out.append(c)
+        i += 1
+    return "".join(out) or None
+
+
+def classify(pattern: str):
+    """
+    返回 (kind, value)，kind 为 "domain" / "suffix" / "keyword"；不能改写返回 None。
+    suffix 的 value 带前导点表示仅子域，不带表示自身 + 子域（sing-box 语义）。
+    """
+    s = pattern.strip()
+    start = s.startswith("^")
+    if start:
+        s = s[1:]
+    end = s.endswith("$") and not s.endswith("\\$")
+    if end:
+        s = s[:-1]
+    # 尾部 ".*" 等于不锚定结尾
+    if s.endswith(".*") and not s.endswith("\\.*"):
+        s = s[:-2]
+        end = False
+
+    scope = None
+    if start:
+        for g in _SELF_OR_SUB_ANCHORED:
+            if s.startswith(g):
+                scope, s = "self_or_sub", s[len(g):]
+                break
+        else:
+            for g in _SUB_ANCHORED:
+                if s.startswith(g):
+                    scope, s = "sub", s[len(g):]
+                    break
+            else:
+                if s.startswith(".*"):
+                    s, start = s[2:], False
+    else:
+        for g in _SELF_OR_SUB_FREE:
+            if s.startswith(g):
+                scope, s = "self_or_sub", s[len(g):]
+                break
+        else:
+            if s.startswith("\\."):
+                scope, s = "sub", s[2:]
+            elif s.startswith(".*"):
+                s = s[2:]
+
+    lit = _literal(s)
+    if lit is None:
+        return None
+
+    if scope == "self_or_sub" and end:
+        return "suffix", lit
+    if scope == "sub" and end:
+        return "suffix", "." + lit
+    if scope is None and start and end:
+        return "domain", lit
+    if scope is None and not start and not end:
+        return "keyword", lit
+    return None
+
+
+# ========= 参考匹配（sing-box 语义）与测试域名 =========
+
+def matches(kind: str, value: str, host: str) -> bool:
+    if kind == "domain":
+        return host == value
+    if kind == "keyword":
+        return value in host
+    if value.startswith("."):
+        return host.endswith(value)
+    return host == value or host.endswith("." + value)
+
+
+def _random_hosts(n: int, seed: int = 20240601) -> list:
+    rnd = random.Random(seed)
+    alphabet = "abcdefghijklmnopqrstuvwxyz0123456789-"
+    out = []
+    for _ in range(n):
+        labels = [
+            "".join(rnd.choice(alphabet) for _ in range(rnd.randint(1, 8)))
+            for _ in range(rnd.randint(1, 4))
+        ]
+        out.append(".".join(labels + [rnd.choice(("com", "net", "cn", "io"))]))
+    return out
+
+
+_RANDOM_HOSTS = _random_hosts(_RANDOM_HOSTS_N)
+
+
+def probe_hosts(text: str) -> list:
+    """围绕一个字面量生成边界测试域名：自身、子域、前后粘连、截断等（都是合法域名写法）。"""
+    t = text.lstrip(".")
+    if not t:
+        return []
+    return [
+        t, "a." + t, "a.b." + t, "x" + t, "x-" + t, t + ".x", t + "x",
+        "x" + t + "x", "a." + t + ".b", t[1:], t[:-1], t.replace(".", "x"),
+        t.upper(),
+    ]
+
+
+def _fragments(pattern: str) -> list:
+    """从任意 regex 里抠出字面片段，用来给合并校验造测试域名。"""
+    return [f.replace("\\", "") for f in re.findall(r"(?:\\.|[a-z0-9-])+", pattern) if len(f) > 2]
+
+
+def _equivalent(regex, kind: str, value: str, hosts) -> bool:
+    return all(bool(regex.search(h)) == matches(kind, value, h) for h in hosts)
+
+
+# ========= 主入口 =========
+
+class RegexPlan:
+    def __init__(self):
+        self.domain = set()
+        self.suffix = set()
+        self.keyword = set()
+        self.regex = []
+        self.total = 0
+        self.rewritten = 0
+        self.merged_in = 0
+        self.merged_out = 0
+        self.rejected = 0
+        self.divergent = 0
+
+    @property
+    def eliminated(self) -> int:
+        return self.total - len(self.regex)
+
+    def summary(self) -> str:
+        return (
+            f"regex {self.total} -> {len(self.regex)}（消除 {self.eliminated}）："
+            f"改写 {self.rewritten}（domain {len(self.domain)} / suffix {len(self.suffix)} / "
+            f"keyword {len(self.keyword)}），合并 {self.merged_in} -> {self.merged_out}，"
+            f"校验不通过保留 {self.rejected}，RE2 语义不同保留 {self.divergent}"
+        )
+
+
+def _merge(patterns: list, plan: RegexPlan, merge_max: int) -> None:
+    mergeable, keep = [], []
+    for p in patterns:
+        try:
+            re.compile(p)
+        except re.error:
+            keep.append(p)
+            continue
+        (keep if _UNSAFE_TO_MERGE.search(p) else mergeable).append(p)
+
+    hosts = list(_RANDOM_HOSTS)
+    for p in mergeable:
+        for f in _fragments(p):
+            hosts.extend(probe_hosts(f))
+
+    for i in range(0, len(mergeable), max(1, merge_max)):
+        group = mergeable[i:i + max(1, merge_max)]
+        if len(group) < 2:
+            keep.extend(group)
+            continue
+        merged = "|".join(f"(?:{p})" for p in group)
+        singles = [re.compile(p) for p in group]
+        combined = re.compile(merged)
+        if all(bool(combined.search(h)) == any(r.search(h) for r in singles) for h in hosts):
+            plan.regex.append(merged)
+            plan.merged_in += len(group)
+            plan.merged_out += 1
+        else:
+            keep.extend(group)
+            plan.rejected += len(group)
+
+    plan.regex.extend(keep)
+
+
+def optimize_domain_regex(patterns, merge_max: int = REGEX_MERGE_MAX) -> RegexPlan:
+    """
+    输入 DOMAIN-REGEX 列表，返回 RegexPlan：
+      domain / suffix / keyword：改写出来的规则（调用方并入对应字段）
+      regex：剩下的（可能已合并）regex
+    """
+    plan = RegexPlan()
+    patterns = sorted(set(p for p in patterns if p))
+    plan.total = len(patterns)
+
+    remaining = []
+    for p in patterns:
+        if _RE2_DIVERGENT.search(p):
+            plan.divergent += 1
+            plan.regex.append(p)
+            continue
+        c = classify(p)
+        if c is None:
+            remaining.append(p)
+            continue
+        kind, value = c
+        hosts = _RANDOM_HOSTS + probe_hosts(value)
+        if not _equivalent(re.compile(p), kind, value, hosts):
+            remaining.append(p)
+            plan.rejected += 1
+            continue
+        getattr(plan, kind).add(value)
+        plan.rewritten += 1
+
+    _merge(remaining, plan, merge_max)
+    return plan
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+规则集客户端开销基准：构建只检查产物非空，从不看它在设备上加载 / 匹配有多贵。
+
+每个产物的规则源（sing-box 源 JSON / remote-delta 快照 / clash YAML / 纯文本，.srs/.mrs 是编译后的
+二进制，这里测它们的规范化源）单独载入 rule_matcher 的参考匹配器（语义同客户端：
+domain / suffix / keyword / regex / CIDR），测：
+  load_ms    解析 + 建索引耗时
+  mem_kb     索引常驻内存（tracemalloc 统计的净分配）
+  synth_lps  合成查询流的每秒查询数（一半命中：由规则条目派生；一半随机不命中）
+  replay_lps 回放查询流（--replay：连接日志或每行一个域名 / IP）的每秒查询数
+匹配时关闭结果缓存，测的是裸匹配开销。
+
+  python3 scripts/rule_bench.py [规则源文件或目录 ...] [--replay conn.log] [--lookups 20000]
+      [--json out.json] [--markdown out.md] [--max-load-ms 500] [--max-mem-mb 64]
+      [--min-lps 20000] [--max-regex 50] [--fail-on-warn]
+
+不给输入时测 remote-delta/*/snapshot.json、singbox/*.json、clash/*.yaml。
+超过阈值的规则集标 ⚠️；加 --fail-on-warn 时有 ⚠️ 就退出码 1（CI 里拦截过大 / regex 过多的规则集）。
+"""
+
+import argparse
+import gc
+import json
+import random
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+from cidr_store import parse_cidr
+from rule_hits import open_log, parse_line
+from rule_matcher import RuleIndex, load_rules_file, ruleset_label, ruleset_name
+
+ROOT = Path(__file__).resolve().parents[1]
+DEFAULT_GLOBS = ("remote-delta/*/snapshot.json", "singbox/*.json", "clash/*.yaml")
+SOURCE_SUFFIXES = (".json", ".yaml", ".yml", ".txt", ".list")
+
+_ALPHABET = "abcdefghijklmnopqrstuvwxyz0123456789"
+
+
+def log(msg: str) -> None:
+    print(msg, flush=True)
+
+
+def collect_inputs(paths) -> list:
+    """文件原样；目录取其中的规则源文件；什么都不给时用默认路径。"""
+    out = []
+    if not paths:
+        for g in DEFAULT_GLOBS:
+            out.extend(sorted(ROOT.glob(g)))
+        return out
+    for p in map(Path, paths):
+        if p.is_dir():
+            out.extend(sorted(x for x in p.iterdir() if x.is_file() and x.suffix in SOURCE_SUFFIXES))
+            out.extend(sorted(p.glob("*/snapshot.json")))
+        elif p.is_file():
+            out.append(p)
+    return out
+
+
+# ========= 查询流 =========
+
+def _rand_label(rnd, n: int = 8) -> str:
+    return "".join(rnd.choice(_ALPHABET) for _ in range(rnd.randint(3, n)))
+
+
+def _rand_ip(rnd, parsed) -> str:
+    import ipaddress
+
+    version, net, plen = parsed
+    bits = 32 if version == 4 else 128
+    host = rnd.getrandbits(bits - plen) if plen < bits else 0
+    addr = net | host
+    return str(ipaddress.IPv4Address(addr) if version == 4 else ipaddress.IPv6Address(addr))
+
+
+def synthetic_stream(rules: dict, n: int, seed: int = 20240601) -> list:
+    """一半由规则条目派生（应命中），一半随机域名 / IP（基本不命中）。"""
+    rnd = random.Random(seed)
+    hits = []
+    for d in rules.get("domain") or ():
+        hits.append(d)
+    for s in rules.get("domain_suffix") or ():
+        s = s.lstrip(".")
+        hits.append(f"{_rand_label(rnd)}.{s}")
+    for k in rules.get("domain_keyword") or ():
+        hits.append(f"{_rand_label(rnd)}{k}{_rand_label(rnd)}.com")
+    for c in rules.get("ip_cidr") or ():
+        parsed = parse_cidr(c)
+        if parsed is not None:
+            hits.append(_rand_ip(rnd, parsed))
+
+    stream = []
+    half = n // 2
+    if hits:
+        stream.extend(rnd.choice(hits) for _ in range(half))
+    while len(stream) < n:
+        if rnd.random() < 0.8:
+            labels = [_rand_label(rnd) for _ in range(rnd.randint(1, 3))]
+            stream.append(".".join(labels + [rnd.choice(("com", "net", "org", "cn", "io"))]))
+        else:
+            stream.append(".".join(str(rnd.randint(1, 254)) for _ in range(4)))
+    rnd.shuffle(stream)
+    return stream
+
+
+def replay_stream(paths, n: int) -> list:
+    """连接日志 / 域名列表 -> 最多 n 个查询（只读前 n 条，内存有界）。"""
+    out = []
+    for path in paths or ():
+        with open_log(path) as f:
+            for line in f:
+                host = parse_line(line) or parse_line(line, "hosts")
+                if host:
+                    out.append(host)
+                    if len(out) >= n:
+                        return out
+    return out
+
+
+# ========= 测量 =========
+
+def build(rules: dict, name: str) -> RuleIndex:
+    idx = RuleIndex(cache_size=0)
+    idx.add(name, rules)
+    return idx
+
+
+def measure_lookups(idx: RuleIndex, stream: list):
+    """返回 (每秒查询数, 命中率)；stream 为空返回 (None, None)。"""
+    if not stream:
+        return None, None
+    match = idx.match
+    t0 = time.perf_counter()
+    matched = 0
+    for h in stream:
+        if match(h):
+            matched += 1
+    elapsed = time.perf_counter() - t0
+    return len(stream) / elapsed if elapsed > 0 else float("inf"), matched / len(stream)
+
+
+def bench_one(path: Path, n: int, replay: list, name: str = "") -> dict:
+    name = name or ruleset_name(path)
+
+    gc.collect()
+    t0 = time.perf_counter()
+    rules = load_rules_file(path)
+    idx = build(rules, name)
+    load_ms = (time.perf_counter() - t0) * 1000
+    del idx
+
+    # 内存单独再建一次（tracemalloc 会拖慢耗时，不和计时混在一起）
+    gc.collect()
+    tracemalloc.start()
+    idx = build(rules, name)
+    mem, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    info = idx.sets[0]
+    synth_lps, synth_hit = measure_lookups(idx, synthetic_stream(rules, n))
+    replay_lps, replay_hit = measure_lookups(idx, replay)
+    return {
+        "name": name,
+        "source": str(path),
+        "entries": info.entries,
+        "counts": dict(sorted(info.counts.items())),
+        "regex": info.counts.get("domain_regex", 0),
+        "load_ms": round(load_ms, 2),
+        "mem_kb": round(mem / 1024, 1),
+        "synth_lps": round(synth_lps) if synth_lps else None,
+        "synth_hit": round(synth_hit, 3) if synth_hit is not None else None,
+        "replay_lps": round(replay_lps) if replay_lps else None,
+        "replay_hit": round(replay_hit, 3) if replay_hit is not None else None,
+        "invalid": idx.invalid,
+    }
+
+
+def check(row: dict, args) -> list:
+    warns = []
+    if args.max_load_ms and row["load_ms"] > args.max_load_ms:
+        warns.append(f"加载 {row['load_ms']}ms > {args.max_load_ms}ms")
+    if args.max_mem_mb and row["mem_kb"] > args.max_mem_mb * 1024:
+        warns.append(f"内存 {row['mem_kb'] / 1024:.1f}MB > {args.max_mem_mb}MB")
+    lps = min(x for x in (row["synth_lps"], row["replay_lps"]) if x) if (row["synth_lps"] or row["replay_lps"]) else None
+    if args.min_lps and lps is not None and lps < args.min_lps:
+        warns.append(f"查询 {lps}/s < {args.min_lps}/s")
+    if args.max_regex and row["regex"] > args.max_regex:
+        warns.append(f"regex {row['regex']} > {args.max_regex}")
+    if row["invalid"]:
+        warns.append(f"无法解析的条目 {row['invalid']}")
+    return warns
+
+
+# ========= 输出 =========
+
+def _fmt(v) -> str:
+    return "-" if v is None else str(v)
+
+
+def format_table(rows: list) -> str:
+    out = [
+        f"{'规则集':<34} {'条目':>8} {'regex':>6} {'加载ms':>9} {'内存KB':>10} {'合成/s':>10} {'命中':>6} {'回放/s':>10} {'命中':>6}"
+    ]
+    for r in rows:
+        out.append(
+            f"{r['name']:<36} {r['entries']:>8} {r['regex']:>6} {r['load_ms']:>9} {r['mem_kb']:>10} "
+            f"{_fmt(r['synth_lps']):>10} {_fmt(r['synth_hit']):>6} {_fmt(r['replay_lps']):>10} {_fmt(r['replay_hit']):>6}"
+        )
+        for w in r["warnings"]:
+            out.append(f"    ⚠️ {w}")
+    return "\n".join(out)
+
+
+def format_markdown(rows: list) -> str:
+    out = [
+        "| 规则集 | 条目 | regex | 加载 ms | 内存 KB | 合成 lookups/s | 回放 lookups/s | 警告 |",
+        "|---|---:|---:|---:|---:|---:|---:|---|",
+    ]
+    for r in rows:
+        out.append(
+            f"| {r['name']} | {r['entries']} | {r['regex']} | {r['load_ms']} | {r['mem_kb']} | "
+            f"{_fmt(r['synth_lps'])} | {_fmt(r['replay_lps'])} | {'⚠️ ' + '; '.join(r['warnings']) if r['warnings'] else ''} |"
+        )
+    return "\n".join(out) + "\n"
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="client-side load / memory / lookup benchmark for rule-set sources")
+    ap.add_argument("inputs", nargs="*", help="规则源文件或目录（默认 remote-delta 快照 + singbox/*.json + clash/*.yaml）")
+    ap.add_argument("--replay", action="append", help="回放用的连接日志 / 域名列表（可多次）")
+    ap.add_argument("--lookups", type=int, default=20000, help="每个规则集的查询次数")
+    ap.add_argument("--json", default="", help="结果另存为 JSON")
+    ap.add_argument("--markdown", default="", help="结果另存为 Markdown 表格（可追加到 $GITHUB_STEP_SUMMARY）")
+    ap.add_argument("--max-load-ms", type=float, default=0, help="加载耗时阈值")
+    ap.add_argument("--max-mem-mb", type=float, default=0, help="内存阈值")
+    ap.add_argument("--min-lps", type=float, default=0, help="每秒查询数下限")
+    ap.add_argument("--max-regex", type=int, default=0, help="regex 条数上限")
+    ap.add_argument("--fail-on-warn", action="store_true", help="有超过阈值的规则集时退出码 1")
+    args = ap.parse_args(argv)
+
+    inputs = collect_inputs(args.inputs)
+    if not inputs:
+        log("❌ 没有找到规则源")
+        return 2
+    replay = replay_stream(args.replay, args.lookups)
+    if args.replay:
+        log(f"🎞️ 回放查询 {len(replay)} 条")
+
+    rows = []
+    for p in inputs:
+        try:
+            row = bench_one(p, args.lookups, replay, ruleset_label(p))
+        except Exception as e:
+            log(f"❌ {p}: {e}")
+            continue
+        row["warnings"] = check(row, args)
+        rows.append(row)
+
+    rows.sort(key=lambda r: (-r["load_ms"], r["name"]))
+    log(format_table(rows))
+    warned = sum(1 for r in rows if r["warnings"])
+    log(f"\n📏 {len(rows)} 个规则集，⚠️ {warned} 个超过阈值")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(rows, f, ensure_ascii=False, indent=2)
+    if args.markdown:
+        with open(args.markdown, "a", encoding="utf-8") as f:
+            f.write(format_markdown(rows))
+    return 1 if warned and args.fail_on_warn else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,489 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+常驻规则查询服务：规则源只解析一次，常驻内存，经 Unix socket 批量查询某个域名 / IP 命中了哪些规则集。
+给 DNS 日志分析、防火墙 hook 之类的自有工具高频调用，免得每次都重新解析一遍规则源。
+
+规则来源（默认 clash singbox geo remote-delta，可用 RULE_DAEMON_DIRS / --dirs 覆盖，递归）：
+  *.json / *.yaml / *.txt           直接解析（rule_matcher）
+  remote-delta/*/snapshot.json      remote-rules.json 产物的规范化源
+  *.srs                             同名 .json 源存在时跳过；否则用 sing-box rule-set decompile 反编译（有 SINGBOX_BIN 时），
+                                    结果按 sha256 缓存到 RULE_DAEMON_CACHE，重启不再反编译
+  *.mrs                             二进制、无反编译工具，跳过（计数）
+
+协议：一行一个请求
+  {"hosts": ["a.com", "1.2.3.4", ...]}  -> {"ok": true, "gen": N, "results": [["singbox/Google", ...], ...]}
+  {"op": "stats"}                       -> 请求数 / 查询数 / 缓存命中率 / 延迟分位数
+  {"op": "sets"}                        -> 已载入的规则集及条目数
+  {"op": "reload"}                      -> 立即重载
+  非 JSON 的一行按单个 host 查询，回 "host<TAB>set1,set2"（方便 socat / nc 在 shell 里用）
+
+规则源变化（mtime / 大小）时后台重建索引再原子替换，查询不中断；SIGHUP 也会触发重载。
+
+  python3 scripts/rule_daemon.py serve [--socket PATH] [--dirs clash singbox ...] [--interval 10]
+  python3 scripts/rule_daemon.py query [--socket PATH] [--batch 512] [host ...]   # 不给 host 时读 stdin
+  python3 scripts/rule_daemon.py stats [--socket PATH]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import signal
+import socket
+import socketserver
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+from rule_matcher import MATCH_CACHE_SIZE, RuleIndex, load_rules_file, ruleset_label
+
+ROOT = Path(__file__).resolve().parents[1]
+
+SOCKET_PATH = os.getenv("RULE_DAEMON_SOCKET", os.path.join(tempfile.gettempdir(), "net-optimize-rules.sock"))
+RULE_DIRS = os.getenv("RULE_DAEMON_DIRS", "clash singbox geo remote-delta").split()
+RELOAD_INTERVAL = float(os.getenv("RULE_DAEMON_INTERVAL", "10"))
+CACHE_DIR = Path(os.getenv("RULE_DAEMON_CACHE", os.path.join(tempfile.gettempdir(), "net-optimize-rules-cache")))
+SINGBOX_BIN = os.getenv("SINGBOX_BIN", "") or shutil.which("sing-box") or ""
+LATENCY_WINDOW = int(os.getenv("RULE_DAEMON_LATENCY_WINDOW", "10000"))
+MAX_LINE = int(os.getenv("RULE_DAEMON_MAX_LINE", str(16 * 1024 * 1024)))
+
+SOURCE_SUFFIXES = (".json", ".yaml", ".yml", ".txt", ".list")
+# 仓库里不是规则源的 JSON
+SKIP_NAMES = {"index.json", "delta.json", "manifest.json"}
+
+
+def log(msg: str) -> None:
+    print(msg, flush=True)
+
+
+# ========= 规则源发现 =========
+
+def scan_sources(dirs) -> tuple:
+    """-> ([(label, 源文件)], 跳过的 .mrs 数, 签名)。签名 = 所有相关文件的 (路径, mtime, 大小)。"""
+    found = []
+    skipped_mrs = 0
+    sig = []
+    for d in dirs:
+        base = Path(d)
+        if not base.is_absolute():
+            base = ROOT / base
+        if not base.is_dir():
+            continue
+        for dirpath, dirnames, filenames in os.walk(base):
+            dirnames.sort()
+            names = set(filenames)
+            for fn in sorted(filenames):
+                p = Path(dirpath) / fn
+                suffix = p.suffix
+                if fn in SKIP_NAMES or fn.endswith(".tmp"):
+                    continue
+                if suffix == ".mrs":
+                    skipped_mrs += 1
+                    continue
+                if suffix == ".srs":
+                    if p.stem + ".json" in names:
+                        continue
+                elif suffix not in SOURCE_SUFFIXES:
+                    continue
+                if p.parent.parent.name == "remote-delta" and fn != "snapshot.json":
+                    continue  # remote-delta/<产物>/ 下的增量文件
+                try:
+                    st = p.stat()
+                except OSError:
+                    continue
+                sig.append((str(p), st.st_mtime_ns, st.st_size))
+                found.append((ruleset_label(p), p))
+    return found, skipped_mrs, tuple(sig)
+
+
+def decompile_srs(path: Path):
+    """.srs -> 反编译出的 JSON 路径（按内容 sha256 缓存）；没有 sing-box 或失败返回 None。"""
+    if not SINGBOX_BIN:
+        return None
+    digest = hashlib.sha256(path.read_bytes()).hexdigest()
+    out = CACHE_DIR / f"{digest}.json"
+    if out.exists():
+        return out
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = out.with_suffix(".json.tmp")
+    r = subprocess.run(
+        [SINGBOX_BIN, "rule-set", "decompile", str(path), "-o", str(tmp)],
+        stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+    )
+    if r.returncode != 0 or not tmp.exists() or tmp.stat().st_size == 0:
+        tmp.unlink(missing_ok=True)
+        return None
+    os.replace(tmp, out)
+    return out
+
+
+# ========= 索引 =========
+
+class Snapshot:
+    """一代索引：RuleIndex + id -> 名字；重载时整体替换。"""
+
+    def __init__(self, gen: int, index: RuleIndex, sig: tuple, stats: dict):
+        self.gen = gen
+        self.index = index
+        self.names = [s.name for s in index.sets]
+        self.sig = sig
+        self.stats = stats
+        self.loaded_at = time.time()
+
+    def lookup(self, host: str) -> list:
+        names = self.names
+        return [names[i] for i in self.index.match(host)]
+
+
+def build_snapshot(gen: int, dirs, cache_size: int) -> Snapshot:
+    t0 = time.perf_counter()
+    found, skipped_mrs, sig = scan_sources(dirs)
+    index = RuleIndex(cache_size)
+    failed = skipped_srs = 0
+    for name, p in found:
+        src = p
+        if p.suffix == ".srs":
+            src = decompile_srs(p)
+            if src is None:
+                skipped_srs += 1
+                continue
+        try:
+            index.add(name, load_rules_file(src), str(p))
+        except Exception as e:
+            failed += 1
+            log(f"⚠️ 载入失败 {p}: {e}")
+    stats = {
+        "sets": len(index.sets),
+        "entries": sum(s.entries for s in index.sets),
+        "skipped_mrs": skipped_mrs,
+        "skipped_srs": skipped_srs,
+        "failed": failed,
+        "invalid": index.invalid,
+        "load_ms": round((time.perf_counter() - t0) * 1000, 1),
+    }
+    return Snapshot(gen, index, sig, stats)
+
+
+# ========= 统计 =========
+
+class LatencyWindow:
+    """最近 N 个请求的服务端耗时（微秒），按需算分位数。"""
+
+    def __init__(self, size: int):
+        self._buf = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, us: float) -> None:
+        with self._lock:
+            self._buf.append(us)
+
+    def percentiles(self) -> dict:
+        with self._lock:
+            xs = sorted(self._buf)
+        if not xs:
+            return {}
+        pick = lambda q: round(xs[min(len(xs) - 1, int(q * len(xs)))], 1)  # noqa: E731
+        return {"p50": pick(0.50), "p90": pick(0.90), "p99": pick(0.99), "max": round(xs[-1], 1), "samples": len(xs)}
+
+
+class RuleDaemon:
+    def __init__(self, dirs, interval: float = RELOAD_INTERVAL, cache_size: int = MATCH_CACHE_SIZE):
+        self.dirs = list(dirs)
+        self.interval = interval
+        self.cache_size = cache_size
+        self.snap = None
+        self.latency = LatencyWindow(LATENCY_WINDOW)
+        self.requests = 0
+        self.lookups = 0
+        self.errors = 0
+        self.reloads = 0
+        self._retired_hits = 0   # 已替换掉的各代索引的缓存命中 / 未命中
+        self._retired_misses = 0
+        self.started = time.time()
+        self._counter_lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+
+    # ---------- 载入 / 热重载 ----------
+
+    def reload(self, force: bool = False) -> bool:
+        """签名变了（或 force）就重建并替换；返回是否替换了。"""
+        with self._reload_lock:
+            cur = self.snap
+            if not force and cur is not None and scan_sources(self.dirs)[2] == cur.sig:
+                return False
+            gen = cur.gen + 1 if cur else 1
+            snap = build_snapshot(gen, self.dirs, self.cache_size)
+            if cur is not None:
+                ci = cur.index.cache_info()
+                self._retired_hits += ci.hits
+                self._retired_misses += ci.misses
+            self.snap = snap  # 引用赋值是原子的，正在进行的查询继续用旧的一代
+            self.reloads += 1 if cur else 0
+            s = snap.stats
+            log(
+                f"📚 第 {gen} 代：{s['sets']} 个规则集 / {s['entries']} 条，{s['load_ms']}ms"
+                f"（跳过 mrs {s['skipped_mrs']}，无法反编译 srs {s['skipped_srs']}，失败 {s['failed']}）"
+            )
+            return True
+
+    def watch(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self.interval)
+            force = self._wake.is_set()
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            try:
+                self.reload(force=force)
+            except Exception as e:
+                log(f"⚠️ 重载失败，继续使用第 {self.snap.gen} 代：{e}")
+
+    def request_reload(self) -> None:
+        self._wake.set()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+
+    # ---------- 请求 ----------
+
+    def handle(self, line: bytes) -> bytes:
+        t0 = time.perf_counter()
+        snap = self.snap
+        n = 0
+        text = line.strip()
+        try:
+            if not text.startswith(b"{"):
+                host = text.decode("utf-8", "replace")
+                n = 1
+                out = f"{host}\t{','.join(snap.lookup(host))}\n".encode()
+            else:
+                req = json.loads(text)
+                op = req.get("op", "lookup")
+                if op == "lookup":
+                    hosts = req.get("hosts") or []
+                    if isinstance(hosts, str):
+                        hosts = [hosts]
+                    n = len(hosts)
+                    lookup = snap.lookup
+                    resp = {"ok": True, "gen": snap.gen, "results": [lookup(h) for h in hosts]}
+                elif op == "stats":
+                    resp = {"ok": True, **self.stats()}
+                elif op == "sets":
+                    resp = {
+                        "ok": True,
+                        "gen": snap.gen,
+                        "sets": [{"name": s.name, "entries": s.entries, "source": s.source} for s in snap.index.sets],
+                    }
+                elif op == "reload":
+                    changed = self.reload(force=True)
+                    resp = {"ok": True, "gen": self.snap.gen, "reloaded": changed}
+                else:
+                    resp = {"ok": False, "error": f"unknown op: {op}"}
+                out = (json.dumps(resp, ensure_ascii=False, separators=(",", ":")) + "\n").encode()
+        except Exception as e:
+            with self._counter_lock:
+                self.errors += 1
+            return (json.dumps({"ok": False, "error": str(e)}, ensure_ascii=False) + "\n").encode()
+
+        with self._counter_lock:
+            self.requests += 1
+            self.lookups += n
+        if n:
+            self.latency.add((time.perf_counter() - t0) * 1e6)
+        return out
+
+    def stats(self) -> dict:
+        snap = self.snap
+        ci = snap.index.cache_info()
+        hits = self._retired_hits + ci.hits
+        misses = self._retired_misses + ci.misses
+        uptime = time.time() - self.started
+        return {
+            "gen": snap.gen,
+            "uptime_s": round(uptime, 1),
+            "requests": self.requests,
+            "lookups": self.lookups,
+            "errors": self.errors,
+            "reloads": self.reloads,
+            "lookups_per_s": round(self.lookups / uptime, 1) if uptime > 0 else 0,
+            "cache": {
+                "size": ci.currsize,
+                "max": ci.maxsize,
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": round(hits / (hits + misses), 4) if hits + misses else None,
+            },
+            "latency_us": self.latency.percentiles(),
+            "index": snap.stats,
+        }
+
+
+# ========= Unix socket 服务 =========
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        daemon = self.server.daemon_ref
+        while True:
+            line = self.rfile.readline(MAX_LINE)
+            if not line:
+                break
+            if not line.strip():
+                continue
+            self.wfile.write(daemon.handle(line))
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def _socket_alive(path: str) -> bool:
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        s.connect(path)
+        return True
+    except OSError:
+        return False
+    finally:
+        s.close()
+
+
+def serve(args) -> int:
+    path = args.socket
+    if os.path.exists(path):
+        if _socket_alive(path):
+            log(f"❌ {path} 已有服务在监听")
+            return 1
+        os.unlink(path)
+
+    daemon = RuleDaemon(args.dirs, args.interval, args.cache_size)
+    daemon.reload(force=True)
+
+    server = _Server(path, _Handler)
+    server.daemon_ref = daemon
+    os.chmod(path, int(args.mode, 8))
+
+    watcher = threading.Thread(target=daemon.watch, name="rule-reload", daemon=True)
+    watcher.start()
+
+    def _shutdown(signum, frame):
+        daemon.stop()
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, _shutdown)
+    signal.signal(signal.SIGINT, _shutdown)
+    if hasattr(signal, "SIGHUP"):
+        signal.signal(signal.SIGHUP, lambda *_: daemon.request_reload())
+
+    log(f"🚀 监听 {path}（每 {args.interval:g}s 检查规则源变化）")
+    try:
+        server.serve_forever(poll_interval=0.5)
+    finally:
+        server.server_close()
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+        s = daemon.stats()
+        log(f"👋 退出：{s['requests']} 个请求 / {s['lookups']} 次查询，缓存命中率 {s['cache']['hit_rate']}")
+    return 0
+
+
+# ========= 客户端 =========
+
+class RuleClient:
+    """给 Python 工具用的同步客户端：lookup(hosts) -> [[规则集名, ...], ...]。"""
+
+    def __init__(self, path: str = SOCKET_PATH, timeout: float = 30):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        self.sock.connect(path)
+        self.rfile = self.sock.makefile("rb")
+
+    def call(self, req: dict) -> dict:
+        self.sock.sendall((json.dumps(req, ensure_ascii=False) + "\n").encode())
+        line = self.rfile.readline(MAX_LINE)
+        if not line:
+            raise ConnectionError("daemon closed connection")
+        resp = json.loads(line)
+        if not resp.get("ok"):
+            raise RuntimeError(resp.get("error") or "request failed")
+        return resp
+
+    def lookup(self, hosts) -> list:
+        return self.call({"hosts": list(hosts)})["results"]
+
+    def close(self) -> None:
+        self.rfile.close()
+        self.sock.close()
+
+
+def query(args) -> int:
+    client = RuleClient(args.socket)
+    try:
+        hosts = args.hosts or (line.strip() for line in sys.stdin)
+        batch = []
+
+        def flush():
+            for h, sets in zip(batch, client.lookup(batch)):
+                print(f"{h}\t{','.join(sets)}")
+            batch.clear()
+
+        for h in hosts:
+            if h:
+                batch.append(h)
+                if len(batch) >= args.batch:
+                    flush()
+        if batch:
+            flush()
+    finally:
+        client.close()
+    return 0
+
+
+def stats(args) -> int:
+    client = RuleClient(args.socket)
+    try:
+        print(json.dumps(client.call({"op": args.op}), ensure_ascii=False, indent=2))
+    finally:
+        client.close()
+    return 0
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="long-running rule-set lookup daemon (Unix socket)")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("serve", help="启动服务")
+    p.add_argument("--socket", default=SOCKET_PATH)
+    p.add_argument("--dirs", nargs="+", default=RULE_DIRS, help="规则源目录（相对仓库根）")
+    p.add_argument("--interval", type=float, default=RELOAD_INTERVAL, help="检查规则源变化的间隔（秒）")
+    p.add_argument("--cache-size", type=int, default=MATCH_CACHE_SIZE, help="LRU 结果缓存条数")
+    p.add_argument("--mode", default="660", help="socket 文件权限（八进制）")
+    p.set_defaults(func=serve)
+
+    p = sub.add_parser("query", help="批量查询（host 参数或 stdin 一行一个）")
+    p.add_argument("--socket", default=SOCKET_PATH)
+    p.add_argument("--batch", type=int, default=512)
+    p.add_argument("hosts", nargs="*")
+    p.set_defaults(func=query)
+
+    for op in ("stats", "sets", "reload"):
+        p = sub.add_parser(op, help=f"{op} 请求")
+        p.add_argument("--socket", default=SOCKET_PATH)
+        p.set_defaults(func=stats, op=op)
+
+    args = ap.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
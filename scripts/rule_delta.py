@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+规则级增量（delta）：Loy-reject / Loy-direct 这类大集合每天只变几行，
+客户端没必要每次都整份下载 .srs / .mrs。
+
+服务端（Diversion_Conversion.py 构建时调用 publish）在 remote-delta/<产物名>/ 下维护：
+  snapshot.json            当前规则快照（规范化 JSON，sha256 即“内容哈希”）
+  delta.json               {"version": 1, "artifact": "Loy-reject.srs", "kind": "srs",
+                            "hash": "<当前快照 sha256>", "size": <快照字节数>,
+                            "deltas": [{"from": "...", "to": "...", "file": "...", "size": ...,
+                                        "add": n, "remove": n}, ...]}   # 旧 -> 新，最多 DELTA_KEEP 代
+  <from12>_<to12>.json     一代增量：{"from", "to", "rules": [{字段: {"add": [...], "remove": [...]}}, ...]}
+
+快照格式：
+  srs: {"kind": "srs", "version": 1, "rules": [sing-box 规则, ...]}（字符串列表字段排序去重）
+  mrs: {"kind": "mrs", "behavior": "domain", "rules": [{"domain": [...]}]}
+增量只描述字符串列表字段的增删；规则结构（条数、其它字段）变了就不出增量，
+链条从这一代重新开始，客户端回退到下载 snapshot.json。
+
+客户端：
+  python3 rule_delta.py apply <remote-delta URL 或目录> <产物名>... -o <输出目录> \\
+      [--sing-box /usr/bin/sing-box] [--mihomo /usr/bin/mihomo]
+
+  本地 <输出目录>/<产物名>.snapshot.json 记录当前快照；能从本地哈希沿增量链走到最新、
+  且增量总大小比整份快照小，就逐代应用增量（每代都校验 to 哈希），否则下载整份快照。
+  然后用本机的 sing-box / mihomo 重新编译出产物（原子替换）。没给编译器时只写源文件
+  （<产物名>.json / .yaml），可以直接当 sing-box / mihomo 的本地规则源用。
+
+  编译器版本不同，本地产物和 CDN 上的二进制不一定逐字节相同，但规则内容由快照哈希保证一致。
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+
+from rules_updater import fetch, write_atomic
+from build_journal import sha256_bytes
+
+DELTA_KEEP = int(os.getenv("DELTA_KEEP", "7"))
+DELTA_INDEX = "delta.json"
+SNAPSHOT_NAME = "snapshot.json"
+DELTA_VERSION = 1
+
+
+def log(msg: str) -> None:
+    print(msg, flush=True)
+
+
+# ========= 快照：规范化 + 哈希 =========
+
+def _is_str_list(v) -> bool:
+    return isinstance(v, list) and all(isinstance(x, str) for x in v)
+
+
+def _canon_rule(rule: dict) -> dict:
+    return {k: (sorted(set(v)) if _is_str_list(v) else v) for k, v in rule.items()}
+
+
+def srs_snapshot(src_json: dict) -> dict:
+    """sing-box rule-set 源 JSON -> 快照。"""
+    rules = [_canon_rule(r) for r in (src_json or {}).get("rules") or [] if isinstance(r, dict)]
+    return {"kind": "srs", "version": (src_json or {}).get("version", 1), "rules": rules}
+
+
+def mrs_snapshot(behavior: str, items: list) -> dict:
+    """mihomo payload 列表 -> 快照。"""
+    return {"kind": "mrs", "behavior": behavior, "rules": [{behavior: sorted(set(items))}]}
+
+
+def dump_snapshot(snap: dict) -> bytes:
+    """规范化序列化（一条一行，git 里 diff 也友好）；哈希就是这串字节的 sha256。"""
+    text = json.dumps(snap, ensure_ascii=False, sort_keys=True, indent=0, separators=(",", ":"))
+    return (text + "\n").encode("utf-8")
+
+
+def _skeleton(snap: dict) -> str:
+    """去掉字符串列表内容后的结构；结构一致才能出增量。"""
+    s = dict(snap)
+    s["rules"] = [{k: (None if _is_str_list(v) else v) for k, v in r.items()} for r in snap["rules"]]
+    return json.dumps(s, sort_keys=True)
+
+
+# ========= 增量：生成 / 应用 =========
+
+def make_delta(old: dict, new: dict):
+    """返回 ([{字段: {"add": [...], "remove": [...]}}, ...], 增加数, 删除数)；结构变了返回 None。"""
+    if _skeleton(old) != _skeleton(new):
+        return None
+    rules, n_add, n_rm = [], 0, 0
+    for o, n in zip(old["rules"], new["rules"]):
+        ops = {}
+        for k, v in n.items():
+            if not _is_str_list(v):
+                continue
+            before, after = set(o.get(k) or []), set(v)
+            add, rm = sorted(after - before), sorted(before - after)
+            if add or rm:
+                ops[k] = {"add": add, "remove": rm}
+                n_add += len(add)
+                n_rm += len(rm)
+        rules.append(ops)
+    return rules, n_add, n_rm
+
+
+def apply_delta(snap: dict, delta: dict) -> dict:
+    rules = []
+    ops_list = delta.get("rules") or []
+    if len(ops_list) != len(snap["rules"]):
+        raise ValueError("delta 规则条数与快照不一致")
+    for r, ops in zip(snap["rules"], ops_list):
+        r = dict(r)
+        for k, op in ops.items():
+            cur = set(r.get(k) or [])
+            cur.difference_update(op.get("remove") or [])
+            cur.update(op.get("add") or [])
+            r[k] = sorted(cur)
+        rules.append(r)
+    out = dict(snap)
+    out["rules"] = rules
+    return out
+
+
+# ========= 服务端：发布 =========
+
+def _read_json(path: Path) -> dict:
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def _write_bytes(path: Path, data: bytes) -> None:
+    write_atomic(str(path), data)
+
+
+def publish(delta_root: Path, artifact: str, snap: dict, keep: int = DELTA_KEEP) -> str:
+    """
+    用本轮快照更新 remote-delta/<artifact>/，返回一行说明（内容没变返回空串）。
+    只保留最近 keep 代增量，已经滚出窗口的增量文件删掉。
+    """
+    d = Path(delta_root) / artifact
+    d.mkdir(parents=True, exist_ok=True)
+    snap_path = d / SNAPSHOT_NAME
+    index = _read_json(d / DELTA_INDEX)
+
+    data = dump_snapshot(snap)
+    new_hash = sha256_bytes(data)
+    old_data = snap_path.read_bytes() if snap_path.exists() else b""
+    old_hash = sha256_bytes(old_data) if old_data else ""
+    if old_hash == new_hash and index.get("hash") == new_hash:
+        return ""
+
+    deltas = [x for x in index.get("deltas") or [] if isinstance(x, dict)]
+    note = "首个快照"
+    if old_data:
+        try:
+            diff = make_delta(json.loads(old_data.decode("utf-8")), snap)
+        except ValueError:
+            diff = None
+        if diff is None:
+            # 结构变了：链条断开，旧增量全部作废
+            deltas = []
+            note = "结构变化，链条重置"
+        else:
+            rules, n_add, n_rm = diff
+            fname = f"{old_hash[:12]}_{new_hash[:12]}.json"
+            body = json.dumps(
+                {"from": old_hash, "to": new_hash, "rules": rules},
+                ensure_ascii=False, sort_keys=True, separators=(",", ":"),
+            ).encode("utf-8")
+            _write_bytes(d / fname, body)
+            deltas.append({
+                "from": old_hash, "to": new_hash, "file": fname,
+                "size": len(body), "add": n_add, "remove": n_rm,
+            })
+            note = f"+{n_add} / -{n_rm}（delta {len(body)} bytes，全量 {len(data)} bytes）"
+
+    deltas = deltas[-keep:] if keep > 0 else []
+    _write_bytes(snap_path, data)
+    _write_bytes(d / DELTA_INDEX, (json.dumps({
+        "version": DELTA_VERSION,
+        "artifact": artifact,
+        "kind": snap["kind"],
+        "hash": new_hash,
+        "size": len(data),
+        "deltas": deltas,
+    }, ensure_ascii=False, indent=2) + "\n").encode("utf-8"))
+
+    live = {x["file"] for x in deltas} | {SNAPSHOT_NAME, DELTA_INDEX}
+    for p in d.iterdir():
+        if p.is_file() and p.name not in live:
+            p.unlink()
+    return f"🧩 delta {artifact}: {note}"
+
+
+def remove(delta_root: Path, artifact: str) -> None:
+    """产物被删（增删同步）时连同它的增量目录一起删。"""
+    d = Path(delta_root) / artifact
+    if d.is_dir():
+        shutil.rmtree(d, ignore_errors=True)
+
+
+# ========= 客户端：应用 =========
+
+def _get(base: str, name: str) -> bytes:
+    if "://" not in base:
+        return (Path(base) / name).read_bytes()
+    _, body, _ = fetch(f"{base.rstrip('/')}/{name}")
+    return body
+
+
+def plan_chain(index: dict, local_hash: str):
+    """从本地哈希沿增量链走到最新，返回增量条目列表；走不通返回 None。"""
+    by_from = {x.get("from"): x for x in index.get("deltas") or [] if isinstance(x, dict)}
+    chain, h = [], local_hash
+    while h != index.get("hash"):
+        step = by_from.get(h)
+        if step is None or len(chain) > len(by_from):
+            return None
+        chain.append(step)
+        h = step.get("to")
+    return chain
+
+
+def build_artifact(snap: dict, artifact: str, out_dir: Path, singbox: str, mihomo: str) -> Path:
+    """快照 -> 源文件，再用本机编译器生成产物；没给编译器就只留源文件。"""
+    if snap["kind"] == "srs":
+        src = out_dir / (Path(artifact).stem + ".json")
+        src_obj = {"version": snap.get("version", 1), "rules": snap["rules"]}
+        write_atomic(str(src), json.dumps(src_obj, ensure_ascii=False, indent=2).encode("utf-8"))
+        cmd = [singbox, "rule-set", "compile", str(src), "-o"] if singbox else None
+    else:
+        behavior = snap["behavior"]
+        src = out_dir / (Path(artifact).stem + ".yaml")
+        lines = "".join(f"  - {x}\n" for x in snap["rules"][0].get(behavior) or [])
+        write_atomic(str(src), ("payload:\n" + lines).encode("utf-8"))
+        cmd = [mihomo, "convert-ruleset", behavior, "yaml", str(src)] if mihomo else None
+
+    if cmd is None:
+        return src
+    dst = out_dir / artifact
+    tmp = out_dir / (artifact + ".tmp")
+    subprocess.run(cmd + [str(tmp)], check=True, stdout=subprocess.DEVNULL)
+    if not tmp.exists() or tmp.stat().st_size == 0:
+        raise RuntimeError(f"编译 {artifact} 没有产出")
+    os.replace(tmp, dst)
+    return dst
+
+
+def apply_one(base: str, artifact: str, out_dir: Path, singbox: str = "", mihomo: str = "") -> int:
+    """更新一个产物，返回本次传输的字节数。"""
+    remote_base = f"{base.rstrip('/')}/{artifact}"
+    index = json.loads(_get(remote_base, DELTA_INDEX).decode("utf-8"))
+    want = index.get("hash")
+
+    snap_path = out_dir / f"{artifact}.snapshot.json"
+    local = snap_path.read_bytes() if snap_path.exists() else b""
+    local_hash = sha256_bytes(local) if local else ""
+
+    if local_hash == want:
+        log(f"✅ {artifact}: 已是最新（{want[:12]}）")
+        return 0
+
+    chain = plan_chain(index, local_hash) if local_hash else None
+    wire = 0
+    snap = None
+    if chain and sum(x.get("size", 0) for x in chain) < index.get("size", 0):
+        snap = json.loads(local.decode("utf-8"))
+        for step in chain:
+            body = _get(remote_base, step["file"])
+            wire += len(body)
+            delta = json.loads(body.decode("utf-8"))
+            snap = apply_delta(snap, delta)
+            if sha256_bytes(dump_snapshot(snap)) != step["to"]:
+                log(f"⚠️ {artifact}: 应用 {step['file']} 后哈希不符，改为下载全量快照")
+                snap = None
+                break
+        else:
+            log(f"🧩 {artifact}: 应用 {len(chain)} 代增量（{wire} bytes）")
+
+    if snap is None:
+        body = _get(remote_base, SNAPSHOT_NAME)
+        wire += len(body)
+        if sha256_bytes(body) != want:
+            raise RuntimeError(f"{artifact}: 快照哈希与 {DELTA_INDEX} 不一致")
+        snap = json.loads(body.decode("utf-8"))
+        log(f"⬇️ {artifact}: 下载全量快照（{len(body)} bytes）")
+
+    data = dump_snapshot(snap)
+    out = build_artifact(snap, artifact, out_dir, singbox, mihomo)
+    # 产物生成成功后再更新本地快照：失败时下次还会从旧快照重试
+    write_atomic(str(snap_path), data)
+    log(f"✅ {artifact}: {local_hash[:12] or '-'} -> {want[:12]}，输出 {out}")
+    return wire
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="rebuild rule-set artifacts locally from remote-delta")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("apply", help="按增量更新本地产物")
+    p.add_argument("base", help="remote-delta 目录的 URL（或本地路径）")
+    p.add_argument("artifacts", nargs="+", help="产物名，如 Loy-reject.srs / Loy-reject_domain.mrs")
+    p.add_argument("-o", "--out-dir", default=".", help="输出目录（同时存放本地快照）")
+    p.add_argument("--sing-box", default=os.getenv("SINGBOX_BIN", ""), help="sing-box 路径（编译 .srs）")
+    p.add_argument("--mihomo", default=os.getenv("MIHOMO_BIN", ""), help="mihomo 路径（编译 .mrs）")
+    args = ap.parse_args(argv)
+
+    out_dir = Path(args.out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    failed = 0
+    wire = 0
+    for artifact in args.artifacts:
+        if artifact != os.path.basename(artifact) or artifact.startswith("."):
+            log(f"❌ 非法产物名: {artifact}")
+            failed += 1
+            continue
+        try:
+            wire += apply_one(args.base, artifact, out_dir, args.sing_box, args.mihomo)
+        except Exception as e:
+            log(f"❌ {artifact}: {e}")
+            failed += 1
+    log(f"📦 传输 {wire} bytes，失败 {failed}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
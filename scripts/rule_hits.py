@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+规则集命中分析：把客户端（sing-box / mihomo）连接日志流式喂给 rule_matcher 索引，
+统计每个规则集的命中数、它造成的匹配开销，并给出推荐顺序（热的在前、冷的建议删掉）。
+
+  python3 scripts/rule_hits.py --rules remote-delta/*.srs/snapshot.json singbox/*.json \\
+      --log /var/log/sing-box.log [--log mihomo.log.gz] [--order a,b,c] [--json report.json]
+
+日志格式（逐行自动识别，认不出的行跳过）：
+  sing-box: ... inbound/xxx[tag]: inbound connection to example.com:443
+            ... inbound/xxx[tag]: inbound packet connection to 1.2.3.4:53
+  mihomo:   ... [TCP] 192.168.1.2:5555 --> example.com:443 match ...
+  hosts:    每行一个域名 / IP（--format hosts）
+
+内存有界：日志逐行读（支持 .gz 和 "-" 标准输入）；每个规则集的热门目标用 Space-Saving（top-K 固定 K 个计数器）；
+精确状态只有“命中规则集组合 -> 次数”，组合数受规则集数量约束，和日志大小无关。
+
+开销模型（估算，单位 ≈ 一次哈希查找；按 sing-box 的匹配方式）：
+  有 domain / domain_suffix：1（后缀树一次查找）
+  每条 domain_keyword：COST_KEYWORD（逐条子串查找）
+  每条 domain_regex：COST_REGEX（逐条 regex）
+  有 ip_cidr：1（有序网段二分）
+一条连接的开销 = 按顺序依次评估的规则集开销之和，直到第一个命中。
+
+推荐顺序：按 命中率 / 单次开销 从大到小（首个命中即停止时期望开销最小的顺序），
+命中数低于 --min-hits 的建议删掉。规则集之间有重叠、且对应不同出站时，调整顺序会改变路由结果，
+报告里会列出受影响的连接数和重叠最多的规则集组合，调整前请确认。
+"""
+
+import argparse
+import gzip
+import json
+import re
+import sys
+import time
+from collections import Counter
+
+from rule_matcher import build_index
+
+COST_LOOKUP = 1.0
+COST_KEYWORD = 0.2
+COST_REGEX = 5.0
+
+TOP_K = 20
+
+_SINGBOX = re.compile(r"inbound (?:packet )?connection to (\S+)")
+_MIHOMO = re.compile(r"\[(?:TCP|UDP)\] \S+ --> (\S+)")
+
+
+def log(msg: str) -> None:
+    print(msg, flush=True)
+
+
+# ========= 日志解析 =========
+
+def split_host(addr: str) -> str:
+    """host:port / [v6]:port / 裸 host -> host。"""
+    addr = addr.strip().strip("\"'")
+    if addr.startswith("["):
+        end = addr.find("]")
+        return addr[1:end] if end > 0 else addr[1:]
+    if addr.count(":") == 1:
+        return addr.rsplit(":", 1)[0]
+    return addr
+
+
+def parse_line(line: str, fmt: str = "auto"):
+    """一行日志 -> 目的 host；不是连接日志返回 None。"""
+    if fmt == "hosts":
+        s = line.strip()
+        return split_host(s) if s and not s.startswith("#") else None
+    if fmt in ("auto", "sing-box"):
+        m = _SINGBOX.search(line)
+        if m:
+            return split_host(m.group(1))
+    if fmt in ("auto", "mihomo"):
+        m = _MIHOMO.search(line)
+        if m:
+            return split_host(m.group(1))
+    return None
+
+
+def open_log(path: str):
+    if path == "-":
+        return sys.stdin
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", errors="replace")
+    return open(path, "r", encoding="utf-8", errors="replace")
+
+
+# ========= Space-Saving top-K =========
+
+class SpaceSaving:
+    """
+    固定 k 个计数器的 top-K 近似（Metwally et al.）：
+    满了以后新元素顶替当前最小计数器，继承其计数并记下误差上界。
+    """
+
+    __slots__ = ("k", "counts", "errors")
+
+    def __init__(self, k: int = TOP_K):
+        self.k = k
+        self.counts = {}
+        self.errors = {}
+
+    def add(self, item, n: int = 1) -> None:
+        c = self.counts
+        if item in c:
+            c[item] += n
+        elif len(c) < self.k:
+            c[item] = n
+            self.errors[item] = 0
+        else:
+            victim = min(c, key=c.get)
+            floor = c.pop(victim)
+            self.errors.pop(victim, None)
+            c[item] = floor + n
+            self.errors[item] = floor
+
+    def top(self, n: int = None):
+        items = sorted(self.counts.items(), key=lambda x: (-x[1], x[0]))
+        return [(k, v, self.errors.get(k, 0)) for k, v in items[: n or self.k]]
+
+
+# ========= 统计 =========
+
+def set_cost(info) -> float:
+    c = info.counts
+    cost = 0.0
+    if c.get("domain") or c.get("domain_suffix"):
+        cost += COST_LOOKUP
+    cost += COST_KEYWORD * c.get("domain_keyword", 0)
+    cost += COST_REGEX * c.get("domain_regex", 0)
+    if info.ip_buckets:
+        cost += COST_LOOKUP
+    return cost
+
+
+def order_cost(order: list, signatures: Counter, costs: list) -> float:
+    """按 order 依次评估、首个命中即停止时，全部连接的总开销。"""
+    total = 0.0
+    for sig, n in signatures.items():
+        hit = set(sig)
+        c = 0.0
+        for sid in order:
+            c += costs[sid]
+            if sid in hit:
+                break
+        total += c * n
+    return total
+
+
+def winner(order: list, sig) -> int:
+    hit = set(sig)
+    for sid in order:
+        if sid in hit:
+            return sid
+    return -1
+
+
+class HitStats:
+    def __init__(self, index, top_k: int = TOP_K):
+        self.index = index
+        self.top_k = top_k
+        self.lines = 0
+        self.connections = 0
+        self.signatures = Counter()
+        self.top_hosts = [SpaceSaving(top_k) for _ in index.sets]
+        self.top_unmatched = SpaceSaving(top_k)
+
+    def feed(self, host: str, order: list) -> None:
+        self.connections += 1
+        sig = self.index.match(host)
+        self.signatures[sig] += 1
+        if not sig:
+            self.top_unmatched.add(host)
+            return
+        w = winner(order, sig)
+        if w >= 0:
+            self.top_hosts[w].add(host)
+
+    def any_hits(self) -> list:
+        hits = [0] * len(self.index.sets)
+        for sig, n in self.signatures.items():
+            for sid in sig:
+                hits[sid] += n
+        return hits
+
+    def first_hits(self, order: list) -> list:
+        hits = [0] * len(self.index.sets)
+        for sig, n in self.signatures.items():
+            w = winner(order, sig)
+            if w >= 0:
+                hits[w] += n
+        return hits
+
+    def reached(self, order: list) -> list:
+        """按 order 评估时，每个规则集被评估了多少次（前面都没命中才会轮到它）。"""
+        out = [0] * len(self.index.sets)
+        for sig, n in self.signatures.items():
+            hit = set(sig)
+            for sid in order:
+                out[sid] += n
+                if sid in hit:
+                    break
+        return out
+
+
+def recommend(stats: HitStats, costs: list, order: list, min_hits: int):
+    """返回 (推荐顺序, 建议删除的规则集)。"""
+    any_hits = stats.any_hits()
+    keep = [sid for sid in order if any_hits[sid] >= min_hits]
+    prune = [sid for sid in order if any_hits[sid] < min_hits]
+    total = max(1, stats.connections)
+    keep.sort(key=lambda sid: (-(any_hits[sid] / total) / max(costs[sid], 1e-9), order.index(sid)))
+    return keep, prune
+
+
+def build_report(stats: HitStats, order: list, min_hits: int) -> dict:
+    idx = stats.index
+    costs = [set_cost(s) for s in idx.sets]
+    any_hits = stats.any_hits()
+    first = stats.first_hits(order)
+    reached = stats.reached(order)
+    new_order, prune = recommend(stats, costs, order, min_hits)
+
+    # 调整顺序 / 删除后，路由结果会变的连接
+    changed = Counter()
+    for sig, n in stats.signatures.items():
+        a, b = winner(order, sig), winner(new_order, sig)
+        if a != b:
+            changed[(a, b)] += n
+
+    overlaps = Counter()
+    for sig, n in stats.signatures.items():
+        if len(sig) > 1:
+            overlaps[sig] += n
+
+    def name(sid):
+        return idx.sets[sid].name if sid >= 0 else "(未命中)"
+
+    sets = []
+    for pos, sid in enumerate(order):
+        info = idx.sets[sid]
+        sets.append({
+            "name": info.name,
+            "position": pos + 1,
+            "entries": info.entries,
+            "hits": first[sid],
+            "any_hits": any_hits[sid],
+            "evaluated": reached[sid],
+            "cost_per_eval": round(costs[sid], 3),
+            "cost": round(reached[sid] * costs[sid], 1),
+            "top": [{"host": h, "count": c, "error": e} for h, c, e in stats.top_hosts[sid].top()],
+        })
+
+    matched = sum(n for sig, n in stats.signatures.items() if sig)
+    return {
+        "lines": stats.lines,
+        "connections": stats.connections,
+        "matched": matched,
+        "sets": sets,
+        "cost_current": round(order_cost(order, stats.signatures, costs), 1),
+        "cost_recommended": round(order_cost(new_order, stats.signatures, costs), 1),
+        "recommended_order": [name(s) for s in new_order],
+        "prune": [name(s) for s in prune],
+        "routing_changes": [
+            {"from": name(a), "to": name(b), "connections": n} for (a, b), n in changed.most_common(TOP_K)
+        ],
+        "routing_changed_connections": sum(changed.values()),
+        "overlaps": [
+            {"sets": [name(s) for s in sig], "connections": n} for sig, n in overlaps.most_common(TOP_K)
+        ],
+        "top_unmatched": [{"host": h, "count": c, "error": e} for h, c, e in stats.top_unmatched.top()],
+    }
+
+
+def format_report(r: dict, top: int) -> str:
+    out = [
+        f"📊 行 {r['lines']}，连接 {r['connections']}，命中任一规则集 {r['matched']}",
+        "",
+        f"{'#':>3}  {'规则集':<28} {'条目':>8} {'命中':>9} {'任一命中':>9} {'被评估':>9} {'单次开销':>8} {'总开销':>11}",
+    ]
+    for s in r["sets"]:
+        out.append(
+            f"{s['position']:>3}  {s['name']:<28} {s['entries']:>8} {s['hits']:>9} {s['any_hits']:>9} "
+            f"{s['evaluated']:>9} {s['cost_per_eval']:>8} {s['cost']:>11}"
+        )
+    out.append("")
+    for s in r["sets"]:
+        if s["top"]:
+            hot = ", ".join(f"{t['host']}({t['count']})" for t in s["top"][:top])
+            out.append(f"🔥 {s['name']}: {hot}")
+    if r["top_unmatched"]:
+        out.append("❔ 未命中: " + ", ".join(f"{t['host']}({t['count']})" for t in r["top_unmatched"][:top]))
+    out.append("")
+    saved = r["cost_current"] - r["cost_recommended"]
+    pct = 100.0 * saved / r["cost_current"] if r["cost_current"] else 0.0
+    out.append(f"✅ 推荐顺序: {' > '.join(r['recommended_order']) or '-'}")
+    out.append(f"🧹 建议删除（冷）: {', '.join(r['prune']) or '-'}")
+    out.append(f"💰 估算开销: 当前 {r['cost_current']} -> 推荐 {r['cost_recommended']}（-{pct:.1f}%）")
+    if r["routing_changed_connections"]:
+        out.append(
+            f"⚠️ 有 {r['routing_changed_connections']} 条连接会改由别的规则集命中"
+            "（规则集对应不同出站时路由会变，调整前请确认）："
+        )
+        for c in r["routing_changes"][:top]:
+            out.append(f"    {c['from']} -> {c['to']}: {c['connections']}")
+    if r["overlaps"]:
+        out.append("🔀 重叠最多的组合: " + "; ".join(
+            f"{'+'.join(o['sets'])}({o['connections']})" for o in r["overlaps"][:top]
+        ))
+    return "\n".join(out)
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="rule-set hit analysis over sing-box / mihomo connection logs")
+    ap.add_argument("--rules", nargs="+", required=True, help="规则源文件（顺序即当前配置里的顺序）")
+    ap.add_argument("--log", action="append", required=True, help="连接日志（可多次；.gz / - 均可）")
+    ap.add_argument("--format", choices=("auto", "sing-box", "mihomo", "hosts"), default="auto")
+    ap.add_argument("--order", default="", help="当前配置里的规则集顺序（逗号分隔的名字），默认按 --rules 顺序")
+    ap.add_argument("--min-hits", type=int, default=1, help="命中数低于此值的规则集建议删除")
+    ap.add_argument("--top", type=int, default=5, help="文本报告里每个规则集列出的热门目标数")
+    ap.add_argument("--json", default="", help="完整报告另存为 JSON")
+    args = ap.parse_args(argv)
+
+    t0 = time.monotonic()
+    index = build_index(args.rules)
+    log(f"📚 载入 {len(index.sets)} 个规则集（{time.monotonic() - t0:.1f}s）")
+
+    by_name = {s.name: i for i, s in enumerate(index.sets)}
+    order = list(range(len(index.sets)))
+    if args.order:
+        names = [n.strip() for n in args.order.split(",") if n.strip()]
+        missing = [n for n in names if n not in by_name]
+        if missing:
+            log(f"❌ --order 里有未载入的规则集: {', '.join(missing)}")
+            return 2
+        order = [by_name[n] for n in names] + [i for i in order if index.sets[i].name not in names]
+
+    stats = HitStats(index)
+    t1 = time.monotonic()
+    for path in args.log:
+        with open_log(path) as f:
+            for line in f:
+                stats.lines += 1
+                host = parse_line(line, args.format)
+                if host:
+                    stats.feed(host, order)
+    elapsed = time.monotonic() - t1
+    log(f"⏱️ 分析 {stats.lines} 行 / {elapsed:.1f}s，缓存 {index.cache_info()}")
+
+    report = build_report(stats, order, args.min_hits)
+    log(format_report(report, args.top))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
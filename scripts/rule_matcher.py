@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+规则集匹配索引：把本仓库的规则源（sing-box 源 JSON / remote-delta 快照 / clash payload YAML / 纯文本列表）
+载入成一个多规则集的查询索引，一次查询返回某个域名 / IP 命中了哪些规则集。
+
+匹配语义按 sing-box：
+  domain          完全相等
+  domain_suffix   "example.com" 匹配自身 + 子域，".example.com" 只匹配子域
+  domain_keyword  子串
+  domain_regex    re.search
+  ip_cidr         目的 IP 落在网段内
+mihomo domain 快照里的 "+.x" 视作自身 + 子域，".x" / "*.x" 视作只匹配子域，其余为完全相等。
+
+索引结构：
+  域名 / 后缀：全局 dict {值: (规则集 id, ...)}，查询时按标签逐级剥离，O(标签数) 次 dict 查找
+  keyword / regex：每个规则集各自合并成一条 regex（C 里跑），编译失败的退回逐条
+  CIDR：按 (版本, 前缀长度) 分桶的 dict {网络地址: (规则集 id, ...)}，查询次数 = 出现过的前缀长度数
+"""
+
+import json
+import os
+import re
+from functools import lru_cache
+from pathlib import Path
+
+from cidr_store import parse_cidr
+
+try:
+    import yaml
+except Exception:
+    yaml = None
+
+MATCH_CACHE_SIZE = int(os.getenv("MATCH_CACHE_SIZE", "65536"))
+
+# _MASKS[v][p]：前缀长度 p 对应的网络掩码
+_MASKS = {
+    4: [((1 << 32) - 1) ^ ((1 << (32 - p)) - 1) for p in range(33)],
+    6: [((1 << 128) - 1) ^ ((1 << (128 - p)) - 1) for p in range(129)],
+}
+
+CLASH_TYPES = {
+    "DOMAIN": "domain",
+    "DOMAIN-SUFFIX": "domain_suffix",
+    "DOMAIN-KEYWORD": "domain_keyword",
+    "DOMAIN-REGEX": "domain_regex",
+    "IP-CIDR": "ip_cidr",
+    "IP-CIDR6": "ip_cidr",
+}
+
+RULE_KEYS = ("domain", "domain_suffix", "domain_keyword", "domain_regex", "ip_cidr")
+
+
+def empty_rules() -> dict:
+    return {k: set() for k in RULE_KEYS}
+
+
+# ========= 载入规则源 =========
+
+def _merge_singbox_rules(out: dict, rules) -> None:
+    for r in rules or []:
+        if not isinstance(r, dict):
+            continue
+        # logical 规则（and / or）嵌套的子规则也收进来：统计命中用，不追求逻辑精确
+        if isinstance(r.get("rules"), list):
+            _merge_singbox_rules(out, r["rules"])
+        for k in RULE_KEYS:
+            v = r.get(k)
+            if isinstance(v, str):
+                v = [v]
+            if isinstance(v, list):
+                out[k].update(x.strip() for x in v if isinstance(x, str) and x.strip())
+
+
+def _merge_mihomo_domains(out: dict, items) -> None:
+    for d in items or []:
+        d = (d or "").strip()
+        if d.startswith("+."):
+            out["domain_suffix"].add(d[2:])
+        elif d.startswith("*."):
+            out["domain_suffix"].add(d[1:])
+        elif d.startswith("."):
+            out["domain_suffix"].add(d)
+        elif d:
+            out["domain"].add(d)
+
+
+def _merge_clash_payload(out: dict, payload) -> None:
+    for line in payload or []:
+        if not isinstance(line, str):
+            continue
+        parts = [p.strip() for p in line.split(",")]
+        key = CLASH_TYPES.get(parts[0].upper()) if len(parts) >= 2 else None
+        if key and parts[1]:
+            out[key].add(parts[1])
+
+
+def _merge_text(out: dict, text: str) -> None:
+    """纯文本：一行一个，CIDR 进 ip_cidr，其余按 domain-text 当后缀（自身 + 子域）。"""
+    for line in text.splitlines():
+        s = line.split("#", 1)[0].strip()
+        if not s:
+            continue
+        if parse_cidr(s) is not None:
+            out["ip_cidr"].add(s)
+        else:
+            out["domain_suffix"].add(s[2:] if s.startswith("+.") else s.lstrip("."))
+
+
+def ruleset_name(path: Path) -> str:
+    """remote-delta/<产物名>/snapshot.json 取目录名，其它取文件名（去扩展名）。"""
+    path = Path(path)
+    if path.name == "snapshot.json":
+        return path.parent.name
+    return path.stem
+
+
+def mihomo_domain_rules(lines) -> dict:
+    """mihomo domain 文本（convert-ruleset domain text 的输入，一行一个）-> {规则类型: set}。"""
+    out = empty_rules()
+    _merge_mihomo_domains(out, (line.split("#", 1)[0] for line in lines))
+    return out
+
+
+def ruleset_label(path) -> str:
+    """带上级目录的名字：singbox/Google 与 clash/Google 区分开；快照取 remote-delta/<产物名>。"""
+    path = Path(path)
+    parent = path.parent.parent if path.name == "snapshot.json" else path.parent
+    return f"{parent.name}/{ruleset_name(path)}" if parent.name else ruleset_name(path)
+
+
+def load_rules_file(path) -> dict:
+    """任一规则源文件 -> {规则类型: set}。认不出格式时按纯文本处理。"""
+    path = Path(path)
+    text = path.read_text(encoding="utf-8", errors="ignore")
+    out = empty_rules()
+
+    obj = None
+    if path.suffix == ".json":
+        try:
+            obj = json.loads(text)
+        except ValueError:
+            obj = None
+    elif path.suffix in (".yaml", ".yml") and yaml is not None:
+        try:
+            obj = yaml.safe_load(text)
+        except Exception:
+            obj = None
+
+    if isinstance(obj, dict) and obj.get("kind") == "mrs":
+        # remote-delta 的 mihomo 快照
+        behavior = obj.get("behavior")
+        for r in obj.get("rules") or []:
+            if behavior == "domain":
+                _merge_mihomo_domains(out, r.get("domain"))
+            elif behavior == "ipcidr":
+                out["ip_cidr"].update(r.get("ipcidr") or [])
+    elif isinstance(obj, dict) and isinstance(obj.get("rules"), list):
+        _merge_singbox_rules(out, obj["rules"])
+    elif isinstance(obj, dict) and isinstance(obj.get("payload"), list):
+        _merge_clash_payload(out, obj["payload"])
+    else:
+        _merge_text(out, text)
+    return out
+
+
+# ========= 索引 =========
+
+class RuleSetInfo:
+    __slots__ = ("name", "counts", "keyword_re", "regex_list", "ip_buckets", "source")
+
+    def __init__(self, name: str, counts: dict, source: str = ""):
+        self.name = name
+        self.counts = counts
+        self.keyword_re = None
+        self.regex_list = []
+        self.ip_buckets = 0  # 用到的 (版本, 前缀长度) 桶数，每个桶查询时一次 dict 查找
+        self.source = source
+
+    @property
+    def entries(self) -> int:
+        return sum(self.counts.values())
+
+
+class RuleIndex:
+    def __init__(self, cache_size: int = MATCH_CACHE_SIZE):
+        self.sets = []
+        self._domain = {}
+        self._suffix = {}       # 自身 + 子域
+        self._suffix_sub = {}   # 只匹配子域
+        self._ip = {}           # (version, prefix) -> {network_int: (id, ...)}
+        self._scan = []         # 有 keyword / regex 的规则集 id
+        self.invalid = 0
+        self._cached = lru_cache(maxsize=cache_size)(self._match_uncached)
+
+    @staticmethod
+    def _add(table: dict, key, sid: int) -> None:
+        cur = table.get(key)
+        if cur is None:
+            table[key] = (sid,)
+        elif cur[-1] != sid:
+            table[key] = cur + (sid,)
+
+    def add(self, name: str, rules: dict, source: str = "") -> int:
+        """加入一个规则集，返回其 id（= 加入顺序）。"""
+        sid = len(self.sets)
+        counts = {k: len(v) for k, v in rules.items() if v}
+        info = RuleSetInfo(name, counts, source)
+
+        for d in rules.get("domain") or ():
+            self._add(self._domain, d.lower(), sid)
+        for s in rules.get("domain_suffix") or ():
+            s = s.lower()
+            if s.startswith("."):
+                self._add(self._suffix_sub, s[1:], sid)
+            else:
+                self._add(self._suffix, s, sid)
+
+        keywords = sorted(rules.get("domain_keyword") or ())
+        if keywords:
+            info.keyword_re = re.compile("|".join(re.escape(k.lower()) for k in keywords))
+        regexes = sorted(rules.get("domain_regex") or ())
+        if regexes:
+            try:
+                info.regex_list = [re.compile("|".join(f"(?:{r})" for r in regexes))]
+            except re.error:
+                for r in regexes:
+                    try:
+                        info.regex_list.append(re.compile(r))
+                    except re.error:
+                        self.invalid += 1
+        if info.keyword_re is not None or info.regex_list:
+            self._scan.append(sid)
+
+        plens = set()
+        for c in rules.get("ip_cidr") or ():
+            parsed = parse_cidr(c)
+            if parsed is None:
+                self.invalid += 1
+                continue
+            version, net, plen = parsed
+            self._add(self._ip.setdefault((version, plen), {}), net, sid)
+            plens.add((version, plen))
+        info.ip_buckets = len(plens)
+
+        self.sets.append(info)
+        self._cached.cache_clear()
+        return sid
+
+    def add_file(self, path, name: str = "") -> int:
+        path = Path(path)
+        return self.add(name or ruleset_name(path), load_rules_file(path), str(path))
+
+    # ---------- 查询 ----------
+
+    def _match_domain(self, host: str, hit: set) -> None:
+        hit.update(self._domain.get(host, ()))
+        hit.update(self._suffix.get(host, ()))
+        i = host.find(".")
+        while i != -1:
+            parent = host[i + 1:]
+            hit.update(self._suffix.get(parent, ()))
+            hit.update(self._suffix_sub.get(parent, ()))
+            i = host.find(".", i + 1)
+        for sid in self._scan:
+            info = self.sets[sid]
+            if info.keyword_re is not None and info.keyword_re.search(host):
+                hit.add(sid)
+            elif any(r.search(host) for r in info.regex_list):
+                hit.add(sid)
+
+    def _match_ip(self, parsed, hit: set) -> None:
+        version, value, _ = parsed
+        masks = _MASKS[version]
+        for (v, plen), table in self._ip.items():
+            if v == version:
+                hit.update(table.get(value & masks[plen], ()))
+
+    def _match_uncached(self, host: str) -> tuple:
+        hit = set()
+        parsed = parse_cidr(host) if host[:1].isdigit() or ":" in host else None
+        if parsed is not None and parsed[2] in (32, 128):
+            self._match_ip(parsed, hit)
+        else:
+            self._match_domain(host, hit)
+        return tuple(sorted(hit))
+
+    def match(self, host: str) -> tuple:
+        """域名或 IP -> 命中的规则集 id（升序）。结果按 LRU 缓存。"""
+        host = (host or "").strip().rstrip(".").lower()
+        if host.startswith("[") and host.endswith("]"):
+            host = host[1:-1]
+        if not host:
+            return ()
+        return self._cached(host)
+
+    def cache_info(self):
+        return self._cached.cache_info()
+
+
+def build_index(paths, cache_size: int = MATCH_CACHE_SIZE) -> RuleIndex:
+    """按给定顺序载入规则源；同名规则集后来的加 #2、#3 区分。"""
+    idx = RuleIndex(cache_size)
+    seen = {}
+    for p in paths:
+        name = ruleset_name(Path(p))
+        seen[name] = seen.get(name, 0) + 1
+        if seen[name] > 1:
+            name = f"{name}#{seen[name]}"
+        idx.add_file(p, name)
+    return idx
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+客户端（路由器 / VPS）规则缓存同步：按 index.json 差量更新。
+
+  python3 rules_updater.py <目录 URL> <本地目录> [--only 'cn*.srs' ...] [--no-prune]
+
+例：
+  python3 rules_updater.py \\
+    https://cdn.jsdelivr.net/gh/SHICHUNHUI88/vps-net-optimize@main/remote-srs \\
+    /etc/sing-box/rules
+
+流程：
+  1) 拉 <目录 URL>/index.json（带 If-None-Match，没变就 304 直接结束）
+  2) 本地文件大小 / sha256 与索引不一致的才下载；下载后校验 sha256 + 大小，原子替换
+  3) 上次索引里有、这次没有的文件删除（只删本工具管理过的文件，--no-prune 关闭）
+  4) 最后写本地 index.json，作为下次比对的基准
+
+只用标准库，单文件拷到设备上就能跑。某个文件校验失败时保留旧文件，退出码 1。
+"""
+
+import argparse
+import fnmatch
+import hashlib
+import json
+import os
+import sys
+import time
+import urllib.error
+import urllib.request
+
+INDEX_NAME = "index.json"
+ETAG_NAME = ".index.etag"
+TIMEOUT = 30
+RETRIES = 3
+USER_AGENT = "vps-net-optimize-rules-updater/1"
+
+
+def log(msg: str) -> None:
+    print(msg, flush=True)
+
+
+def sha256_file(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def fetch(url: str, etag: str = ""):
+    """GET，返回 (status, body, etag)；304 时 body 为 None。网络错误按退避重试。"""
+    headers = {"User-Agent": USER_AGENT}
+    if etag:
+        headers["If-None-Match"] = etag
+    for attempt in range(RETRIES + 1):
+        try:
+            req = urllib.request.Request(url, headers=headers)
+            with urllib.request.urlopen(req, timeout=TIMEOUT) as resp:
+                return resp.status, resp.read(), resp.headers.get("ETag", "")
+        except urllib.error.HTTPError as e:
+            if e.code == 304:
+                return 304, None, etag
+            if e.code < 500 and e.code != 429 or attempt >= RETRIES:
+                raise
+        except (urllib.error.URLError, OSError):
+            if attempt >= RETRIES:
+                raise
+        time.sleep(min(8, 0.5 * 2 ** attempt))
+    raise RuntimeError("unreachable")
+
+
+def read_json(path: str) -> dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def write_atomic(path: str, data: bytes) -> None:
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def safe_name(name: str) -> bool:
+    """索引里的文件名只允许是目录下的普通文件名（防路径穿越）。"""
+    return bool(name) and name == os.path.basename(name) and name not in (".", "..") \
+        and not name.startswith(".")
+
+
+def is_current(path: str, entry: dict) -> bool:
+    try:
+        if os.path.getsize(path) != entry.get("size"):
+            return False
+    except OSError:
+        return False
+    return sha256_file(path) == entry.get("sha256")
+
+
+def sync(base_url: str, local_dir: str, only=None, prune: bool = True) -> int:
+    base_url = base_url.rstrip("/")
+    os.makedirs(local_dir, exist_ok=True)
+    local_index_path = os.path.join(local_dir, INDEX_NAME)
+    etag_path = os.path.join(local_dir, ETAG_NAME)
+
+    local_index = read_json(local_index_path)
+    local_files = local_index.get("files") if isinstance(local_index.get("files"), dict) else {}
+    etag = ""
+    if local_files and os.path.exists(etag_path):
+        with open(etag_path, "r", encoding="utf-8") as f:
+            etag = f.read().strip()
+
+    status, body, new_etag = fetch(f"{base_url}/{INDEX_NAME}", etag)
+    if status == 304:
+        # 索引没变：只确认本地文件还完好，坏了的按旧索引补下载
+        remote = local_index
+        log(f"ℹ️ {INDEX_NAME} 未变化（304）")
+    else:
+        remote = json.loads(body.decode("utf-8"))
+    remote_files = remote.get("files") if isinstance(remote.get("files"), dict) else {}
+
+    wanted = {
+        n: e for n, e in remote_files.items()
+        if safe_name(n) and isinstance(e, dict) and (not only or any(fnmatch.fnmatch(n, p) for p in only))
+    }
+
+    downloaded, unchanged, failed, removed = [], 0, [], []
+    wire = 0
+    for name in sorted(wanted):
+        entry = wanted[name]
+        dst = os.path.join(local_dir, name)
+        if is_current(dst, entry):
+            unchanged += 1
+            continue
+        try:
+            _, data, _ = fetch(f"{base_url}/{name}")
+        except Exception as e:
+            log(f"❌ {name}: 下载失败: {e}")
+            failed.append(name)
+            continue
+        if len(data) != entry.get("size") or hashlib.sha256(data).hexdigest() != entry.get("sha256"):
+            # CDN 上索引和文件可能短暂不一致：保留旧文件，下次再试
+            log(f"❌ {name}: 校验失败（sha256/size 与索引不一致），保留旧文件")
+            failed.append(name)
+            continue
+        write_atomic(dst, data)
+        wire += len(data)
+        downloaded.append(name)
+        log(f"⬇️ {name} ({len(data)} bytes)")
+
+    if prune:
+        for name in sorted(set(local_files) - set(remote_files)):
+            p = os.path.join(local_dir, name)
+            if safe_name(name) and os.path.exists(p):
+                os.remove(p)
+                removed.append(name)
+                log(f"🗑️ {name}")
+
+    # 有失败时不更新基准，下次还会重试这些文件
+    if not failed:
+        if status != 304:
+            write_atomic(local_index_path, json.dumps(remote, ensure_ascii=False, indent=2).encode("utf-8"))
+        if new_etag:
+            write_atomic(etag_path, new_etag.encode("utf-8"))
+
+    log(
+        f"✅ 下载 {len(downloaded)}（{wire} bytes），未变 {unchanged}，"
+        f"删除 {len(removed)}，失败 {len(failed)}"
+    )
+    return 1 if failed else 0
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="sync a local rules cache from a directory index.json")
+    ap.add_argument("base_url", help="产物目录 URL（其下有 index.json）")
+    ap.add_argument("local_dir", help="本地缓存目录")
+    ap.add_argument("--only", action="append", help="只同步匹配的文件名（glob，可多次）")
+    ap.add_argument("--no-prune", action="store_true", help="不删除索引里已消失的文件")
+    args = ap.parse_args(argv)
+    try:
+        return sync(args.base_url, args.local_dir, args.only, prune=not args.no_prune)
+    except Exception as e:
+        log(f"❌ 同步失败: {e}")
+        return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -52,9 +52,18 @@ if [ "$GEOIP_TXT_COUNT" -eq 0 ] || [ "$GEOSITE_TXT_COUNT" -eq 0 ]; then
   exit 1
 fi
 
-echo "[3/6] Clean output (sync add/del)..."
-rm -rf "$OUT_GEOIP_DIR" "$OUT_GEOSITE_DIR"
+echo "[3/6] Prepare staging dirs..."
+# 先编译到临时目录，最后增量同步到 geo/（只重写哈希变了的，只删已消失的；index.json 不动）
 mkdir -p "$OUT_GEOIP_DIR" "$OUT_GEOSITE_DIR" geo
+STAGE_GEOIP_DIR="$WORKDIR/stage_geoip"
+STAGE_GEOSITE_DIR="$WORKDIR/stage_geosite"
+mkdir -p "$STAGE_GEOIP_DIR" "$STAGE_GEOSITE_DIR"
+
+# index.json 元数据：<文件名>\t<字段>\t<值>
+GEOIP_META="$WORKDIR/geoip_meta.tsv"
+GEOSITE_META="$WORKDIR/geosite_meta.tsv"
+: > "$GEOIP_META"
+: > "$GEOSITE_META"
 
 REPORT_FILTERED="geo/REPORT-loy-geosite-filtered.txt"
 REPORT_SKIPPED="geo/REPORT-loy-geosite-skipped-keyword-regexp.txt"
@@ -87,9 +96,10 @@ while IFS= read -r f; do
   tag="${base#geoip_}"; tag="${tag%.txt}"
   [[ "$tag" == "$base" ]] && tag="${base%.txt}"
 
-  out="${OUT_GEOIP_DIR}/${tag}.mrs"
+  out="${STAGE_GEOIP_DIR}/${tag}.mrs"
   if convert_atomic ipcidr "$f" "$out"; then
     geoip_mrs_count=$((geoip_mrs_count+1))
+    printf '%s\tipcidr\t%s\n' "${tag}.mrs" "$(grep -c . "$f" || true)" >> "$GEOIP_META"
   fi
 done < <(find "$WORKDIR/geoip_txt" -type f -name '*.txt' | sort)
 
@@ -108,6 +118,8 @@ while IFS= read -r f; do
 
   out_txt="$WORKDIR/geosite_domain_only/${tag}.txt"
   : > "$out_txt"
+  n_full=0
+  n_suffix=0
 
   while IFS= read -r line; do
     [[ -z "$line" ]] && continue
@@ -118,6 +130,7 @@ while IFS= read -r f; do
         ;;
       full:*)
         echo "${line#full:}" >> "$out_txt"
+        n_full=$((n_full+1))
         ;;
       *)
         if [[ "$line" == .* || "$line" == *"*"* ]]; then
@@ -125,6 +138,7 @@ while IFS= read -r f; do
         else
           echo ".$line" >> "$out_txt"
         fi
+        n_suffix=$((n_suffix+1))
         ;;
     esac
   done < "$f"
@@ -135,15 +149,36 @@ while IFS= read -r f; do
     continue
   fi
 
-  out_mrs="${OUT_GEOSITE_DIR}/${tag}.mrs"
+  out_mrs="${STAGE_GEOSITE_DIR}/${tag}.mrs"
   if convert_atomic domain "$out_txt" "$out_mrs"; then
     geosite_mrs_count=$((geosite_mrs_count+1))
+    printf '%s\tdomain\t%s\n%s\tdomain_suffix\t%s\n' \
+      "${tag}.mrs" "$n_full" "${tag}.mrs" "$n_suffix" >> "$GEOSITE_META"
   fi
 done < <(find "$WORKDIR/geosite_txt" -type f -name '*.txt' | sort)
 
 echo "[INFO] geosite mrs generated: $geosite_mrs_count"
 echo "[INFO] geosite filtered empty tags: $filtered_tags"
 
+echo "[INFO] build geosite prefilter index..."
+# 每个分类一个 Bloom 过滤器打包成一个文件：批量分类 / 重叠分析先过过滤器，只对候选分类精确匹配
+# 先在临时目录生成并自检（无漏报 + 误判率达标），通过才替换 geo/geosite-prefilter.bin
+PREFILTER_TMP="$WORKDIR/geosite-prefilter.bin"
+if python3 "$SCRIPT_DIR/geo_prefilter.py" build "$WORKDIR/geosite_domain_only" -o "$PREFILTER_TMP" --require-dir "$STAGE_GEOSITE_DIR" \
+  && python3 "$SCRIPT_DIR/geo_prefilter.py" check "$PREFILTER_TMP" "$WORKDIR/geosite_domain_only"; then
+  mv -f "$PREFILTER_TMP" geo/geosite-prefilter.bin
+else
+  echo "WARN: prefilter build/check failed, keep previous geo/geosite-prefilter.bin"
+fi
+
+echo "[INFO] sync staging -> geo/ (add/del)..."
+python3 "$SCRIPT_DIR/mirror_sync.py" "$STAGE_GEOIP_DIR"   "$OUT_GEOIP_DIR"   --include '*.mrs'
+python3 "$SCRIPT_DIR/mirror_sync.py" "$STAGE_GEOSITE_DIR" "$OUT_GEOSITE_DIR" --include '*.mrs'
+
+echo "[INFO] write index.json..."
+python3 "$SCRIPT_DIR/artifact_index.py" "$OUT_GEOIP_DIR"   --suffix .mrs --source "$GEOIP_URL"   --meta "$GEOIP_META"
+python3 "$SCRIPT_DIR/artifact_index.py" "$OUT_GEOSITE_DIR" --suffix .mrs --source "$GEOSITE_URL" --meta "$GEOSITE_META"
+
 echo "[6/6] Done. Final counts:"
 echo "geoip mrs:   $(find "$OUT_GEOIP_DIR" -type f -name '*.mrs' | wc -l | tr -d ' ')"
 echo "geosite mrs: $(find "$OUT_GEOSITE_DIR" -type f -name '*.mrs' | wc -l | tr -d ' ')"
@@ -7,17 +7,23 @@ GEOSITE_URL='https://cdn.jsdelivr.net/gh/Loyalsoldier/v2ray-rules-dat@release/ge
 OUT_GEOIP_DIR='singbox/Loy-geoip'
 OUT_GEOSITE_DIR='singbox/Loy-geosite'
 
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+
 WORKDIR="$(mktemp -d)"
 trap 'rm -rf "$WORKDIR"' EXIT
 
-mkdir -p "$OUT_GEOIP_DIR" "$OUT_GEOSITE_DIR"
+mkdir -p "$OUT_GEOIP_DIR" "$OUT_GEOSITE_DIR" "$WORKDIR/geoip_srs" "$WORKDIR/geosite_srs"
 
 curl -fsSL --retry 3 --retry-delay 2 "$GEOIP_URL" -o "$WORKDIR/geoip.dat"
 curl -fsSL --retry 3 --retry-delay 2 "$GEOSITE_URL" -o "$WORKDIR/geosite.dat"
 
-# 清空旧文件，避免残留
-rm -f "$OUT_GEOIP_DIR"/*.srs 2>/dev/null || true
-rm -f "$OUT_GEOSITE_DIR"/*.srs 2>/dev/null || true
+geodat2srs geoip   -i "$WORKDIR/geoip.dat"   -o "$WORKDIR/geoip_srs"
+geodat2srs geosite -i "$WORKDIR/geosite.dat" -o "$WORKDIR/geosite_srs"
+
+# 增量同步（代替清空重写）：只重写哈希变了的，只删已消失的，避免残留
+python3 "$SCRIPT_DIR/mirror_sync.py" "$WORKDIR/geoip_srs"   "$OUT_GEOIP_DIR"   --include '*.srs'
+python3 "$SCRIPT_DIR/mirror_sync.py" "$WORKDIR/geosite_srs" "$OUT_GEOSITE_DIR" --include '*.srs'
 
-geodat2srs geoip   -i "$WORKDIR/geoip.dat"   -o "$OUT_GEOIP_DIR"
-geodat2srs geosite -i "$WORKDIR/geosite.dat" -o "$OUT_GEOSITE_DIR"
\ No newline at end of file
+# 每个目录写 index.json（sha256 / size / 源地址 / 构建时间）
+python3 "$SCRIPT_DIR/artifact_index.py" "$OUT_GEOIP_DIR"   --suffix .srs --source "$GEOIP_URL"
+python3 "$SCRIPT_DIR/artifact_index.py" "$OUT_GEOSITE_DIR" --suffix .srs --source "$GEOSITE_URL"
@@ -0,0 +1,34 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "scripts"))
+
+from cidr_store import CidrStore, _split_prefixes, parse_cidr  # noqa: E402
+
+
+def test_empty_prefix_is_invalid_per_item():
+    assert parse_cidr("1.2.3.4/") is None
+    assert parse_cidr("::1/") is None
+
+
+def test_empty_prefix_is_invalid_in_mixed_block():
+    # 有的带 "/" 有的不带：走 partition 分支，空前缀不能被补成 /32
+    assert _split_prefixes(["1.2.3.4/", "5.6.7.8"], 32) is None
+    assert _split_prefixes(["::1/", "2001:db8::1"], 128) is None
+    assert _split_prefixes(["1.2.3.4", "5.6.7.8/8"], 32) == (("1.2.3.4", "5.6.7.8"), [32, 8])
+
+
+def test_empty_prefix_is_invalid_in_slash_block():
+    assert _split_prefixes(["1.2.3.4/", "5.6.7.8/8"], 32) is None
+
+
+def test_store_rejects_empty_prefix_on_both_paths():
+    for items, want in (
+        (["1.2.3.4/"], []),
+        (["1.2.3.4/", "5.6.7.8"], ["5.6.7.8/32"]),
+        (["1.2.3.4/", "5.6.7.8/8"], ["5.0.0.0/8"]),
+        (["::1/", "2001:db8::1"], ["2001:db8::1/128"]),
+    ):
+        store = CidrStore(items)
+        assert store.to_list() == want
+        assert store.invalid == 1